@@ -126,6 +126,11 @@ def create_app(config_class=Config):
     db.init_app(app)
     logger.info("数据库扩展已初始化")
     
+    # 人员、分组、战斗记录通过 ORM 修改后使统计结果缓存失效
+    from app.models import Person, PlayerGroup, BattleRecord
+    from app.utils.result_cache import register_cache_invalidation
+    register_cache_invalidation(Person, PlayerGroup, BattleRecord)
+    
     # 注册蓝图
     from app.routes.battle import battle_bp
     from app.routes.home import home_bp
@@ -160,6 +165,10 @@ def create_app(config_class=Config):
     app.register_blueprint(player_group_bp)
     logger.info("蓝图已注册: /auth, /api/auth, /api/battle, /api/person, /api/player_group, /api/dashboard, /battle, /, /person, /reward, /player_group")
     
+    # 注册命令行命令
+    from app.commands import register_commands
+    register_commands(app)
+    
     # 为需要登录的蓝图添加保护
     for blueprint in [home_bp, battle_bp, player_group_bp]:
         for view_func in blueprint.view_functions.values():
@@ -176,6 +185,15 @@ def create_app(config_class=Config):
         except Exception as e:
             logger.error(f"数据库连接失败: {str(e)}", exc_info=True)
     
+    # 重新提交上次进程退出前排队中的解析任务，只在处理请求的进程中执行，命令行命令不受影响
+    @app.before_first_request
+    def resume_ingest_jobs():
+        try:
+            from app.utils.ingest_jobs import resume_pending_jobs
+            resume_pending_jobs(app)
+        except Exception as e:
+            logger.warning(f"恢复排队中的解析任务失败: {str(e)}")
+    
     # 请求前中间件
     @app.before_request
     def before_request():
@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+命令行管理命令，通过 flask <命令> 调用
+"""
+
+import os
+import glob
+import time
+from datetime import timedelta
+import click
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from app import db
+from app.config import Config
+from app.models.player import BattleRecord
+from app.utils.file_parser import (
+    parse_log_file,
+    battle_record_key,
+    load_existing_players,
+    save_battle_log_to_db
+)
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.services.battle_service import (
+    backfill_battle_record_person_ids,
+    backfill_battle_record_coordinates,
+    PERSON_ID_BACKFILL_CHUNK_SIZE
+)
+from app.services.stats_service import (
+    rebuild_player_daily_stats,
+    rebuild_kill_pair_daily,
+    rebuild_kill_heatmap_daily,
+    rebuild_kill_timeline_minute,
+    battle_record_day_range,
+    exclude_archived_days
+)
+from app.services import partition_service
+from app.utils import migrations
+from app.utils.result_cache import bump_data_generation
+from app.utils.log_parser import EVENT_KILL, EVENT_BLESSING, iter_event_batches
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 历史日志回填时每个事务写入的事件数
+BACKFILL_BATCH_SIZE = 20000
+
+# 重建每日汇总时每个事务覆盖的天数
+REBUILD_DAYS_PER_BATCH = 31
+
+
+def register_commands(app):
+    """注册命令行命令"""
+    app.cli.add_command(ingest_dir_command)
+    app.cli.add_command(backfill_person_ids_command)
+    app.cli.add_command(rebuild_daily_stats_command)
+    app.cli.add_command(rebuild_kill_pairs_command)
+    app.cli.add_command(backfill_coordinates_command)
+    app.cli.add_command(rebuild_heatmap_command)
+    app.cli.add_command(rebuild_timeline_command)
+    app.cli.add_command(db_command)
+    app.cli.add_command(partitions_command)
+
+
+def collect_log_files(paths):
+    """
+    展开目录和通配符，返回去重排序后的日志文件列表
+
+    目录会递归查找扩展名在 ALLOWED_EXTENSIONS 中的文件。
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if name.rsplit('.', 1)[-1].lower() in Config.ALLOWED_EXTENSIONS:
+                        files.add(os.path.join(root, name))
+        else:
+            files.update(p for p in glob.glob(path, recursive=True) if os.path.isfile(p))
+    return sorted(files)
+
+
+def merge_events(parsed_files):
+    """
+    合并各文件的解析结果，按时间排序并在内存中跨文件去重
+
+    Returns:
+        tuple: (事件列表, 重复击杀数, 重复祝福数)
+    """
+    events = []
+    seen_kills = set()
+    seen_blessings = set()
+    duplicate_kills = 0
+    duplicate_blessings = 0
+    for battle_details, blessings in parsed_files:
+        for detail in battle_details:
+            key = battle_record_key(detail)
+            if key in seen_kills:
+                duplicate_kills += 1
+                continue
+            seen_kills.add(key)
+            events.append((EVENT_KILL, detail))
+        for blessing in blessings:
+            key = (blessing['player_name'], blessing['blessing_name'], blessing['timestamp'])
+            if key in seen_blessings:
+                duplicate_blessings += 1
+                continue
+            seen_blessings.add(key)
+            events.append((EVENT_BLESSING, blessing))
+
+    # 同一时间戳内击杀排在祝福之前，与日志中的顺序一致
+    events.sort(key=lambda event: (event[1]['timestamp'], event[0] != EVENT_KILL))
+    return events, duplicate_kills, duplicate_blessings
+
+
+@click.command('ingest-dir')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--workers', '-w', type=int, default=os.cpu_count() or 1, show_default=True,
+              help='解析日志的进程数')
+@click.option('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, show_default=True,
+              help='每个事务写入的事件数')
+@click.option('--dry-run', is_flag=True, help='只解析和去重，不写入数据库')
+@with_appcontext
+def ingest_dir_command(paths, workers, batch_size, dry_run):
+    """批量回填历史战斗日志：PATHS 可以是目录或通配符，如 'logs/2025-*/*.txt'"""
+    files = collect_log_files(paths)
+    if not files:
+        raise click.ClickException(f"没有找到日志文件: {', '.join(paths)}")
+    click.echo(f"共 {len(files)} 个日志文件，使用 {workers} 个进程解析")
+
+    start_time = time.perf_counter()
+    parsed_files = []
+    total_lines = 0
+    total_bytes = 0
+
+    # 1. 多进程解析
+    with click.progressbar(length=len(files), label='解析日志') as bar:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(parse_log_file, path) for path in files]
+                for future in as_completed(futures):
+                    path, encoding, lines, battle_details, blessings = future.result()
+                    parsed_files.append((battle_details, blessings))
+                    total_lines += lines
+                    total_bytes += os.path.getsize(path)
+                    bar.update(1)
+        else:
+            for path in files:
+                path, encoding, lines, battle_details, blessings = parse_log_file(path)
+                parsed_files.append((battle_details, blessings))
+                total_lines += lines
+                total_bytes += os.path.getsize(path)
+                bar.update(1)
+    parse_time = time.perf_counter() - start_time
+
+    # 2. 合并排序并跨文件去重
+    events, duplicate_kills, duplicate_blessings = merge_events(parsed_files)
+    parsed_files = None
+    merge_time = time.perf_counter() - start_time - parse_time
+    kill_count = sum(1 for kind, _ in events if kind == EVENT_KILL)
+    click.echo(
+        f"解析 {total_lines} 行 ({total_bytes / 1024 / 1024:.1f} MB)，耗时 {parse_time:.2f}s；"
+        f"合并后 {kill_count} 条击杀、{len(events) - kill_count} 条祝福，"
+        f"跨文件重复 {duplicate_kills} 条击杀、{duplicate_blessings} 条祝福"
+    )
+
+    if dry_run:
+        click.echo("--dry-run: 不写入数据库")
+        return
+
+    # 3. 按批写库，每批一个事务
+    stats = {'inserted': 0, 'skipped': 0, 'blessings_updated': 0}
+    existing_players = load_existing_players()
+    write_start = time.perf_counter()
+    with click.progressbar(length=len(events), label='写入数据库') as bar:
+        for battle_details, blessings in iter_event_batches(events, batch_size):
+            success, message = save_battle_log_to_db(
+                battle_details, blessings, existing_players=existing_players, stats=stats
+            )
+            if not success:
+                raise click.ClickException(message)
+            bar.update(len(battle_details) + len(blessings))
+    write_time = time.perf_counter() - write_start
+    total_time = time.perf_counter() - start_time
+
+    click.echo(
+        f"写入完成：插入 {stats['inserted']} 条战斗记录，跳过 {stats['skipped']} 条已存在记录，"
+        f"更新 {stats['blessings_updated']} 条祝福标记"
+    )
+    click.echo(f"解析: {parse_time:.2f}s, {total_lines / parse_time:,.0f} 行/秒")
+    click.echo(f"合并: {merge_time:.2f}s")
+    click.echo(f"写库: {write_time:.2f}s, {len(events) / write_time:,.0f} 条/秒" if write_time else "写库: 0s")
+    click.echo(
+        f"总计: {total_time:.2f}s, {total_lines / total_time:,.0f} 行/秒, "
+        f"{len(events) / total_time:,.0f} 条事件/秒, 新增 {stats['inserted'] / total_time:,.0f} 条记录/秒"
+    )
+
+
+@click.command('backfill-person-ids')
+@click.option('--chunk-size', type=int, default=PERSON_ID_BACKFILL_CHUNK_SIZE, show_default=True,
+              help='每条 UPDATE 覆盖的记录 id 区间')
+@with_appcontext
+def backfill_person_ids_command(chunk_size):
+    """按 person.name 回填 battle_record.win_person_id / lost_person_id"""
+    min_id, max_id = db.session.query(func.min(BattleRecord.id), func.max(BattleRecord.id)).one()
+    if min_id is None:
+        click.echo("battle_record 表为空，无需回填")
+        return
+
+    start_time = time.perf_counter()
+    last_id = min_id - 1
+    with click.progressbar(length=max_id - min_id + 1, label='回填 person id') as bar:
+        def report(end_id, _max_id):
+            nonlocal last_id
+            bar.update(end_id - last_id)
+            last_id = end_id
+
+        updated = backfill_battle_record_person_ids(chunk_size, progress_callback=report)
+    click.echo(f"回填完成：更新 {updated} 条战斗记录，耗时 {time.perf_counter() - start_time:.2f}s")
+    click.echo("请执行 flask rebuild-daily-stats、flask rebuild-kill-pairs、flask rebuild-heatmap 和 flask rebuild-timeline 重建汇总")
+
+
+@click.command('backfill-coordinates')
+@click.option('--chunk-size', type=int, default=PERSON_ID_BACKFILL_CHUNK_SIZE, show_default=True,
+              help='每条 UPDATE 覆盖的记录 id 区间')
+@with_appcontext
+def backfill_coordinates_command(chunk_size):
+    """从 position 解析并回填 battle_record.x_coord / y_coord"""
+    min_id, max_id = db.session.query(func.min(BattleRecord.id), func.max(BattleRecord.id)).one()
+    if min_id is None:
+        click.echo("battle_record 表为空，无需回填")
+        return
+
+    start_time = time.perf_counter()
+    last_id = min_id - 1
+    with click.progressbar(length=max_id - min_id + 1, label='回填坐标') as bar:
+        def report(end_id, _max_id):
+            nonlocal last_id
+            bar.update(end_id - last_id)
+            last_id = end_id
+
+        updated = backfill_battle_record_coordinates(chunk_size, progress_callback=report)
+    click.echo(f"回填完成：更新 {updated} 条战斗记录，耗时 {time.perf_counter() - start_time:.2f}s")
+    click.echo("请执行 flask rebuild-heatmap 重建热力图汇总")
+
+
+def rebuild_daily_table(model, rebuild_func, label, start_day, end_day, days_per_batch):
+    """
+    按日期分批从 battle_record 重建按天汇总的表，每批一个事务
+
+    Args:
+        model: 汇总表模型，需要有 stat_date 列
+        rebuild_func: rebuild_func(开始日期, 结束日期) 重建左闭右开日期区间，返回写入行数
+        label: 进度条和提示中的名称
+        start_day / end_day: 命令行传入的起止日期（均包含），None 表示战斗记录的最早/最晚日期
+    """
+    first_day, last_day = battle_record_day_range()
+    if first_day is None:
+        click.echo("battle_record 表为空，无需重建")
+        return
+
+    full_rebuild = start_day is None and end_day is None
+    start_day = start_day.date() if start_day else first_day
+    end_day = end_day.date() + timedelta(days=1) if end_day else last_day
+    if start_day >= end_day:
+        raise click.ClickException("开始日期必须早于结束日期")
+
+    start_time = time.perf_counter()
+    if full_rebuild:
+        # 全量重建时同时清理战斗记录时间范围之外的汇总（已归档的月份除外）
+        model.query.filter(
+            db.or_(model.stat_date < first_day, model.stat_date >= last_day),
+            exclude_archived_days(model.stat_date)
+        ).delete(synchronize_session=False)
+
+    total_days = (end_day - start_day).days
+    rows = 0
+    with click.progressbar(length=total_days, label=f'重建{label}') as bar:
+        batch_start = start_day
+        while batch_start < end_day:
+            batch_end = min(batch_start + timedelta(days=days_per_batch), end_day)
+            rows += rebuild_func(batch_start, batch_end)
+            db.session.commit()
+            bar.update((batch_end - batch_start).days)
+            batch_start = batch_end
+    bump_data_generation(f'重建{label}')
+
+    click.echo(f"重建完成：{start_day} ~ {end_day - timedelta(days=1)}，写入 {rows} 行{label}，耗时 {time.perf_counter() - start_time:.2f}s")
+
+
+@click.command('rebuild-daily-stats')
+@click.option('--start', 'start_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='开始日期（包含），默认最早的战斗记录')
+@click.option('--end', 'end_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='结束日期（包含），默认最晚的战斗记录')
+@click.option('--days-per-batch', type=int, default=REBUILD_DAYS_PER_BATCH, show_default=True,
+              help='每个事务重建的天数')
+@with_appcontext
+def rebuild_daily_stats_command(start_day, end_day, days_per_batch):
+    """从 battle_record 重建 player_daily_stats 每日汇总"""
+    rebuild_daily_table(PlayerDailyStats, rebuild_player_daily_stats, '每日汇总', start_day, end_day, days_per_batch)
+
+
+@click.command('rebuild-kill-pairs')
+@click.option('--start', 'start_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='开始日期（包含），默认最早的战斗记录')
+@click.option('--end', 'end_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='结束日期（包含），默认最晚的战斗记录')
+@click.option('--days-per-batch', type=int, default=REBUILD_DAYS_PER_BATCH, show_default=True,
+              help='每个事务重建的天数')
+@with_appcontext
+def rebuild_kill_pairs_command(start_day, end_day, days_per_batch):
+    """从 battle_record 重建 kill_pair_daily 每日击杀对汇总"""
+    rebuild_daily_table(KillPairDaily, rebuild_kill_pair_daily, '击杀对汇总', start_day, end_day, days_per_batch)
+
+
+@click.command('rebuild-heatmap')
+@click.option('--start', 'start_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='开始日期（包含），默认最早的战斗记录')
+@click.option('--end', 'end_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='结束日期（包含），默认最晚的战斗记录')
+@click.option('--days-per-batch', type=int, default=REBUILD_DAYS_PER_BATCH, show_default=True,
+              help='每个事务重建的天数')
+@with_appcontext
+def rebuild_heatmap_command(start_day, end_day, days_per_batch):
+    """从 battle_record 重建 kill_heatmap_daily 每日击杀热力图汇总"""
+    rebuild_daily_table(KillHeatmapDaily, rebuild_kill_heatmap_daily, '热力图汇总', start_day, end_day, days_per_batch)
+
+
+@click.command('rebuild-timeline')
+@click.option('--start', 'start_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='开始日期（包含），默认最早的战斗记录')
+@click.option('--end', 'end_day', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='结束日期（包含），默认最晚的战斗记录')
+@click.option('--days-per-batch', type=int, default=REBUILD_DAYS_PER_BATCH, show_default=True,
+              help='每个事务重建的天数')
+@with_appcontext
+def rebuild_timeline_command(start_day, end_day, days_per_batch):
+    """从 battle_record 重建 kill_timeline_minute 每分钟势力击杀时间线汇总"""
+    rebuild_daily_table(KillTimelineMinute, rebuild_kill_timeline_minute, '时间线汇总', start_day, end_day,
+                        days_per_batch)
+
+
+@click.group('db')
+def db_command():
+    """数据库结构迁移（脚本位于 db/migrations）"""
+
+
+def _echo_migration(action):
+    return lambda migration: click.echo(f"{action} {migration.version}_{migration.name}: {migration.description}")
+
+
+@db_command.command('status')
+@with_appcontext
+def db_status_command():
+    """列出全部迁移及执行时间"""
+    for migration, applied_at in migrations.migration_status():
+        state = applied_at.strftime('%Y-%m-%d %H:%M:%S') if applied_at else '未执行'
+        click.echo(f"{migration.version}_{migration.name:<24} {state:<19}  {migration.description}")
+
+
+@db_command.command('upgrade')
+@click.option('--target', help='升级到的版本号（包含），默认全部')
+@with_appcontext
+def db_upgrade_command(target):
+    """按版本号顺序执行尚未执行的迁移"""
+    try:
+        executed = migrations.upgrade(target, progress_callback=_echo_migration('执行'))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if executed:
+        bump_data_generation('数据库迁移')
+    click.echo(f"执行了 {len(executed)} 个迁移" if executed else "已是最新版本")
+
+
+@db_command.command('downgrade')
+@click.argument('target')
+@with_appcontext
+def db_downgrade_command(target):
+    """回退 TARGET 之后的迁移，TARGET 为 0000 时全部回退"""
+    try:
+        reverted = migrations.downgrade(target, progress_callback=_echo_migration('回退'))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if reverted:
+        bump_data_generation('数据库迁移回退')
+    click.echo(f"回退了 {len(reverted)} 个迁移")
+
+
+@db_command.command('stamp')
+@click.argument('target')
+@with_appcontext
+def db_stamp_command(target):
+    """把 TARGET 及之前的迁移登记为已执行（不执行），用于已手工建好表结构的库"""
+    try:
+        stamped = migrations.stamp(target)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"登记了 {len(stamped)} 个迁移，当前版本 {target}")
+
+
+@click.group('partitions')
+def partitions_command():
+    """battle_record 按月分区的维护和冷数据归档"""
+
+
+def _archive_dir_option(func):
+    return click.option('--archive-dir', help='归档目录，默认 BATTLE_RECORD_ARCHIVE_DIR')(func)
+
+
+@partitions_command.command('status')
+@with_appcontext
+def partitions_status_command():
+    """列出 battle_record 的分区和已归档的月份"""
+    partitions = partition_service.list_partitions()
+    if partitions:
+        for name, _, rows in partitions:
+            click.echo(f"{name:<10} 约 {rows} 行")
+    else:
+        click.echo("battle_record 未分区")
+    for archive in partition_service.archived_months():
+        click.echo(f"已归档 {archive.month:%Y-%m}: {archive.row_count} 条 -> {archive.file_name}，"
+                   f"{archive.archived_at:%Y-%m-%d %H:%M:%S}")
+
+
+@partitions_command.command('rotate')
+@click.option('--horizon', type=int, help='保留最近几个整月的明细，默认 BATTLE_RECORD_ARCHIVE_MONTHS')
+@click.option('--ahead', type=int, help='提前创建几个月的分区，默认 BATTLE_RECORD_FUTURE_PARTITIONS')
+@_archive_dir_option
+@click.option('--dry-run', is_flag=True, help='只列出要创建的分区和要归档的月份')
+@with_appcontext
+def partitions_rotate_command(horizon, ahead, archive_dir, dry_run):
+    """创建未来月份的分区，归档超出保留范围的月份（适合每月由定时任务执行）"""
+    config = current_app.config
+    horizon = config['BATTLE_RECORD_ARCHIVE_MONTHS'] if horizon is None else horizon
+    ahead = config['BATTLE_RECORD_FUTURE_PARTITIONS'] if ahead is None else ahead
+    if dry_run:
+        future = partition_service.plan_future_partitions(ahead)
+        months = partition_service.plan_archive_months(horizon)
+        click.echo(f"将创建分区: {', '.join(partition_service.partition_name(m) for m in future) or '无'}")
+        click.echo(f"将归档月份: {', '.join(f'{m:%Y-%m}' for m in months) or '无'}")
+        return
+
+    start_time = time.perf_counter()
+    try:
+        result = partition_service.rotate_partitions(horizon, ahead, archive_dir)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for item in result['archived']:
+        click.echo(f"已归档 {item['month']:%Y-%m}: {item['rows']} 条 -> {item['file']}")
+    click.echo(f"轮换完成：创建 {len(result['created'])} 个分区，归档 {len(result['archived'])} 个月份，"
+               f"耗时 {time.perf_counter() - start_time:.2f}s")
+
+
+@partitions_command.command('archive')
+@click.argument('month', type=click.DateTime(formats=['%Y-%m']))
+@_archive_dir_option
+@with_appcontext
+def partitions_archive_command(month, archive_dir):
+    """归档 MONTH（如 2025-01）的战斗记录"""
+    try:
+        item = partition_service.archive_month(month.date(), archive_dir)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"已归档 {item['month']:%Y-%m}: {item['rows']} 条 -> {item['file']}")
+
+
+@partitions_command.command('restore')
+@click.argument('month', type=click.DateTime(formats=['%Y-%m']))
+@_archive_dir_option
+@with_appcontext
+def partitions_restore_command(month, archive_dir):
+    """从归档文件恢复 MONTH（如 2025-01）的战斗记录"""
+    try:
+        item = partition_service.restore_month(month.date(), archive_dir)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"已恢复 {item['month']:%Y-%m}: {item['rows']} 条 <- {item['file']}")
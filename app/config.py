@@ -24,10 +24,39 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = os.environ.get('FLASK_ENV') == 'development'  # 在开发环境下显示SQL语句
     
+    # 统计分析后端：sql（默认）或 numpy（内存列式引擎，需要安装 NumPy）
+    ANALYTICS_BACKEND = os.environ.get('ANALYTICS_BACKEND', 'sql')
+    # 列式引擎两次检查数据库变化的最长间隔（秒），用于发现其他进程写入的数据
+    COLUMNAR_REFRESH_INTERVAL = int(os.environ.get('COLUMNAR_REFRESH_INTERVAL', 600))
+
+    # 统计查询结果缓存：最多缓存的结果数、存活时间上限（秒，0 表示不限）
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 600))
+
+    # 首页仪表盘：并发查询的线程数、每个查询的截止时间（秒）
+    DASHBOARD_WORKERS = int(os.environ.get('DASHBOARD_WORKERS', 5))
+    DASHBOARD_QUERY_TIMEOUT = float(os.environ.get('DASHBOARD_QUERY_TIMEOUT', 10))
+
+    # 玩家排名快照：最多保留的快照数（按 LRU 淘汰）、存活时间上限（秒，0 表示不限）
+    RANK_SNAPSHOT_SIZE = int(os.environ.get('RANK_SNAPSHOT_SIZE', 64))
+    RANK_SNAPSHOT_TTL = int(os.environ.get('RANK_SNAPSHOT_TTL', 600))
+
+    # battle_record 归档配置：早于 N 个整月的明细导出到归档目录后删除，MySQL 下提前创建未来 N 个月的分区
+    BATTLE_RECORD_ARCHIVE_DIR = os.environ.get('BATTLE_RECORD_ARCHIVE_DIR') or \
+        os.path.join(os.path.dirname(basedir), 'archives')
+    BATTLE_RECORD_ARCHIVE_MONTHS = int(os.environ.get('BATTLE_RECORD_ARCHIVE_MONTHS', 12))
+    BATTLE_RECORD_FUTURE_PARTITIONS = int(os.environ.get('BATTLE_RECORD_FUTURE_PARTITIONS', 3))
+
     # 上传文件配置
     UPLOAD_FOLDER = os.path.join(os.path.dirname(basedir), 'uploads')
     ALLOWED_EXTENSIONS = {'txt', 'log', 'csv'}
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 限制上传文件大小为 10MB
+    # 单个上传文件的大小上限（未压缩的字节数），默认与请求体上限一致
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', MAX_CONTENT_LENGTH))
+
+    # 后台解析任务：线程数、执行中的任务超过该秒数没有更新进度时视为进程已退出
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+    INGEST_JOB_HEARTBEAT_TIMEOUT = int(os.environ.get('INGEST_JOB_HEARTBEAT_TIMEOUT', 900))
     
     # 调试配置
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
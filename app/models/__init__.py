@@ -1,4 +1,8 @@
 from app.models.player import Person, BattleRecord, PlayerGroup
 from app.models.rankings import Rankings
+from app.models.upload import BattleLogUpload
+from app.models.job import IngestJob
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.models.archive import BattleRecordArchive
 
-__all__ = ['Person', 'BattleRecord', 'PlayerGroup', 'Rankings']
+__all__ = ['Person', 'BattleRecord', 'PlayerGroup', 'Rankings', 'BattleLogUpload', 'IngestJob', 'PlayerDailyStats', 'KillPairDaily', 'KillHeatmapDaily', 'KillTimelineMinute', 'BattleRecordArchive']
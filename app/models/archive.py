@@ -0,0 +1,26 @@
+from app import db
+from datetime import datetime
+
+class BattleRecordArchive(db.Model):
+    """
+    battle_record 归档记录表 - 每个已归档月份一行
+
+    整月明细导出为压缩文件后从 battle_record 删除（MySQL 下删除该月分区），
+    player_daily_stats、kill_pair_daily 中该月的汇总保留，重建汇总时跳过这些月份。
+    恢复后 restored_at 非空，再次归档时更新同一行。
+    """
+    __tablename__ = 'battle_record_archive'
+    __table_args__ = (
+        db.UniqueConstraint('month', name='uk_battle_record_archive_month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False)  # 归档月份（该月 1 日）
+    row_count = db.Column(db.Integer, nullable=False, default=0)  # 归档的战斗记录条数（含已删除的）
+    file_name = db.Column(db.String(255), nullable=False)  # 归档文件名，位于 BATTLE_RECORD_ARCHIVE_DIR
+    checksum = db.Column(db.String(64), nullable=False)  # 归档文件的 SHA-256
+    archived_at = db.Column(db.DateTime, default=datetime.now)  # 归档时间
+    restored_at = db.Column(db.DateTime)  # 恢复时间，未恢复为空
+
+    def __repr__(self):
+        return f'<BattleRecordArchive {self.month:%Y-%m}>'
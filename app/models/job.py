@@ -0,0 +1,68 @@
+from app import db
+from datetime import datetime
+
+class IngestJob(db.Model):
+    """
+    战斗日志解析任务表 - 上传接口只创建任务，由后台线程池执行并上报进度
+    
+    任务表是上传接口和后台线程之间唯一的共享状态，不依赖外部消息队列。
+    """
+    __tablename__ = 'ingest_job'
+    
+    STATUS_PENDING = 'pending'  # 排队中
+    STATUS_RUNNING = 'running'  # 解析中
+    STATUS_SUCCESS = 'success'  # 已完成
+    STATUS_FAILED = 'failed'  # 失败
+    STATUS_DUPLICATE = 'duplicate'  # 相同文件已入库，未解析
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING, index=True)
+    original_filename = db.Column(db.String(255))  # 上传时的文件名
+    content_hash = db.Column(db.String(64), index=True)  # 文件内容 sha256
+    storage_path = db.Column(db.String(255))  # 压缩存储路径(相对上传目录)
+    file_size = db.Column(db.BigInteger, default=0)  # 文件大小(字节)
+    chunk_hashes = db.Column(db.Text)  # 每个完整块的 sha256，JSON 数组，完成后写入上传登记表
+    encoding = db.Column(db.String(20))  # 解码使用的编码
+    resumed_from = db.Column(db.BigInteger, default=0)  # 开始解析的字节偏移
+    lines = db.Column(db.Integer, default=0)  # 已解析行数
+    kills = db.Column(db.Integer, default=0)  # 已解析击杀记录数
+    blessings = db.Column(db.Integer, default=0)  # 已解析祝福记录数
+    inserted = db.Column(db.Integer, default=0)  # 已插入战斗记录数
+    skipped = db.Column(db.Integer, default=0)  # 跳过的重复战斗记录数
+    blessings_updated = db.Column(db.Integer, default=0)  # 已更新祝福标记数
+    message = db.Column(db.String(500))  # 结果或错误信息
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<IngestJob {self.id}: {self.status}>'
+    
+    @property
+    def elapsed_seconds(self):
+        """已用时间(秒)，未开始时为 0"""
+        if not self.started_at:
+            return 0
+        end_time = self.finished_at or datetime.now()
+        return round((end_time - self.started_at).total_seconds(), 2)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.original_filename,
+            'file_size': self.file_size,
+            'resumed_from': self.resumed_from,
+            'lines_parsed': self.lines,
+            'kills': self.kills,
+            'blessings': self.blessings,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'blessings_updated': self.blessings_updated,
+            'elapsed_seconds': self.elapsed_seconds,
+            'message': self.message,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
@@ -50,7 +50,11 @@ class BattleRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     win = db.Column(db.String(100), default='0')  # 被击杀者名称，0表示无击杀
     lost = db.Column(db.String(100), default='0')  # 击杀者名称，0表示未被击杀
+    win_person_id = db.Column(db.Integer)  # win 对应的 person.id，入库时解析，找不到玩家时为空
+    lost_person_id = db.Column(db.Integer)  # lost 对应的 person.id
     position = db.Column(db.String(100))  # 位置坐标，格式: "X,Y"
+    x_coord = db.Column(db.Integer)  # position 中的 X 坐标，入库时解析
+    y_coord = db.Column(db.Integer)  # position 中的 Y 坐标
     remark = db.Column(db.Integer, default=0)  # 备注字段，用于存储祝福次数
     publish_at = db.Column(db.DateTime)  # 战斗时间
     created_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,103 @@
+from app import db
+from datetime import datetime
+
+class PlayerDailyStats(db.Model):
+    """
+    玩家每日战绩汇总表 - 按 (日期, 玩家) 预聚合 battle_record
+    
+    入库时与战斗记录在同一事务中增量更新，整天范围的统计直接读取本表，
+    不再扫描 battle_record。历史数据通过 flask rebuild-daily-stats 重建。
+    """
+    __tablename__ = 'player_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'person_id', name='uk_player_daily_stats_date_person'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)  # 统计日期
+    person_id = db.Column(db.Integer, nullable=False, index=True)  # person.id
+    kills = db.Column(db.Integer, nullable=False, default=0)  # 击杀数
+    deaths = db.Column(db.Integer, nullable=False, default=0)  # 死亡数
+    blessings = db.Column(db.Integer, nullable=False, default=0)  # 带祝福的击杀数
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<PlayerDailyStats {self.stat_date} {self.person_id}>'
+
+
+class KillPairDaily(db.Model):
+    """
+    每日击杀对汇总表 - 按 (日期, 击杀者, 被击杀者) 预聚合 battle_record
+
+    入库时与战斗记录在同一事务中增量更新，势力/分组/玩家的击杀明细按天求和后取前 N 名，
+    不再把 battle_record 与 person 关联两次现场聚合。历史数据通过 flask rebuild-kill-pairs 重建。
+    """
+    __tablename__ = 'kill_pair_daily'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'killer_id', 'victim_id', name='uk_kill_pair_daily_date_pair'),
+        db.Index('idx_kill_pair_daily_killer', 'killer_id', 'stat_date'),
+        db.Index('idx_kill_pair_daily_victim', 'victim_id', 'stat_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)  # 统计日期
+    killer_id = db.Column(db.Integer, nullable=False)  # 击杀者 person.id
+    victim_id = db.Column(db.Integer, nullable=False)  # 被击杀者 person.id
+    kills = db.Column(db.Integer, nullable=False, default=0)  # 击杀次数
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<KillPairDaily {self.stat_date} {self.killer_id}->{self.victim_id}>'
+
+
+class KillHeatmapDaily(db.Model):
+    """
+    每日击杀热力图汇总表 - 按 (日期, 势力, 网格) 预聚合 battle_record 的击杀坐标
+
+    网格边长为 HEATMAP_CELL_SIZE 个坐标单位，cell_x/cell_y 为坐标整除边长后的网格编号；
+    击杀计入击杀者势力所在网格的 kills，同时计入被击杀者势力的 deaths，未解析到玩家的一侧不计入。
+    入库时与战斗记录在同一事务中增量更新，历史数据通过 flask rebuild-heatmap 重建。
+    """
+    __tablename__ = 'kill_heatmap_daily'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'god', 'cell_x', 'cell_y', name='uk_kill_heatmap_daily_date_cell'),
+        db.Index('idx_kill_heatmap_daily_god', 'god', 'stat_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)  # 统计日期
+    god = db.Column(db.String(20), nullable=False)  # 势力
+    cell_x = db.Column(db.Integer, nullable=False)  # 网格 X 编号
+    cell_y = db.Column(db.Integer, nullable=False)  # 网格 Y 编号
+    kills = db.Column(db.Integer, nullable=False, default=0)  # 该势力在此网格的击杀数
+    deaths = db.Column(db.Integer, nullable=False, default=0)  # 该势力在此网格的死亡数
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<KillHeatmapDaily {self.stat_date} {self.god} ({self.cell_x},{self.cell_y})>'
+
+
+class KillTimelineMinute(db.Model):
+    """
+    每分钟战斗时间线汇总表 - 按 (日期, 势力, 当天分钟序号) 预聚合 battle_record
+
+    击杀（含带祝福的击杀）计入击杀者势力，死亡计入被击杀者势力，未解析到玩家的一侧不计入；
+    只保存有战斗的分钟。入库时与战斗记录在同一事务中增量更新，历史数据通过 flask rebuild-timeline 重建。
+    """
+    __tablename__ = 'kill_timeline_minute'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'god', 'minute_of_day', name='uk_kill_timeline_minute_date_god'),
+        db.Index('idx_kill_timeline_minute_god', 'god', 'stat_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)  # 统计日期
+    god = db.Column(db.String(20), nullable=False)  # 势力
+    minute_of_day = db.Column(db.SmallInteger, nullable=False)  # 当天的分钟序号（0 ~ 1439）
+    kills = db.Column(db.Integer, nullable=False, default=0)  # 该势力在这一分钟的击杀数
+    deaths = db.Column(db.Integer, nullable=False, default=0)  # 该势力在这一分钟的死亡数
+    blessings = db.Column(db.Integer, nullable=False, default=0)  # 带祝福的击杀数
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<KillTimelineMinute {self.stat_date} {self.minute_of_day // 60:02d}:{self.minute_of_day % 60:02d} {self.god}>'
@@ -0,0 +1,37 @@
+from app import db
+from datetime import datetime
+import json
+
+class BattleLogUpload(db.Model):
+    """
+    战斗日志上传登记表 - 按内容哈希记录已入库的日志文件
+    
+    chunk_hashes 保存按 chunk_size 切分的每个完整字节块的哈希，用于识别
+    在旧文件基础上追加了新内容的日志，只处理新增的尾部。
+    """
+    __tablename__ = 'battle_log_upload'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)  # 整个文件的 sha256
+    first_chunk_hash = db.Column(db.String(64), index=True)  # 第一个完整块的 sha256，用于查找前缀相同的旧文件
+    chunk_size = db.Column(db.Integer, nullable=False)  # 分块大小(字节)
+    chunk_hashes = db.Column(db.Text)  # 每个完整块的 sha256，JSON 数组
+    file_size = db.Column(db.BigInteger, nullable=False)  # 文件大小(字节)
+    storage_path = db.Column(db.String(255))  # 压缩后按内容寻址的存储路径(相对上传目录)
+    original_filename = db.Column(db.String(255))  # 上传时的文件名
+    encoding = db.Column(db.String(20))  # 解析使用的编码
+    resumed_from = db.Column(db.BigInteger, default=0)  # 从该字节偏移开始解析(前面的内容已由旧文件入库)
+    kill_count = db.Column(db.Integer, default=0)  # 本次解析的击杀记录数
+    blessing_count = db.Column(db.Integer, default=0)  # 本次解析的祝福记录数
+    inserted_count = db.Column(db.Integer, default=0)  # 新插入的战斗记录数
+    skipped_count = db.Column(db.Integer, default=0)  # 跳过的重复战斗记录数
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    create_by = db.Column(db.Integer)
+    
+    def __repr__(self):
+        return f'<BattleLogUpload {self.content_hash[:12]}>'
+    
+    def get_chunk_hashes(self):
+        """返回完整块哈希列表"""
+        return json.loads(self.chunk_hashes) if self.chunk_hashes else []
@@ -7,12 +7,10 @@ from app.utils.jwt_auth import token_required
 from app.utils.logger import get_logger
 from app.extensions import db
 from app.models import Person
-from app.config import Config
 from datetime import datetime, timedelta
 from dateutil import parser
+from app.utils.time_range import datetime_range_bounds, time_window_condition
 from sqlalchemy import text
-import os
-from werkzeug.utils import secure_filename
 
 logger = get_logger()
 
@@ -27,16 +25,20 @@ from app.services.battle_service import (
     get_gods_stats as get_gods_stats_service,
     get_all_jobs as get_all_jobs_service,
     get_faction_kill_details as get_faction_kill_details_service,
-    get_group_kill_details as get_group_kill_details_service
+    get_group_kill_details as get_group_kill_details_service,
+    get_player_battles as get_player_battles_service,
+    get_kill_heatmap as get_kill_heatmap_service,
+    get_battle_timeline as get_battle_timeline_service,
+    get_faction_statistics,
+    PLAYER_BATTLES_PAGE_SIZE,
+    TIMELINE_MAX_POINTS
 )
+from app.services.stats_service import HEATMAP_CELL_SIZE
+from app.services.rank_snapshot import get_player_rank, get_rank_movers, RANK_MOVERS_LIMIT
 
 # 导入必要的函数（从 battle.py）
-from app.routes.battle import (
-    parse_text_file,
-    save_battle_log_to_db,
-    allowed_file,
-    get_faction_statistics
-)
+from app.routes.battle import allowed_file
+from app.utils.ingest_jobs import enqueue_upload, get_job
 
 
 @api_battle_bp.route('/rankings', methods=['GET'])
@@ -104,6 +106,81 @@ def api_get_rankings():
         }), 500
 
 
+def _ranking_filter(value):
+    """势力/职业筛选参数：all 或空表示不筛选"""
+    return None if value in (None, '', 'all') else value
+
+
+@api_battle_bp.route('/rank/<string:player_name>', methods=['GET'])
+@token_required
+def api_get_player_rank(player_name):
+    """API 获取单个玩家的名次和相对上一个周期的名次变化，不返回完整排名列表"""
+    try:
+        player_rank = get_player_rank(
+            player_name,
+            faction=_ranking_filter(request.args.get('faction')),
+            job=_ranking_filter(request.args.get('job')),
+            time_range=request.args.get('time_range', 'today'),
+            start_datetime=request.args.get('start_datetime'),
+            end_datetime=request.args.get('end_datetime')
+        )
+
+        if not player_rank:
+            return jsonify({
+                'status': 'error',
+                'message': f'未找到玩家: {player_name}'
+            }), 404
+
+        return jsonify({
+            'status': 'success',
+            'message': '获取玩家名次成功',
+            'data': player_rank
+        }), 200
+    except Exception as e:
+        logger.error(f"API 获取玩家名次时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取玩家名次失败: {str(e)}'
+        }), 500
+
+
+@api_battle_bp.route('/rankings/movers', methods=['GET'])
+@token_required
+def api_get_rank_movers():
+    """API 获取相对上一个周期名次上升、下降最多的玩家"""
+    try:
+        faction = _ranking_filter(request.args.get('faction'))
+        job = _ranking_filter(request.args.get('job'))
+        time_range = request.args.get('time_range', 'today')
+
+        try:
+            movers = get_rank_movers(
+                faction=faction,
+                job=job,
+                time_range=time_range,
+                start_datetime=request.args.get('start_datetime'),
+                end_datetime=request.args.get('end_datetime'),
+                limit=request.args.get('limit', default=RANK_MOVERS_LIMIT, type=int)
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'status': 'success',
+            'message': '获取名次变化成功',
+            'data': dict(movers, filters={'faction': faction, 'job': job, 'time_range': time_range})
+        }), 200
+    except Exception as e:
+        logger.error(f"API 获取名次变化时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取名次变化失败: {str(e)}'
+        }), 500
+
+
 @api_battle_bp.route('/player/<string:player_name>', methods=['GET'])
 @token_required
 def api_get_player_details(player_name):
@@ -143,6 +220,52 @@ def api_get_player_details(player_name):
         }), 500
 
 
+@api_battle_bp.route('/player/<string:player_name>/battles', methods=['GET'])
+@token_required
+def api_get_player_battles(player_name):
+    """API 分页获取玩家战斗记录，下一页传入上一页返回的 next_cursor"""
+    try:
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', default=PLAYER_BATTLES_PAGE_SIZE, type=int)
+        time_range = request.args.get('time_range')
+        start_datetime = request.args.get('start_datetime')
+        end_datetime = request.args.get('end_datetime')
+        
+        try:
+            page = get_player_battles_service(
+                player_name=player_name,
+                cursor=cursor,
+                limit=limit,
+                time_range=time_range,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        
+        if page is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'未找到玩家: {player_name}'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'message': '获取玩家战斗记录成功',
+            'data': page
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"API 获取玩家 {player_name} 战斗记录时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取玩家战斗记录失败: {str(e)}'
+        }), 500
+
+
 @api_battle_bp.route('/jobs', methods=['GET'])
 @token_required
 def api_get_jobs():
@@ -203,6 +326,83 @@ def api_get_faction_kill_details():
             'message': f'获取势力击杀明细失败: {str(e)}'
         }), 500
 
+
+@api_battle_bp.route('/heatmap', methods=['GET'])
+@token_required
+def api_get_kill_heatmap():
+    """API 获取击杀热力图：按网格汇总的各势力击杀/死亡数，faction 为空时返回所有势力"""
+    try:
+        faction = request.args.get('faction') or None
+        time_range = request.args.get('time_range', 'month')
+        start_datetime = request.args.get('start_datetime')
+        end_datetime = request.args.get('end_datetime')
+        cell_size = request.args.get('cell_size', default=HEATMAP_CELL_SIZE, type=int)
+
+        try:
+            heatmap = get_kill_heatmap_service(
+                faction=faction,
+                time_range=time_range,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                cell_size=cell_size
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'status': 'success',
+            'message': '获取击杀热力图成功',
+            'data': dict(heatmap, faction=faction)
+        }), 200
+    except Exception as e:
+        logger.error(f"API 获取击杀热力图时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取击杀热力图失败: {str(e)}'
+        }), 500
+
+
+@api_battle_bp.route('/timeline', methods=['GET'])
+@token_required
+def api_get_battle_timeline():
+    """API 获取战斗时间线：各势力每个时间桶的击杀/死亡/祝福数，点数不超过 max_points"""
+    try:
+        faction = request.args.get('faction') or None
+        time_range = request.args.get('time_range', 'today')
+        start_datetime = request.args.get('start_datetime')
+        end_datetime = request.args.get('end_datetime')
+        max_points = request.args.get('max_points', default=TIMELINE_MAX_POINTS, type=int)
+
+        try:
+            timeline = get_battle_timeline_service(
+                faction=faction,
+                time_range=time_range,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                max_points=max_points
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'status': 'success',
+            'message': '获取战斗时间线成功',
+            'data': dict(timeline, faction=faction)
+        }), 200
+    except Exception as e:
+        logger.error(f"API 获取战斗时间线时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取战斗时间线失败: {str(e)}'
+        }), 500
+
+
 @api_battle_bp.route('/upload', methods=['POST'])
 @token_required
 def api_upload_battle_log():
@@ -229,42 +429,28 @@ def api_upload_battle_log():
                 'message': '只支持 .txt 文件'
             }), 400
         
-        # 保存文件
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        file.save(file_path)
-        logger.info(f"API 文件已保存: {file_path}")
-        
-        # 解析文件
-        success, message, battle_details, blessings = parse_text_file(file_path)
+        # 保存文件并提交后台解析任务，立即返回任务 id，进度通过 /jobs/<id> 查询
+        logger.info(f"API 提交上传文件解析任务: {file.filename}")
+        job, message = enqueue_upload(file.stream, file.filename, source=request.current_user.get('username'))
         
-        if not success:
-            return jsonify({
-                'status': 'error',
-                'message': f'文件解析失败: {message}'
-            }), 400
-        
-        # 保存到数据库
-        save_success, save_message = save_battle_log_to_db(battle_details, blessings)
-        
-        if save_success:
-            logger.info(f"API 上传成功: {save_message}")
+        if job:
+            logger.info(f"API 上传成功: {message}")
             return jsonify({
                 'status': 'success',
-                'message': f'{message}，{save_message}',
-                'data': {
-                    'battle_count': len(battle_details),
-                    'blessing_count': len(blessings)
-                }
-            }), 200
+                'message': message,
+                'data': job.to_dict()
+            }), 202
         else:
             return jsonify({
                 'status': 'error',
-                'message': f'保存失败: {save_message}'
-            }), 500
+                'message': f'文件处理失败: {message}'
+            }), 400
             
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"API 上传文件时出错: {str(e)}", exc_info=True)
         return jsonify({
@@ -273,6 +459,33 @@ def api_upload_battle_log():
         }), 500
 
 
+@api_battle_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def api_get_ingest_job(job_id):
+    """API 查询上传解析任务进度"""
+    try:
+        job = get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'status': 'error',
+                'message': f'未找到解析任务: {job_id}'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'message': '获取解析任务成功',
+            'data': job.to_dict()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"API 查询解析任务 {job_id} 时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'查询失败: {str(e)}'
+        }), 500
+
+
 @api_battle_bp.route('/faction_stats', methods=['GET'])
 @token_required
 def api_get_faction_stats():
@@ -490,18 +703,11 @@ def api_get_group_details():
                 }), 400
         
         # 构建日期条件
-        date_condition = ""
-        query_params = {
+        date_condition, query_params = time_window_condition('br.publish_at', *datetime_range_bounds(start_datetime, end_datetime))
+        query_params.update({
             'god': god,
             'player_name': player_name
-        }
-        
-        if start_datetime:
-            date_condition += " AND br.publish_at >= :start_datetime"
-            query_params['start_datetime'] = start_datetime
-        if end_datetime:
-            date_condition += " AND br.publish_at <= :end_datetime"
-            query_params['end_datetime'] = end_datetime
+        })
         
         # 首先查询分组信息
         group_query = text("""
@@ -6,13 +6,8 @@ API 仪表盘路由
 """
 
 from flask import Blueprint, request, jsonify
-from app.routes.battle import get_faction_statistics
-from app.services.data_service import (
-    get_faction_stats,
-    get_daily_kills_by_player,
-    get_daily_deaths_by_player,
-    get_daily_scores_by_player
-)
+from app.services.dashboard_service import load_dashboard_data
+from app.utils.result_cache import cache_stats
 from app.utils.logger import get_logger
 from app.utils.jwt_auth import token_required
 
@@ -31,11 +26,16 @@ def api_dashboard():
         if date_range == 'all':
             date_range = 'week'
         
-        # 获取势力统计数据
-        faction_stats, top_deaths, top_killers, top_scorers = get_faction_stats(date_range)
-        
-        # 获取势力人数统计
-        faction_statistics = get_faction_statistics()
+        # 并发获取势力统计、势力人数统计和每日击杀/死亡/得分数据
+        dashboard = load_dashboard_data(date_range)
+        faction_stats = dashboard['faction_stats']
+        top_deaths = dashboard['top_deaths']
+        top_killers = dashboard['top_killers']
+        top_scorers = dashboard['top_scorers']
+        faction_statistics = dashboard['faction_statistics']
+        daily_kills_data = dashboard['daily_kills']
+        daily_deaths_data = dashboard['daily_deaths']
+        daily_scores_data = dashboard['daily_scores']
         
         # 准备图表数据
         chart_data = {
@@ -62,13 +62,6 @@ def api_dashboard():
         total_blessings = sum(chart_data['blessings'])
         total_players = sum(faction_player_counts.values())
         
-        # 获取每日击杀数据
-        daily_kills_data = get_daily_kills_by_player(date_range, limit=5)
-        # 获取每日死亡数据
-        daily_deaths_data = get_daily_deaths_by_player(date_range, limit=5)
-        # 获取每日得分数据
-        daily_scores_data = get_daily_scores_by_player(date_range, limit=5)
-        
         # 构建响应数据
         response_data = {
             'status': 'success',
@@ -95,7 +88,11 @@ def api_dashboard():
                     'deaths': daily_deaths_data,
                     'scores': daily_scores_data
                 },
-                'date_range': date_range
+                'date_range': date_range,
+                # 有查询超时或出错时为 true，对应部分为空数据
+                'partial': dashboard['partial'],
+                'timed_out': dashboard['timed_out'],
+                'failed': dashboard['failed']
             }
         }
         
@@ -108,3 +105,21 @@ def api_dashboard():
             'status': 'error',
             'message': f'获取首页数据失败: {str(e)}'
         }), 500
+
+
+@api_dashboard_bp.route('/dashboard/cache_stats', methods=['GET'])
+@token_required
+def api_cache_stats():
+    """统计结果缓存的命中/未命中等指标"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'message': '获取缓存指标成功',
+            'data': cache_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"API 获取缓存指标时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'获取缓存指标失败: {str(e)}'
+        }), 500
@@ -8,6 +8,8 @@
 from flask import Blueprint, request, jsonify
 from app.models.player import Person
 from app.extensions import db
+from app.services.battle_service import resolve_battle_record_person_ids
+from app.services.stats_service import move_person_faction
 from sqlalchemy import or_, and_, distinct
 from datetime import datetime
 from app.utils.jwt_auth import token_required
@@ -141,6 +143,9 @@ def api_person_add():
         )
         
         db.session.add(person)
+        db.session.flush()
+        # 已入库的战斗记录中可能已有该玩家，补上 person id
+        resolve_battle_record_person_ids([person.name])
         db.session.commit()
         
         logger.info(f"添加人员成功: {person.name}")
@@ -185,6 +190,8 @@ def api_person_edit(id):
             }), 400
         
         # 更新字段
+        old_name = person.name
+        old_god = person.god
         if 'name' in data:
             person.name = data['name']
         if 'god' in data:
@@ -199,6 +206,13 @@ def api_person_edit(id):
         person.updated_at = datetime.now()
         person.update_by = 1  # 这里应该是当前登录用户的ID
         
+        if person.god != old_god:
+            # 热力图和时间线按势力汇总，该玩家现有记录的计数转到新势力
+            move_person_faction(person.id, old_god, person.god)
+        if person.name != old_name:
+            # 改名后旧名称的战斗记录不再属于该玩家，新名称的记录归属该玩家
+            db.session.flush()
+            resolve_battle_record_person_ids([old_name, person.name])
         db.session.commit()
         
         logger.info(f"更新人员成功: {person.name}")
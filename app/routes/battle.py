@@ -11,19 +11,20 @@ from werkzeug.utils import secure_filename
 from app import db
 from app.models.player import Person, BattleRecord
 from app.models.rankings import Rankings
-from app.utils.file_parser import parse_text_file, save_battle_log_to_db
+from app.utils.ingest_jobs import enqueue_upload
 from app.utils.data_service import get_player_rankings, get_battle_details_by_player, export_data_to_json, get_statistics
 from app.config import Config
 from app.utils.logger import get_logger
 from app.utils.battle_report import generate_battle_report, export_battle_sql
 from datetime import datetime, date, time, timedelta
-from sqlalchemy import text, func, distinct, cast, String, DATE, TIME, Integer, or_, case
+from sqlalchemy import text, func, String, Integer, case
 from app.utils.auth import login_required
 from app.utils.jwt_auth import token_required
 import json
 from app.utils.web_scraper import get_rankings_by_scraper
 from dateutil import parser
-from app.services.battle_service import get_player_rankings as get_rankings_service, get_all_jobs
+from app.utils.time_range import time_range_bounds, datetime_range_bounds, time_window_condition
+from app.services.battle_service import get_player_rankings as get_rankings_service, get_all_jobs, get_gods_stats, get_pk_participation, get_pk_participation_dates, get_faction_statistics, get_player_kill_details
 
 logger = get_logger()
 
@@ -64,51 +65,19 @@ def upload_file():
         logger.info(f"收到上传文件: {file.filename}")
         
         if file and allowed_file(file.filename):
-            # 保存文件
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-            
-            # 确保上传目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            logger.debug(f"确保上传目录存在: {os.path.dirname(file_path)}")
-            
+            # 保存文件并提交后台解析任务，已入库的内容不再重复解析
+            logger.info(f"提交上传文件解析任务: {file.filename}")
             try:
-                file.save(file_path)
-                logger.info(f"文件已保存到: {file_path}")
+                job, message = enqueue_upload(file.stream, file.filename, source=session.get('user_id'))
+                if job:
+                    logger.info(f"解析任务已提交: {message}")
+                    flash(message, 'success')
+                else:
+                    logger.error(f"提交解析任务失败: {message}")
+                    flash(message, 'error')
             except Exception as e:
-                logger.error(f"保存文件时出错: {str(e)}", exc_info=True)
-                flash('保存文件时出错: ' + str(e), 'error')
-                return redirect(request.url)
-            
-            # 解析战斗日志文本
-            logger.info(f"开始解析文件: {file_path}")
-            success, message, battle_details, blessings = parse_text_file(file_path)
-            
-            # 如果解析成功但提示数据库连接问题，直接显示消息
-            if success and "数据库连接失败" in message:
-                logger.warning("解析成功但数据库连接失败")
-                flash(message, 'warning')
-                return redirect(url_for('battle.rankings'))
-                
-            if success:
-                logger.info(f"文件解析成功: {message}")
-                # 保存到数据库
-                logger.info("开始将解析结果保存到数据库")
-                try:
-                    save_success, save_message = save_battle_log_to_db(battle_details, blessings)
-                    if save_success:
-                        logger.info(f"数据保存成功: {save_message}")
-                        flash(f"{message}，{save_message}", 'success')
-                    else:
-                        logger.error(f"数据保存失败: {save_message}")
-                        flash(save_message, 'error')
-                except Exception as e:
-                    logger.error(f"保存到数据库时发生异常: {str(e)}", exc_info=True)
-                    error_message = str(e)
-                    flash(f"文件解析成功，但保存到数据库时出错: {error_message}", 'error')
-            else:
-                logger.error(f"文件解析失败: {message}")
-                flash(message, 'error')
+                logger.error(f"解析上传文件时发生异常: {str(e)}", exc_info=True)
+                flash(f"处理上传文件时出错: {str(e)}", 'error')
             
             return redirect(url_for('battle.rankings'))
         else:
@@ -158,26 +127,10 @@ def rankings():
         query_job = raw_job
         selected_job = raw_job
         
-    # 确定时间筛选条件（用于filtered_battle_records CTE，不需要br.前缀）
-    date_condition = ""
-    # 如果提供了具体的开始和结束日期，优先使用
+    # 如果提供了具体的开始和结束日期，优先使用，不使用预设时间范围
+    # （时间条件由服务层 resolve_time_window 统一生成）
     if start_datetime and end_datetime:
-        date_condition = f"AND publish_at BETWEEN '{start_datetime}' AND '{end_datetime}'"
-        # 在这种情况下，不使用预设时间范围
         time_range = None
-    elif time_range == 'today':
-        date_condition = "AND DATE(publish_at) = CURDATE()"
-    elif time_range == 'yesterday':
-        date_condition = "AND DATE(publish_at) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)"
-    elif time_range == 'week':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
-    elif time_range == 'month':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-    elif time_range == 'three_months':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)"
-    elif time_range == 'all':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)"
-    # 如果是'all'则不添加时间筛选
     
     # --- End Modified Filter Logic --- 
 
@@ -238,14 +191,13 @@ def player_details(person_id):
     start_date = request.args.get('start_datetime')
     end_date = request.args.get('end_datetime')
     
-    date_condition = ""
+    start, end = None, None
     # 如果提供了具体的开始和结束日期，优先使用
     if start_date and end_date:
         try:
-            # 格式化日期字符串以防SQL注入并确保格式正确
             start_datetime = parser.parse(start_date)
             end_datetime = parser.parse(end_date)
-            date_condition = f"AND br.publish_at BETWEEN '{start_datetime:%Y-%m-%d %H:%M:%S}' AND '{end_datetime:%Y-%m-%d %H:%M:%S}'"
+            start, end = datetime_range_bounds(start_datetime, end_datetime)
             # 为模板保存格式化后的日期字符串
             start_date = start_datetime.strftime('%Y-%m-%dT%H:%M')
             end_date = end_datetime.strftime('%Y-%m-%dT%H:%M')
@@ -254,28 +206,13 @@ def player_details(person_id):
             # 重置为默认值
             start_date = None
             end_date = None
-            date_condition = ""
-    # 如果没有明确的日期参数但有时间范围，根据时间范围设置日期条件
-    elif time_range:
-        now = datetime.now()
-        if time_range == 'today':
-            date_condition = f"AND DATE(br.publish_at) = '{now:%Y-%m-%d}'"
-        elif time_range == 'yesterday':
-            yesterday = now - timedelta(days=1)
-            date_condition = f"AND DATE(br.publish_at) = '{yesterday:%Y-%m-%d}'"
-        elif time_range == 'week':
-            week_ago = now - timedelta(days=7)
-            date_condition = f"AND br.publish_at >= '{week_ago:%Y-%m-%d}'"
-        elif time_range == 'month':
-            month_ago = now - timedelta(days=30)
-            date_condition = f"AND br.publish_at >= '{month_ago:%Y-%m-%d}'"
-        elif time_range == 'three_months':
-            three_months_ago = now - timedelta(days=90)
-            date_condition = f"AND br.publish_at >= '{three_months_ago:%Y-%m-%d}'"
+    # 如果没有明确的日期参数但有时间范围，按时间范围预设（all 表示不限时间）
+    elif time_range and time_range != 'all':
+        start, end = time_range_bounds(time_range)
     
     try:
-        # 获取玩家战斗明细，传递时间参数
-        player_details = get_battle_details_by_player(person_id, date_condition=date_condition)
+        # 获取玩家战斗明细，传递时间区间
+        player_details = get_battle_details_by_player(person_id, start, end)
         
         if not player_details:
             flash('未找到该玩家的详细信息', 'warning')
@@ -586,30 +523,15 @@ def leaderboard():
 
 @battle_bp.route('/player/<string:player_name>/kills')
 def get_player_kills(player_name):
-    """获取玩家的击杀详情"""
+    """获取玩家的击杀详情（按 kill_pair_daily 汇总全部记录）"""
     try:
-        # 查询玩家的所有击杀记录
-        query = text("""
-            SELECT 
-                p2.name as victim,
-                p2.faction as victim_faction,
-                COUNT(*) as count
-            FROM battle_records br
-            JOIN person p1 ON br.winner_id = p1.id
-            JOIN person p2 ON br.loser_id = p2.id
-            WHERE p1.name = :player_name
-            GROUP BY p2.name, p2.faction
-            ORDER BY count DESC
-        """)
-        
-        result = db.session.execute(query, {'player_name': player_name})
         kills = [
             {
-                'victim': row.victim,
-                'victim_faction': row.victim_faction,
-                'count': row.count
+                'victim': row['name'],
+                'victim_faction': row['god'],
+                'count': row['count']
             }
-            for row in result
+            for row in get_player_kill_details(player_name, 'out')
         ]
         
         return jsonify({'kills': kills})
@@ -682,81 +604,6 @@ def rankings_stats():
         logger.error(f"获取统计数据时出错: {str(e)}", exc_info=True)
         return jsonify({'error': '获取统计数据失败'}), 500
 
-def get_faction_statistics():
-    """
-    获取各个势力的统计数据
-    :return: 各个势力的人数、击杀数和死亡数
-    """
-    logger.info("获取各个势力的统计数据")
-    
-    # 构建查询 - 优化版：先过滤battle_record并聚合，充分利用索引
-    sql = """
-    WITH filtered_battle_records AS (
-        -- 1. 先过滤battle_record表（利用 deleted_at 索引）
-        SELECT win, lost
-        FROM battle_record
-        WHERE deleted_at IS NULL
-    ),
-    win_stats AS (
-        -- 2. 统计每个玩家的击杀记录（利用 win 索引）
-        SELECT 
-            win as player_name,
-            COUNT(*) as kills
-        FROM filtered_battle_records
-        WHERE win IS NOT NULL
-        GROUP BY win
-    ),
-    lost_stats AS (
-        -- 3. 统计每个玩家的死亡记录（利用 lost 索引）
-        SELECT 
-            lost as player_name,
-            COUNT(*) as deaths
-        FROM filtered_battle_records
-        WHERE lost IS NOT NULL
-        GROUP BY lost
-    ),
-    player_stats AS (
-        -- 4. 将统计数据与玩家表JOIN（只保留有战斗记录的玩家）
-        SELECT
-            p.id,
-            p.god,
-            COALESCE(ws.kills, 0) as kills,
-            COALESCE(ls.deaths, 0) as deaths
-        FROM person p
-        LEFT JOIN win_stats ws ON p.name = ws.player_name
-        LEFT JOIN lost_stats ls ON p.name = ls.player_name
-        WHERE p.deleted_at IS NULL
-          AND p.god IS NOT NULL
-          AND (COALESCE(ws.kills, 0) > 0 OR COALESCE(ls.deaths, 0) > 0)
-    )
-    SELECT 
-        god AS faction,
-        COUNT(DISTINCT id) AS player_count,
-        SUM(kills) AS kills,
-        SUM(deaths) AS deaths
-    FROM player_stats
-    GROUP BY god
-    ORDER BY god
-    """
-    
-    # 执行查询
-    result = db.session.execute(text(sql))
-    
-    # 处理结果
-    faction_stats = []
-    for row in result:
-        faction_stats.append({
-            'faction': row.faction,
-            'player_count': row.player_count or 0,
-            'kills': row.kills or 0,
-            'deaths': row.deaths or 0,
-            'score': (row.kills or 0) * 3 - (row.deaths or 0)
-        })
-    
-    logger.debug(f"势力统计数据: {faction_stats}")
-    
-    return faction_stats 
-
 @battle_bp.route('/rankings/faction_stats')
 @login_required
 def rankings_faction_stats():
@@ -818,202 +665,14 @@ def gods_ranking():
         end_datetime_str = end_datetime.strftime('%Y-%m-%dT%H:%M')
     # --- End Default Date Logic ---
     
-    # 获取三个神的数据
-    gods = ['梵天', '比湿奴', '湿婆']
-    stats = {}
-    
     try:
-        for god in gods:
-            # 构建日期条件（用于CTE中的battle_record表）
-            date_condition = ""
-            query_params = {'god': god}
-            
-            if start_datetime:
-                date_condition += " AND publish_at >= :start_datetime"
-                query_params['start_datetime'] = start_datetime
-            if end_datetime:
-                date_condition += " AND publish_at <= :end_datetime"
-                query_params['end_datetime'] = end_datetime
-            
-            # 根据是否需要按玩家分组进行统计选择不同的查询
-            if show_grouped:
-                # 使用玩家分组的查询 - 优化版：先过滤battle_record并聚合，充分利用索引
-                query = text(f"""
-                    WITH filtered_battle_records AS (
-                        -- 1. 先过滤battle_record表（利用 publish_at 和 deleted_at 索引）
-                        SELECT win, lost, remark
-                        FROM battle_record
-                        WHERE deleted_at IS NULL
-                          {date_condition}
-                    ),
-                    win_stats AS (
-                        -- 2. 统计每个玩家的击杀记录（利用 win 索引）
-                        SELECT 
-                            win as player_name,
-                            COUNT(*) as kills,
-                            SUM(COALESCE(remark, 0)) as bless
-                        FROM filtered_battle_records
-                        WHERE win IS NOT NULL
-                        GROUP BY win
-                    ),
-                    lost_stats AS (
-                        -- 3. 统计每个玩家的死亡记录（利用 lost 索引）
-                        SELECT 
-                            lost as player_name,
-                            COUNT(*) as deaths
-                        FROM filtered_battle_records
-                        WHERE lost IS NOT NULL
-                        GROUP BY lost
-                    ),
-                    player_battle_stats AS (
-                        -- 4. 将统计数据与玩家表JOIN（使用等值JOIN，可以走索引）
-                        SELECT
-                            p.id,
-                            p.name,
-                            COALESCE(ws.kills, 0) as kills,
-                            COALESCE(ls.deaths, 0) as deaths,
-                            COALESCE(ws.bless, 0) as bless
-                        FROM person p
-                        LEFT JOIN win_stats ws ON p.name = ws.player_name
-                        LEFT JOIN lost_stats ls ON p.name = ls.player_name
-                        WHERE p.god = :god
-                          AND p.deleted_at IS NULL
-                          AND (COALESCE(ws.kills, 0) > 0 
-                               OR COALESCE(ls.deaths, 0) > 0 
-                               OR COALESCE(ws.bless, 0) > 0)
-                    ),
-                    player_distinct AS (
-                        -- 2. 获取所有有效的玩家ID，并关联其分组信息 (与之前类似)
-                        SELECT
-                            p.id,
-                            p.name AS original_player_name, -- Keep original name if needed
-                            p.god,
-                            COALESCE(p.player_group_id, p.id) AS group_key,
-                            COALESCE(pg.group_name, p.name) AS player_name, -- Display name
-                            CASE
-                                WHEN p.player_group_id IS NOT NULL AND EXISTS (
-                                    SELECT 1 FROM person p2
-                                    WHERE p2.player_group_id = p.player_group_id
-                                    AND p2.id != p.id
-                                    AND p2.deleted_at IS NULL
-                                ) THEN 1
-                                ELSE 0
-                            END AS is_group
-                        FROM
-                            person p
-                        LEFT JOIN
-                            player_group pg ON p.player_group_id = pg.id
-                        WHERE
-                            p.god = :god
-                            AND p.deleted_at IS NULL
-                    )
-                    -- 3. 简化最终聚合：直接聚合 player_distinct 和 player_battle_stats
-                    SELECT
-                        pd.player_name AS name, -- Display name (group or individual)
-                        MAX(pd.is_group) AS is_group, -- Get the is_group flag for the group
-                        SUM(COALESCE(pbs.kills, 0)) AS kills,
-                        SUM(COALESCE(pbs.deaths, 0)) AS deaths,
-                        SUM(COALESCE(pbs.bless, 0)) AS bless
-                    FROM
-                        player_distinct pd
-                    LEFT JOIN
-                        player_battle_stats pbs ON pd.id = pbs.id -- Join member info to their stats by ID
-                    GROUP BY
-                        pd.group_key, pd.player_name -- Group by the unique group key and its display name
-                    HAVING
-                        SUM(COALESCE(pbs.kills, 0)) > 0 OR SUM(COALESCE(pbs.deaths, 0)) > 0 OR SUM(COALESCE(pbs.bless, 0)) > 0 -- Keep filtering
-                    ORDER BY
-                        kills DESC, deaths ASC, bless DESC
-                """)
-            else:
-                # 原始查询（不考虑玩家分组） - 优化版: 先过滤battle_record并聚合，充分利用索引
-                query = text(f"""
-                    WITH filtered_battle_records AS (
-                        -- 1. 先过滤battle_record表（利用 publish_at 和 deleted_at 索引）
-                        SELECT win, lost, remark
-                        FROM battle_record
-                        WHERE deleted_at IS NULL
-                          {date_condition}
-                    ),
-                    win_stats AS (
-                        -- 2. 统计每个玩家的击杀记录（利用 win 索引）
-                        SELECT 
-                            win as player_name,
-                            COUNT(*) as kills,
-                            SUM(COALESCE(remark, 0)) as bless
-                        FROM filtered_battle_records
-                        WHERE win IS NOT NULL
-                        GROUP BY win
-                    ),
-                    lost_stats AS (
-                        -- 3. 统计每个玩家的死亡记录（利用 lost 索引）
-                        SELECT 
-                            lost as player_name,
-                            COUNT(*) as deaths
-                        FROM filtered_battle_records
-                        WHERE lost IS NOT NULL
-                        GROUP BY lost
-                    ),
-                    player_stats AS (
-                        -- 4. 将统计数据与玩家表JOIN（使用等值JOIN，可以走索引）
-                        SELECT 
-                            p.id,
-                            CONCAT(p.name, '(', IFNULL(p.job, '无'), ')') AS name,
-                            COALESCE(ws.kills, 0) as kills,
-                            COALESCE(ls.deaths, 0) as deaths,
-                            COALESCE(ws.bless, 0) as bless
-                        FROM person p
-                        LEFT JOIN win_stats ws ON p.name = ws.player_name
-                        LEFT JOIN lost_stats ls ON p.name = ls.player_name
-                        WHERE p.god = :god
-                          AND p.deleted_at IS NULL
-                          AND (COALESCE(ws.kills, 0) > 0 
-                               OR COALESCE(ls.deaths, 0) > 0 
-                               OR COALESCE(ws.bless, 0) > 0)
-                    )
-                    SELECT 
-                        name,
-                        kills,
-                        deaths,
-                        bless
-                    FROM player_stats
-                    ORDER BY kills DESC, deaths ASC, bless DESC
-                """)
-            
-            # 获取玩家数据
-            player_stats = []
-            total_kills = 0
-            total_deaths = 0
-            total_bless = 0
-            
-            for row in db.session.execute(query, query_params):
-                # --- DEBUGGING: Print raw row data --- 
-                # print(f"DEBUG ROW: {row._asdict()}") 
-                # --- END DEBUGGING ---
-                
-                player_data = {
-                    'name': row.name,
-                    'kills': int(row.kills or 0),
-                    'deaths': int(row.deaths or 0),
-                    'bless': int(row.bless or 0)
-                }
-                
-                # 如果是分组查询，添加is_group字段
-                if show_grouped:
-                    player_data['is_group'] = bool(row.is_group) if hasattr(row, 'is_group') else False
-                    
-                player_stats.append(player_data)
-                total_kills += int(row.kills or 0)
-                total_deaths += int(row.deaths or 0)
-                total_bless += int(row.bless or 0)
-            
-            stats[god] = {
-                'kills': total_kills,
-                'deaths': total_deaths,
-                'bless': total_bless,
-                'players': player_stats,
-                'player_count': len(player_stats)
-            }
+        # 三神统计由服务层一次查询完成
+        stats = get_gods_stats(start_datetime, end_datetime, show_grouped)
+        if not show_grouped:
+            # 不分组时显示为 游戏ID(职业)
+            for data in stats.values():
+                for player in data['players']:
+                    player['name'] = f"{player['name']}({player['job']})"
         
         return render_template('battle/gods.html', 
                              stats=stats,
@@ -1059,18 +718,11 @@ def group_details():
                 return jsonify({'error': '结束时间格式不正确'}), 400
         
         # 构建日期条件
-        date_condition = ""
-        query_params = {
+        date_condition, query_params = time_window_condition('br.publish_at', *datetime_range_bounds(start_datetime, end_datetime))
+        query_params.update({
             'god': god,
             'player_name': player_name
-        }
-        
-        if start_datetime:
-            date_condition += " AND br.publish_at >= :start_datetime"
-            query_params['start_datetime'] = start_datetime
-        if end_datetime:
-            date_condition += " AND br.publish_at <= :end_datetime"
-            query_params['end_datetime'] = end_datetime
+        })
         
         # 首先查询分组信息
         group_query = text("""
@@ -1185,173 +837,14 @@ def pk_participation():
         end_date_str = end_date.strftime('%Y-%m-%d')
     # --- End Default Date Logic ---
 
-    # 使用确切的时间范围
-    start_datetime = datetime.combine(start_date, time(20, 0, 0))
-    end_datetime = datetime.combine(end_date, time(21, 59, 59))
-
     summary_data = []
     try:
-        # --- 1. Database Query for Raw Participation Data (No blessing info needed here) ---
-        # 查询参与PK的比湿奴玩家的基本信息和不重复的参与日期
-        query_participation = text("""
-            SELECT DISTINCT
-                p.id AS person_id,
-                p.name AS person_name,
-                p.god,
-                p.job,
-                p.player_group_id,
-                pg.group_name,
-                DATE(br.publish_at) as participation_date
-            FROM person p
-            JOIN battle_record br ON p.name IN (br.win, br.lost)
-            LEFT JOIN player_group pg ON p.player_group_id = pg.id
-            WHERE p.deleted_at IS NULL
-              AND p.god = '比湿奴'
-              AND br.publish_at >= :start_datetime
-              AND br.publish_at <= :end_datetime
-              -- 时间范围已由 start_datetime 和 end_datetime 控制
-            ORDER BY p.player_group_id, p.id, participation_date
-        """)
-
-        results = db.session.execute(query_participation, {
-            'start_datetime': start_datetime,
-            'end_datetime': end_datetime
-        }).fetchall()
-
-        # --- 2. Process Results and Aggregate basic info (No blessing count here) ---
-        group_aggregates = {}
-        individual_aggregates = {}
-
-        for row in results:
-            person_id, person_name, god, job, player_group_id, group_name, participation_date = row
-            # logger.debug(f"Processing participation: {person_name}, Date: {participation_date}") # Optional debug
-
-            if player_group_id:
-                group_key = player_group_id
-                if group_key not in group_aggregates:
-                    group_aggregates[group_key] = {
-                        'name': group_name or f'分组 {group_key}',
-                        'god': god,
-                        'members': [], # Store member details {id, name, job}
-                        'jobs': set(),
-                        'participation_dates': set()
-                    }
-                group_aggregates[group_key]['participation_dates'].add(participation_date)
-                # Store unique members and their jobs
-                member_ids = {m['id'] for m in group_aggregates[group_key]['members']}
-                if person_id not in member_ids:
-                     group_aggregates[group_key]['members'].append({'id': person_id, 'name': person_name, 'job': job})
-                     group_aggregates[group_key]['jobs'].add(job)
-            else:
-                # Individual players
-                if person_id not in individual_aggregates:
-                    individual_aggregates[person_id] = {
-                        'id': person_id,
-                        'name': person_name,
-                        'god': god,
-                        'job': job,
-                        'participation_dates': set()
-                    }
-                individual_aggregates[person_id]['participation_dates'].add(participation_date)
-
-
-        # --- 3. Calculate Statistics and Prepare Final Summary Data (Query blessing count here) ---
-        final_summary_data = []
-        total_reward_all = 0
-        period_total_days = (end_date - start_date).days + 1
-        full_attendance_list = []
-
-        # Base SQL for counting blessings in the time range where remark='1'
-        query_blessing_count_base = """
-            SELECT COUNT(*)
-            FROM battle_record br
-            WHERE br.remark = '1'
-              AND br.publish_at >= :start_datetime
-              AND br.publish_at <= :end_datetime
-              AND {win_condition}
-        """
-        query_params_blessing = {
-            'start_datetime': start_datetime,
-            'end_datetime': end_datetime
-        }
-
-
-        # Process aggregated groups
-        for group_key, data in group_aggregates.items():
-            participation_days = len(data['participation_dates'])
-            group_job = '奶' if '奶' in data['jobs'] else (list(data['jobs'])[0] if data['jobs'] else '未知')
-            member_names = [m['name'] for m in data['members']]
-
-            # Get blessing count for the group
-            blessing_count = 0
-            if member_names: # Only query if group has members
-                win_condition = "br.win IN :member_names"
-                query_blessing_sql = query_blessing_count_base.format(win_condition=win_condition)
-                # Create a copy of params for this specific query to avoid modification issues
-                current_params = query_params_blessing.copy()
-                current_params['member_names'] = tuple(member_names) # Use tuple for IN clause
-                blessing_count = db.session.execute(text(query_blessing_sql), current_params).scalar() or 0
-                logger.debug(f"Group '{data['name']}' blessing count: {blessing_count} for members: {member_names}") # Debug log
-
-            base_reward_per_day = 20_000_000_000 if group_job == '奶' else 10_000_000_000
-            total_base_reward = base_reward_per_day * participation_days
-            blessing_bonus = 10_000_000_000 if blessing_count > 0 else 0
-            total_reward = total_base_reward + blessing_bonus
-            total_reward_all += total_reward
-
-            if participation_days == period_total_days:
-                full_attendance_list.append(data['name'] + " (组)")
-
-            final_summary_data.append({
-                'id': group_key,
-                'name': data['name'],
-                'god': data['god'],
-                'job': group_job,
-                'participation_days': participation_days,
-                'total_blessings': blessing_count, # Use the queried count
-                'reward': total_reward,
-                'is_group': True
-            })
-
-        # Process individual players
-        for player_id, data in individual_aggregates.items():
-            participation_days = len(data['participation_dates'])
-            job = data['job'] or '未知'
-            player_name = data['name']
-
-            # Get blessing count for the individual
-            win_condition = "br.win = :player_name"
-            query_blessing_sql = query_blessing_count_base.format(win_condition=win_condition)
-            # Create a copy of params
-            current_params = query_params_blessing.copy()
-            current_params['player_name'] = player_name
-            blessing_count = db.session.execute(text(query_blessing_sql), current_params).scalar() or 0
-            logger.debug(f"Individual '{player_name}' blessing count: {blessing_count}") # Debug log
-
-            base_reward_per_day = 20_000_000_000 if job == '奶' else 10_000_000_000
-            total_base_reward = base_reward_per_day * participation_days
-            blessing_bonus = 10_000_000_000 if blessing_count > 0 else 0
-            total_reward = total_base_reward + blessing_bonus
-            total_reward_all += total_reward
-
-            if participation_days == period_total_days:
-                full_attendance_list.append(data['name'])
-
-            final_summary_data.append({
-                'id': player_id,
-                'name': data['name'],
-                'god': data['god'],
-                'job': job,
-                'participation_days': participation_days,
-                'total_blessings': blessing_count, # Use the queried count
-                'reward': total_reward,
-                'is_group': False
-            })
-
-        # --- Sort the final list by reward (desc), then participation days (desc), then name (asc) ---
-        final_summary_data.sort(key=lambda x: (-x['reward'], -x['participation_days'], x['name']))
-        summary_data = final_summary_data
-
+        # 参与天数、祝福数和奖励由服务层一次查询统计
+        participation = get_pk_participation(start_date, end_date)
+        summary_data = participation['summary_data']
+        total_reward_all = participation['total_reward_all']
+        period_total_days = participation['period_total_days']
+        full_attendance_list = participation['full_attendance_list']
     except Exception as e:
         logger.error(f"获取PK参与统计时出错: {str(e)}", exc_info=True)
         flash('获取PK参与统计数据时出错', 'error')
@@ -1384,29 +877,9 @@ def pk_participation_details_api():
     try:
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        start_datetime = datetime.combine(start_date, datetime.min.time())
-        end_datetime_next_day = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
-
-        # Query distinct participation dates
-        participation_dates = (
-            db.session.query(
-                distinct(cast(BattleRecord.publish_at, DATE)).label('participation_date')
-            )
-            .join(Person, or_(Person.name == BattleRecord.win, Person.name == BattleRecord.lost))
-            .filter(
-                Person.id == player_id,
-                Person.god == god, # Also filter by god for consistency?
-                BattleRecord.publish_at >= start_datetime,
-                BattleRecord.publish_at < end_datetime_next_day,
-                cast(BattleRecord.publish_at, TIME) >= time(20, 0, 0),
-                cast(BattleRecord.publish_at, TIME) <= time(21, 59, 59)
-            )
-            .order_by(cast(BattleRecord.publish_at, DATE).desc())
-            .all()
-        )
 
-        # Convert date objects to strings
-        details = [d.participation_date.strftime('%Y-%m-%d') for d in participation_dates]
+        # 与汇总表使用同一个时间窗口和筛选条件，日期数等于汇总中的参与天数
+        details = get_pk_participation_dates(player_id, start_date, end_date, god)
 
         return jsonify({"details": details})
 
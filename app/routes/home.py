@@ -6,8 +6,7 @@
 """
 
 from flask import Blueprint, render_template, current_app, request, flash, redirect, url_for, jsonify
-from app.routes.battle import get_faction_statistics
-from app.services.data_service import get_faction_stats, get_daily_kills_by_player, get_daily_deaths_by_player, get_daily_scores_by_player
+from app.services.dashboard_service import load_dashboard_data
 from app.utils.logger import get_logger
 from app.utils.auth import login_required
 from app.utils.jwt_auth import token_required
@@ -29,14 +28,18 @@ def index():
         if date_range == 'all':
             date_range = 'week'
         
-        # 获取势力统计数据
-        if date_range == 'custom' and start_date and end_date:
-            faction_stats, top_deaths, top_killers, top_scorers = get_faction_stats(date_range, start_date, end_date)
-        else:
-            faction_stats, top_deaths, top_killers, top_scorers = get_faction_stats(date_range)
-        
-        # 获取势力人数统计
-        faction_statistics = get_faction_statistics()
+        # 并发获取势力统计、势力人数统计和每日击杀/死亡/得分数据
+        dashboard = load_dashboard_data(date_range, start_date, end_date)
+        if dashboard['partial']:
+            flash('部分统计数据加载超时或出错，请稍后刷新', 'warning')
+        faction_stats = dashboard['faction_stats']
+        top_deaths = dashboard['top_deaths']
+        top_killers = dashboard['top_killers']
+        top_scorers = dashboard['top_scorers']
+        faction_statistics = dashboard['faction_statistics']
+        daily_kills_data = dashboard['daily_kills']
+        daily_deaths_data = dashboard['daily_deaths']
+        daily_scores_data = dashboard['daily_scores']
         
         # 准备饼图数据
         faction_player_names = []
@@ -88,20 +91,6 @@ def index():
         }
         
         # 不再需要从各个势力收集top_killers和top_scorers
-        
-        # 获取每日击杀数据
-        if date_range == 'custom' and start_date and end_date:
-            daily_kills_data = get_daily_kills_by_player(date_range, limit=5, start_date=start_date, end_date=end_date)
-            # 获取每日死亡数据
-            daily_deaths_data = get_daily_deaths_by_player(date_range, limit=5, start_date=start_date, end_date=end_date)
-            # 获取每日得分数据
-            daily_scores_data = get_daily_scores_by_player(date_range, limit=5, start_date=start_date, end_date=end_date)
-        else:
-            daily_kills_data = get_daily_kills_by_player(date_range, limit=5)
-            # 获取每日死亡数据
-            daily_deaths_data = get_daily_deaths_by_player(date_range, limit=5)
-            # 获取每日得分数据
-            daily_scores_data = get_daily_scores_by_player(date_range, limit=5)
 
         return render_template('home/index.html',
                             chart_data=chart_data,
@@ -155,11 +144,16 @@ def api_dashboard():
         if date_range == 'all':
             date_range = 'week'
         
-        # 获取势力统计数据
-        faction_stats, top_deaths, top_killers, top_scorers = get_faction_stats(date_range)
-        
-        # 获取势力人数统计
-        faction_statistics = get_faction_statistics()
+        # 并发获取势力统计、势力人数统计和每日击杀/死亡/得分数据
+        dashboard = load_dashboard_data(date_range)
+        faction_stats = dashboard['faction_stats']
+        top_deaths = dashboard['top_deaths']
+        top_killers = dashboard['top_killers']
+        top_scorers = dashboard['top_scorers']
+        faction_statistics = dashboard['faction_statistics']
+        daily_kills_data = dashboard['daily_kills']
+        daily_deaths_data = dashboard['daily_deaths']
+        daily_scores_data = dashboard['daily_scores']
         
         # 准备图表数据
         chart_data = {
@@ -186,13 +180,6 @@ def api_dashboard():
         total_blessings = sum(chart_data['blessings'])
         total_players = sum(faction_player_counts.values())
         
-        # 获取每日击杀数据
-        daily_kills_data = get_daily_kills_by_player(date_range, limit=5)
-        # 获取每日死亡数据
-        daily_deaths_data = get_daily_deaths_by_player(date_range, limit=5)
-        # 获取每日得分数据
-        daily_scores_data = get_daily_scores_by_player(date_range, limit=5)
-        
         # 构建响应数据
         response_data = {
             'status': 'success',
@@ -219,7 +206,11 @@ def api_dashboard():
                     'deaths': daily_deaths_data,
                     'scores': daily_scores_data
                 },
-                'date_range': date_range
+                'date_range': date_range,
+                # 有查询超时或出错时为 true，对应部分为空数据
+                'partial': dashboard['partial'],
+                'timed_out': dashboard['timed_out'],
+                'failed': dashboard['failed']
             }
         }
         
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for
 from app.models.player import Person
 from app.extensions import db
+from app.services.battle_service import resolve_battle_record_person_ids
+from app.services.stats_service import move_person_faction
 from sqlalchemy import or_, and_, distinct
 from datetime import datetime
 import json
@@ -106,6 +108,9 @@ def person_add():
         })
         
         db.session.add(person)
+        db.session.flush()
+        # 已入库的战斗记录中可能已有该玩家，补上 person id
+        resolve_battle_record_person_ids([person.name])
         db.session.commit()
         return jsonify({'code': 0, 'message': '添加成功'})
     except Exception as e:
@@ -121,6 +126,8 @@ def person_edit(id):
     if request.method == 'POST':
         try:
             data = request.get_json()  # 改为获取JSON数据
+            old_name = person.name
+            old_god = person.god
             person.name = data.get('name')
             person.god = data.get('god')
             person.union_name = data.get('union_name')
@@ -129,6 +136,13 @@ def person_edit(id):
             person.updated_at = datetime.now()
             person.update_by = 1  # 这里应该是当前登录用户的ID
             
+            if person.god != old_god:
+                # 热力图和时间线按势力汇总，该玩家现有记录的计数转到新势力
+                move_person_faction(person.id, old_god, person.god)
+            if person.name != old_name:
+                # 改名后旧名称的战斗记录不再属于该玩家，新名称的记录归属该玩家
+                db.session.flush()
+                resolve_battle_record_person_ids([old_name, person.name])
             db.session.commit()
             return jsonify({'code': 0, 'message': '更新成功'})
         except Exception as e:
@@ -5,13 +5,56 @@
 战斗数据服务层
 """
 
+import base64
+from datetime import datetime, time, timedelta
 from app.extensions import db
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
+from app.services.stats_service import (
+    refresh_person_daily_stats, refresh_person_kill_pairs, player_totals_sql, player_daily_sql, kill_pairs_sql, kd_ratio,
+    faction_rollup_deltas, apply_faction_rollup_deltas, heatmap_cells_sql, timeline_minutes_sql, HEATMAP_CELL_SIZE
+)
+from app.utils.time_range import datetime_range_bounds, resolve_time_window, time_window_condition
+from app.utils.result_cache import cached_result, bump_data_generation
+from app.utils.file_parser import load_existing_players
+from app.services import columnar_engine
+from app.services.columnar_engine import columnar_enabled
 from app.utils.logger import get_logger
 
 logger = get_logger()
 
+# 三神（势力）
+GODS = ('梵天', '比湿奴', '湿婆')
 
+# 晚间 PK 时段：开始日期的开始时间至结束日期的结束时间
+PK_START_TIME = time(20, 0, 0)
+PK_END_TIME = time(21, 59, 59)
+
+# 晚间 PK 奖励：每参与一天的基础奖励（奶妈双倍），时段内有祝福时额外奖励一次
+PK_DAILY_REWARD = 10_000_000_000
+PK_HEALER_DAILY_REWARD = 20_000_000_000
+PK_BLESSING_BONUS = 10_000_000_000
+
+# 玩家战斗记录分页：默认每页条数和上限
+PLAYER_BATTLES_PAGE_SIZE = 20
+PLAYER_BATTLES_MAX_PAGE_SIZE = 100
+
+# 回填 person id 时每条 UPDATE 覆盖的 battle_record id 区间
+PERSON_ID_BACKFILL_CHUNK_SIZE = 50000
+
+# 战斗时间线最多返回的时间点数，时间段较长时自动合并为更大的桶
+TIMELINE_MAX_POINTS = 240
+
+# 时间线一天以内的桶大小（分钟），都能整除一天，桶从当天 0 点对齐
+TIMELINE_MINUTE_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 180, 360, 720)
+
+# 时间线一天以上的桶大小（天），从区间开始日期的 0 点对齐
+TIMELINE_DAY_BUCKETS = (1, 2, 3, 7, 14, 30, 61, 91, 182, 365)
+
+# 祝福数超过该势力时间线均值加 N 倍标准差的桶标记为祝福高峰
+BLESSING_SPIKE_STDDEVS = 2
+
+
+@cached_result
 def get_player_rankings(faction=None, job=None, time_range='today', start_datetime=None, end_datetime=None):
     """
     获取玩家排名数据（公共服务函数）
@@ -24,75 +67,46 @@ def get_player_rankings(faction=None, job=None, time_range='today', start_dateti
         end_datetime: 自定义结束时间
     
     Returns:
-        list: 排名数据列表，每个元素包含 id, name, job, faction, kills, deaths, blessings, kd_ratio, score
-    """
-    # 确定时间筛选条件
-    date_condition = ""
-    if start_datetime and end_datetime:
-        date_condition = f"AND publish_at BETWEEN '{start_datetime}' AND '{end_datetime}'"
-    elif time_range == 'today':
-        date_condition = "AND DATE(publish_at) = CURDATE()"
-    elif time_range == 'yesterday':
-        date_condition = "AND DATE(publish_at) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)"
-    elif time_range == 'week':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
-    elif time_range == 'month':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-    elif time_range == 'three_months':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)"
-    elif time_range == 'all':
-        date_condition = "AND publish_at >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)"
-    
-    # 构建查询 - 优化版：先过滤 battle_record 并聚合，充分利用索引
+        list: 排名数据列表，每个元素包含 id, name, job, faction, kills, deaths, blessings, kd_ratio, score；
+              按得分、击杀降序、死亡升序排列，都相同时按 id 排列，顺序是确定的
+    """
+    # 确定时间范围 [start, end)
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    return player_rankings(faction, job, start, end)
+
+
+def player_rankings(faction=None, job=None, start=None, end=None):
+    """[start, end) 内的玩家排名，返回格式与 get_player_rankings 相同"""
+    if columnar_enabled():
+        return columnar_engine.player_rankings(faction, job, start, end)
+    
+    # 构建查询 - 整天部分读取 player_daily_stats，不足一天的首尾时段读取 battle_record
+    totals_sql, params = player_totals_sql(start, end)
     query_text = """
-        WITH filtered_battle_records AS (
-            -- 1. 先过滤 battle_record 表（利用 deleted_at 和 publish_at 索引）
-            SELECT win, lost, remark
-            FROM battle_record
-            WHERE deleted_at IS NULL
-              {filtered_date_condition}
-        ),
-        win_stats AS (
-            -- 2. 统计每个玩家的击杀和祝福（利用 win 索引）
-            SELECT 
-                win as player_name,
-                COUNT(*) as kills,
-                SUM(COALESCE(remark, 0)) as blessings
-            FROM filtered_battle_records
-            WHERE win IS NOT NULL
-            GROUP BY win
-        ),
-        lost_stats AS (
-            -- 3. 统计每个玩家的死亡（利用 lost 索引）
-            SELECT 
-                lost as player_name,
-                COUNT(*) as deaths
-            FROM filtered_battle_records
-            WHERE lost IS NOT NULL
-            GROUP BY lost
+        WITH player_totals AS (
+            {player_totals_sql}
         ),
         player_stats AS (
-            -- 4. 将统计数据与玩家表 JOIN（使用等值 JOIN，可以走索引）
+            -- 将统计数据与玩家表 JOIN
             SELECT 
                 p.id,
                 p.name,
                 p.job,
                 p.god as faction,
-                COALESCE(ws.kills, 0) as kills,
-                COALESCE(ls.deaths, 0) as deaths,
-                COALESCE(ws.blessings, 0) as blessings,
+                COALESCE(pt.kills, 0) as kills,
+                COALESCE(pt.deaths, 0) as deaths,
+                COALESCE(pt.blessings, 0) as blessings,
                 CASE 
-                    WHEN COALESCE(ls.deaths, 0) > 0 
-                    THEN ROUND(COALESCE(ws.kills, 0) * 1.0 / COALESCE(ls.deaths, 0), 2)
-                    ELSE COALESCE(ws.kills, 0)
+                    WHEN COALESCE(pt.deaths, 0) > 0 
+                    THEN ROUND(COALESCE(pt.kills, 0) * 1.0 / COALESCE(pt.deaths, 0), 2)
+                    ELSE COALESCE(pt.kills, 0)
                 END as kd_ratio
             FROM person p
-            LEFT JOIN win_stats ws ON p.name = ws.player_name
-            LEFT JOIN lost_stats ls ON p.name = ls.player_name
+            JOIN player_totals pt ON p.id = pt.person_id
             WHERE p.deleted_at IS NULL
                 AND (:faction IS NULL OR p.god = :faction)
                 AND (:job IS NULL OR p.job = :job)
-                AND (COALESCE(ws.kills, 0) > 0 OR COALESCE(ls.deaths, 0) > 0)
+                AND (COALESCE(pt.kills, 0) > 0 OR COALESCE(pt.deaths, 0) > 0)
         )
         SELECT 
             id,
@@ -105,16 +119,17 @@ def get_player_rankings(faction=None, job=None, time_range='today', start_dateti
             kd_ratio,
             (kills * 3 + blessings - deaths) as score
         FROM player_stats
-        ORDER BY score DESC, kills DESC, deaths ASC
-    """.format(filtered_date_condition=date_condition)
+        ORDER BY score DESC, kills DESC, deaths ASC, id ASC
+    """.format(player_totals_sql=totals_sql)
     
     query = text(query_text)
     
     # 执行查询
-    result = db.session.execute(query, {
+    params.update({
         'faction': faction,
         'job': job
     })
+    result = db.session.execute(query, params)
     
     # 转换结果为列表
     player_rankings = []
@@ -135,6 +150,7 @@ def get_player_rankings(faction=None, job=None, time_range='today', start_dateti
     return player_rankings
 
 
+@cached_result
 def get_all_jobs():
     """
     获取所有职业列表
@@ -197,6 +213,139 @@ def get_god_rankings(url=None):
     }
 
 
+def load_player_battle_summary(player_name, person_id, start=None, end=None, recent_limit=50):
+    """
+    一次查询取回玩家在 [start, end) 内的战绩汇总、近期战斗和击杀/被杀明细
+
+    击杀一侧（win = 玩家）和被杀一侧（lost = 玩家）各在 win/lost 索引上做范围扫描，
+    得到次数、祝福数和最后战斗时间，再各取最近 recent_limit 条（至少 1 条）原始记录，
+    最后位置取最近一条记录的 position（position 是字符串，MAX 得到的是字典序最大的坐标）；
+    击杀/被杀明细按 person_id 从 kill_pair_daily 按天求和后关联 person，
+    六部分 UNION ALL 后一次返回。
+    明细与势力/分组击杀明细的口径一致：按 person id 归属。各部分都不含已删除的战斗记录，
+    kills/deaths 与明细次数之和使用同一批记录。
+    自己击杀自己的记录两侧都会计入。
+
+    Args:
+        player_name: 玩家名称
+        person_id: 玩家的 person.id
+        start: 可选，开始时间（包含）
+        end: 可选，结束时间（不包含）
+        recent_limit: 近期战斗条数
+
+    Returns:
+        dict: kills, deaths, blessings, last_position, last_battle_time,
+              recent_battles（按时间倒序，含 id, opponent_name, battle_result, blessings, position, publish_at）,
+              kills_details / deaths_details（按次数降序的对手列表，含 id, name, job, god, count）
+    """
+    date_condition, params = time_window_condition('br.publish_at', start, end)
+    params['player_name'] = player_name
+    params['person_id'] = person_id
+    recent_limit = int(recent_limit)
+    # 最后位置来自最近一条记录，近期战斗至少取 1 条
+    fetch_limit = max(recent_limit, 1)
+
+    def totals(side, player_column):
+        return f"""
+        SELECT '{side}' AS side, 'totals' AS part, NULL AS id, NULL AS opponent_name, COUNT(*) AS cnt,
+               SUM(COALESCE(br.remark, 0)) AS blessings, NULL AS position, MAX(br.publish_at) AS publish_at,
+               NULL AS opponent_id, NULL AS opponent_job, NULL AS opponent_god
+        FROM battle_record br
+        WHERE br.{player_column} = :player_name
+          AND br.deleted_at IS NULL
+          {date_condition}"""
+
+    def recent(side, player_column, opponent_column):
+        return f"""
+        SELECT * FROM (
+            SELECT '{side}' AS side, 'recent' AS part, br.id, br.{opponent_column} AS opponent_name, 1 AS cnt,
+                   br.remark AS blessings, br.position, br.publish_at,
+                   NULL AS opponent_id, NULL AS opponent_job, NULL AS opponent_god
+            FROM battle_record br
+            WHERE br.{player_column} = :player_name
+              AND br.deleted_at IS NULL
+              {date_condition}
+            ORDER BY br.publish_at DESC, br.id DESC
+            LIMIT {fetch_limit}
+        ) recent_{side}"""
+
+    def pairs(side, player_role, opponent_role):
+        pairs_sql, pair_params = kill_pairs_sql(start, end, f" AND {{{player_role}}} = :person_id")
+        params.update(pair_params)
+        return f"""
+        SELECT '{side}' AS side, 'pairs' AS part, NULL AS id, o.name AS opponent_name, SUM(kp.kills) AS cnt,
+               NULL AS blessings, NULL AS position, NULL AS publish_at,
+               o.id AS opponent_id, o.job AS opponent_job, o.god AS opponent_god
+        FROM ({pairs_sql}) kp
+        JOIN person o ON o.id = kp.{opponent_role}_id
+        GROUP BY o.id, o.name, o.job, o.god"""
+
+    sql = '\n        UNION ALL'.join([
+        totals('win', 'win'),
+        totals('lost', 'lost'),
+        recent('win', 'win', 'lost'),
+        recent('lost', 'lost', 'win'),
+        pairs('win', 'killer', 'victim'),
+        pairs('lost', 'victim', 'killer')
+    ])
+    rows = db.session.execute(text(sql).columns(publish_at=db.DateTime), params).fetchall()
+
+    side_totals = {}  # side -> 汇总行
+    opponents = {'win': [], 'lost': []}  # side -> 对手明细
+    recent_rows = {'win': {}, 'lost': {}}  # side -> 战斗记录 id -> 行
+    for row in rows:
+        if row.part == 'totals':
+            side_totals[row.side] = row
+        elif row.part == 'recent':
+            recent_rows[row.side][row.id] = row
+        else:
+            opponents[row.side].append({
+                'id': row.opponent_id,
+                'name': row.opponent_name,
+                'job': row.opponent_job,
+                'god': row.opponent_god,
+                'count': int(row.cnt)
+            })
+
+    times = [row.publish_at for row in side_totals.values() if row.publish_at is not None]
+
+    # 近期战斗：自己击杀自己的记录按击杀显示一次
+    merged = dict(recent_rows['lost'])
+    merged.update(recent_rows['win'])
+    recent_battles = sorted(
+        merged.values(),
+        key=lambda row: (row.publish_at is not None, row.publish_at or datetime.min, row.id),
+        reverse=True
+    )
+    last_position = recent_battles[0].position if recent_battles else None
+    recent_battles = recent_battles[:recent_limit]
+
+    for side in opponents:
+        opponents[side].sort(key=lambda item: (-item['count'], item['id']))
+
+    return {
+        'kills': int(side_totals['win'].cnt),
+        'deaths': int(side_totals['lost'].cnt),
+        'blessings': int(side_totals['win'].blessings or 0),
+        'last_position': last_position,
+        'last_battle_time': max(times) if times else None,
+        'recent_battles': [
+            {
+                'id': row.id,
+                'opponent_name': row.opponent_name,
+                'battle_result': row.side,
+                'blessings': row.blessings,
+                'position': row.position,
+                'publish_at': row.publish_at
+            }
+            for row in recent_battles
+        ],
+        'kills_details': opponents['win'],
+        'deaths_details': opponents['lost']
+    }
+
+
+@cached_result
 def get_player_details(player_name, time_range='week', start_datetime=None, end_datetime=None):
     """
     获取玩家详细信息（公共服务函数）
@@ -211,7 +360,6 @@ def get_player_details(player_name, time_range='week', start_datetime=None, end_
         dict: 玩家详细信息，包括基本信息、战绩统计、近期战斗记录
     """
     from app.models.player import Person
-    from datetime import datetime, timedelta
     
     # 查找玩家
     player = Person.query.filter_by(name=player_name, deleted_at=None).first()
@@ -219,73 +367,12 @@ def get_player_details(player_name, time_range='week', start_datetime=None, end_
         logger.warning(f"找不到玩家: {player_name}")
         return None
     
-    # 确定时间筛选条件
-    date_condition = ""
-    if start_datetime and end_datetime:
-        date_condition = f"AND br.publish_at BETWEEN '{start_datetime}' AND '{end_datetime}'"
-    elif time_range:
-        now = datetime.now()
-        if time_range == 'today':
-            date_condition = f"AND DATE(br.publish_at) = '{now:%Y-%m-%d}'"
-        elif time_range == 'yesterday':
-            yesterday = now - timedelta(days=1)
-            date_condition = f"AND DATE(br.publish_at) = '{yesterday:%Y-%m-%d}'"
-        elif time_range == 'week':
-            week_ago = now - timedelta(days=7)
-            date_condition = f"AND br.publish_at >= '{week_ago:%Y-%m-%d}'"
-        elif time_range == 'month':
-            month_ago = now - timedelta(days=30)
-            date_condition = f"AND br.publish_at >= '{month_ago:%Y-%m-%d}'"
-        elif time_range == 'three_months':
-            three_months_ago = now - timedelta(days=90)
-            date_condition = f"AND br.publish_at >= '{three_months_ago:%Y-%m-%d}'"
-    
-    # 获取战绩汇总数据
-    sql = """
-    WITH player_battle_stats AS (
-        SELECT 
-            p.id AS player_id,
-            p.name AS player_name,
-            p.job AS player_job,
-            p.god AS player_god,
-            COUNT(DISTINCT CASE WHEN br.win = p.name THEN br.id END) as kills,
-            COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
-            SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
-            MAX(br.position) as last_position,
-            MAX(br.publish_at) as last_battle_time
-        FROM 
-            person p
-        LEFT JOIN 
-            battle_record br ON (br.win = p.name OR br.lost = p.name)
-        WHERE 
-            p.name = :player_name
-            AND p.deleted_at IS NULL
-            {date_condition}
-        GROUP BY 
-            p.id, p.name, p.job, p.god
-    )
-    SELECT 
-        player_id,
-        player_name,
-        player_job,
-        player_god,
-        kills,
-        deaths,
-        blessings,
-        CASE WHEN deaths > 0 
-             THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
-             ELSE kills END as kd_ratio,
-        (kills * 3 + blessings - deaths) as score,
-        last_position,
-        last_battle_time
-    FROM 
-        player_battle_stats
-    """.format(date_condition=date_condition)
-    
-    result = db.session.execute(text(sql), {"player_name": player_name}).first()
+    # 确定时间筛选条件（all 表示不限时间）
+    start, end = resolve_time_window(None if time_range == 'all' else time_range, start_datetime, end_datetime)
+    summary = load_player_battle_summary(player_name, player.id, start, end)
     
     # 如果没有战绩记录，返回基本信息
-    if not result or (result.kills == 0 and result.deaths == 0):
+    if summary['kills'] == 0 and summary['deaths'] == 0:
         logger.debug(f"玩家 {player_name} 没有战绩记录")
         return {
             'id': player.id,
@@ -304,155 +391,169 @@ def get_player_details(player_name, time_range='week', start_datetime=None, end_
             'deaths_details': []
         }
     
-    # 获取近期战斗记录
-    recent_battles_sql = """
-    SELECT 
-        br.id,
-        CASE 
-            WHEN br.win = :player_name THEN br.lost
-            ELSE br.win
-        END as opponent_name,
-        CASE 
-            WHEN br.win = :player_name THEN 'win'
-            ELSE 'lost'
-        END as battle_result,
-        br.remark as blessings,
-        br.position,
-        br.publish_at
-    FROM 
-        battle_record br 
-    WHERE 
-        (br.win = :player_name OR br.lost = :player_name)
-        {date_condition}
-    ORDER BY 
-        br.publish_at DESC 
-    LIMIT 50
-    """.format(date_condition=date_condition)
-    
-    recent_battles = db.session.execute(text(recent_battles_sql), {"player_name": player_name}).fetchall()
-    
-    # 查询击杀明细
-    kills_details_sql = """
-    SELECT 
-        v.id AS victim_id,
-        v.name AS victim_name,
-        v.job AS victim_job,
-        v.god AS victim_god,
-        COUNT(*) AS kill_count
-    FROM 
-        battle_record br
-    JOIN 
-        person v ON br.lost = v.name
-    WHERE 
-        br.win = :player_name
-        {date_condition}
-    GROUP BY 
-        v.id, v.name, v.job, v.god
-    ORDER BY 
-        kill_count DESC
-    LIMIT 50
-    """.format(date_condition=date_condition)
-    
-    if not date_condition and (start_datetime and end_datetime):
-        old_condition = """
-        AND (:start_datetime IS NULL OR br.publish_at >= :start_datetime)
-        AND (:end_datetime IS NULL OR br.publish_at <= :end_datetime)
-        """
-        kills_details_sql = kills_details_sql.replace("{date_condition}", old_condition)
-        kills_rows = db.session.execute(text(kills_details_sql), {"player_name": player_name, "start_datetime": start_datetime, "end_datetime": end_datetime}).fetchall()
-    else:
-        kills_rows = db.session.execute(text(kills_details_sql), {"player_name": player_name}).fetchall()
-    
-    kills_details = [
-        {
-            'id': row.victim_id,
-            'name': row.victim_name,
-            'job': row.victim_job,
-            'god': row.victim_god,
-            'count': int(row.kill_count or 0)
-        }
-        for row in kills_rows
-    ]
-    
-    # 查询被杀明细
-    deaths_details_sql = """
-    SELECT 
-        k.id AS killer_id,
-        k.name AS killer_name,
-        k.job AS killer_job,
-        k.god AS killer_god,
-        COUNT(*) AS death_count
-    FROM 
-        battle_record br
-    JOIN 
-        person k ON br.win = k.name
-    WHERE 
-        br.lost = :player_name
-        {date_condition}
-    GROUP BY 
-        k.id, k.name, k.job, k.god
-    ORDER BY 
-        death_count DESC
-    LIMIT 50
-    """.format(date_condition=date_condition)
-    
-    if not date_condition and (start_datetime and end_datetime):
-        old_condition = """
-        AND (:start_datetime IS NULL OR br.publish_at >= :start_datetime)
-        AND (:end_datetime IS NULL OR br.publish_at <= :end_datetime)
-        """
-        deaths_details_sql = deaths_details_sql.replace("{date_condition}", old_condition)
-        deaths_rows = db.session.execute(text(deaths_details_sql), {"player_name": player_name, "start_datetime": start_datetime, "end_datetime": end_datetime}).fetchall()
-    else:
-        deaths_rows = db.session.execute(text(deaths_details_sql), {"player_name": player_name}).fetchall()
-    
-    deaths_details = [
-        {
-            'id': row.killer_id,
-            'name': row.killer_name,
-            'job': row.killer_job,
-            'god': row.killer_god,
-            'count': int(row.death_count or 0)
-        }
-        for row in deaths_rows
-    ]
+    kills = summary['kills']
+    deaths = summary['deaths']
+    blessings = int(summary['blessings'])
+    last_battle_time = summary['last_battle_time']
     
     # 构建返回数据
     player_details = {
-        'id': result.player_id,
-        'name': result.player_name,
-        'faction': result.player_god,
-        'job': result.player_job,
-        'kills': int(result.kills),
-        'deaths': int(result.deaths),
-        'kd_ratio': float(result.kd_ratio),
-        'score': int(result.score),
-        'blessings': int(result.blessings),
-        'last_battle_time': result.last_battle_time.strftime('%Y-%m-%d %H:%M:%S') if result.last_battle_time else None,
-        'last_position': result.last_position or '0,0',
+        'id': player.id,
+        'name': player.name,
+        'faction': player.god,
+        'job': player.job,
+        'kills': kills,
+        'deaths': deaths,
+        'kd_ratio': kd_ratio(kills, deaths),
+        'score': kills * 3 + blessings - deaths,
+        'blessings': blessings,
+        'last_battle_time': last_battle_time.strftime('%Y-%m-%d %H:%M:%S') if last_battle_time else None,
+        'last_position': summary['last_position'] or '0,0',
         'recent_battles': [
             {
-                'id': battle.id,
-                'opponent_name': battle.opponent_name,
-                'battle_result': battle.battle_result,
-                'blessings': int(battle.blessings) if battle.blessings else 0,
-                'position': battle.position,
-                'publish_at': battle.publish_at.strftime('%Y-%m-%d %H:%M:%S') if battle.publish_at else None
+                'id': battle['id'],
+                'opponent_name': battle['opponent_name'],
+                'battle_result': battle['battle_result'],
+                'blessings': int(battle['blessings']) if battle['blessings'] else 0,
+                'position': battle['position'],
+                'publish_at': battle['publish_at'].strftime('%Y-%m-%d %H:%M:%S') if battle['publish_at'] else None
             }
-            for battle in recent_battles
+            for battle in summary['recent_battles'][:50]
         ],
-        'kills_details': kills_details,
-        'deaths_details': deaths_details
+        'kills_details': summary['kills_details'][:50],
+        'deaths_details': summary['deaths_details'][:50]
     }
     
     logger.debug(f"获取玩家 {player_name} 详情成功")
     return player_details
 
 
+def encode_battle_cursor(publish_at, battle_id):
+    """把一页最后一条战斗记录的 (publish_at, id) 编码为不透明的游标字符串"""
+    raw = f"{publish_at:%Y-%m-%d %H:%M:%S}|{int(battle_id)}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_battle_cursor(cursor):
+    """
+    解析游标，返回 (publish_at, id)
+
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        publish_at, battle_id = raw.split('|')
+        return datetime.strptime(publish_at, '%Y-%m-%d %H:%M:%S'), int(battle_id)
+    except Exception:
+        raise ValueError(f"无效的游标: {cursor}")
+
+
+def get_player_battles(player_name, cursor=None, limit=PLAYER_BATTLES_PAGE_SIZE, time_range=None,
+                       start_datetime=None, end_datetime=None):
+    """
+    按时间倒序分页获取玩家的战斗记录（游标分页）
+
+    按 (publish_at, id) 做键集分页：下一页只取排在游标之前的记录，击杀和被杀两侧各自
+    在 (win, publish_at) / (lost, publish_at) 索引上做一次范围扫描后 UNION ALL，每页的
+    查询成本与翻到第几页无关。
+
+    Args:
+        player_name: 玩家名称
+        cursor: 可选，上一页返回的 next_cursor，为空时取第一页
+        limit: 每页条数，最多 PLAYER_BATTLES_MAX_PAGE_SIZE
+        time_range: 可选，时间范围预设，默认不限
+        start_datetime: 可选，自定义开始时间
+        end_datetime: 可选，自定义结束时间
+
+    Returns:
+        dict: battles, next_cursor（没有更多记录时为 None）, has_more；找不到玩家时返回 None
+
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    from app.models.player import Person
+
+    if not Person.query.filter_by(name=player_name, deleted_at=None).first():
+        logger.warning(f"找不到玩家: {player_name}")
+        return None
+
+    limit = max(1, min(int(limit), PLAYER_BATTLES_MAX_PAGE_SIZE))
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    date_condition, params = time_window_condition('br.publish_at', start, end)
+    params['player_name'] = player_name
+
+    keyset_condition = ""
+    if cursor:
+        params['cursor_at'], params['cursor_id'] = decode_battle_cursor(cursor)
+        keyset_condition = """AND (br.publish_at < :cursor_at
+               OR (br.publish_at = :cursor_at AND br.id < :cursor_id))"""
+
+    # 多取一条判断是否还有下一页；自己击杀自己的记录只在击杀一侧出现，击杀者为空的记录算作被杀
+    sql = f"""
+    SELECT id, opponent_name, battle_result, blessings, position, publish_at
+    FROM (
+        SELECT br.id, br.lost AS opponent_name, 'win' AS battle_result,
+               br.remark AS blessings, br.position, br.publish_at
+        FROM battle_record br
+        WHERE br.win = :player_name
+          AND br.deleted_at IS NULL
+          AND br.publish_at IS NOT NULL
+          {date_condition}
+          {keyset_condition}
+        ORDER BY br.publish_at DESC, br.id DESC
+        LIMIT {limit + 1}
+    ) AS wins
+    UNION ALL
+    SELECT id, opponent_name, battle_result, blessings, position, publish_at
+    FROM (
+        SELECT br.id, br.win AS opponent_name, 'lost' AS battle_result,
+               br.remark AS blessings, br.position, br.publish_at
+        FROM battle_record br
+        WHERE br.lost = :player_name
+          AND (br.win IS NULL OR br.win <> :player_name)
+          AND br.deleted_at IS NULL
+          AND br.publish_at IS NOT NULL
+          {date_condition}
+          {keyset_condition}
+        ORDER BY br.publish_at DESC, br.id DESC
+        LIMIT {limit + 1}
+    ) AS losses
+    ORDER BY publish_at DESC, id DESC
+    LIMIT {limit + 1}
+    """
+    query = text(sql).columns(publish_at=db.DateTime)
+    if cursor:
+        # 按列类型绑定游标时间，与库中存储的格式一致
+        query = query.bindparams(bindparam('cursor_at', type_=db.DateTime))
+    rows = db.session.execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'battles': [
+            {
+                'id': row.id,
+                'opponent_name': row.opponent_name,
+                'battle_result': row.battle_result,
+                'blessings': int(row.blessings) if row.blessings else 0,
+                'position': row.position,
+                'publish_at': row.publish_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for row in rows
+        ],
+        'next_cursor': encode_battle_cursor(rows[-1].publish_at, rows[-1].id) if has_more else None,
+        'has_more': has_more
+    }
+
+
+@cached_result
 def get_gods_stats(start_datetime=None, end_datetime=None, show_grouped=False):
     """
     获取三神统计数据（公共服务函数）
     
+    三个势力的玩家在同一条查询中统计（战绩只汇总一次），按 god 列拆分到各势力。
+    
     Args:
         start_datetime: 开始时间
         end_datetime: 结束时间
@@ -461,193 +562,102 @@ def get_gods_stats(start_datetime=None, end_datetime=None, show_grouped=False):
     Returns:
         dict: 三神统计数据，包含每个神的击杀、死亡、爆灯数据和玩家列表
     """
-    gods = ['梵天', '比湿奴', '湿婆']
-    stats = {}
+    stats = {
+        god: {'kills': 0, 'deaths': 0, 'bless': 0, 'players': [], 'player_count': 0}
+        for god in GODS
+    }
     
     try:
-        for god in gods:
-            # 构建日期条件
-            date_condition = ""
-            query_params = {'god': god}
-            
-            if start_datetime:
-                date_condition += " AND publish_at >= :start_datetime"
-                query_params['start_datetime'] = start_datetime
-            if end_datetime:
-                date_condition += " AND publish_at <= :end_datetime"
-                query_params['end_datetime'] = end_datetime
+        # 整天部分读取 player_daily_stats，不足一天的首尾时段读取 battle_record
+        start, end = datetime_range_bounds(start_datetime, end_datetime)
+        if columnar_enabled():
+            return columnar_engine.gods_stats(GODS, start, end, show_grouped)
+        
+        totals_sql, totals_params = player_totals_sql(start, end)
+        query_params = dict(totals_params, gods=list(GODS))
+        
+        # 根据是否需要按玩家分组进行统计选择不同的查询
+        if show_grouped:
+            # 按分组合并战绩，每个分组一行，职业取成员中非空职业的最大值；
+            # 分组内还有其他未删除成员时标记为 is_group
+            query = text(f"""
+                WITH player_totals AS (
+                    {totals_sql}
+                ),
+                group_members AS (
+                    SELECT player_group_id, COUNT(*) AS members
+                    FROM person
+                    WHERE player_group_id IS NOT NULL
+                      AND deleted_at IS NULL
+                    GROUP BY player_group_id
+                )
+                SELECT
+                    p.god AS god,
+                    COALESCE(pg.group_name, p.name) AS name,
+                    MAX(p.job) AS job,
+                    MAX(CASE WHEN gm.members > 1 THEN 1 ELSE 0 END) AS is_group,
+                    SUM(COALESCE(pt.kills, 0)) AS kills,
+                    SUM(COALESCE(pt.deaths, 0)) AS deaths,
+                    SUM(COALESCE(pt.blessings, 0)) AS bless
+                FROM person p
+                LEFT JOIN player_totals pt ON p.id = pt.person_id
+                LEFT JOIN player_group pg ON p.player_group_id = pg.id
+                LEFT JOIN group_members gm ON p.player_group_id = gm.player_group_id
+                WHERE p.god IN :gods
+                  AND p.deleted_at IS NULL
+                GROUP BY
+                    p.god, COALESCE(p.player_group_id, p.id), COALESCE(pg.group_name, p.name)
+                HAVING
+                    SUM(COALESCE(pt.kills, 0)) > 0 OR SUM(COALESCE(pt.deaths, 0)) > 0 OR SUM(COALESCE(pt.blessings, 0)) > 0
+                ORDER BY
+                    kills DESC, deaths ASC, bless DESC
+            """)
+        else:
+            # 原始查询（不考虑玩家分组）
+            query = text(f"""
+                WITH player_totals AS (
+                    {totals_sql}
+                )
+                SELECT
+                    p.god AS god,
+                    p.name AS name,
+                    p.job AS job,
+                    COALESCE(pt.kills, 0) as kills,
+                    COALESCE(pt.deaths, 0) as deaths,
+                    COALESCE(pt.blessings, 0) as bless
+                FROM person p
+                JOIN player_totals pt ON p.id = pt.person_id
+                WHERE p.god IN :gods
+                  AND p.deleted_at IS NULL
+                  AND (COALESCE(pt.kills, 0) > 0
+                       OR COALESCE(pt.deaths, 0) > 0
+                       OR COALESCE(pt.blessings, 0) > 0)
+                ORDER BY kills DESC, deaths ASC, bless DESC
+            """)
+        query = query.bindparams(bindparam('gods', expanding=True))
+        
+        # 结果已按排名排序，逐行追加到所属势力即保持各势力内的顺序
+        for row in db.session.execute(query, query_params):
+            player_data = {
+                'name': row.name,
+                'job': row.job or '未知',
+                'kills': int(row.kills or 0),
+                'deaths': int(row.deaths or 0),
+                'bless': int(row.bless or 0)
+            }
             
-            # 根据是否需要按玩家分组进行统计选择不同的查询
+            # 如果是分组查询，添加is_group字段
             if show_grouped:
-                # 使用玩家分组的查询
-                query = text(f"""
-                    WITH filtered_battle_records AS (
-                        SELECT win, lost, remark
-                        FROM battle_record
-                        WHERE deleted_at IS NULL
-                          {date_condition}
-                    ),
-                    win_stats AS (
-                        SELECT 
-                            win as player_name,
-                            COUNT(*) as kills,
-                            SUM(COALESCE(remark, 0)) as bless
-                        FROM filtered_battle_records
-                        WHERE win IS NOT NULL
-                        GROUP BY win
-                    ),
-                    lost_stats AS (
-                        SELECT 
-                            lost as player_name,
-                            COUNT(*) as deaths
-                        FROM filtered_battle_records
-                        WHERE lost IS NOT NULL
-                        GROUP BY lost
-                    ),
-                    player_battle_stats AS (
-                        SELECT
-                            p.id,
-                            p.name,
-                            COALESCE(ws.kills, 0) as kills,
-                            COALESCE(ls.deaths, 0) as deaths,
-                            COALESCE(ws.bless, 0) as bless
-                        FROM person p
-                        LEFT JOIN win_stats ws ON p.name = ws.player_name
-                        LEFT JOIN lost_stats ls ON p.name = ls.player_name
-                        WHERE p.god = :god
-                          AND p.deleted_at IS NULL
-                          AND (COALESCE(ws.kills, 0) > 0 
-                               OR COALESCE(ls.deaths, 0) > 0 
-                               OR COALESCE(ws.bless, 0) > 0)
-                    ),
-                    player_distinct AS (
-                        SELECT
-                            p.id,
-                            p.name AS original_player_name,
-                            p.god,
-                            COALESCE(p.player_group_id, p.id) AS group_key,
-                            COALESCE(pg.group_name, p.name) AS player_name,
-                            CASE
-                                WHEN p.player_group_id IS NOT NULL AND EXISTS (
-                                    SELECT 1 FROM person p2
-                                    WHERE p2.player_group_id = p.player_group_id
-                                    AND p2.id != p.id
-                                    AND p2.deleted_at IS NULL
-                                ) THEN 1
-                                ELSE 0
-                            END AS is_group
-                        FROM
-                            person p
-                        LEFT JOIN
-                            player_group pg ON p.player_group_id = pg.id
-                        WHERE
-                            p.god = :god
-                            AND p.deleted_at IS NULL
-                    )
-                    SELECT
-                        pd.player_name AS name,
-                        p.job AS job,
-                        MAX(pd.is_group) AS is_group,
-                        SUM(COALESCE(pbs.kills, 0)) AS kills,
-                        SUM(COALESCE(pbs.deaths, 0)) AS deaths,
-                        SUM(COALESCE(pbs.bless, 0)) AS bless
-                    FROM
-                        player_distinct pd
-                    LEFT JOIN
-                        player_battle_stats pbs ON pd.id = pbs.id
-                    LEFT JOIN
-                        person p ON pd.id = p.id
-                    GROUP BY
-                        pd.group_key, pd.player_name, p.job
-                    HAVING
-                        SUM(COALESCE(pbs.kills, 0)) > 0 OR SUM(COALESCE(pbs.deaths, 0)) > 0 OR SUM(COALESCE(pbs.bless, 0)) > 0
-                    ORDER BY
-                        kills DESC, deaths ASC, bless DESC
-                """)
-            else:
-                # 原始查询（不考虑玩家分组）
-                query = text(f"""
-                    WITH filtered_battle_records AS (
-                        SELECT win, lost, remark
-                        FROM battle_record
-                        WHERE deleted_at IS NULL
-                          {date_condition}
-                    ),
-                    win_stats AS (
-                        SELECT 
-                            win as player_name,
-                            COUNT(*) as kills,
-                            SUM(COALESCE(remark, 0)) as bless
-                        FROM filtered_battle_records
-                        WHERE win IS NOT NULL
-                        GROUP BY win
-                    ),
-                    lost_stats AS (
-                        SELECT 
-                            lost as player_name,
-                            COUNT(*) as deaths
-                        FROM filtered_battle_records
-                        WHERE lost IS NOT NULL
-                        GROUP BY lost
-                    ),
-                    player_stats AS (
-                        SELECT 
-                            p.id,
-                            p.name AS name,
-                            p.job AS job,
-                            COALESCE(ws.kills, 0) as kills,
-                            COALESCE(ls.deaths, 0) as deaths,
-                            COALESCE(ws.bless, 0) as bless
-                        FROM person p
-                        LEFT JOIN win_stats ws ON p.name = ws.player_name
-                        LEFT JOIN lost_stats ls ON p.name = ls.player_name
-                        WHERE p.god = :god
-                          AND p.deleted_at IS NULL
-                          AND (COALESCE(ws.kills, 0) > 0 
-                               OR COALESCE(ls.deaths, 0) > 0 
-                               OR COALESCE(ws.bless, 0) > 0)
-                    )
-                    SELECT 
-                        name,
-                        job,
-                        kills,
-                        deaths,
-                        bless
-                    FROM player_stats
-                    ORDER BY kills DESC, deaths ASC, bless DESC
-                """)
+                player_data['is_group'] = bool(row.is_group)
             
-            # 获取玩家数据
-            player_stats = []
-            total_kills = 0
-            total_deaths = 0
-            total_bless = 0
-            
-            for row in db.session.execute(query, query_params):
-                player_data = {
-                    'name': row.name,
-                    'job': row.job if hasattr(row, 'job') and row.job else '未知',
-                    'kills': int(row.kills or 0),
-                    'deaths': int(row.deaths or 0),
-                    'bless': int(row.bless or 0)
-                }
-                
-                # 如果是分组查询，添加is_group字段
-                if show_grouped:
-                    player_data['is_group'] = bool(row.is_group) if hasattr(row, 'is_group') else False
-                    
-                player_stats.append(player_data)
-                total_kills += int(row.kills or 0)
-                total_deaths += int(row.deaths or 0)
-                total_bless += int(row.bless or 0)
-            
-            stats[god] = {
-                'kills': total_kills,
-                'deaths': total_deaths,
-                'bless': total_bless,
-                'players': player_stats,
-                'player_count': len(player_stats)
-            }
+            god_stats = stats[row.god]
+            god_stats['players'].append(player_data)
+            god_stats['kills'] += player_data['kills']
+            god_stats['deaths'] += player_data['deaths']
+            god_stats['bless'] += player_data['bless']
+        
+        for god_stats in stats.values():
+            god_stats['player_count'] = len(god_stats['players'])
         
         logger.info(f"获取三神统计成功")
         return stats
@@ -657,79 +667,112 @@ def get_gods_stats(start_datetime=None, end_datetime=None, show_grouped=False):
         raise
 
 
-def get_group_kill_details(group_name, direction='out', time_range='week', start_datetime=None, end_datetime=None, limit=100):
+@cached_result
+def get_faction_statistics():
     """
-    获取指定玩家分组的击杀/被杀明细汇总
-    direction为out表示该分组击杀了哪些人, 为in表示该分组被哪些人击杀
-    支持时间筛选
+    获取各个势力的统计数据
+    :return: 各个势力的人数、击杀数和死亡数
     """
-    from datetime import datetime, timedelta
+    logger.info("获取各个势力的统计数据")
     
-    # 构建时间条件
-    date_condition = ""
-    params = {'group_name': group_name}
+    if columnar_enabled():
+        return columnar_engine.faction_statistics()
     
-    if start_datetime and end_datetime:
-        date_condition = "AND br.publish_at BETWEEN :start_datetime AND :end_datetime"
-        params['start_datetime'] = start_datetime
-        params['end_datetime'] = end_datetime
-    elif time_range:
-        now = datetime.now()
-        if time_range == 'today':
-            date_condition = "AND DATE(br.publish_at) = CURDATE()"
-        elif time_range == 'yesterday':
-            date_condition = "AND DATE(br.publish_at) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)"
-        elif time_range == 'week':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
-        elif time_range == 'month':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-        elif time_range == 'three_months':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)"
-        elif time_range == 'all':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)"
-    
-    if direction == 'out':
-        # 该分组击杀了哪些人
-        sql = f"""
+    # 先过滤battle_record再按玩家聚合；执行计划见 benchmarks/check_query_plans.py 的基线
+    sql = """
+    WITH filtered_battle_records AS (
+        -- 1. 先过滤battle_record表（走覆盖索引 idx_battle_record_live_time_ids，不回表）
+        SELECT win_person_id, lost_person_id
+        FROM battle_record
+        WHERE deleted_at IS NULL
+    ),
+    win_stats AS (
+        -- 2. 统计每个玩家的击杀记录
         SELECT 
-            v.id AS target_id,
-            v.name AS target_name,
-            v.job AS target_job,
-            v.god AS target_god,
-            COUNT(*) AS cnt
-        FROM battle_record br
-        JOIN person k ON br.win = k.name
-        JOIN person v ON br.lost = v.name
-        JOIN player_group pg ON k.player_group_id = pg.id
-        WHERE pg.group_name = :group_name
-          AND br.deleted_at IS NULL
-          {date_condition}
-        GROUP BY v.id, v.name, v.job, v.god
-        ORDER BY cnt DESC
-        LIMIT {int(limit)}
-        """
-    else:
-        # 该分组被哪些人击杀
-        sql = f"""
+            win_person_id as person_id,
+            COUNT(*) as kills
+        FROM filtered_battle_records
+        WHERE win_person_id IS NOT NULL
+        GROUP BY win_person_id
+    ),
+    lost_stats AS (
+        -- 3. 统计每个玩家的死亡记录
         SELECT 
-            k.id AS target_id,
-            k.name AS target_name,
-            k.job AS target_job,
-            k.god AS target_god,
-            COUNT(*) AS cnt
-        FROM battle_record br
-        JOIN person v ON br.lost = v.name
-        JOIN person k ON br.win = k.name
-        JOIN player_group pg ON v.player_group_id = pg.id
-        WHERE pg.group_name = :group_name
-          AND br.deleted_at IS NULL
-          {date_condition}
-        GROUP BY k.id, k.name, k.job, k.god
-        ORDER BY cnt DESC
-        LIMIT {int(limit)}
-        """
+            lost_person_id as person_id,
+            COUNT(*) as deaths
+        FROM filtered_battle_records
+        WHERE lost_person_id IS NOT NULL
+        GROUP BY lost_person_id
+    ),
+    player_stats AS (
+        -- 4. 将统计数据与玩家表JOIN（只保留有战斗记录的玩家）
+        SELECT
+            p.id,
+            p.god,
+            COALESCE(ws.kills, 0) as kills,
+            COALESCE(ls.deaths, 0) as deaths
+        FROM person p
+        LEFT JOIN win_stats ws ON p.id = ws.person_id
+        LEFT JOIN lost_stats ls ON p.id = ls.person_id
+        WHERE p.deleted_at IS NULL
+          AND p.god IS NOT NULL
+          AND (COALESCE(ws.kills, 0) > 0 OR COALESCE(ls.deaths, 0) > 0)
+    )
+    SELECT 
+        god AS faction,
+        COUNT(DISTINCT id) AS player_count,
+        SUM(kills) AS kills,
+        SUM(deaths) AS deaths
+    FROM player_stats
+    GROUP BY god
+    ORDER BY god
+    """
+    
+    # 执行查询
+    result = db.session.execute(text(sql))
+    
+    # 处理结果
+    faction_stats = []
+    for row in result:
+        faction_stats.append({
+            'faction': row.faction,
+            'player_count': row.player_count or 0,
+            'kills': row.kills or 0,
+            'deaths': row.deaths or 0,
+            'score': (row.kills or 0) * 3 - (row.deaths or 0)
+        })
     
-    rows = db.session.execute(text(sql), params).fetchall()
+    logger.debug(f"势力统计数据: {faction_stats}")
+    
+    return faction_stats
+
+
+def _kill_details_from_pairs(direction, members_sql, params, start, end, limit):
+    """
+    按 kill_pair_daily 汇总一组玩家的击杀/被杀对手，按次数降序取前 limit 名
+
+    Args:
+        direction: out 表示这组玩家击杀了哪些人，in 表示被哪些人击杀
+        members_sql: 返回这组玩家 person.id 的子查询
+        params: 子查询的绑定参数
+        limit: 返回的对手数，None 表示不限
+    """
+    member, target = ('killer', 'victim') if direction == 'out' else ('victim', 'killer')
+    pairs_sql, pair_params = kill_pairs_sql(start, end, f" AND {{{member}}} IN ({members_sql})")
+    sql = f"""
+    SELECT 
+        t.id AS target_id,
+        t.name AS target_name,
+        t.job AS target_job,
+        t.god AS target_god,
+        SUM(kp.kills) AS cnt
+    FROM ({pairs_sql}) kp
+    JOIN person t ON t.id = kp.{target}_id
+    GROUP BY t.id, t.name, t.job, t.god
+    ORDER BY cnt DESC, t.id
+    {'' if limit is None else f'LIMIT {int(limit)}'}
+    """
+    rows = db.session.execute(text(sql), dict(params, **pair_params)).fetchall()
     return [
         {
             'id': r.target_id,
@@ -742,84 +785,499 @@ def get_group_kill_details(group_name, direction='out', time_range='week', start
     ]
 
 
+@cached_result
+def get_group_kill_details(group_name, direction='out', time_range='week', start_datetime=None, end_datetime=None, limit=100):
+    """
+    获取指定玩家分组的击杀/被杀明细汇总
+    direction为out表示该分组击杀了哪些人, 为in表示该分组被哪些人击杀
+    支持时间筛选，整天部分读取 kill_pair_daily
+    """
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    if columnar_enabled():
+        return columnar_engine.group_kill_details(group_name, direction, start, end, limit)
+    
+    members_sql = """
+        SELECT p.id FROM person p
+        JOIN player_group pg ON p.player_group_id = pg.id
+        WHERE pg.group_name = :group_name
+    """
+    return _kill_details_from_pairs(direction, members_sql, {'group_name': group_name}, start, end, limit)
+
+
+@cached_result
 def get_faction_kill_details(faction, direction='out', time_range='week', start_datetime=None, end_datetime=None, limit=100):
     """
     获取指定势力的击杀明细
     direction为out表示该势力击杀了哪些人, 为in表示该势力被哪些人击杀
-    支持时间筛选
-    """
-    # 构建时间条件
-    date_condition = ""
-    if start_datetime and end_datetime:
-        date_condition = "AND br.publish_at BETWEEN :start_datetime AND :end_datetime"
-    elif time_range:
-        from datetime import datetime, timedelta
-        now = datetime.now()
-        if time_range == 'today':
-            date_condition = "AND DATE(br.publish_at) = CURDATE()"
-        elif time_range == 'yesterday':
-            date_condition = "AND DATE(br.publish_at) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)"
-        elif time_range == 'week':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
-        elif time_range == 'month':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-        elif time_range == 'three_months':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)"
-        elif time_range == 'all':
-            date_condition = "AND br.publish_at >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)"
-    
-    params = {'faction': faction}
-    if start_datetime and end_datetime:
-        params['start_datetime'] = start_datetime
-        params['end_datetime'] = end_datetime
-    
-    if direction == 'out':
-        # 该势力击杀了哪些人
-        sql = f"""
-        SELECT 
-            v.id AS target_id,
-            v.name AS target_name,
-            v.job AS target_job,
-            v.god AS target_god,
-            COUNT(*) AS cnt
-        FROM battle_record br
-        JOIN person k ON br.win = k.name
-        JOIN person v ON br.lost = v.name
-        WHERE k.god = :faction
-          AND br.deleted_at IS NULL
-          {date_condition}
-        GROUP BY v.id, v.name, v.job, v.god
-        ORDER BY cnt DESC
-        LIMIT {int(limit)}
-        """
-    else:
-        # 该势力被哪些人击杀
-        sql = f"""
-        SELECT 
-            k.id AS target_id,
-            k.name AS target_name,
-            k.job AS target_job,
-            k.god AS target_god,
-            COUNT(*) AS cnt
-        FROM battle_record br
-        JOIN person v ON br.lost = v.name
-        JOIN person k ON br.win = k.name
-        WHERE v.god = :faction
-          AND br.deleted_at IS NULL
-          {date_condition}
-        GROUP BY k.id, k.name, k.job, k.god
-        ORDER BY cnt DESC
-        LIMIT {int(limit)}
-        """
+    支持时间筛选，整天部分读取 kill_pair_daily
+    """
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    if columnar_enabled():
+        return columnar_engine.faction_kill_details(faction, direction, start, end, limit)
     
-    rows = db.session.execute(text(sql), params).fetchall()
-    return [
+    members_sql = "SELECT id FROM person WHERE god = :faction"
+    return _kill_details_from_pairs(direction, members_sql, {'faction': faction}, start, end, limit)
+
+
+@cached_result
+def get_player_kill_details(player_name, direction='out', time_range=None, start_datetime=None, end_datetime=None, limit=None):
+    """
+    获取指定玩家的击杀/被杀明细
+    direction为out表示该玩家击杀了哪些人, 为in表示被哪些人击杀
+    time_range 为空时统计全部记录，limit 为空时返回全部对手
+    """
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    members_sql = "SELECT id FROM person WHERE name = :player_name"
+    return _kill_details_from_pairs(direction, members_sql, {'player_name': player_name}, start, end, limit)
+
+
+@cached_result
+def get_kill_heatmap(faction=None, time_range='month', start_datetime=None, end_datetime=None, cell_size=HEATMAP_CELL_SIZE):
+    """
+    击杀热力图：各势力在每个网格的击杀/死亡数
+
+    整天部分读取 kill_heatmap_daily，按 cell_size 合并汇总表的网格后返回；没有坐标的记录不计入。
+
+    Args:
+        faction: 势力，为空时返回所有势力
+        cell_size: 网格边长，必须是 HEATMAP_CELL_SIZE 的正整数倍
+
+    Returns:
+        dict: cell_size, cells（[{'x', 'y', 'god', 'kills', 'deaths'}]，x/y 为网格左上角坐标），
+              max_kills, max_deaths
+
+    Raises:
+        ValueError: cell_size 不是 HEATMAP_CELL_SIZE 的正整数倍
+    """
+    if cell_size <= 0 or cell_size % HEATMAP_CELL_SIZE:
+        raise ValueError(f'网格边长必须是 {HEATMAP_CELL_SIZE} 的正整数倍')
+    factor = cell_size // HEATMAP_CELL_SIZE
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+
+    conditions = "" if faction is None else " AND {god} = :faction"
+    cells_sql, params = heatmap_cells_sql(start, end, conditions)
+    # factor 是校验过的整数，直接写入 SQL，GROUP BY 与 SELECT 中的表达式保持一致
+    query = text(f"""
+        SELECT god, cell_x - cell_x % {factor} AS cell_x, cell_y - cell_y % {factor} AS cell_y,
+               SUM(kills) AS kills, SUM(deaths) AS deaths
+        FROM ({cells_sql}) heatmap_cells
+        GROUP BY god, cell_x - cell_x % {factor}, cell_y - cell_y % {factor}
+        HAVING SUM(kills) > 0 OR SUM(deaths) > 0
+        ORDER BY god, cell_x, cell_y
+    """)
+    if faction is not None:
+        params['faction'] = faction
+
+    cells = [
         {
-            'id': r.target_id,
-            'name': r.target_name,
-            'job': r.target_job,
-            'god': r.target_god,
-            'count': int(r.cnt or 0)
+            'x': int(row.cell_x) * HEATMAP_CELL_SIZE,
+            'y': int(row.cell_y) * HEATMAP_CELL_SIZE,
+            'god': row.god,
+            'kills': int(row.kills),
+            'deaths': int(row.deaths)
         }
-        for r in rows
+        for row in db.session.execute(query, params)
     ]
+    return {
+        'cell_size': cell_size,
+        'cells': cells,
+        'max_kills': max((cell['kills'] for cell in cells), default=0),
+        'max_deaths': max((cell['deaths'] for cell in cells), default=0)
+    }
+
+
+def _timeline_buckets(start, end, max_points):
+    """
+    选择能让 [start, end) 不超过 max_points 个桶的最小桶大小
+
+    Returns:
+        tuple: (桶大小（分钟）, 第一个桶的开始时间, 桶数)
+    """
+    midnight = datetime.combine(start.date(), time.min)
+    for minutes in TIMELINE_MINUTE_BUCKETS:
+        offset = (start - midnight) // timedelta(minutes=minutes)
+        first = midnight + timedelta(minutes=minutes * offset)
+        count = -(-(end - first) // timedelta(minutes=minutes))
+        if count <= max_points:
+            return minutes, first, count
+
+    span_days = -(-(end - midnight) // timedelta(days=1))
+    days = next((days for days in TIMELINE_DAY_BUCKETS if -(-span_days // days) <= max_points),
+                -(-span_days // max_points))
+    return days * 1440, midnight, -(-span_days // days)
+
+
+def _blessing_spikes(blessings):
+    """祝福数明显高于该时间线平均水平的桶下标"""
+    if not blessings:
+        return []
+    mean = sum(blessings) / len(blessings)
+    stddev = (sum((value - mean) ** 2 for value in blessings) / len(blessings)) ** 0.5
+    threshold = mean + BLESSING_SPIKE_STDDEVS * stddev
+    return [idx for idx, value in enumerate(blessings) if value > 0 and value > threshold]
+
+
+@cached_result
+def get_battle_timeline(faction=None, time_range='today', start_datetime=None, end_datetime=None,
+                        max_points=TIMELINE_MAX_POINTS):
+    """
+    战斗时间线：各势力每个时间桶的击杀、死亡和带祝福的击杀数
+
+    整分钟部分读取 kill_timeline_minute。桶大小按时间段长度自动选择（1 分钟起），
+    返回的点数不超过 max_points；没有战斗的桶补 0。
+
+    Args:
+        faction: 势力，为空时返回所有势力
+        max_points: 最多返回的时间点数
+
+    Returns:
+        dict: bucket_minutes, times（每个桶的开始时间）, series（每个势力一项，含 faction, kills, deaths,
+              blessings 和 blessing_spikes 祝福高峰的桶下标）
+
+    Raises:
+        ValueError: max_points 小于 1 或时间区间为空
+    """
+    if max_points < 1:
+        raise ValueError('时间点数必须大于 0')
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    if start is None:
+        first_day = db.session.execute(text(
+            "SELECT MIN(stat_date) AS first_day FROM kill_timeline_minute"
+        ).columns(first_day=db.Date)).scalar()
+        start = datetime.combine(first_day or datetime.now().date(), time.min)
+    if end is None:
+        # 不限结束时间时到当前这一分钟为止
+        end = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+    if start >= end:
+        raise ValueError('开始时间必须早于结束时间')
+
+    bucket_minutes, first, count = _timeline_buckets(start, end, max_points)
+    conditions = "" if faction is None else " AND {god} = :faction"
+    minutes_sql, params = timeline_minutes_sql(start, end, conditions)
+    if faction is not None:
+        params['faction'] = faction
+    # 桶大小是选定的整数，直接写入 SQL；一天以上的桶先按天聚合，再在内存中合并
+    bucket_expr = f"minute_of_day - minute_of_day % {bucket_minutes}" if bucket_minutes < 1440 else "0"
+    query = text(f"""
+        SELECT stat_date, god, {bucket_expr} AS bucket_minute,
+               SUM(kills) AS kills, SUM(deaths) AS deaths, SUM(blessings) AS blessings
+        FROM ({minutes_sql}) timeline
+        GROUP BY stat_date, god{'' if bucket_minutes >= 1440 else f', {bucket_expr}'}
+    """).columns(stat_date=db.Date)
+
+    gods = [faction] if faction is not None else list(GODS)
+    series = {}
+    first_minute = first.hour * 60 + first.minute
+    for row in db.session.execute(query, params):
+        if row.god not in series:
+            if row.god not in gods:
+                gods.append(row.god)
+            series[row.god] = {'kills': [0] * count, 'deaths': [0] * count, 'blessings': [0] * count}
+        minutes = (row.stat_date - first.date()).days * 1440 + int(row.bucket_minute) - first_minute
+        idx = minutes // bucket_minutes
+        if not 0 <= idx < count:
+            continue
+        values = series[row.god]
+        values['kills'][idx] += int(row.kills or 0)
+        values['deaths'][idx] += int(row.deaths or 0)
+        values['blessings'][idx] += int(row.blessings or 0)
+
+    result = []
+    for god in gods:
+        values = series.get(god) or {'kills': [0] * count, 'deaths': [0] * count, 'blessings': [0] * count}
+        result.append(dict(values, faction=god, blessing_spikes=_blessing_spikes(values['blessings'])))
+    return {
+        'bucket_minutes': bucket_minutes,
+        'times': [(first + timedelta(minutes=bucket_minutes * idx)).strftime('%Y-%m-%d %H:%M') for idx in range(count)],
+        'series': result
+    }
+
+
+@cached_result
+def get_pk_participation(start_date, end_date, god='比湿奴'):
+    """
+    晚间 PK 参与天数、祝福数和奖励
+
+    统计开始日期 20:00 至结束日期 21:59:59 之间的战斗记录，一条查询取回每个玩家每天的
+    参与情况和祝福数（整天部分读 player_daily_stats），分组和个人的汇总在内存中完成。
+
+    Args:
+        start_date: 开始日期
+        end_date: 结束日期
+        god: 统计的势力
+
+    Returns:
+        dict: summary_data（按奖励、参与天数降序排列的分组/个人列表）, total_reward_all,
+              period_total_days, full_attendance_list
+    """
+    start_datetime = datetime.combine(start_date, PK_START_TIME)
+    end_datetime = datetime.combine(end_date, PK_END_TIME) + timedelta(seconds=1)
+    daily_sql, daily_params = player_daily_sql(start_datetime, end_datetime)
+
+    query = text(f"""
+        WITH player_daily AS (
+            {daily_sql}
+        )
+        SELECT
+            p.id AS person_id,
+            p.name AS person_name,
+            p.god,
+            p.job,
+            p.player_group_id,
+            pg.group_name,
+            pd.stat_date AS participation_date,
+            pd.blessings
+        FROM player_daily pd
+        JOIN person p ON p.id = pd.person_id
+        LEFT JOIN player_group pg ON p.player_group_id = pg.id
+        WHERE p.deleted_at IS NULL
+          AND p.god = :god
+          AND (pd.kills > 0 OR pd.deaths > 0)
+        ORDER BY p.player_group_id, p.id, pd.stat_date
+    """)
+
+    # 分组按 player_group_id 合并成员，未分组的玩家单独统计
+    group_aggregates = {}
+    individual_aggregates = {}
+    for row in db.session.execute(query, dict(daily_params, god=god)):
+        if row.player_group_id:
+            data = group_aggregates.setdefault(row.player_group_id, {
+                'name': row.group_name or f'分组 {row.player_group_id}',
+                'god': row.god,
+                'member_ids': set(),
+                'jobs': [],
+                'participation_dates': set(),
+                'blessings': 0
+            })
+            if row.person_id not in data['member_ids']:
+                data['member_ids'].add(row.person_id)
+                if row.job not in data['jobs']:
+                    data['jobs'].append(row.job)
+        else:
+            data = individual_aggregates.setdefault(row.person_id, {
+                'name': row.person_name,
+                'god': row.god,
+                'job': row.job or '未知',
+                'participation_dates': set(),
+                'blessings': 0
+            })
+        data['participation_dates'].add(row.participation_date)
+        data['blessings'] += int(row.blessings or 0)
+
+    period_total_days = (end_date - start_date).days + 1
+    summary_data = []
+    full_attendance_list = []
+
+    def add_summary(item_id, data, job, is_group):
+        participation_days = len(data['participation_dates'])
+        daily_reward = PK_HEALER_DAILY_REWARD if job == '奶' else PK_DAILY_REWARD
+        reward = daily_reward * participation_days + (PK_BLESSING_BONUS if data['blessings'] > 0 else 0)
+        if participation_days == period_total_days:
+            full_attendance_list.append(data['name'] + " (组)" if is_group else data['name'])
+        summary_data.append({
+            'id': item_id,
+            'name': data['name'],
+            'god': data['god'],
+            'job': job,
+            'participation_days': participation_days,
+            'total_blessings': data['blessings'],
+            'reward': reward,
+            'is_group': is_group
+        })
+
+    for group_id, data in group_aggregates.items():
+        group_job = '奶' if '奶' in data['jobs'] else (data['jobs'][0] if data['jobs'] else '未知')
+        add_summary(group_id, data, group_job, True)
+    for person_id, data in individual_aggregates.items():
+        add_summary(person_id, data, data['job'], False)
+
+    summary_data.sort(key=lambda x: (-x['reward'], -x['participation_days'], x['name']))
+    logger.info(f"获取晚间PK参与统计成功: {start_date} ~ {end_date}，{len(summary_data)} 条")
+    return {
+        'summary_data': summary_data,
+        'total_reward_all': sum(item['reward'] for item in summary_data),
+        'period_total_days': period_total_days,
+        'full_attendance_list': full_attendance_list
+    }
+
+
+@cached_result
+def get_pk_participation_dates(person_id, start_date, end_date, god='比湿奴'):
+    """
+    玩家在晚间 PK 统计周期内的参与日期
+
+    与 get_pk_participation 使用同一个时间窗口和筛选条件（按 person_id 关联 player_daily，
+    排除已删除的玩家和战斗记录），返回的日期数等于汇总中该玩家的参与天数。
+
+    Args:
+        person_id: 玩家 id
+        start_date: 开始日期
+        end_date: 结束日期
+        god: 统计的势力
+
+    Returns:
+        list: 参与日期（YYYY-MM-DD），按日期降序排列
+    """
+    start_datetime = datetime.combine(start_date, PK_START_TIME)
+    end_datetime = datetime.combine(end_date, PK_END_TIME) + timedelta(seconds=1)
+    daily_sql, daily_params = player_daily_sql(start_datetime, end_datetime)
+
+    query = text(f"""
+        WITH player_daily AS (
+            {daily_sql}
+        )
+        SELECT pd.stat_date AS participation_date
+        FROM player_daily pd
+        JOIN person p ON p.id = pd.person_id
+        WHERE p.id = :person_id
+          AND p.deleted_at IS NULL
+          AND p.god = :god
+          AND (pd.kills > 0 OR pd.deaths > 0)
+        ORDER BY pd.stat_date DESC
+    """).columns(participation_date=db.Date)
+
+    rows = db.session.execute(query, dict(daily_params, person_id=person_id, god=god))
+    return [row.participation_date.strftime('%Y-%m-%d') for row in rows]
+
+
+def backfill_battle_record_person_ids(chunk_size=PERSON_ID_BACKFILL_CHUNK_SIZE, progress_callback=None):
+    """
+    按 person.name 回填所有战斗记录的 win_person_id / lost_person_id
+
+    名称按入库时的规则（load_existing_players）解析。按 id 区间分段读取记录，只 UPDATE
+    person id 发生变化的记录并逐段提交，避免在大表上长时间锁表。
+
+    Args:
+        chunk_size: 每段覆盖的 id 区间大小
+        progress_callback: 可选，每段完成后以 (当前段结束 id, 最大 id) 调用
+
+    Returns:
+        int: 更新的记录数
+    """
+    bounds = db.session.execute(text("SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM battle_record")).fetchone()
+    if bounds.min_id is None:
+        return 0
+
+    players = load_existing_players()
+    select_query = text("""
+        SELECT id, win, lost, win_person_id, lost_person_id
+        FROM battle_record
+        WHERE id >= :start_id AND id < :end_id
+    """)
+    update_query = text("""
+        UPDATE battle_record
+        SET win_person_id = :win_person_id, lost_person_id = :lost_person_id, updated_at = :now
+        WHERE id = :id
+    """)
+    updated = 0
+    for start_id in range(bounds.min_id, bounds.max_id + 1, chunk_size):
+        end_id = start_id + chunk_size
+        now = datetime.now()
+        changes = []
+        for row in db.session.execute(select_query, {'start_id': start_id, 'end_id': end_id}):
+            win_person_id, lost_person_id = players.get(row.win), players.get(row.lost)
+            if (win_person_id, lost_person_id) != (row.win_person_id, row.lost_person_id):
+                changes.append({'id': row.id, 'win_person_id': win_person_id,
+                                'lost_person_id': lost_person_id, 'now': now})
+        if changes:
+            db.session.execute(update_query, changes)
+        updated += len(changes)
+        db.session.commit()
+        if progress_callback:
+            progress_callback(min(end_id - 1, bounds.max_id), bounds.max_id)
+    bump_data_generation('回填 person id')
+
+    logger.info(f"回填战斗记录 person id 完成，共 {updated} 条")
+    return updated
+
+
+def backfill_battle_record_coordinates(chunk_size=PERSON_ID_BACKFILL_CHUNK_SIZE, progress_callback=None):
+    """
+    从 position 字符串解析 x_coord / y_coord，回填还没有坐标的战斗记录
+
+    按 id 区间分段执行 UPDATE 并逐段提交；回填后需要重建热力图汇总（rebuild_kill_heatmap_daily）。
+
+    Args:
+        chunk_size: 每段覆盖的 id 区间大小
+        progress_callback: 可选，每段完成后以 (当前段结束 id, 最大 id) 调用
+
+    Returns:
+        int: 更新的记录数
+    """
+    bounds = db.session.execute(text("SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM battle_record")).fetchone()
+    if bounds.min_id is None:
+        return 0
+
+    if db.engine.dialect.name == 'mysql':
+        x_expr = "CAST(SUBSTRING_INDEX(position, ',', 1) AS SIGNED)"
+        y_expr = "CAST(SUBSTRING_INDEX(position, ',', -1) AS SIGNED)"
+    else:
+        x_expr = "CAST(substr(position, 1, instr(position, ',') - 1) AS INTEGER)"
+        y_expr = "CAST(substr(position, instr(position, ',') + 1) AS INTEGER)"
+    query = text(f"""
+        UPDATE battle_record
+        SET x_coord = {x_expr}, y_coord = {y_expr}
+        WHERE id >= :start_id AND id < :end_id AND x_coord IS NULL AND position LIKE '%,%'
+    """)
+    updated = 0
+    for start_id in range(bounds.min_id, bounds.max_id + 1, chunk_size):
+        end_id = start_id + chunk_size
+        updated += db.session.execute(query, {'start_id': start_id, 'end_id': end_id}).rowcount
+        db.session.commit()
+        if progress_callback:
+            progress_callback(min(end_id - 1, bounds.max_id), bounds.max_id)
+
+    logger.info(f"回填战斗记录坐标完成，共 {updated} 条")
+    return updated
+
+
+def resolve_battle_record_person_ids(player_names):
+    """
+    玩家新增或改名后，重新解析这些名称对应战斗记录的 person id
+
+    只更新 win/lost 等于给定名称的记录（名称按入库时的规则 load_existing_players 解析），
+    并重新汇总归属发生变化的玩家的每日战绩和击杀对，
+    按势力汇总的热力图和时间线按更新前后的差值调整，不提交事务，由调用方与人员的修改一起提交。
+
+    Args:
+        player_names: 需要重新解析的玩家名称（改名时应同时包含旧名称和新名称）
+
+    Returns:
+        int: 更新的记录数
+    """
+    names = sorted({name for name in player_names if name})
+    if not names:
+        return 0
+
+    # 热力图和时间线按势力汇总，无法按玩家重新汇总：先扣减这些记录按原归属的计数，更新后再按新归属累加
+    faction_conditions = " AND {name} IN :names"
+    faction_deltas = faction_rollup_deltas(faction_conditions, {'names': names}, expanding=['names'], sign=-1)
+
+    players = load_existing_players()
+    affected_person_ids = set()
+    updated = 0
+    for column in ('win', 'lost'):
+        # 改名前归属的玩家也需要重新汇总
+        affected_person_ids.update(row[0] for row in db.session.execute(text(f"""
+            SELECT DISTINCT {column}_person_id FROM battle_record WHERE {column} IN :names
+        """).bindparams(bindparam('names', expanding=True)), {'names': names}))
+        query = text(f"""
+            UPDATE battle_record
+            SET {column}_person_id = :person_id, updated_at = :now
+            WHERE {column} = :name
+        """)
+        now = datetime.now()
+        for name in names:
+            updated += db.session.execute(query, {'person_id': players.get(name), 'name': name, 'now': now}).rowcount
+
+    affected_person_ids.update(row[0] for row in db.session.execute(
+        text("SELECT id FROM person WHERE name IN :names").bindparams(bindparam('names', expanding=True)),
+        {'names': names}
+    ))
+    refresh_person_daily_stats(affected_person_ids)
+    refresh_person_kill_pairs(affected_person_ids)
+    faction_rollup_deltas(faction_conditions, {'names': names}, expanding=['names'], deltas=faction_deltas)
+    apply_faction_rollup_deltas(faction_deltas)
+
+    logger.info(f"重新解析 {len(names)} 个玩家名称的战斗记录 person id，更新 {updated} 条")
+    return updated
@@ -0,0 +1,483 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗记录列式内存分析引擎（可选）
+
+配置 ANALYTICS_BACKEND=numpy 且安装了 NumPy 时，排名、势力统计、每日趋势和击杀明细
+改由内存中的 NumPy 列计算，不再查询数据库。battle_record 按时间排序加载为紧凑的列：
+
+- ts: int64，publish_at 的秒数（按本地时间直接换算，不做时区转换）
+- win / lost: int32，击杀者/被击杀者的 person id（未解析到玩家时为 -1）
+- blessed: bool，是否带祝福（remark = 1）
+- xy: int32，x_coord/y_coord 打包为 x << 16 | y（没有坐标时为 -1）
+
+时间区间用 searchsorted 定位，按玩家的聚合用 bincount 完成。person 表较小，每次刷新
+整表重新加载，数组按 person id 下标访问。
+
+数据版本号变化（入库、人员/分组修改）或距离上次检查超过配置项 COLUMNAR_REFRESH_INTERVAL
+秒时检查数据库：只有新增记录时按 id 增量追加；已加载的记录被修改过（updated_at 晚于
+上次加载）或记录数对不上时整表重新加载。
+"""
+
+import math
+import time
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text
+from app.extensions import db
+from app.services.stats_service import kd_ratio
+from app.utils.result_cache import data_generation
+from app.utils.logger import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，未安装时只能使用 SQL 后端
+    np = None
+
+logger = get_logger()
+
+# 加载 battle_record 时每次读取的行数
+COLUMNAR_LOAD_CHUNK_SIZE = 50000
+
+_EPOCH = datetime(1970, 1, 1)
+_SECONDS_PER_DAY = 86400
+
+_lock = threading.Lock()
+_store = None  # (BattleColumns, PersonTable)，刷新时整体替换
+_state = {'generation': None, 'checked_at': 0.0, 'max_id': 0, 'watermark': None}
+_warned_unavailable = False
+
+
+def columnar_available():
+    """是否安装了 NumPy"""
+    return np is not None
+
+
+def columnar_enabled():
+    """当前应用是否配置为使用列式引擎（配置了但未安装 NumPy 时回退到 SQL 并记录一次警告）"""
+    global _warned_unavailable
+    if current_app.config.get('ANALYTICS_BACKEND', 'sql') != 'numpy':
+        return False
+    if np is None:
+        if not _warned_unavailable:
+            logger.warning("ANALYTICS_BACKEND=numpy 但未安装 NumPy，使用 SQL 后端")
+            _warned_unavailable = True
+        return False
+    return True
+
+
+def reset_columnar_store():
+    """丢弃已加载的数据，下次查询时重新加载"""
+    global _store
+    with _lock:
+        _store = None
+        _state.update({'generation': None, 'checked_at': 0.0, 'max_id': 0, 'watermark': None})
+
+
+def to_epoch_seconds(value):
+    """把区间端点转换为秒数，不足一秒的向上取整（记录精确到秒，[start, end) 语义不变）"""
+    if value is None:
+        return None
+    return math.ceil((value - _EPOCH).total_seconds())
+
+
+def _epoch_day_str(day):
+    return (_EPOCH + timedelta(days=int(day))).strftime('%Y-%m-%d')
+
+
+class BattleColumns:
+    """按时间排序的战斗记录列，创建后不再修改，刷新时整体替换"""
+
+    def __init__(self, ts, win, lost, blessed, xy):
+        self.ts = ts
+        self.win = win
+        self.lost = lost
+        self.blessed = blessed
+        self.xy = xy
+        self.max_person_ref = int(max(win.max(initial=-1), lost.max(initial=-1)))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def window(self, start=None, end=None):
+        """[start, end) 对应的切片范围"""
+        lo = 0 if start is None else int(np.searchsorted(self.ts, to_epoch_seconds(start), side='left'))
+        hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, to_epoch_seconds(end), side='left'))
+        return lo, max(lo, hi)
+
+    def append(self, other):
+        """追加新记录，新记录早于已有记录时重新排序"""
+        ts = np.concatenate([self.ts, other.ts])
+        columns = [ts, np.concatenate([self.win, other.win]), np.concatenate([self.lost, other.lost]),
+                   np.concatenate([self.blessed, other.blessed]), np.concatenate([self.xy, other.xy])]
+        if len(self.ts) and len(other.ts) and other.ts[0] < self.ts[-1]:
+            order = np.argsort(ts, kind='stable')
+            columns = [column[order] for column in columns]
+        return BattleColumns(*columns)
+
+
+class PersonTable:
+    """person 表，各数组以 person id 为下标"""
+
+    def __init__(self, rows, size):
+        self.size = size
+        self.exists = np.zeros(size, dtype=bool)
+        self.deleted = np.zeros(size, dtype=bool)
+        self.group_id = np.full(size, -1, dtype=np.int64)
+        self.names = [None] * size
+        self.jobs = [None] * size
+        self.gods = [None] * size
+        self.group_names = {}
+        for row in rows:
+            self.exists[row.id] = True
+            self.deleted[row.id] = row.deleted_at is not None
+            self.names[row.id] = row.name
+            self.jobs[row.id] = row.job
+            self.gods[row.id] = row.god
+            if row.player_group_id is not None:
+                self.group_id[row.id] = row.player_group_id
+                if row.group_name is not None:
+                    self.group_names[row.player_group_id] = row.group_name
+        self.active = self.exists & ~self.deleted
+
+    def mask_of(self, values, attr):
+        """属性（gods / jobs）等于 values 中任一值的 person id 掩码"""
+        values = set(values)
+        return np.fromiter((value in values for value in getattr(self, attr)), dtype=bool, count=self.size)
+
+
+def _load_persons(min_size):
+    rows = db.session.execute(text("""
+        SELECT p.id, p.name, p.job, p.god, p.deleted_at, p.player_group_id, pg.group_name
+        FROM person p
+        LEFT JOIN player_group pg ON p.player_group_id = pg.id
+    """)).fetchall()
+    size = max([row.id for row in rows] + [min_size - 1, 0]) + 1
+    return PersonTable(rows, size)
+
+
+def _pack_position(x, y):
+    if x is not None and y is not None and 0 <= x < 65536 and 0 <= y < 65536:
+        return (x << 16) | y
+    return -1
+
+
+def _load_battle_columns(after_id=0):
+    """按 id 分段读取 id > after_id 的未删除记录，返回 (按时间排序的列, 最大 id)"""
+    query = text("""
+        SELECT id, win_person_id, lost_person_id, remark, x_coord, y_coord, publish_at
+        FROM battle_record
+        WHERE id > :after_id
+          AND deleted_at IS NULL
+          AND publish_at IS NOT NULL
+        ORDER BY id
+        LIMIT :limit
+    """).columns(publish_at=db.DateTime)
+
+    parts = {'ts': [], 'win': [], 'lost': [], 'blessed': [], 'xy': []}
+    max_id = after_id
+    while True:
+        rows = db.session.execute(query, {'after_id': max_id, 'limit': COLUMNAR_LOAD_CHUNK_SIZE}).fetchall()
+        if not rows:
+            break
+        max_id = rows[-1].id
+        parts['ts'].append(np.array([row.publish_at for row in rows], dtype='datetime64[s]').astype(np.int64))
+        parts['win'].append(np.array([-1 if row.win_person_id is None else row.win_person_id for row in rows], dtype=np.int32))
+        parts['lost'].append(np.array([-1 if row.lost_person_id is None else row.lost_person_id for row in rows], dtype=np.int32))
+        parts['blessed'].append(np.array([str(row.remark) == '1' for row in rows], dtype=bool))
+        parts['xy'].append(np.array([_pack_position(row.x_coord, row.y_coord) for row in rows], dtype=np.int32))
+
+    dtypes = {'ts': np.int64, 'win': np.int32, 'lost': np.int32, 'blessed': bool, 'xy': np.int32}
+    columns = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=dtypes[name]) for name, chunks in parts.items()}
+    order = np.argsort(columns['ts'], kind='stable')
+    return BattleColumns(*(columns[name][order] for name in ('ts', 'win', 'lost', 'blessed', 'xy'))), max_id
+
+
+def _refresh():
+    """按需加载或增量刷新，调用方持有 _lock"""
+    global _store
+    started = time.perf_counter()
+    watermark = datetime.now()
+
+    if _store is not None:
+        loaded_columns = _store[0]
+        # 已加载范围内有记录被修改，或记录数不一致（并发事务晚提交的小 id、被删除的记录）时整表重新加载
+        check = db.session.execute(text("""
+            SELECT
+                SUM(CASE WHEN deleted_at IS NULL AND publish_at IS NOT NULL THEN 1 ELSE 0 END) AS loaded,
+                SUM(CASE WHEN updated_at >= :watermark THEN 1 ELSE 0 END) AS changed
+            FROM battle_record
+            WHERE id <= :max_id
+        """), {'max_id': _state['max_id'], 'watermark': _state['watermark']}).fetchone()
+        if (check.changed or 0) or (check.loaded or 0) != len(loaded_columns):
+            logger.info(f"已加载的战斗记录有变化（修改 {check.changed or 0} 条，"
+                        f"记录数 {len(loaded_columns)} -> {check.loaded or 0}），重新加载列式数据")
+            columns, max_id = _load_battle_columns()
+        else:
+            new_columns, max_id = _load_battle_columns(_state['max_id'])
+            columns = loaded_columns.append(new_columns) if len(new_columns) else loaded_columns
+            if len(new_columns):
+                logger.info(f"列式数据追加 {len(new_columns)} 条战斗记录")
+    else:
+        columns, max_id = _load_battle_columns()
+        logger.info(f"列式数据加载 {len(columns)} 条战斗记录，耗时 {time.perf_counter() - started:.2f}s")
+
+    _store = (columns, _load_persons(columns.max_person_ref + 1))
+    _state.update({'max_id': max_id, 'watermark': watermark})
+
+
+def get_store():
+    """
+    返回最新的 (BattleColumns, PersonTable)
+
+    数据版本号变化或超过刷新间隔时先检查数据库，刷新期间其他线程等待。
+    """
+    generation = data_generation()
+    interval = current_app.config['COLUMNAR_REFRESH_INTERVAL']
+    store = _store
+    if (store is not None and _state['generation'] == generation
+            and time.monotonic() - _state['checked_at'] < interval):
+        return store
+    with _lock:
+        if (_store is None or _state['generation'] != generation
+                or time.monotonic() - _state['checked_at'] >= interval):
+            _refresh()
+            _state.update({'generation': generation, 'checked_at': time.monotonic()})
+        return _store
+
+
+def _player_totals(columns, persons, start, end):
+    """[start, end) 内每个 person id 的击杀、死亡、祝福数"""
+    lo, hi = columns.window(start, end)
+    win = columns.win[lo:hi]
+    lost = columns.lost[lo:hi]
+    has_win = win >= 0
+    kills = np.bincount(win[has_win], minlength=persons.size)
+    deaths = np.bincount(lost[lost >= 0], minlength=persons.size)
+    blessings = np.bincount(win[has_win & columns.blessed[lo:hi]], minlength=persons.size)
+    return kills, deaths, blessings
+
+
+def player_rankings(faction=None, job=None, start=None, end=None):
+    """玩家排名，与 battle_service.get_player_rankings 的返回格式相同"""
+    columns, persons = get_store()
+    kills, deaths, blessings = _player_totals(columns, persons, start, end)
+    mask = persons.active & ((kills > 0) | (deaths > 0))
+    if faction is not None:
+        mask &= persons.mask_of([faction], 'gods')
+    if job is not None:
+        mask &= persons.mask_of([job], 'jobs')
+
+    ids = np.nonzero(mask)[0]
+    scores = kills[ids] * 3 + blessings[ids] - deaths[ids]
+    order = np.lexsort((ids, deaths[ids], -kills[ids], -scores))
+    rankings = []
+    for person_id, score in zip(ids[order].tolist(), scores[order].tolist()):
+        person_kills = int(kills[person_id])
+        person_deaths = int(deaths[person_id])
+        rankings.append({
+            'id': person_id,
+            'name': persons.names[person_id],
+            'job': persons.jobs[person_id],
+            'faction': persons.gods[person_id],
+            'kills': person_kills,
+            'deaths': person_deaths,
+            'blessings': int(blessings[person_id]),
+            'kd_ratio': kd_ratio(person_kills, person_deaths),
+            'score': int(score)
+        })
+    return rankings
+
+
+def gods_stats(gods, start=None, end=None, show_grouped=False):
+    """三神统计，与 battle_service.get_gods_stats 的返回格式相同"""
+    columns, persons = get_store()
+    kills, deaths, blessings = _player_totals(columns, persons, start, end)
+    candidates = persons.active & persons.mask_of(gods, 'gods')
+
+    stats = {god: {'kills': 0, 'deaths': 0, 'bless': 0, 'players': [], 'player_count': 0} for god in gods}
+    players = {god: [] for god in gods}
+    if show_grouped:
+        # 分组内还有其他未删除成员时标记为 is_group
+        grouped_ids = persons.group_id[persons.active & (persons.group_id >= 0)]
+        members = np.bincount(grouped_ids, minlength=int(persons.group_id.max(initial=-1)) + 1) if len(grouped_ids) else None
+        groups = {}
+        for person_id in np.nonzero(candidates)[0].tolist():
+            group_id = int(persons.group_id[person_id])
+            name = persons.group_names.get(group_id, persons.names[person_id]) if group_id >= 0 else persons.names[person_id]
+            key = (persons.gods[person_id], group_id if group_id >= 0 else -person_id - 1, name)
+            entry = groups.setdefault(key, {'name': name, 'job': None, 'is_group': False,
+                                            'kills': 0, 'deaths': 0, 'bless': 0})
+            # 与 SQL 的 MAX(p.job) 一致：取成员中非空职业的最大值
+            job = persons.jobs[person_id]
+            if job is not None and (entry['job'] is None or job > entry['job']):
+                entry['job'] = job
+            entry['is_group'] |= bool(group_id >= 0 and members is not None and members[group_id] > 1)
+            entry['kills'] += int(kills[person_id])
+            entry['deaths'] += int(deaths[person_id])
+            entry['bless'] += int(blessings[person_id])
+        for (god, _, _), entry in groups.items():
+            if entry['kills'] > 0 or entry['deaths'] > 0 or entry['bless'] > 0:
+                players[god].append(entry)
+    else:
+        active = candidates & ((kills > 0) | (deaths > 0) | (blessings > 0))
+        for person_id in np.nonzero(active)[0].tolist():
+            players[persons.gods[person_id]].append({
+                'name': persons.names[person_id],
+                'job': persons.jobs[person_id],
+                'kills': int(kills[person_id]),
+                'deaths': int(deaths[person_id]),
+                'bless': int(blessings[person_id])
+            })
+
+    for god, entries in players.items():
+        entries.sort(key=lambda entry: (-entry['kills'], entry['deaths'], -entry['bless'], entry['name']))
+        god_stats = stats[god]
+        for entry in entries:
+            player_data = {
+                'name': entry['name'],
+                'job': entry['job'] or '未知',
+                'kills': entry['kills'],
+                'deaths': entry['deaths'],
+                'bless': entry['bless']
+            }
+            if show_grouped:
+                player_data['is_group'] = entry['is_group']
+            god_stats['players'].append(player_data)
+            god_stats['kills'] += entry['kills']
+            god_stats['deaths'] += entry['deaths']
+            god_stats['bless'] += entry['bless']
+        god_stats['player_count'] = len(god_stats['players'])
+    return stats
+
+
+def faction_statistics():
+    """各势力的人数、击杀和死亡（全部时间），与 battle_service.get_faction_statistics 的返回格式相同"""
+    columns, persons = get_store()
+    kills, deaths, _ = _player_totals(columns, persons, None, None)
+    mask = persons.active & ((kills > 0) | (deaths > 0))
+    factions = {}
+    for person_id in np.nonzero(mask)[0].tolist():
+        god = persons.gods[person_id]
+        if god is None:
+            continue
+        entry = factions.setdefault(god, {'player_count': 0, 'kills': 0, 'deaths': 0})
+        entry['player_count'] += 1
+        entry['kills'] += int(kills[person_id])
+        entry['deaths'] += int(deaths[person_id])
+    return [
+        {
+            'faction': god,
+            'player_count': entry['player_count'],
+            'kills': entry['kills'],
+            'deaths': entry['deaths'],
+            'score': entry['kills'] * 3 - entry['deaths']
+        }
+        for god, entry in sorted(factions.items())
+    ]
+
+
+def kill_details(source_mask_fn, direction='out', start=None, end=None, limit=100):
+    """
+    击杀/被杀明细：direction 为 out 时统计 source 击杀了哪些人，为 in 时统计 source 被哪些人击杀
+
+    Args:
+        source_mask_fn: 以 PersonTable 为参数、返回 source 玩家掩码的函数
+    """
+    columns, persons = get_store()
+    lo, hi = columns.window(start, end)
+    win = columns.win[lo:hi]
+    lost = columns.lost[lo:hi]
+    source = source_mask_fn(persons)
+    valid = (win >= 0) & (lost >= 0)
+    win = win[valid]
+    lost = lost[valid]
+    valid = persons.exists[win] & persons.exists[lost]
+    if direction == 'out':
+        targets = lost[valid & source[win]]
+    else:
+        targets = win[valid & source[lost]]
+    counts = np.bincount(targets, minlength=persons.size)
+    target_ids = np.nonzero(counts)[0]
+    order = np.lexsort((target_ids, -counts[target_ids]))[:int(limit)]
+    return [
+        {
+            'id': person_id,
+            'name': persons.names[person_id],
+            'job': persons.jobs[person_id],
+            'god': persons.gods[person_id],
+            'count': int(counts[person_id])
+        }
+        for person_id in target_ids[order].tolist()
+    ]
+
+
+def faction_kill_details(faction, direction='out', start=None, end=None, limit=100):
+    """势力的击杀/被杀明细，与 battle_service.get_faction_kill_details 的返回格式相同"""
+    return kill_details(lambda persons: persons.mask_of([faction], 'gods'), direction, start, end, limit)
+
+
+def group_kill_details(group_name, direction='out', start=None, end=None, limit=100):
+    """玩家分组的击杀/被杀明细，与 battle_service.get_group_kill_details 的返回格式相同"""
+    def source_mask(persons):
+        group_ids = [group_id for group_id, name in persons.group_names.items() if name == group_name]
+        return np.isin(persons.group_id, group_ids) if group_ids else np.zeros(persons.size, dtype=bool)
+    return kill_details(source_mask, direction, start, end, limit)
+
+
+def daily_player_series(metric, start=None, end=None, limit=5):
+    """
+    每日击杀/死亡/得分趋势，与 data_service.get_daily_*_by_player 的返回格式相同
+
+    Args:
+        metric: kills、deaths 或 score（击杀 * 3 - 死亡）
+    """
+    columns, persons = get_store()
+    lo, hi = columns.window(start, end)
+    if hi <= lo:
+        return {'dates': [], 'players': []}
+
+    days = columns.ts[lo:hi] // _SECONDS_PER_DAY
+    first_day = int(days[0])
+    day_count = int(days[-1]) - first_day + 1
+    day_index = (days - first_day).astype(np.int64)
+    win = columns.win[lo:hi]
+    lost = columns.lost[lo:hi]
+    has_win = win >= 0
+    has_lost = lost >= 0
+    cells = day_count * persons.size
+    kills = np.bincount(day_index[has_win] * persons.size + win[has_win], minlength=cells).reshape(day_count, persons.size)
+    deaths = np.bincount(day_index[has_lost] * persons.size + lost[has_lost], minlength=cells).reshape(day_count, persons.size)
+
+    if metric == 'kills':
+        values = kills
+        present = kills > 0
+    elif metric == 'deaths':
+        values = deaths
+        present = deaths > 0
+    else:
+        values = kills * 3 - deaths
+        present = (kills > 0) | (deaths > 0)
+    present &= persons.active
+    values = np.where(present, values, 0)
+
+    totals = values.sum(axis=0)
+    candidates = np.nonzero(present.any(axis=0) & ((totals > 0) if metric == 'score' else True))[0]
+    top = candidates[np.lexsort((candidates, -totals[candidates]))][:int(limit)]
+    if not len(top):
+        return {'dates': [], 'players': []}
+
+    day_offsets = np.nonzero(present[:, top].any(axis=1))[0]
+    dates = [_epoch_day_str(first_day + offset) for offset in day_offsets.tolist()]
+    players = [
+        {
+            'name': persons.names[person_id],
+            'faction': persons.gods[person_id],
+            'data': [int(value) for value in values[day_offsets, person_id].tolist()]
+        }
+        for person_id in top.tolist()
+    ]
+    players.sort(key=lambda player: player['name'])
+    return {'dates': dates, 'players': players}
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+首页仪表盘数据服务
+
+仪表盘的势力统计、势力人数和每日击杀/死亡/得分五个查询互不依赖，在进程内共享的
+线程池中并发执行，每个查询在独立的应用上下文（独立的数据库会话）中运行。
+超过截止时间或出错的查询使用空数据代替，结果中以 partial 标记。
+
+这里汇总的查询函数出错时直接抛出异常（不在内部吞掉后返回空数据），因此 failed 能区分
+查询出错和确实没有数据；新增查询时也要遵守这一点，否则出错会被当作完整的空结果返回。
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from app.extensions import db
+from app.services.battle_service import get_faction_statistics
+from app.services.data_service import (
+    get_faction_stats,
+    get_daily_kills_by_player,
+    get_daily_deaths_by_player,
+    get_daily_scores_by_player
+)
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers):
+    """延迟创建进程内共享的线程池，线程数取首次创建时的配置"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dashboard')
+        return _executor
+
+
+def _run_in_app_context(app, func, args, kwargs):
+    """在独立的应用上下文中执行查询，结束时释放本线程的数据库会话"""
+    with app.app_context():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db.session.remove()
+
+
+def load_dashboard_data(date_range, start_date=None, end_date=None, limit=5, timeout=None):
+    """
+    并发获取仪表盘数据
+
+    Args:
+        date_range: 日期范围（today、yesterday、week、month、three_months、custom）
+        start_date: 可选，custom 时的开始日期
+        end_date: 可选，custom 时的结束日期
+        limit: 每日榜单的玩家数
+        timeout: 可选，每个查询的截止时间（秒），从提交时开始计算，默认为配置项 DASHBOARD_QUERY_TIMEOUT
+
+    Returns:
+        dict: faction_stats, top_deaths, top_killers, top_scorers, faction_statistics,
+              daily_kills, daily_deaths, daily_scores；partial 表示是否有查询超时或出错，
+              timed_out 为超过截止时间的查询名称，failed 为抛出异常（如数据库错误）的查询名称
+    """
+    config = current_app.config
+    timeout = config['DASHBOARD_QUERY_TIMEOUT'] if timeout is None else timeout
+    range_kwargs = {}
+    if date_range == 'custom' and start_date and end_date:
+        range_kwargs = {'start_date': start_date, 'end_date': end_date}
+
+    # 查询名称 -> (函数, 位置参数, 关键字参数, 超时或出错时的默认值)
+    empty_daily = {'dates': [], 'players': []}
+    queries = {
+        'faction_stats': (get_faction_stats, (date_range,), range_kwargs, ([], [], [], [])),
+        'faction_statistics': (get_faction_statistics, (), {}, []),
+        'daily_kills': (get_daily_kills_by_player, (date_range,), dict(range_kwargs, limit=limit), empty_daily),
+        'daily_deaths': (get_daily_deaths_by_player, (date_range,), dict(range_kwargs, limit=limit), empty_daily),
+        'daily_scores': (get_daily_scores_by_player, (date_range,), dict(range_kwargs, limit=limit), empty_daily)
+    }
+
+    app = current_app._get_current_object()
+    executor = _get_executor(config['DASHBOARD_WORKERS'])
+    started = time.monotonic()
+    deadline = started + timeout
+    futures = {
+        name: executor.submit(_run_in_app_context, app, func, args, kwargs)
+        for name, (func, args, kwargs, _) in queries.items()
+    }
+
+    results = {}
+    timed_out = []
+    failed = []
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # 还在排队的查询直接取消，已经在执行的查询无法中断，完成后结果仍会写入缓存
+            future.cancel()
+            timed_out.append(name)
+            results[name] = queries[name][3]
+        except Exception as e:
+            logger.error(f"仪表盘查询 {name} 出错: {str(e)}", exc_info=True)
+            failed.append(name)
+            results[name] = queries[name][3]
+
+    if timed_out or failed:
+        logger.warning(f"仪表盘数据不完整，超时: {timed_out}，出错: {failed}")
+    logger.debug(f"仪表盘数据查询耗时 {time.monotonic() - started:.3f}s")
+
+    faction_stats, top_deaths, top_killers, top_scorers = results['faction_stats']
+    return {
+        'faction_stats': faction_stats,
+        'top_deaths': top_deaths,
+        'top_killers': top_killers,
+        'top_scorers': top_scorers,
+        'faction_statistics': results['faction_statistics'],
+        'daily_kills': results['daily_kills'],
+        'daily_deaths': results['daily_deaths'],
+        'daily_scores': results['daily_scores'],
+        'partial': bool(timed_out or failed),
+        'timed_out': timed_out,
+        'failed': failed
+    }
@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+battle_record 按月分区和冷数据归档
+
+MySQL 下 battle_record 按 publish_at 做 RANGE 分区：每月一个分区 pYYYYMM（上界为下月 1 日），
+最后是兜底的 pmax（MAXVALUE）。按时间过滤的查询（publish_at >= :start AND publish_at < :end）
+只扫描涉及的月份分区。
+
+- ensure_future_partitions 从 pmax 拆出未来几个月的分区
+- archive_month 先从明细重建该月的 player_daily_stats / kill_pair_daily / kill_heatmap_daily /
+  kill_timeline_minute，再把整月明细
+  （含已软删除的记录）导出为 gzip 压缩的 JSON Lines 文件，校验条数后删除该月分区
+- restore_month 校验归档文件后写回明细，并重新汇总该月
+
+归档过的月份登记在 battle_record_archive 表中。汇总表中这些月份的数据保留，整天范围的统计
+不受影响，重建汇总时跳过这些月份；直接读取明细的查询（战斗历史、不足一天的时段、
+NumPy 列式引擎等）看不到已归档的记录。
+
+其他数据库（SQLite 等）没有分区，归档按时间范围导出和删除明细，其余行为相同。
+"""
+
+import os
+import gzip
+import json
+import hashlib
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import text, inspect, func
+from app.extensions import db
+from app.models.player import BattleRecord
+from app.models.archive import BattleRecordArchive
+from app.services.stats_service import (
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily,
+    rebuild_kill_timeline_minute
+)
+from app.utils.time_range import month_start, next_month, subtract_months
+from app.utils.result_cache import bump_data_generation
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 兜底分区名，容纳最后一个月份分区之后的记录
+FUTURE_PARTITION = 'pmax'
+
+# 导出和恢复时每批读写的记录数
+ARCHIVE_CHUNK_SIZE = 5000
+
+
+def partition_name(month):
+    """月份分区名，如 p202501"""
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name):
+    """分区名对应的月份（1 日），不是月份分区时返回 None"""
+    try:
+        return datetime.strptime(name, 'p%Y%m').date()
+    except ValueError:
+        return None
+
+
+def archive_file_name(month):
+    return f"battle_record_{month:%Y%m}.jsonl.gz"
+
+
+def _is_mysql():
+    return db.engine.dialect.name == 'mysql'
+
+
+def _month_sequence(first_month, last_month):
+    """[first_month, last_month] 之间的每个月份（均为 1 日）"""
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def _partition_bound():
+    """
+    分区上界的写法：DATETIME 列用 RANGE COLUMNS 直接比较，
+    TIMESTAMP 列（db/battle_record.sql 建的旧表）只能按 UNIX_TIMESTAMP() 分区
+
+    Returns:
+        tuple: (PARTITION BY 子句, 月份 -> 上界表达式的函数)
+    """
+    column_type = db.session.execute(text("""
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'battle_record' AND COLUMN_NAME = 'publish_at'
+    """)).scalar()
+    if column_type == 'timestamp':
+        return "RANGE (UNIX_TIMESTAMP(publish_at))", lambda month: f"UNIX_TIMESTAMP('{month:%Y-%m-%d} 00:00:00')"
+    return "RANGE COLUMNS (publish_at)", lambda month: f"'{month:%Y-%m-%d}'"
+
+
+def _partition_definitions(months, bound):
+    """各月份分区和 pmax 的定义"""
+    definitions = [f"PARTITION {partition_name(month)} VALUES LESS THAN ({bound(next_month(month))})" for month in months]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return ',\n'.join(definitions)
+
+
+def list_partitions():
+    """
+    battle_record 的分区（按顺序），未分区或不是 MySQL 时返回空列表
+
+    Returns:
+        list: [(分区名, 月份，pmax 为 None, 预估行数), ...]
+    """
+    if not _is_mysql():
+        return []
+    rows = db.session.execute(text("""
+        SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'battle_record' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)).fetchall()
+    return [(row[0], partition_month(row[0]), int(row[1] or 0)) for row in rows]
+
+
+def partition_battle_record(months_ahead, today=None):
+    """
+    把 battle_record 转换为按月分区（仅 MySQL，会重建整张表）
+
+    分区表的主键必须包含分区列，主键改为 (id, publish_at)，publish_at 改为 NOT NULL；
+    InnoDB 分区表不支持外键，同时删除 battle_record 上的外键。
+
+    Args:
+        months_ahead: 提前创建到当前月份之后第几个月的分区
+        today: 可选，基准日期，默认今天
+
+    Returns:
+        list: 创建的分区名，已经分区时返回空列表
+    """
+    if not _is_mysql():
+        raise ValueError("只有 MySQL 支持分区")
+    if list_partitions():
+        return []
+
+    null_count = db.session.execute(text("SELECT COUNT(*) FROM battle_record WHERE publish_at IS NULL")).scalar()
+    if null_count:
+        raise ValueError(f"有 {null_count} 条战斗记录的 publish_at 为空，请先补齐或删除后再分区")
+
+    today = today or date.today()
+    first_at = db.session.execute(text("SELECT MIN(publish_at) FROM battle_record")).scalar()
+    months = _month_sequence(month_start(first_at or today), subtract_months(month_start(today), -months_ahead))
+    partition_by, bound = _partition_bound()
+    column_type = db.session.execute(text("""
+        SELECT COLUMN_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'battle_record' AND COLUMN_NAME = 'publish_at'
+    """)).scalar()
+
+    for foreign_key in inspect(db.session.connection()).get_foreign_keys('battle_record'):
+        db.session.execute(text(f"ALTER TABLE battle_record DROP FOREIGN KEY {foreign_key['name']}"))
+    # 改主键和分区在同一条 ALTER 中完成，只重建一次表
+    db.session.execute(text(f"""
+        ALTER TABLE battle_record
+            MODIFY publish_at {column_type} NOT NULL,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, publish_at)
+        PARTITION BY {partition_by} (
+            {_partition_definitions(months, bound)}
+        )
+    """))
+    logger.info(f"battle_record 已按月分区: {partition_name(months[0])} ~ {partition_name(months[-1])}")
+    return [partition_name(month) for month in months]
+
+
+def unpartition_battle_record():
+    """取消 battle_record 的分区，主键恢复为 id（仅 MySQL）"""
+    if not list_partitions():
+        return False
+    db.session.execute(text("ALTER TABLE battle_record REMOVE PARTITIONING"))
+    db.session.execute(text("ALTER TABLE battle_record DROP PRIMARY KEY, ADD PRIMARY KEY (id)"))
+    logger.info("battle_record 已取消分区")
+    return True
+
+
+def plan_future_partitions(months_ahead, today=None):
+    """还需要创建的未来月份分区（到当前月份之后第 months_ahead 个月），未分区时返回空列表"""
+    month_partitions = [month for _, month, _ in list_partitions() if month]
+    if not month_partitions:
+        return []
+    target = subtract_months(month_start(today or date.today()), -months_ahead)
+    return _month_sequence(next_month(max(month_partitions)), target)
+
+
+def ensure_future_partitions(months_ahead, today=None):
+    """
+    从 pmax 拆出未来月份的分区
+
+    pmax 中只有晚于最后一个月份分区的记录（通常为空），REORGANIZE 只搬移这部分。
+
+    Returns:
+        list: 创建的分区名
+    """
+    months = plan_future_partitions(months_ahead, today)
+    if not months:
+        return []
+    _, bound = _partition_bound()
+    db.session.execute(text(f"""
+        ALTER TABLE battle_record REORGANIZE PARTITION {FUTURE_PARTITION} INTO (
+            {_partition_definitions(months, bound)}
+        )
+    """))
+    names = [partition_name(month) for month in months]
+    logger.info(f"已创建 battle_record 分区: {', '.join(names)}")
+    return names
+
+
+def _ensure_month_partition(month):
+    """
+    恢复归档前确保该月有单独的分区
+
+    删除分区后该月的时间范围并入了下一个分区，从下一个分区（或 pmax）中拆出该月。
+    """
+    partitions = list_partitions()
+    name = partition_name(month)
+    if not partitions or name in {partition[0] for partition in partitions}:
+        return
+    following = next(partition for partition in partitions if partition[1] is None or partition[1] > month)
+    _, bound = _partition_bound()
+    following_bound = 'MAXVALUE' if following[1] is None else bound(next_month(following[1]))
+    db.session.execute(text(f"""
+        ALTER TABLE battle_record REORGANIZE PARTITION {following[0]} INTO (
+            PARTITION {name} VALUES LESS THAN ({bound(next_month(month))}),
+            PARTITION {following[0]} VALUES LESS THAN ({following_bound})
+        )
+    """))
+    logger.info(f"已从 {following[0]} 拆出分区 {name}")
+
+
+def archived_months():
+    """已归档且未恢复的月份记录"""
+    return BattleRecordArchive.query.filter(
+        BattleRecordArchive.restored_at.is_(None)
+    ).order_by(BattleRecordArchive.month).all()
+
+
+def plan_archive_months(horizon_months, today=None):
+    """
+    早于 horizon_months 个整月、还有明细的月份
+
+    分区表按月份分区判断，其他数据库从最早的一条记录逐月检查；已归档的月份不再列出。
+    """
+    cutoff = subtract_months(month_start(today or date.today()), horizon_months)
+    archived = {archive.month for archive in archived_months()}
+    partitions = list_partitions()
+    if partitions:
+        return [month for _, month, _ in partitions if month and month < cutoff and month not in archived]
+
+    first_at = db.session.query(func.min(BattleRecord.publish_at)).scalar()
+    if first_at is None:
+        return []
+    months = []
+    for month in _month_sequence(month_start(first_at), cutoff):
+        if month >= cutoff or month in archived:
+            continue
+        exists = db.session.query(BattleRecord.id).filter(
+            BattleRecord.publish_at >= datetime.combine(month, datetime.min.time()),
+            BattleRecord.publish_at < datetime.combine(next_month(month), datetime.min.time())
+        ).first()
+        if exists:
+            months.append(month)
+    return months
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _export_month(month, path, partitioned):
+    """把该月明细按 id 顺序分批写入 gzip 文件，返回 (条数, SHA-256)"""
+    columns = [column.name for column in BattleRecord.__table__.columns]
+    if partitioned:
+        source = f"battle_record PARTITION ({partition_name(month)})"
+        conditions = ""
+    else:
+        source = "battle_record"
+        conditions = "AND publish_at >= :month_start AND publish_at < :month_end"
+    sql = text(f"""
+        SELECT {', '.join(columns)} FROM {source}
+        WHERE id > :last_id {conditions}
+        ORDER BY id
+        LIMIT {ARCHIVE_CHUNK_SIZE}
+    """).columns(*BattleRecord.__table__.columns)
+    params = {'month_start': datetime.combine(month, datetime.min.time()),
+              'month_end': datetime.combine(next_month(month), datetime.min.time())}
+
+    rows = 0
+    last_id = 0
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        while True:
+            chunk = db.session.execute(sql, dict(params, last_id=last_id)).fetchall()
+            if not chunk:
+                break
+            for row in chunk:
+                f.write(json.dumps({column: _serialize(value) for column, value in zip(columns, row)},
+                                   ensure_ascii=False) + '\n')
+            rows += len(chunk)
+            last_id = chunk[-1].id
+    os.replace(temp_path, path)
+    return rows, file_checksum(path)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archive_month(month, archive_dir=None):
+    """
+    归档一个已经结束的月份：重建该月汇总，导出明细，删除明细（分区表删除该月分区）
+
+    Args:
+        month: 该月中的任意一天
+        archive_dir: 归档目录，默认 BATTLE_RECORD_ARCHIVE_DIR
+
+    Returns:
+        dict: {'month', 'rows', 'file', 'checksum'}
+    """
+    month = month_start(month)
+    if next_month(month) > date.today():
+        raise ValueError(f"{month:%Y-%m} 还没有结束，不能归档")
+    archive = BattleRecordArchive.query.filter_by(month=month).first()
+    if archive and archive.restored_at is None:
+        raise ValueError(f"{month:%Y-%m} 已经归档")
+    partitions = list_partitions()
+    partitioned = bool(partitions)
+    if partitioned and partition_name(month) not in {partition[0] for partition in partitions}:
+        raise ValueError(f"battle_record 没有分区 {partition_name(month)}")
+
+    archive_dir = archive_dir or current_app.config['BATTLE_RECORD_ARCHIVE_DIR']
+    os.makedirs(archive_dir, exist_ok=True)
+    file_name = archive_file_name(month)
+
+    # 1. 汇总表以明细为准重建该月，归档后这是该月统计的唯一来源
+    rebuild_player_daily_stats(month, next_month(month))
+    rebuild_kill_pair_daily(month, next_month(month))
+    rebuild_kill_heatmap_daily(month, next_month(month))
+    rebuild_kill_timeline_minute(month, next_month(month))
+    db.session.commit()
+
+    # 2. 导出明细
+    rows, checksum = _export_month(month, os.path.join(archive_dir, file_name), partitioned)
+
+    # 3. 登记并删除明细
+    if archive is None:
+        archive = BattleRecordArchive(month=month)
+        db.session.add(archive)
+    archive.row_count = rows
+    archive.file_name = file_name
+    archive.checksum = checksum
+    archive.archived_at = datetime.now()
+    archive.restored_at = None
+    try:
+        if partitioned:
+            # DROP PARTITION 会隐式提交，先提交登记，删除失败时撤销
+            db.session.commit()
+            db.session.execute(text(f"ALTER TABLE battle_record DROP PARTITION {partition_name(month)}"))
+        else:
+            deleted = db.session.execute(text("""
+                DELETE FROM battle_record WHERE publish_at >= :month_start AND publish_at < :month_end
+            """), {'month_start': datetime.combine(month, datetime.min.time()),
+                   'month_end': datetime.combine(next_month(month), datetime.min.time())}).rowcount
+            if deleted != rows:
+                raise ValueError(f"{month:%Y-%m} 导出 {rows} 条但删除 {deleted} 条，可能有并发写入，已回滚")
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if partitioned:
+            BattleRecordArchive.query.filter_by(month=month).update({'restored_at': datetime.now()})
+            db.session.commit()
+        logger.error(f"归档 {month:%Y-%m} 失败", exc_info=True)
+        raise
+
+    bump_data_generation(f'归档 {month:%Y-%m}')
+    logger.info(f"已归档 {month:%Y-%m}: {rows} 条战斗记录 -> {file_name}")
+    return {'month': month, 'rows': rows, 'file': file_name, 'checksum': checksum}
+
+
+def _parse_archived_row(record, datetime_columns):
+    for column in datetime_columns:
+        if record.get(column):
+            record[column] = datetime.fromisoformat(record[column])
+    return record
+
+
+def restore_month(month, archive_dir=None):
+    """
+    从归档文件恢复一个月份的明细，并从明细重新汇总该月
+
+    Returns:
+        dict: {'month', 'rows', 'file'}
+    """
+    month = month_start(month)
+    archive = BattleRecordArchive.query.filter_by(month=month, restored_at=None).first()
+    if archive is None:
+        raise ValueError(f"{month:%Y-%m} 没有归档")
+    archive_dir = archive_dir or current_app.config['BATTLE_RECORD_ARCHIVE_DIR']
+    path = os.path.join(archive_dir, archive.file_name)
+    if not os.path.exists(path):
+        raise ValueError(f"找不到归档文件 {path}")
+    if file_checksum(path) != archive.checksum:
+        raise ValueError(f"归档文件 {path} 的校验和与登记的不一致")
+
+    _ensure_month_partition(month)
+    table = BattleRecord.__table__
+    datetime_columns = [column.name for column in table.columns if isinstance(column.type, db.DateTime)]
+    rows = 0
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            chunk = []
+            for line in f:
+                chunk.append(_parse_archived_row(json.loads(line), datetime_columns))
+                if len(chunk) >= ARCHIVE_CHUNK_SIZE:
+                    db.session.execute(table.insert(), chunk)
+                    rows += len(chunk)
+                    chunk = []
+            if chunk:
+                db.session.execute(table.insert(), chunk)
+                rows += len(chunk)
+        if rows != archive.row_count:
+            raise ValueError(f"归档文件有 {rows} 条记录，登记的是 {archive.row_count} 条")
+
+        archive.restored_at = datetime.now()
+        db.session.flush()
+        rebuild_player_daily_stats(month, next_month(month))
+        rebuild_kill_pair_daily(month, next_month(month))
+        rebuild_kill_heatmap_daily(month, next_month(month))
+        rebuild_kill_timeline_minute(month, next_month(month))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.error(f"恢复 {month:%Y-%m} 失败", exc_info=True)
+        raise
+
+    bump_data_generation(f'恢复 {month:%Y-%m}')
+    logger.info(f"已恢复 {month:%Y-%m}: {rows} 条战斗记录 <- {archive.file_name}")
+    return {'month': month, 'rows': rows, 'file': archive.file_name}
+
+
+def rotate_partitions(horizon_months=None, months_ahead=None, archive_dir=None, today=None):
+    """
+    分区轮换：创建未来月份的分区，归档早于 horizon_months 个整月的月份
+
+    Returns:
+        dict: {'created': [分区名], 'archived': [archive_month 的返回值]}
+    """
+    config = current_app.config
+    horizon_months = config['BATTLE_RECORD_ARCHIVE_MONTHS'] if horizon_months is None else horizon_months
+    months_ahead = config['BATTLE_RECORD_FUTURE_PARTITIONS'] if months_ahead is None else months_ahead
+    if horizon_months < 1:
+        raise ValueError("归档范围至少保留 1 个整月")
+
+    created = ensure_future_partitions(months_ahead, today)
+    archived = [archive_month(month, archive_dir) for month in plan_archive_months(horizon_months, today)]
+    return {'created': created, 'archived': archived}
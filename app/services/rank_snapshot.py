@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+玩家排名快照
+
+移动端只需要某个玩家的名次和名次变化时，不必下载完整的排名列表。排名快照按
+(时间区间, 势力, 职业) 把 get_player_rankings 的结果保存为有序数组，并建立
+玩家名称到下标的索引：
+
+- 查询单个玩家的名次只需查一次索引，不重新计算排名
+- 名次变化与上一个周期（previous_window，today 对应 yesterday，week 对应之前的 7 天）的
+  快照比较，两个快照都复用
+
+快照记录创建时的数据版本号，入库、人员修改等递增版本号后失效；解析任务完成后
+refresh_rank_snapshots 立即重建失效的快照，入库后的第一次查询不用等待计算。与结果缓存
+一样，版本号是进程内的，其他进程写库后依靠存活时间上限（配置项 RANK_SNAPSHOT_TTL 秒）失效。
+today/week 等相对时间范围的区间随日期变化，跨天后自动使用新的快照。
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.models.player import Person
+from app.services.battle_service import player_rankings
+from app.utils.time_range import resolve_time_window, previous_window
+from app.utils.result_cache import data_generation
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 名次变化榜默认返回的人数和上限
+RANK_MOVERS_LIMIT = 10
+RANK_MOVERS_MAX_LIMIT = 100
+
+_lock = threading.Lock()
+_snapshots = OrderedDict()  # (开始, 结束, 势力, 职业) -> (数据版本, 创建时间, RankSnapshot)
+
+
+class RankSnapshot:
+    """某个时间区间、势力、职业下按名次排列的排名，创建后不再修改"""
+
+    def __init__(self, rankings):
+        self.players = rankings
+        self.positions = {}
+        for idx, player in enumerate(rankings):
+            # 同名时保留名次靠前的
+            self.positions.setdefault(player['name'], idx)
+
+    def __len__(self):
+        return len(self.players)
+
+    def rank_of(self, name):
+        """玩家的名次（从 1 开始）和排名数据，不在排名中时为 (None, None)"""
+        idx = self.positions.get(name)
+        if idx is None:
+            return None, None
+        return idx + 1, self.players[idx]
+
+
+def clear_rank_snapshots():
+    """丢弃全部快照"""
+    with _lock:
+        _snapshots.clear()
+
+
+def _store(key, generation, snapshot):
+    max_size = current_app.config['RANK_SNAPSHOT_SIZE']
+    with _lock:
+        # 计算期间数据发生了变化时不保存，避免保留旧数据
+        if generation == data_generation():
+            _snapshots[key] = (generation, time.monotonic(), snapshot)
+            _snapshots.move_to_end(key)
+            while len(_snapshots) > max_size:
+                _snapshots.popitem(last=False)
+
+
+def get_rank_snapshot(start=None, end=None, faction=None, job=None):
+    """[start, end) 内的排名快照，没有可用的快照时计算并保存"""
+    key = (start, end, faction, job)
+    generation = data_generation()
+    ttl = current_app.config['RANK_SNAPSHOT_TTL']
+    with _lock:
+        entry = _snapshots.get(key)
+        if entry is not None:
+            stored_generation, stored_at, snapshot = entry
+            if stored_generation == generation and (
+                    not ttl or time.monotonic() - stored_at <= ttl):
+                _snapshots.move_to_end(key)
+                return snapshot
+            del _snapshots[key]
+
+    started = time.perf_counter()
+    snapshot = RankSnapshot(player_rankings(faction, job, start, end))
+    logger.debug(f"生成排名快照 {start} ~ {end} {faction or '全部势力'} {job or '全部职业'}: "
+                 f"{len(snapshot)} 名玩家，耗时 {time.perf_counter() - started:.3f}s")
+    _store(key, generation, snapshot)
+    return snapshot
+
+
+def refresh_rank_snapshots():
+    """
+    重建已失效的快照（最近使用的优先），返回重建的个数
+
+    解析任务完成后调用，使入库前查询过的区间在下一次查询时直接命中。
+    """
+    with _lock:
+        keys = list(reversed(_snapshots))
+    refreshed = 0
+    for key in keys:
+        with _lock:
+            entry = _snapshots.get(key)
+            current = entry is not None and entry[0] == data_generation()
+        if not current:
+            get_rank_snapshot(*key)
+            refreshed += 1
+    if refreshed:
+        logger.info(f"已重建 {refreshed} 个排名快照")
+    return refreshed
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value is not None else None
+
+
+def _snapshot_pair(faction, job, time_range, start_datetime, end_datetime):
+    """当前周期和上一个周期的快照及各自的区间"""
+    start, end = resolve_time_window(time_range, start_datetime, end_datetime)
+    previous_start, previous_end = previous_window(start, end)
+    current = get_rank_snapshot(start, end, faction, job)
+    previous = get_rank_snapshot(previous_start, previous_end, faction, job)
+    window = {
+        'start': _format_time(start),
+        'end': _format_time(end),
+        'previous_start': _format_time(previous_start),
+        'previous_end': _format_time(previous_end)
+    }
+    return current, previous, window
+
+
+def _rank_change(rank, previous_rank):
+    """名次上升为正数，两个周期有一个不在排名中时为 None"""
+    if rank is None or previous_rank is None:
+        return None
+    return previous_rank - rank
+
+
+def get_player_rank(player_name, faction=None, job=None, time_range='today', start_datetime=None, end_datetime=None):
+    """
+    玩家在排名中的名次和相对上一个周期的名次变化
+
+    名次与 get_player_rankings 返回列表中的位置一致（从 1 开始）。
+
+    Args:
+        player_name: 玩家名称
+        faction / job: 在该势力、职业的排名中查找，为空时为全部玩家的排名
+
+    Returns:
+        dict: name, faction, job, rank, total, previous_rank, previous_total, rank_change（上升为正数）,
+              kills, deaths, blessings, kd_ratio, score 和 window（两个周期的起止时间）；
+              该时段没有战斗时 rank 等为 None、统计为 0，玩家不存在时返回 None
+    """
+    current, previous, window = _snapshot_pair(faction, job, time_range, start_datetime, end_datetime)
+    rank, player = current.rank_of(player_name)
+    previous_rank, _ = previous.rank_of(player_name)
+    if player is None:
+        person = Person.query.filter_by(name=player_name, deleted_at=None).first()
+        if person is None:
+            return None
+        player = {'name': person.name, 'job': person.job, 'faction': person.god,
+                  'kills': 0, 'deaths': 0, 'blessings': 0, 'kd_ratio': 0.0, 'score': 0}
+
+    return {
+        'name': player['name'],
+        'faction': player['faction'],
+        'job': player['job'],
+        'rank': rank,
+        'total': len(current),
+        'previous_rank': previous_rank,
+        'previous_total': len(previous),
+        'rank_change': _rank_change(rank, previous_rank),
+        'kills': player['kills'],
+        'deaths': player['deaths'],
+        'blessings': player['blessings'],
+        'kd_ratio': player['kd_ratio'],
+        'score': player['score'],
+        'window': window
+    }
+
+
+def get_rank_movers(faction=None, job=None, time_range='today', start_datetime=None, end_datetime=None,
+                    limit=RANK_MOVERS_LIMIT):
+    """
+    相对上一个周期名次上升、下降最多的玩家
+
+    Args:
+        limit: 每个列表最多返回的人数，不超过 RANK_MOVERS_MAX_LIMIT
+
+    Returns:
+        dict: risers（上升最多）, fallers（下降最多）, newcomers（上一个周期不在排名中，按名次排列）,
+              total, previous_total, window；每项含 name, faction, job, score, rank, previous_rank, rank_change
+
+    Raises:
+        ValueError: limit 小于 1
+    """
+    if limit < 1:
+        raise ValueError('返回人数必须大于 0')
+    limit = min(limit, RANK_MOVERS_MAX_LIMIT)
+    current, previous, window = _snapshot_pair(faction, job, time_range, start_datetime, end_datetime)
+
+    moved = []
+    newcomers = []
+    for rank, player in enumerate(current.players, start=1):
+        previous_rank, _ = previous.rank_of(player['name'])
+        entry = {
+            'name': player['name'],
+            'faction': player['faction'],
+            'job': player['job'],
+            'score': player['score'],
+            'rank': rank,
+            'previous_rank': previous_rank,
+            'rank_change': _rank_change(rank, previous_rank)
+        }
+        if previous_rank is None:
+            if len(newcomers) < limit:
+                newcomers.append(entry)
+        elif entry['rank_change']:
+            moved.append(entry)
+
+    risers = sorted((entry for entry in moved if entry['rank_change'] > 0),
+                    key=lambda entry: (-entry['rank_change'], entry['rank']))[:limit]
+    fallers = sorted((entry for entry in moved if entry['rank_change'] < 0),
+                     key=lambda entry: (entry['rank_change'], entry['rank']))[:limit]
+    return {
+        'risers': risers,
+        'fallers': fallers,
+        'newcomers': newcomers,
+        'total': len(current),
+        'previous_total': len(previous),
+        'window': window
+    }
@@ -0,0 +1,967 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+玩家每日战绩汇总服务
+
+player_daily_stats 按 (日期, person_id) 保存击杀、死亡和带祝福的击杀数：
+入库时 save_battle_log_to_db 在同一事务中累加增量，历史数据用
+rebuild_player_daily_stats 从 battle_record 重建。
+
+统计查询通过 player_totals_sql / player_daily_sql 取数：整天部分读取汇总表，
+只有不足一天的首尾时段扫描 battle_record，两部分 UNION ALL 后再聚合。
+
+kill_pair_daily 按 (日期, 击杀者, 被击杀者) 保存击杀次数，维护方式相同，
+势力/分组/玩家的击杀明细通过 kill_pairs_sql 按天求和。
+
+kill_heatmap_daily 按 (日期, 势力, 网格)、kill_timeline_minute 按 (日期, 势力, 分钟) 保存计数，
+入库时同样累加增量。这两张表按势力汇总，无法按玩家重新汇总：记录归属变化（玩家新增、改名）时用
+faction_rollup_deltas 求变化前后的差值，玩家换势力时用 move_person_faction 把其计数转到新势力。
+
+已归档月份（battle_record_archive）的明细不在 battle_record 中，各汇总表里这些日期的
+数据是唯一来源，重建和重新汇总时都跳过（exclude_archived_days）。
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import text, bindparam, func, and_, or_, not_, true
+from app.extensions import db
+from app.models.player import Person, BattleRecord
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.models.archive import BattleRecordArchive
+from app.utils.time_range import split_whole_days, next_month
+from app.utils.migrations import has_table
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 汇总表每条 INSERT 写入的行数
+DAILY_STATS_UPSERT_CHUNK_SIZE = 1000
+
+# 热力图汇总的网格边长（坐标单位），查询时可以按它的整数倍合并网格
+HEATMAP_CELL_SIZE = 10
+
+# 按势力汇总的表的键列（第二列为势力）和计数列
+HEATMAP_KEY_COLUMNS = ('stat_date', 'god', 'cell_x', 'cell_y')
+HEATMAP_COUNT_COLUMNS = ('kills', 'deaths')
+TIMELINE_KEY_COLUMNS = ('stat_date', 'god', 'minute_of_day')
+TIMELINE_COUNT_COLUMNS = ('kills', 'deaths', 'blessings')
+
+# 按 battle_record 明细聚合每日战绩的 SQL，win_conditions / lost_conditions 为额外的 AND 条件
+_RAW_DAILY_SQL = """
+    SELECT DATE(publish_at) AS stat_date, win_person_id AS person_id,
+           COUNT(*) AS kills, 0 AS deaths,
+           SUM(CASE WHEN remark = 1 THEN 1 ELSE 0 END) AS blessings
+    FROM battle_record
+    WHERE deleted_at IS NULL AND win_person_id IS NOT NULL {win_conditions}
+    GROUP BY DATE(publish_at), win_person_id
+    UNION ALL
+    SELECT DATE(publish_at) AS stat_date, lost_person_id AS person_id,
+           0 AS kills, COUNT(*) AS deaths, 0 AS blessings
+    FROM battle_record
+    WHERE deleted_at IS NULL AND lost_person_id IS NOT NULL {lost_conditions}
+    GROUP BY DATE(publish_at), lost_person_id
+"""
+
+
+# 按 battle_record 明细聚合每日击杀对的 SQL，conditions 为额外的 AND 条件
+_RAW_KILL_PAIR_SQL = """
+    SELECT DATE(publish_at) AS stat_date, win_person_id AS killer_id, lost_person_id AS victim_id,
+           COUNT(*) AS kills
+    FROM battle_record
+    WHERE deleted_at IS NULL AND win_person_id IS NOT NULL AND lost_person_id IS NOT NULL {conditions}
+    GROUP BY DATE(publish_at), win_person_id, lost_person_id
+"""
+
+
+# 按 battle_record 明细聚合每日每个玩家在各网格的击杀/死亡数的 SQL，{cell_x} / {cell_y} 为网格编号的表达式
+_RAW_HEATMAP_SQL = """
+    SELECT DATE(publish_at) AS stat_date, win_person_id AS person_id,
+           {cell_x} AS cell_x, {cell_y} AS cell_y,
+           COUNT(*) AS kills, 0 AS deaths
+    FROM battle_record
+    WHERE deleted_at IS NULL AND win_person_id IS NOT NULL AND x_coord IS NOT NULL AND y_coord IS NOT NULL {win_conditions}
+    GROUP BY DATE(publish_at), win_person_id, {cell_x}, {cell_y}
+    UNION ALL
+    SELECT DATE(publish_at) AS stat_date, lost_person_id AS person_id,
+           {cell_x} AS cell_x, {cell_y} AS cell_y,
+           0 AS kills, COUNT(*) AS deaths
+    FROM battle_record
+    WHERE deleted_at IS NULL AND lost_person_id IS NOT NULL AND x_coord IS NOT NULL AND y_coord IS NOT NULL {lost_conditions}
+    GROUP BY DATE(publish_at), lost_person_id, {cell_x}, {cell_y}
+"""
+
+
+# 按 battle_record 明细聚合每个玩家每分钟的击杀/死亡/祝福数的 SQL，{minute} 为当天分钟序号的表达式
+_RAW_TIMELINE_SQL = """
+    SELECT DATE(publish_at) AS stat_date, win_person_id AS person_id, {minute} AS minute_of_day,
+           COUNT(*) AS kills, 0 AS deaths,
+           SUM(CASE WHEN remark = 1 THEN 1 ELSE 0 END) AS blessings
+    FROM battle_record
+    WHERE deleted_at IS NULL AND win_person_id IS NOT NULL {win_conditions}
+    GROUP BY DATE(publish_at), win_person_id, {minute}
+    UNION ALL
+    SELECT DATE(publish_at) AS stat_date, lost_person_id AS person_id, {minute} AS minute_of_day,
+           0 AS kills, COUNT(*) AS deaths, 0 AS blessings
+    FROM battle_record
+    WHERE deleted_at IS NULL AND lost_person_id IS NOT NULL {lost_conditions}
+    GROUP BY DATE(publish_at), lost_person_id, {minute}
+"""
+
+
+def _raw_daily_sql(conditions):
+    """conditions 中的 {column} 会替换为 win_person_id / lost_person_id"""
+    return _RAW_DAILY_SQL.format(
+        win_conditions=conditions.format(column='win_person_id'),
+        lost_conditions=conditions.format(column='lost_person_id')
+    )
+
+
+def _split_window_conditions(start, end, prefix=''):
+    """
+    把 [start, end) 拆分为汇总表的 stat_date 条件和明细表的 publish_at 条件
+
+    Args:
+        prefix: 绑定参数名前缀，同一条 SQL 中有多个窗口时用于区分
+
+    Returns:
+        tuple: (汇总表条件列表，没有整天部分时为 None, 以 AND 开头的明细条件，没有不足一天的时段时为 None, 参数)
+    """
+    whole_days, partial = split_whole_days(start, end)
+    params = {}
+
+    rollup_conditions = None
+    if whole_days is not None:
+        first_day, end_day = whole_days
+        rollup_conditions = []
+        if first_day is not None:
+            rollup_conditions.append(f"stat_date >= :{prefix}rollup_start")
+            params[f'{prefix}rollup_start'] = first_day
+        if end_day is not None:
+            rollup_conditions.append(f"stat_date < :{prefix}rollup_end")
+            params[f'{prefix}rollup_end'] = end_day
+
+    raw_condition = None
+    if partial:
+        ranges = []
+        for idx, (range_start, range_end) in enumerate(partial):
+            ranges.append(f"(publish_at >= :{prefix}raw_start_{idx} AND publish_at < :{prefix}raw_end_{idx})")
+            params[f'{prefix}raw_start_{idx}'] = range_start
+            params[f'{prefix}raw_end_{idx}'] = range_end
+        raw_condition = f"AND ({' OR '.join(ranges)})"
+
+    return rollup_conditions, raw_condition, params
+
+
+def _daily_parts_sql(start=None, end=None):
+    """
+    [start, end) 内按 (日期, 玩家) 的战绩，整天部分读汇总表，首尾不足一天的时段读明细
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 stat_date, person_id, kills, deaths, blessings（可能有重复键，需要再聚合）
+    """
+    rollup_conditions, raw_condition, params = _split_window_conditions(start, end)
+    parts = []
+
+    if rollup_conditions is not None:
+        where = f"WHERE {' AND '.join(rollup_conditions)}" if rollup_conditions else ""
+        parts.append(f"""
+            SELECT stat_date, person_id, kills, deaths, blessings
+            FROM player_daily_stats
+            {where}
+        """)
+
+    if raw_condition:
+        parts.append(_raw_daily_sql(raw_condition))
+
+    if not parts:
+        # 空区间
+        parts.append("SELECT stat_date, person_id, kills, deaths, blessings FROM player_daily_stats WHERE 1 = 0")
+    return "\nUNION ALL\n".join(parts), params
+
+
+def player_totals_sql(start=None, end=None):
+    """
+    [start, end) 内每个玩家战绩合计的子查询
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 person_id, kills, deaths, blessings
+    """
+    parts_sql, params = _daily_parts_sql(start, end)
+    sql = f"""
+        SELECT person_id,
+               SUM(kills) AS kills,
+               SUM(deaths) AS deaths,
+               SUM(blessings) AS blessings
+        FROM ({parts_sql}) daily_parts
+        GROUP BY person_id
+    """
+    return sql, params
+
+
+def player_daily_sql(start=None, end=None):
+    """
+    [start, end) 内每个玩家每天战绩的子查询
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 stat_date, person_id, kills, deaths, blessings
+    """
+    parts_sql, params = _daily_parts_sql(start, end)
+    sql = f"""
+        SELECT stat_date,
+               person_id,
+               SUM(kills) AS kills,
+               SUM(deaths) AS deaths,
+               SUM(blessings) AS blessings
+        FROM ({parts_sql}) daily_parts
+        GROUP BY stat_date, person_id
+    """
+    return sql, params
+
+
+def _raw_kill_pair_sql(conditions):
+    """conditions 中的 {killer} / {victim} 会替换为 win_person_id / lost_person_id"""
+    return _RAW_KILL_PAIR_SQL.format(conditions=conditions.format(killer='win_person_id', victim='lost_person_id'))
+
+
+def kill_pairs_sql(start=None, end=None, conditions=''):
+    """
+    [start, end) 内每个击杀对的击杀次数子查询，整天部分读 kill_pair_daily，首尾不足一天的时段读明细
+
+    Args:
+        start: 开始时间（包含），None 表示不限
+        end: 结束时间（不包含），None 表示不限
+        conditions: 额外的 AND 条件，{killer} / {victim} 替换为击杀者/被击杀者 id 列，
+                    如 " AND {killer} = :person_id"
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 stat_date, killer_id, victim_id, kills（同一击杀对可能有多行，需要再聚合）
+    """
+    rollup_conditions, raw_condition, params = _split_window_conditions(start, end, prefix='pair_')
+    parts = []
+
+    if rollup_conditions is not None:
+        where = ' AND '.join(rollup_conditions) or '1 = 1'
+        parts.append(f"""
+            SELECT stat_date, killer_id, victim_id, kills
+            FROM kill_pair_daily
+            WHERE {where} {conditions.format(killer='killer_id', victim='victim_id')}
+        """)
+
+    if raw_condition:
+        parts.append(_raw_kill_pair_sql(f"{raw_condition} {conditions}"))
+
+    if not parts:
+        # 空区间
+        parts.append("SELECT stat_date, killer_id, victim_id, kills FROM kill_pair_daily WHERE 1 = 0")
+    return "\nUNION ALL\n".join(parts), params
+
+
+def _heatmap_cell_sql(column):
+    """坐标整除网格边长得到的网格编号的 SQL 表达式，各数据库上都是整数（MySQL 的 / 结果为 DECIMAL）"""
+    if db.engine.dialect.name == 'mysql':
+        return f"({column} DIV {HEATMAP_CELL_SIZE})"
+    return f"({column} / {HEATMAP_CELL_SIZE})"
+
+
+def _raw_heatmap_sql(conditions):
+    """conditions 中的 {column} / {name} 会替换为 win_person_id / win 或 lost_person_id / lost"""
+    return _RAW_HEATMAP_SQL.format(
+        cell_x=_heatmap_cell_sql('x_coord'),
+        cell_y=_heatmap_cell_sql('y_coord'),
+        win_conditions=conditions.format(column='win_person_id', name='win'),
+        lost_conditions=conditions.format(column='lost_person_id', name='lost')
+    )
+
+
+def _minute_of_day_sql():
+    """publish_at 在当天的分钟序号（0 ~ 1439）的 SQL 表达式"""
+    if db.engine.dialect.name == 'mysql':
+        return "(HOUR(publish_at) * 60 + MINUTE(publish_at))"
+    return "(CAST(strftime('%H', publish_at) AS INTEGER) * 60 + CAST(strftime('%M', publish_at) AS INTEGER))"
+
+
+def _raw_timeline_sql(conditions):
+    """conditions 中的 {column} / {name} 会替换为 win_person_id / win 或 lost_person_id / lost"""
+    return _RAW_TIMELINE_SQL.format(
+        minute=_minute_of_day_sql(),
+        win_conditions=conditions.format(column='win_person_id', name='win'),
+        lost_conditions=conditions.format(column='lost_person_id', name='lost')
+    )
+
+
+def _split_minute_window(start, end):
+    """
+    把 [start, end) 拆分为 kill_timeline_minute 的整分钟条件和明细表的不足一分钟时段条件
+
+    Returns:
+        tuple: (汇总表条件列表，没有整分钟部分时为 None, 以 AND 开头的明细条件，没有不足一分钟的时段时为 None, 参数)
+    """
+    first_minute = None
+    if start is not None:
+        first_minute = start.replace(second=0, microsecond=0)
+        if first_minute < start:
+            first_minute += timedelta(minutes=1)
+    end_minute = end.replace(second=0, microsecond=0) if end is not None else None
+
+    params = {}
+    partial = []
+    if first_minute is not None and end_minute is not None and first_minute >= end_minute:
+        # 区间落在同一分钟内
+        rollup_conditions = None
+        partial.append((start, end))
+    else:
+        rollup_conditions = []
+        if first_minute is not None:
+            # stat_date 单独比较一次，可以按索引做范围扫描
+            rollup_conditions.append("stat_date >= :timeline_start_day AND (stat_date > :timeline_start_day "
+                                     "OR minute_of_day >= :timeline_start_minute)")
+            params['timeline_start_day'] = first_minute.date()
+            params['timeline_start_minute'] = minute_of_day(first_minute)
+            if start < first_minute:
+                partial.append((start, first_minute))
+        if end_minute is not None:
+            rollup_conditions.append("stat_date <= :timeline_end_day AND (stat_date < :timeline_end_day "
+                                     "OR minute_of_day < :timeline_end_minute)")
+            params['timeline_end_day'] = end_minute.date()
+            params['timeline_end_minute'] = minute_of_day(end_minute)
+            if end_minute < end:
+                partial.append((end_minute, end))
+
+    raw_condition = None
+    if partial:
+        ranges = []
+        for idx, (range_start, range_end) in enumerate(partial):
+            ranges.append(f"(publish_at >= :timeline_raw_start_{idx} AND publish_at < :timeline_raw_end_{idx})")
+            params[f'timeline_raw_start_{idx}'] = range_start
+            params[f'timeline_raw_end_{idx}'] = range_end
+        raw_condition = f"AND ({' OR '.join(ranges)})"
+    return rollup_conditions, raw_condition, params
+
+
+def timeline_minutes_sql(start=None, end=None, conditions=''):
+    """
+    [start, end) 内各势力每分钟的击杀/死亡/祝福数子查询，整分钟部分读 kill_timeline_minute，
+    只有首尾不足一分钟的时段读明细
+
+    Args:
+        conditions: 额外的 AND 条件，{god} 替换为势力列，如 " AND {god} = :god"
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 stat_date, god, minute_of_day, kills, deaths, blessings（同一分钟可能有多行，需要再聚合）
+    """
+    rollup_conditions, raw_condition, params = _split_minute_window(start, end)
+    parts = []
+
+    if rollup_conditions is not None:
+        where = ' AND '.join(rollup_conditions) or '1 = 1'
+        parts.append(f"""
+            SELECT stat_date, god, minute_of_day, kills, deaths, blessings
+            FROM kill_timeline_minute
+            WHERE {where} {conditions.format(god='god')}
+        """)
+
+    if raw_condition:
+        parts.append(f"""
+            SELECT tl.stat_date, tl_person.god, tl.minute_of_day, tl.kills, tl.deaths, tl.blessings
+            FROM ({_raw_timeline_sql(raw_condition)}) tl
+            JOIN person tl_person ON tl_person.id = tl.person_id
+            WHERE tl_person.god IS NOT NULL {conditions.format(god='tl_person.god')}
+        """)
+    return "\nUNION ALL\n".join(parts), params
+
+
+def heatmap_cells_sql(start=None, end=None, conditions=''):
+    """
+    [start, end) 内各势力在每个网格的击杀/死亡数子查询，整天部分读 kill_heatmap_daily，首尾不足一天的时段读明细
+
+    Args:
+        conditions: 额外的 AND 条件，{god} 替换为势力列，如 " AND {god} = :god"
+
+    Returns:
+        tuple: (SQL, 参数)，结果列为 stat_date, god, cell_x, cell_y, kills, deaths（同一网格可能有多行，需要再聚合）
+    """
+    rollup_conditions, raw_condition, params = _split_window_conditions(start, end, prefix='heatmap_')
+    parts = []
+
+    if rollup_conditions is not None:
+        where = ' AND '.join(rollup_conditions) or '1 = 1'
+        parts.append(f"""
+            SELECT stat_date, god, cell_x, cell_y, kills, deaths
+            FROM kill_heatmap_daily
+            WHERE {where} {conditions.format(god='god')}
+        """)
+
+    if raw_condition:
+        parts.append(f"""
+            SELECT hp.stat_date, hp_person.god, hp.cell_x, hp.cell_y, hp.kills, hp.deaths
+            FROM ({_raw_heatmap_sql(raw_condition)}) hp
+            JOIN person hp_person ON hp_person.id = hp.person_id
+            WHERE hp_person.god IS NOT NULL {conditions.format(god='hp_person.god')}
+        """)
+
+    if not parts:
+        # 空区间
+        parts.append("SELECT stat_date, god, cell_x, cell_y, kills, deaths FROM kill_heatmap_daily WHERE 1 = 0")
+    return "\nUNION ALL\n".join(parts), params
+
+
+def kd_ratio(kills, deaths):
+    """击杀/死亡比，保留两位小数并四舍五入（与 SQL 中 ROUND(kills / deaths, 2) 一致），没有死亡时为击杀数"""
+    if deaths <= 0:
+        return float(kills)
+    return ((kills * 200 + deaths) // (2 * deaths)) / 100
+
+
+def add_kill_deltas(deltas, rows):
+    """
+    把新插入的战斗记录累加到增量字典
+
+    Args:
+        deltas: {(日期, person_id): [kills, deaths, blessings]}
+        rows: 含 win_person_id, lost_person_id, publish_at 的记录字典（新记录尚未标记祝福）
+    """
+    for row in rows:
+        stat_date = row['publish_at'].date()
+        if row.get('win_person_id') is not None:
+            deltas.setdefault((stat_date, row['win_person_id']), [0, 0, 0])[0] += 1
+        if row.get('lost_person_id') is not None:
+            deltas.setdefault((stat_date, row['lost_person_id']), [0, 0, 0])[1] += 1
+    return deltas
+
+
+def add_blessing_deltas(deltas, records):
+    """把新标记祝福的记录 (win_person_id, publish_at) 累加到增量字典"""
+    for win_person_id, publish_at in records:
+        if win_person_id is not None:
+            deltas.setdefault((publish_at.date(), win_person_id), [0, 0, 0])[2] += 1
+    return deltas
+
+
+def _upsert_counts(table, key_columns, count_columns, rows):
+    """
+    把 rows 中的计数累加到汇总表，键已存在时在原值上相加
+
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite 使用 ON CONFLICT DO UPDATE，
+    其他数据库逐行 UPDATE，不存在时再 INSERT。
+    """
+    dialect = db.engine.dialect.name
+
+    if dialect in ('mysql', 'sqlite'):
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for start in range(0, len(rows), DAILY_STATS_UPSERT_CHUNK_SIZE):
+            stmt = insert(table).values(rows[start:start + DAILY_STATS_UPSERT_CHUNK_SIZE])
+            new_values = stmt.inserted if dialect == 'mysql' else stmt.excluded
+            set_ = {column: table.c[column] + new_values[column] for column in count_columns}
+            set_['updated_at'] = new_values.updated_at
+            if dialect == 'mysql':
+                stmt = stmt.on_duplicate_key_update(**set_)
+            else:
+                stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_)
+            db.session.execute(stmt)
+    else:
+        for row in rows:
+            update = table.update()
+            for column in key_columns:
+                update = update.where(table.c[column] == row[column])
+            values = {column: table.c[column] + row[column] for column in count_columns}
+            result = db.session.execute(update.values(updated_at=row['updated_at'], **values))
+            if result.rowcount == 0:
+                db.session.execute(table.insert(), row)
+
+
+def apply_daily_stats_deltas(deltas):
+    """
+    把增量累加到 player_daily_stats，不提交事务，由调用方与战斗记录一起提交
+
+    Returns:
+        int: 涉及的 (日期, 玩家) 数
+    """
+    if not deltas:
+        return 0
+
+    now = datetime.now()
+    rows = [
+        {'stat_date': stat_date, 'person_id': person_id,
+         'kills': kills, 'deaths': deaths, 'blessings': blessings, 'updated_at': now}
+        for (stat_date, person_id), (kills, deaths, blessings) in sorted(deltas.items())
+    ]
+    _upsert_counts(PlayerDailyStats.__table__, ('stat_date', 'person_id'), ('kills', 'deaths', 'blessings'), rows)
+    return len(rows)
+
+
+def add_kill_pair_deltas(deltas, rows):
+    """
+    把新插入的战斗记录累加到击杀对增量字典
+
+    Args:
+        deltas: {(日期, 击杀者 id, 被击杀者 id): kills}
+        rows: 含 win_person_id, lost_person_id, publish_at 的记录字典，任一 id 为空的记录不计入
+    """
+    for row in rows:
+        killer_id = row.get('win_person_id')
+        victim_id = row.get('lost_person_id')
+        if killer_id is not None and victim_id is not None:
+            key = (row['publish_at'].date(), killer_id, victim_id)
+            deltas[key] = deltas.get(key, 0) + 1
+    return deltas
+
+
+def apply_kill_pair_deltas(deltas):
+    """
+    把增量累加到 kill_pair_daily，不提交事务，由调用方与战斗记录一起提交
+
+    Returns:
+        int: 涉及的 (日期, 击杀对) 数
+    """
+    if not deltas:
+        return 0
+
+    now = datetime.now()
+    rows = [
+        {'stat_date': stat_date, 'killer_id': killer_id, 'victim_id': victim_id, 'kills': kills, 'updated_at': now}
+        for (stat_date, killer_id, victim_id), kills in sorted(deltas.items())
+    ]
+    _upsert_counts(KillPairDaily.__table__, ('stat_date', 'killer_id', 'victim_id'), ('kills',), rows)
+    return len(rows)
+
+
+def heatmap_cell(coord):
+    """坐标所在的网格编号"""
+    return coord // HEATMAP_CELL_SIZE
+
+
+def add_heatmap_deltas(deltas, rows, sign=1):
+    """
+    把战斗记录累加到热力图增量字典
+
+    Args:
+        deltas: {(日期, person_id, cell_x, cell_y): [kills, deaths]}
+        rows: 含 win_person_id, lost_person_id, x_coord, y_coord, publish_at 的记录字典，没有坐标的记录不计入
+        sign: 1 为累加，-1 为扣减
+    """
+    for row in rows:
+        if row.get('x_coord') is None or row.get('y_coord') is None:
+            continue
+        cell = (heatmap_cell(row['x_coord']), heatmap_cell(row['y_coord']))
+        stat_date = row['publish_at'].date()
+        if row.get('win_person_id') is not None:
+            deltas.setdefault((stat_date, row['win_person_id']) + cell, [0, 0])[0] += sign
+        if row.get('lost_person_id') is not None:
+            deltas.setdefault((stat_date, row['lost_person_id']) + cell, [0, 0])[1] += sign
+    return deltas
+
+
+def apply_heatmap_deltas(deltas):
+    """
+    按玩家当前势力把增量累加到 kill_heatmap_daily，不提交事务，由调用方与战斗记录一起提交
+
+    Returns:
+        int: 涉及的 (日期, 势力, 网格) 数
+    """
+    return _apply_faction_deltas(KillHeatmapDaily.__table__, HEATMAP_KEY_COLUMNS, HEATMAP_COUNT_COLUMNS, deltas)
+
+
+def minute_of_day(moment):
+    """时间在当天的分钟序号（0 ~ 1439）"""
+    return moment.hour * 60 + moment.minute
+
+
+def add_timeline_deltas(deltas, rows, sign=1):
+    """
+    把战斗记录累加到时间线增量字典
+
+    Args:
+        deltas: {(日期, person_id, 分钟序号): [kills, deaths, blessings]}
+        rows: 含 win_person_id, lost_person_id, publish_at 的记录字典（新记录尚未标记祝福）
+        sign: 1 为累加，-1 为扣减
+    """
+    for row in rows:
+        stat_date = row['publish_at'].date()
+        minute = minute_of_day(row['publish_at'])
+        if row.get('win_person_id') is not None:
+            deltas.setdefault((stat_date, row['win_person_id'], minute), [0, 0, 0])[0] += sign
+        if row.get('lost_person_id') is not None:
+            deltas.setdefault((stat_date, row['lost_person_id'], minute), [0, 0, 0])[1] += sign
+    return deltas
+
+
+def add_timeline_blessing_deltas(deltas, records):
+    """把新标记祝福的记录 (win_person_id, publish_at) 累加到时间线增量字典"""
+    for win_person_id, publish_at in records:
+        if win_person_id is not None:
+            deltas.setdefault((publish_at.date(), win_person_id, minute_of_day(publish_at)), [0, 0, 0])[2] += 1
+    return deltas
+
+
+def apply_timeline_deltas(deltas):
+    """
+    按玩家当前势力把增量累加到 kill_timeline_minute，不提交事务，由调用方与战斗记录一起提交
+
+    Returns:
+        int: 涉及的 (日期, 势力, 分钟) 数
+    """
+    return _apply_faction_deltas(KillTimelineMinute.__table__, TIMELINE_KEY_COLUMNS, TIMELINE_COUNT_COLUMNS, deltas)
+
+
+def _faction_rollups():
+    """按势力汇总的表：[(表, 键列, 计数列, 明细聚合 SQL 生成函数)]，键列的第二列 god 对应明细中的 person_id"""
+    return [
+        (KillHeatmapDaily.__table__, HEATMAP_KEY_COLUMNS, HEATMAP_COUNT_COLUMNS, _raw_heatmap_sql),
+        (KillTimelineMinute.__table__, TIMELINE_KEY_COLUMNS, TIMELINE_COUNT_COLUMNS, _raw_timeline_sql),
+    ]
+
+
+def _person_gods(person_ids):
+    """{person_id: 势力}，没有势力的玩家不在结果中"""
+    person_ids = sorted(person_ids)
+    gods = {}
+    for start in range(0, len(person_ids), DAILY_STATS_UPSERT_CHUNK_SIZE):
+        gods.update(db.session.query(Person.id, Person.god).filter(
+            Person.id.in_(person_ids[start:start + DAILY_STATS_UPSERT_CHUNK_SIZE]), Person.god.isnot(None)
+        ))
+    return gods
+
+
+def _upsert_faction_counts(table, key_columns, count_columns, deltas):
+    """把 {(日期, 势力, ...): [计数, ...]} 累加到按势力汇总的表，扣减后计数全为 0 的行删除"""
+    deltas = {key: counts for key, counts in deltas.items() if any(counts)}
+    if not deltas:
+        return 0
+
+    now = datetime.now()
+    rows = [
+        dict(zip(key_columns, key), **dict(zip(count_columns, counts)), updated_at=now)
+        for key, counts in sorted(deltas.items())
+    ]
+    _upsert_counts(table, key_columns, count_columns, rows)
+
+    reduced_days = sorted({key[0] for key, counts in deltas.items() if min(counts) < 0})
+    if reduced_days:
+        db.session.execute(table.delete().where(
+            table.c.stat_date.in_(reduced_days), *[table.c[column] == 0 for column in count_columns]
+        ))
+    return len(rows)
+
+
+def _apply_faction_deltas(table, key_columns, count_columns, deltas):
+    """把按玩家的增量 {(日期, person_id, ...): [计数, ...]} 换算为玩家当前的势力后累加，没有势力的玩家不计入"""
+    gods = _person_gods({key[1] for key in deltas})
+    faction_deltas = {}
+    for key, counts in deltas.items():
+        god = gods.get(key[1])
+        if god is None:
+            continue
+        total = faction_deltas.setdefault((key[0], god) + key[2:], [0] * len(count_columns))
+        for idx, count in enumerate(counts):
+            total[idx] += count
+    return _upsert_faction_counts(table, key_columns, count_columns, faction_deltas)
+
+
+def faction_rollup_deltas(conditions, params, expanding=(), sign=1, deltas=None):
+    """
+    按条件从 battle_record 聚合每个玩家在各个按势力汇总的表中的计数，累加到增量字典
+
+    按势力汇总的表无法按玩家重新汇总，记录归属变化前以 sign=-1、变化后以 sign=1 各调用一次，
+    再用 apply_faction_rollup_deltas 累加差值。
+
+    Args:
+        conditions: 以 AND 开头的条件，{column} / {name} 替换为 win_person_id / win 或 lost_person_id / lost
+        expanding: IN 列表参数名
+
+    Returns:
+        dict: {表名: {(日期, person_id, ...): [计数, ...]}}
+    """
+    deltas = {} if deltas is None else deltas
+    for table, key_columns, count_columns, raw_sql in _faction_rollups():
+        table_deltas = deltas.setdefault(table.name, {})
+        columns = ('stat_date', 'person_id') + tuple(key_columns[2:]) + tuple(count_columns)
+        sql = text(f"""
+            SELECT {', '.join(columns)}
+            FROM ({raw_sql(conditions)}) rollup_parts
+        """).columns(stat_date=db.Date)
+        if expanding:
+            sql = sql.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+        key_size = len(key_columns)
+        for row in db.session.execute(sql, params):
+            key = (row[0],) + tuple(int(value) for value in row[1:key_size])
+            counts = table_deltas.setdefault(key, [0] * len(count_columns))
+            for idx, value in enumerate(row[key_size:]):
+                counts[idx] += sign * int(value or 0)
+    return deltas
+
+
+def apply_faction_rollup_deltas(deltas):
+    """把 faction_rollup_deltas 得到的增量按玩家当前势力累加到各表，不提交事务"""
+    return sum(
+        _apply_faction_deltas(table, key_columns, count_columns, deltas.get(table.name, {}))
+        for table, key_columns, count_columns, _ in _faction_rollups()
+    )
+
+
+def move_person_faction(person_id, old_god, new_god):
+    """
+    玩家换势力后把其现有记录在按势力汇总的表（热力图、时间线）中的计数从旧势力转到新势力，不提交事务
+
+    已归档月份没有明细，保留原有汇总（与其他汇总表的处理一致）。
+
+    Returns:
+        int: 涉及的汇总行数
+    """
+    if old_god == new_god:
+        return 0
+    conditions, params = _archived_record_conditions()
+    person_deltas = faction_rollup_deltas(conditions + " AND {column} = :person_id", dict(params, person_id=person_id))
+
+    moved = 0
+    for table, key_columns, count_columns, _ in _faction_rollups():
+        faction_deltas = {}
+        for key, counts in person_deltas[table.name].items():
+            for god, sign in ((old_god, -1), (new_god, 1)):
+                if god is None:
+                    continue
+                total = faction_deltas.setdefault((key[0], god) + key[2:], [0] * len(count_columns))
+                for idx, count in enumerate(counts):
+                    total[idx] += sign * count
+        moved += _upsert_faction_counts(table, key_columns, count_columns, faction_deltas)
+    return moved
+
+
+def _rebuild_faction_rollup(table, key_columns, count_columns, raw_sql, start_day, end_day):
+    """从 battle_record 重建按势力汇总的表的 [start_day, end_day) 日期区间，跳过已归档月份"""
+    delete = table.delete().where(exclude_archived_days(table.c.stat_date))
+    conditions, params = _archived_record_conditions()
+    if start_day is not None:
+        delete = delete.where(table.c.stat_date >= start_day)
+        conditions += " AND publish_at >= :start_at"
+        params['start_at'] = datetime.combine(start_day, time.min)
+    if end_day is not None:
+        delete = delete.where(table.c.stat_date < end_day)
+        conditions += " AND publish_at < :end_at"
+        params['end_at'] = datetime.combine(end_day, time.min)
+
+    db.session.execute(delete)
+    group_columns = ['rollup_parts.stat_date', 'p.god'] + [f'rollup_parts.{column}' for column in key_columns[2:]]
+    sql = text(f"""
+        INSERT INTO {table.name} ({', '.join(key_columns)}, {', '.join(count_columns)}, updated_at)
+        SELECT {', '.join(group_columns)}, {', '.join(f'SUM(rollup_parts.{column})' for column in count_columns)}, :now
+        FROM ({raw_sql(conditions)}) rollup_parts
+        JOIN person p ON p.id = rollup_parts.person_id
+        WHERE p.god IS NOT NULL
+        GROUP BY {', '.join(group_columns)}
+    """)
+    return db.session.execute(sql, dict(params, now=datetime.now())).rowcount
+
+
+def rebuild_kill_heatmap_daily(start_day=None, end_day=None):
+    """
+    从 battle_record 重建 [start_day, end_day) 日期区间的热力图汇总，不提交事务
+
+    区间内已归档的月份跳过，保留原有汇总。
+
+    Args:
+        start_day: 开始日期（包含），None 表示不限
+        end_day: 结束日期（不包含），None 表示不限
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    return _rebuild_faction_rollup(KillHeatmapDaily.__table__, HEATMAP_KEY_COLUMNS, HEATMAP_COUNT_COLUMNS,
+                                   _raw_heatmap_sql, start_day, end_day)
+
+
+def rebuild_kill_timeline_minute(start_day=None, end_day=None):
+    """
+    从 battle_record 重建 [start_day, end_day) 日期区间的每分钟时间线汇总，不提交事务
+
+    区间内已归档的月份跳过，保留原有汇总。
+
+    Args:
+        start_day: 开始日期（包含），None 表示不限
+        end_day: 结束日期（不包含），None 表示不限
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    return _rebuild_faction_rollup(KillTimelineMinute.__table__, TIMELINE_KEY_COLUMNS, TIMELINE_COUNT_COLUMNS,
+                                   _raw_timeline_sql, start_day, end_day)
+
+
+def archived_day_ranges():
+    """已归档且未恢复的月份 [(1 日, 下月 1 日), ...]"""
+    # 迁移 0004 之前的迁移也会重建汇总，那时还没有登记表
+    if not has_table(BattleRecordArchive.__tablename__):
+        return []
+    months = db.session.query(BattleRecordArchive.month).filter(
+        BattleRecordArchive.restored_at.is_(None)
+    ).order_by(BattleRecordArchive.month).all()
+    return [(month, next_month(month)) for month, in months]
+
+
+def exclude_archived_days(column):
+    """排除已归档月份的条件（用于汇总表的 DELETE），没有归档时为恒真"""
+    ranges = archived_day_ranges()
+    if not ranges:
+        return true()
+    return not_(or_(*[and_(column >= start_day, column < end_day) for start_day, end_day in ranges]))
+
+
+def _archived_record_conditions():
+    """
+    从 battle_record 重新汇总时排除已归档月份的条件和参数
+
+    归档后迟到写入这些日期的记录已由入库时的增量累加进保留的汇总，不能再汇总一次。
+    """
+    conditions = ""
+    params = {}
+    for idx, (start_day, end_day) in enumerate(archived_day_ranges()):
+        conditions += f" AND NOT (publish_at >= :archived_start_{idx} AND publish_at < :archived_end_{idx})"
+        params[f'archived_start_{idx}'] = datetime.combine(start_day, time.min)
+        params[f'archived_end_{idx}'] = datetime.combine(end_day, time.min)
+    return conditions, params
+
+
+def _insert_from_battle_records(conditions, params, expanding=()):
+    """按条件从 battle_record 聚合后写入汇总表（跳过已归档月份），expanding 为 IN 列表参数名"""
+    archived_conditions, archived_params = _archived_record_conditions()
+    conditions += archived_conditions
+    params = dict(params, **archived_params)
+    sql = text(f"""
+        INSERT INTO player_daily_stats (stat_date, person_id, kills, deaths, blessings, updated_at)
+        SELECT stat_date, person_id, SUM(kills), SUM(deaths), SUM(blessings), :now
+        FROM ({_raw_daily_sql(conditions)}) daily_parts
+        GROUP BY stat_date, person_id
+    """)
+    if expanding:
+        sql = sql.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return db.session.execute(sql, dict(params, now=datetime.now())).rowcount
+
+
+def rebuild_player_daily_stats(start_day=None, end_day=None):
+    """
+    从 battle_record 重建 [start_day, end_day) 日期区间的汇总数据，不提交事务
+
+    区间内已归档的月份跳过，保留原有汇总。
+
+    Args:
+        start_day: 开始日期（包含），None 表示不限
+        end_day: 结束日期（不包含），None 表示不限
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    table = PlayerDailyStats.__table__
+    delete = table.delete().where(exclude_archived_days(table.c.stat_date))
+    conditions = ""
+    params = {}
+    if start_day is not None:
+        delete = delete.where(table.c.stat_date >= start_day)
+        conditions += " AND publish_at >= :start_at"
+        params['start_at'] = datetime.combine(start_day, time.min)
+    if end_day is not None:
+        delete = delete.where(table.c.stat_date < end_day)
+        conditions += " AND publish_at < :end_at"
+        params['end_at'] = datetime.combine(end_day, time.min)
+
+    db.session.execute(delete)
+    return _insert_from_battle_records(conditions, params)
+
+
+def refresh_person_daily_stats(person_ids):
+    """
+    重新汇总指定玩家的全部每日战绩（玩家新增、改名导致记录归属变化后调用），不提交事务
+
+    已归档月份没有明细，保留原有汇总。
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    person_ids = sorted({person_id for person_id in person_ids if person_id is not None})
+    if not person_ids:
+        return 0
+
+    table = PlayerDailyStats.__table__
+    db.session.execute(table.delete().where(
+        table.c.person_id.in_(person_ids), exclude_archived_days(table.c.stat_date)
+    ))
+    return _insert_from_battle_records(" AND {column} IN :person_ids", {'person_ids': person_ids}, expanding=['person_ids'])
+
+
+def _insert_kill_pairs_from_battle_records(conditions, params, expanding=()):
+    """按条件从 battle_record 聚合后写入 kill_pair_daily（跳过已归档月份），expanding 为 IN 列表参数名"""
+    archived_conditions, archived_params = _archived_record_conditions()
+    conditions += archived_conditions
+    params = dict(params, **archived_params)
+    sql = text(f"""
+        INSERT INTO kill_pair_daily (stat_date, killer_id, victim_id, kills, updated_at)
+        SELECT stat_date, killer_id, victim_id, kills, :now
+        FROM ({_raw_kill_pair_sql(conditions)}) pair_parts
+    """)
+    if expanding:
+        sql = sql.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return db.session.execute(sql, dict(params, now=datetime.now())).rowcount
+
+
+def rebuild_kill_pair_daily(start_day=None, end_day=None):
+    """
+    从 battle_record 重建 [start_day, end_day) 日期区间的击杀对汇总，不提交事务
+
+    区间内已归档的月份跳过，保留原有汇总。
+
+    Args:
+        start_day: 开始日期（包含），None 表示不限
+        end_day: 结束日期（不包含），None 表示不限
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    table = KillPairDaily.__table__
+    delete = table.delete().where(exclude_archived_days(table.c.stat_date))
+    conditions = ""
+    params = {}
+    if start_day is not None:
+        delete = delete.where(table.c.stat_date >= start_day)
+        conditions += " AND publish_at >= :start_at"
+        params['start_at'] = datetime.combine(start_day, time.min)
+    if end_day is not None:
+        delete = delete.where(table.c.stat_date < end_day)
+        conditions += " AND publish_at < :end_at"
+        params['end_at'] = datetime.combine(end_day, time.min)
+
+    db.session.execute(delete)
+    return _insert_kill_pairs_from_battle_records(conditions, params)
+
+
+def refresh_person_kill_pairs(person_ids):
+    """
+    重新汇总指定玩家作为击杀者或被击杀者的全部击杀对（记录归属变化后调用），不提交事务
+
+    已归档月份没有明细，保留原有汇总。
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    person_ids = sorted({person_id for person_id in person_ids if person_id is not None})
+    if not person_ids:
+        return 0
+
+    table = KillPairDaily.__table__
+    db.session.execute(table.delete().where(
+        db.or_(table.c.killer_id.in_(person_ids), table.c.victim_id.in_(person_ids)),
+        exclude_archived_days(table.c.stat_date)
+    ))
+    return _insert_kill_pairs_from_battle_records(
+        " AND ({killer} IN :person_ids OR {victim} IN :person_ids)", {'person_ids': person_ids}, expanding=['person_ids']
+    )
+
+
+def battle_record_day_range():
+    """battle_record 中最早和最晚一条记录的日期，没有记录时返回 (None, None)"""
+    # MIN 和 MAX 分开查询，各自只需在 (deleted_at, publish_at, ...) 索引上定位一次
+    first_at = db.session.query(func.min(BattleRecord.publish_at)).filter(BattleRecord.deleted_at.is_(None)).scalar()
+    last_at = db.session.query(func.max(BattleRecord.publish_at)).filter(BattleRecord.deleted_at.is_(None)).scalar()
+    if first_at is None:
+        return None, None
+    return first_at.date(), last_at.date() + timedelta(days=1)
@@ -10,6 +10,7 @@ import logging
 import os
 from datetime import datetime
 from app.extensions import db
+from app.utils.time_range import date_range_bounds, time_window_condition
 from app.utils.logger import get_logger
 from sqlalchemy import text
 
@@ -76,14 +77,9 @@ def generate_battle_report(output_dir="reports", start_date=None, end_date=None)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         csv_filename = os.path.join(output_dir, f"battle_report_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{timestamp}.csv")
         
-        # 构建SQL查询，包含日期范围过滤
-        date_filter = ""
-        
-        if start_date:
-            date_filter += f" AND br.publish_at >= '{start_date.strftime('%Y-%m-%d %H:%M:%S')}'"
-            
-        if end_date:
-            date_filter += f" AND br.publish_at <= '{end_date.strftime('%Y-%m-%d %H:%M:%S')}'"
+        # 构建SQL查询，包含日期范围过滤（起止日期均包含）
+        date_filter, date_params = time_window_condition('br.publish_at', *date_range_bounds(start_date, end_date))
+        date_filter = f" {date_filter}" if date_filter else ""
         
         # 执行SQL查询获取战斗报告数据
         report_sql = f"""
@@ -115,7 +111,7 @@ def generate_battle_report(output_dir="reports", start_date=None, end_date=None)
         """
         
         # 使用SQLAlchemy执行原始SQL
-        result = db.session.execute(text(report_sql))
+        result = db.session.execute(text(report_sql), date_params)
         
         # 获取列名
         columns = result.keys()
@@ -3,6 +3,8 @@ from app import db
 from sqlalchemy import func, desc, and_, text
 from datetime import datetime
 import json
+from app.services.battle_service import load_player_battle_summary
+from app.services.stats_service import kd_ratio
 from app.utils.logger import get_logger
 
 logger = get_logger()
@@ -232,8 +234,7 @@ def get_player_rankings(faction=None, limit=30):
                 COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
                 -- 统计祝福次数(只有win的玩家才会有祝福)
                 SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
-                -- 获取最后战斗位置和时间
-                MAX(br.position) as last_position,
+                -- 获取最后战斗时间（最后位置在外层取该时间的记录）
                 MAX(br.publish_at) as last_battle_time,
                 MAX(p.updated_at) as last_updated
             FROM 
@@ -269,7 +270,11 @@ def get_player_rankings(faction=None, limit=30):
                  THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
                  ELSE kills END as kd_ratio,
             (kills * 3 + blessings - deaths) as score,
-            last_position,
+            -- position 是字符串，MAX 得到的是字典序最大的坐标，改为取最后一场战斗的位置
+            (SELECT br.position FROM battle_record br
+             WHERE br.publish_at = player_stats.last_battle_time
+               AND (br.win = player_stats.player_name OR br.lost = player_stats.player_name)
+             ORDER BY br.id DESC LIMIT 1) as last_position,
             last_battle_time,
             last_updated
         FROM 
@@ -310,8 +315,15 @@ def get_player_rankings(faction=None, limit=30):
         return []
 
 
-def get_battle_details_by_player(person_id, start_date=None, end_date=None, date_condition=""):
-    """获取指定玩家的战斗明细"""
+def get_battle_details_by_player(person_id, start=None, end=None):
+    """
+    获取指定玩家的战斗明细
+
+    Args:
+        person_id: 玩家ID
+        start: 可选，开始时间（包含）
+        end: 可选，结束时间（不包含）
+    """
     logger.info(f"获取玩家ID {person_id} 的战斗明细")
     
     try:
@@ -323,72 +335,13 @@ def get_battle_details_by_player(person_id, start_date=None, end_date=None, date
         
         logger.debug(f"找到玩家: {player.name}, 势力: {player.god}, 职业: {player.job}")
         
-        # 使用SQL查询获取战绩汇总数据
-        sql = """
-        WITH player_battle_stats AS (
-            SELECT 
-                p.id AS player_id,
-                p.name AS player_name,
-                p.job AS player_job,
-                p.god AS player_god,
-                -- 统计击杀次数(通过win字段关联)
-                COUNT(DISTINCT CASE WHEN br.win = p.name THEN br.id END) as kills,
-                -- 统计死亡次数(通过lost字段关联)
-                COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
-                -- 统计祝福次数(只有win的玩家才会有祝福)
-                SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
-                -- 获取最后战斗位置和时间
-                MAX(br.position) as last_position,
-                MAX(br.publish_at) as last_battle_time,
-                MAX(p.updated_at) as last_updated
-            FROM 
-                person p
-            LEFT JOIN 
-                battle_record br ON br.win = p.name OR br.lost = p.name
-            WHERE 
-                p.id = :person_id
-                -- 添加时间过滤条件
-                {date_condition}
-            GROUP BY 
-                p.id, p.name, p.job, p.god
-        )
-        SELECT 
-            player_id,
-            player_name,
-            player_job,
-            player_god,
-            kills,
-            deaths,
-            blessings,
-            CASE WHEN deaths > 0 
-                 THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
-                 ELSE kills END as kd_ratio,
-            (kills * 3 + blessings - deaths) as score,
-            last_position,
-            last_battle_time,
-            last_updated
-        FROM 
-            player_battle_stats
-        """
-        
-        # 替换日期条件
-        sql = sql.format(date_condition=date_condition)
+        # 一次查询取回玩家的击杀和被杀记录，战绩汇总、近期战斗和击杀/被杀明细都由此得出
+        summary = load_player_battle_summary(player.name, player.id, start, end)
+        kills = summary['kills']
+        deaths = summary['deaths']
         
-        # 如果传入了具体的日期但没有传入date_condition，则使用旧的方式添加日期条件
-        if not date_condition and (start_date or end_date):
-            old_condition = """
-                -- 添加时间过滤条件
-                AND (:start_date IS NULL OR br.publish_at >= :start_date)
-                AND (:end_date IS NULL OR br.publish_at <= :end_date)
-            """
-            sql = sql.replace("{date_condition}", old_condition)
-            result = db.session.execute(text(sql), {"person_id": person_id, "start_date": start_date, "end_date": end_date}).first()
-        else:
-            # 使用新的date_condition参数
-            result = db.session.execute(text(sql), {"person_id": person_id}).first()
-        
-        # 如果没有战绩记录，返回基本信息
-        if not result:
+        # 指定了时间范围且范围内没有战绩记录，返回基本信息
+        if kills == 0 and deaths == 0 and (start is not None or end is not None):
             logger.debug(f"玩家 {player.name} 没有战绩记录，返回基本信息")
             return {
                 'id': player.id,
@@ -406,166 +359,32 @@ def get_battle_details_by_player(person_id, start_date=None, end_date=None, date
         
         # 创建包含详细信息的字典
         player_details = {
-            'id': result.player_id,
-            'name': result.player_name,
-            'god': result.player_god,
-            'job': result.player_job,
-            'kills': result.kills,
-            'deaths': result.deaths,
-            'kd_ratio': result.kd_ratio,
-            'score': result.score,
-            'blessings': result.blessings,
-            'last_battle_time': result.last_battle_time,
-            'last_position': result.last_position
+            'id': player.id,
+            'name': player.name,
+            'god': player.god,
+            'job': player.job,
+            'kills': kills,
+            'deaths': deaths,
+            'kd_ratio': kd_ratio(kills, deaths) if deaths > 0 else kills,
+            'score': kills * 3 + summary['blessings'] - deaths,
+            'blessings': summary['blessings'],
+            'last_battle_time': summary['last_battle_time'],
+            'last_position': summary['last_position']
         }
         
-        # 获取近期战斗记录
-        recent_battles_sql = """
-        SELECT 
-            br.id,
-            CASE 
-                WHEN br.win = :player_name THEN br.lost  -- 如果是胜利者，显示被击杀者
-                ELSE br.win  -- 如果是失败者，显示击杀者
-            END as opponent_name,
-            CASE 
-                WHEN br.win = :player_name THEN 'win'  -- 玩家是胜利者
-                ELSE 'lost'  -- 玩家是失败者
-            END as battle_result,
-            br.remark as blessings,
-            br.position,
-            br.publish_at
-        FROM 
-            battle_record br 
-        WHERE 
-            br.win = :player_name OR br.lost = :player_name
-            -- 添加时间过滤条件
-            {date_condition}
-        ORDER BY 
-            br.publish_at DESC 
-        LIMIT 50
-        """
-        
-        # 替换日期条件
-        recent_battles_sql = recent_battles_sql.format(date_condition=date_condition)
-        
-        # 如果传入了具体的日期但没有传入date_condition，则使用旧的方式添加日期条件
-        if not date_condition and (start_date or end_date):
-            old_condition = """
-            -- 添加时间过滤条件
-            AND (:start_date IS NULL OR br.publish_at >= :start_date)
-            AND (:end_date IS NULL OR br.publish_at <= :end_date)
-            """
-            recent_battles_sql = recent_battles_sql.replace("{date_condition}", old_condition)
-            recent_battles = db.session.execute(text(recent_battles_sql), {"player_name": player.name, "start_date": start_date, "end_date": end_date}).fetchall()
-        else:
-            # 使用新的date_condition参数
-            recent_battles = db.session.execute(text(recent_battles_sql), {"player_name": player.name}).fetchall()
-        
         # 添加近期战斗记录
         player_details['recent_battles'] = [{
-            'id': battle.id,
-            'opponent_name': battle.opponent_name,
-            'battle_result': battle.battle_result,
-            'blessings': battle.blessings,
-            'position': battle.position,
-            'time': battle.publish_at.strftime('%Y-%m-%d %H:%M:%S') if battle.publish_at else None
-        } for battle in recent_battles]
-        
-        # 获取玩家击杀其他玩家的次数
-        kills_details_sql = """
-        SELECT 
-            v.id AS victim_id,
-            v.name AS victim_name,
-            v.job AS victim_job,
-            v.god AS victim_god,
-            COUNT(*) AS kill_count
-        FROM 
-            battle_record br
-        JOIN 
-            person v ON br.lost = v.name  -- 被击杀者关联
-        WHERE 
-            br.win = :player_name  -- 当前玩家是胜利者(击杀者)
-            -- 添加时间过滤条件
-            {date_condition}
-        GROUP BY 
-            v.id, v.name, v.job, v.god
-        ORDER BY 
-            kill_count DESC
-        LIMIT 20
-        """
-        
-        # 替换日期条件
-        kills_details_sql = kills_details_sql.format(date_condition=date_condition)
-        
-        # 如果传入了具体的日期但没有传入date_condition，则使用旧的方式添加日期条件
-        if not date_condition and (start_date or end_date):
-            old_condition = """
-            -- 添加时间过滤条件
-            AND (:start_date IS NULL OR br.publish_at >= :start_date)
-            AND (:end_date IS NULL OR br.publish_at <= :end_date)
-            """
-            kills_details_sql = kills_details_sql.replace("{date_condition}", old_condition)
-            kills_details = db.session.execute(text(kills_details_sql), {"player_name": player.name, "start_date": start_date, "end_date": end_date}).fetchall()
-        else:
-            # 使用新的date_condition参数
-            kills_details = db.session.execute(text(kills_details_sql), {"player_name": player.name}).fetchall()
-        
-        # 添加击杀详情
-        player_details['kills_details'] = [{
-            'id': kill.victim_id,
-            'name': kill.victim_name,
-            'job': kill.victim_job,
-            'god': kill.victim_god,
-            'count': kill.kill_count
-        } for kill in kills_details]
-        
-        # 获取被其他玩家击杀的次数
-        deaths_details_sql = """
-        SELECT 
-            k.id AS killer_id,
-            k.name AS killer_name,
-            k.job AS killer_job,
-            k.god AS killer_god,
-            COUNT(*) AS death_count
-        FROM 
-            battle_record br
-        JOIN 
-            person k ON br.win = k.name  -- 击杀者关联
-        WHERE 
-            br.lost = :player_name  -- 当前玩家是失败者(被击杀者)
-            -- 添加时间过滤条件
-            {date_condition}
-        GROUP BY 
-            k.id, k.name, k.job, k.god
-        ORDER BY 
-            death_count DESC
-        LIMIT 20
-        """
-        
-        # 替换日期条件
-        deaths_details_sql = deaths_details_sql.format(date_condition=date_condition)
-        
-        # 如果传入了具体的日期但没有传入date_condition，则使用旧的方式添加日期条件
-        if not date_condition and (start_date or end_date):
-            old_condition = """
-            -- 添加时间过滤条件
-            AND (:start_date IS NULL OR br.publish_at >= :start_date)
-            AND (:end_date IS NULL OR br.publish_at <= :end_date)
-            """
-            deaths_details_sql = deaths_details_sql.replace("{date_condition}", old_condition)
-            deaths_details = db.session.execute(text(deaths_details_sql), {"player_name": player.name, "start_date": start_date, "end_date": end_date}).fetchall()
-        else:
-            # 使用新的date_condition参数
-            deaths_details = db.session.execute(text(deaths_details_sql), {"player_name": player.name}).fetchall()
-        
-        # 添加死亡详情
-        player_details['deaths_details'] = [{
-            'id': death.killer_id,
-            'name': death.killer_name,
-            'job': death.killer_job,
-            'god': death.killer_god,
-            'count': death.death_count
-        } for death in deaths_details]
+            'id': battle['id'],
+            'opponent_name': battle['opponent_name'],
+            'battle_result': battle['battle_result'],
+            'blessings': battle['blessings'],
+            'position': battle['position'],
+            'time': battle['publish_at'].strftime('%Y-%m-%d %H:%M:%S') if battle['publish_at'] else None
+        } for battle in summary['recent_battles'][:50]]
+        
+        # 添加击杀详情和死亡详情
+        player_details['kills_details'] = summary['kills_details'][:20]
+        player_details['deaths_details'] = summary['deaths_details'][:20]
         
         logger.info(f"返回玩家 {player.name} 的战斗明细")
         return player_details
@@ -597,8 +416,7 @@ def export_data_to_json(faction=None):
                 COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
                 -- 统计祝福次数(只有win的玩家才会有祝福)
                 SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
-                -- 获取最后战斗位置和时间
-                MAX(br.position) as last_position,
+                -- 获取最后战斗时间（最后位置在外层取该时间的记录）
                 MAX(br.publish_at) as last_battle_time,
                 MAX(p.updated_at) as last_updated
             FROM 
@@ -634,7 +452,11 @@ def export_data_to_json(faction=None):
                  THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
                  ELSE kills END as kd_ratio,
             (kills * 3 + blessings - deaths) as score,
-            last_position,
+            -- position 是字符串，MAX 得到的是字典序最大的坐标，改为取最后一场战斗的位置
+            (SELECT br.position FROM battle_record br
+             WHERE br.publish_at = player_stats.last_battle_time
+               AND (br.win = player_stats.player_name OR br.lost = player_stats.player_name)
+             ORDER BY br.id DESC LIMIT 1) as last_position,
             last_battle_time,
             last_updated
         FROM 
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上传日志的编码识别
+
+游戏客户端导出的日志绝大多数是 GBK，少量是 UTF-8。按以下顺序在内存中的字节上
+严格解码，第一个成功的编码即为结果，整个过程只读取一次字节：
+
+1. UTF-8（带 BOM 时为 utf-8-sig）。非 UTF-8 内容几乎不可能通过严格校验，所以总是最先尝试
+2. 同一上传来源上次识别出的编码（缓存）
+3. GBK、GB18030
+4. 以上都失败时才调用 chardet 检测，结果写入缓存，该来源之后的上传不再检测
+
+完整内容使用 decode_log_bytes / decode_log_file；流式上传只能看到开头的字节，
+使用 resolve_encoding 选定编码后再以 errors='replace' 增量解码。
+"""
+
+import codecs
+import threading
+from collections import OrderedDict
+import chardet
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 不依赖 chardet 时依次严格尝试的编码
+CANDIDATE_ENCODINGS = ['utf-8', 'gbk', 'gb18030']
+
+# 所有编码都无法严格解码时使用的编码（GBK 的超集），配合 errors='replace'
+LAST_RESORT_ENCODING = 'gb18030'
+
+# 按上传来源缓存的编码数量上限
+SOURCE_CACHE_SIZE = 1024
+
+_source_encodings = OrderedDict()
+_source_lock = threading.Lock()
+
+
+def get_cached_encoding(source):
+    """返回该来源上次识别出的编码"""
+    if source is None:
+        return None
+    with _source_lock:
+        encoding = _source_encodings.get(source)
+        if encoding is not None:
+            _source_encodings.move_to_end(source)
+        return encoding
+
+
+def remember_encoding(source, encoding):
+    """记录该来源识别出的编码，超过上限时淘汰最久未使用的来源"""
+    if source is None:
+        return
+    with _source_lock:
+        _source_encodings[source] = encoding
+        _source_encodings.move_to_end(source)
+        while len(_source_encodings) > SOURCE_CACHE_SIZE:
+            _source_encodings.popitem(last=False)
+
+
+def _normalize(encoding):
+    """把 UTF-8 统一为带 BOM 检测的名称，避免 BOM 出现在第一行里"""
+    return 'utf-8-sig' if codecs.lookup(encoding).name == 'utf-8' else encoding
+
+
+def _candidates(source):
+    """严格尝试的编码顺序：UTF-8 之后优先尝试该来源缓存的编码"""
+    candidates = CANDIDATE_ENCODINGS[:1]
+    cached = get_cached_encoding(source)
+    if cached and _normalize(cached) != _normalize(candidates[0]):
+        candidates.append(cached)
+    candidates.extend(enc for enc in CANDIDATE_ENCODINGS[1:] if enc != cached)
+    return candidates
+
+
+def _chardet_encoding(data):
+    """调用 chardet 检测，返回 Python 支持的编码名称或 None"""
+    detection = chardet.detect(data)
+    detected_encoding = detection.get('encoding')
+    detected_confidence = detection.get('confidence') or 0
+    logger.info(f"Chardet 检测结果: encoding='{detected_encoding}', confidence={detected_confidence:.2f}")
+    if not detected_encoding:
+        return None
+    try:
+        codecs.lookup(detected_encoding)
+    except LookupError:
+        logger.warning(f"Python 不支持编码 '{detected_encoding}'")
+        return None
+    return detected_encoding
+
+
+def _try_decode(data, encoding, final):
+    """严格解码，成功返回文本，失败返回 None；final=False 时允许末尾有不完整的多字节字符"""
+    try:
+        return codecs.getincrementaldecoder(_normalize(encoding))().decode(data, final=final)
+    except UnicodeDecodeError:
+        return None
+
+
+def _resolve(data, source, final):
+    """按顺序严格解码 data，返回 (编码, 文本)"""
+    for encoding in _candidates(source):
+        text = _try_decode(data, encoding, final)
+        if text is not None:
+            encoding = _normalize(encoding)
+            remember_encoding(source, encoding)
+            return encoding, text
+
+    logger.warning("按 UTF-8/GBK/GB18030 均无法严格解码，使用 chardet 检测编码")
+    detected = _chardet_encoding(data)
+    if detected:
+        text = _try_decode(data, detected, final)
+        if text is not None:
+            encoding = _normalize(detected)
+            remember_encoding(source, encoding)
+            return encoding, text
+
+    logger.warning(f"无法严格解码，使用 {LAST_RESORT_ENCODING} 并替换无法解码的字节")
+    return LAST_RESORT_ENCODING, None
+
+
+def resolve_encoding(head, source=None):
+    """
+    根据开头的字节确定编码，用于流式解码
+
+    Args:
+        head: 流开头的字节（末尾可以截断在多字节字符中间）
+        source: 可选，上传来源（上传用户、目录等），用于缓存
+
+    Returns:
+        str: 编码名称
+    """
+    encoding, _ = _resolve(head, source, final=False)
+    return encoding
+
+
+def decode_log_bytes(data, source=None):
+    """
+    解码完整的日志内容
+
+    Args:
+        data: 完整的字节内容
+        source: 可选，上传来源，用于缓存
+
+    Returns:
+        tuple: (文本, 编码)
+    """
+    encoding, text = _resolve(data, source, final=True)
+    if text is None:
+        text = data.decode(encoding, errors='replace')
+    return text, encoding
+
+
+def decode_log_file(file_path, source=None):
+    """读取一次文件并解码，返回 (文本, 编码)"""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return decode_log_bytes(data, source)
@@ -7,14 +7,24 @@
 
 import re
 import os
-import codecs
 from datetime import datetime
 from app.models.player import Person, BattleRecord
 from app import db
 from app.utils.logger import get_logger
-import chardet
 from app.utils.transaction_helper import retry_on_deadlock
-import io
+from app.services.stats_service import (
+    add_kill_deltas, add_blessing_deltas, apply_daily_stats_deltas, add_kill_pair_deltas, apply_kill_pair_deltas,
+    add_heatmap_deltas, apply_heatmap_deltas, add_timeline_deltas, add_timeline_blessing_deltas, apply_timeline_deltas
+)
+from app.utils.encoding_resolver import resolve_encoding, decode_log_file
+from app.utils.result_cache import bump_data_generation
+from app.utils.log_parser import (
+    iter_event_lines,
+    iter_battle_events,
+    iter_decoded_lines,
+    iter_event_batches,
+    split_battle_events
+)
 
 logger = get_logger()
 
@@ -49,97 +59,42 @@ def parse_csv_file(file_path):
         return False, f"解析CSV文件时出错：{str(e)}", None
 
 
-def parse_text_file(file_path):
-    """解析文本文件，先尝试chardet检测编码，然后尝试解码。"""
+# 编码检测读取的字节数
+ENCODING_SAMPLE_SIZE = 32 * 1024
+
+# 流式解析每次读取的字节数和每批写库的事件数
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_SIZE = 2000
+
+# 多行 INSERT 每条语句包含的记录数
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+def parse_text_file(file_path, source=None):
+    """
+    解析文本文件，只读取一次文件，编码由 encoding_resolver 识别
+    
+    Args:
+        file_path: 文件路径
+        source: 可选，上传来源（上传用户等），用于缓存识别出的编码
+    """
     logger.info(f"尝试解析文件: {file_path}")
-    content = None
-    encoding_used = None
-    detected_encoding = None
-    detected_confidence = 0
-    # 预设编码列表，作为 chardet 检测失败或结果不可信时的后备
-    fallback_encodings = ['gbk', 'gb2312', 'utf-8']
-
-    # --- 1. 使用 chardet 检测编码 --- 
     try:
-        # 读取文件开头一部分用于检测 (例如 32KB)
-        # 使用 io.open 更灵活，可以处理二进制
-        with io.open(file_path, "rb") as f:
-            raw_data = f.read(32 * 1024) # Read first 32KB
-            if not raw_data:
-                 logger.warning(f"文件为空: {file_path}")
-                 return False, "文件为空", [], []
-                 
-            detection = chardet.detect(raw_data)
-            detected_encoding = detection.get('encoding')
-            detected_confidence = detection.get('confidence', 0)
-            logger.info(f"Chardet 检测结果: encoding='{detected_encoding}', confidence={detected_confidence:.2f}")
-
+        if os.path.getsize(file_path) == 0:
+            logger.warning(f"文件为空: {file_path}")
+            return False, "文件为空", [], []
+        content, encoding_used = decode_log_file(file_path, source=source)
+        logger.info(f"成功使用 {encoding_used} 编码读取文件")
+        if '\ufffd' in content:
+            logger.warning(f"文件在使用 {encoding_used} 读取时检测到替换字符 ('\uFFFD')，原始文件可能包含无法解码的字节。")
     except FileNotFoundError:
         logger.error(f"文件不存在: {file_path}")
         return False, "文件不存在", [], []
     except Exception as e:
-        logger.error(f"读取文件进行编码检测时出错: {e}", exc_info=True)
-        # 检测失败，我们将直接使用 fallback 列表
-        detected_encoding = None 
-
-    # --- 2. 确定尝试解码的顺序 --- 
-    encodings_to_try = []
-    # 如果 chardet 检测到结果且置信度较高 (例如 > 0.9)，优先尝试它
-    # 特别关注中文相关的编码
-    if detected_encoding and detected_confidence > 0.9:
-        # 标准化常见的中文编码名称
-        normalized_encoding = detected_encoding.lower()
-        if normalized_encoding in ['gb2312', 'gbk', 'gb18030']:
-           # 如果是GB系列，将GBK放在首位尝试（兼容性好），然后是检测到的，再是GB2312
-           encodings_to_try.extend(['gbk', normalized_encoding, 'gb2312'])
-        elif normalized_encoding == 'utf-8':
-            encodings_to_try.append('utf-8')
-        else:
-           # 对于其他高置信度的编码，也加入尝试列表
-            encodings_to_try.append(detected_encoding) 
-            
-    # 添加后备编码（确保不重复）
-    for enc in fallback_encodings:
-        if enc not in encodings_to_try:
-            encodings_to_try.append(enc)
-            
-    logger.info(f"最终尝试解码顺序: {encodings_to_try}")
+        logger.error(f"读取文件时出错: {e}", exc_info=True)
+        return False, f"读取文件时出错: {str(e)}", [], []
 
-    # --- 3. 依次尝试解码 --- 
-    for encoding in encodings_to_try:
-        try:
-            # 对非 UTF-8 编码使用 errors='replace' 策略
-            errors_policy = 'replace' if encoding != 'utf-8' else 'strict'
-            with codecs.open(file_path, 'r', encoding=encoding, errors=errors_policy) as file:
-                content = file.read()
-            
-            encoding_used = encoding
-            logger.info(f"成功使用 {encoding} 编码读取文件 (errors='{errors_policy}')")
-            
-            # 检查是否有替换字符 (表明原始数据可能有问题)
-            if errors_policy == 'replace' and '\ufffd' in content:
-                 logger.warning(f"文件在使用 {encoding} (errors='replace') 读取时检测到替换字符 ('\uFFFD')，原始文件可能包含无法解码的字节。")
-            
-            break # 成功读取，跳出循环
-            
-        except UnicodeDecodeError:
-            logger.warning(f"使用 {encoding} 编码 (errors='{errors_policy}') 打开文件时发生 UnicodeDecodeError，尝试下一种编码...")
-        except LookupError: # 处理 Python 不支持的编码名称
-            logger.warning(f"Python 不支持编码 '{encoding}'，跳过尝试...")
-        except Exception as e:
-            logger.error(f"尝试使用 {encoding} 编码 (errors='{errors_policy}') 读取时发生一般错误: {e}", exc_info=True)
-            # 对于其他读取错误，继续尝试下一种编码
-            
-    # --- 4. 处理解码结果 --- 
-    if content is None:
-        logger.error(f"无法使用尝试的所有编码 ({', '.join(encodings_to_try)}) 读取文件: {file_path}")
-        # 最终错误消息可以结合 chardet 的原始检测结果
-        error_msg = f"无法识别或解码文件编码。尝试列表: {encodings_to_try}。"
-        if detected_encoding:
-             error_msg += f" (Chardet 最初检测为: {detected_encoding}, 置信度: {detected_confidence:.2f})"
-        return False, error_msg, [], []
-
-    # --- 5. 如果成功读取文件内容，则继续执行后续逻辑 --- 
+    # 读取成功，继续执行后续逻辑
     try:
         # 打印前几行用于调试
         lines = content.split('\n')
@@ -173,84 +128,14 @@ def parse_text_file(file_path):
 
 
 def parse_battle_log(log_content):
-    """使用正则表达式解析战斗日志内容"""
+    """解析战斗日志内容，按 [战况]/[公告] 前缀分类后再做锚定匹配"""
     logger.info("开始解析日志内容")
-    
-    # 计算总行数
-    lines = log_content.strip().split('\n')
-    total_lines = len(lines)
+    total_lines = log_content.count('\n') + 1
     logger.info(f"日志共 {total_lines} 行")
     
-    # 定义正则表达式
-    # 击杀记录模式：[战况]玩家A 击杀 玩家B !坐标:X，Y (YYYYMMDD,HH:MM:SS)
-    kill_pattern = r'\[战况\](.*?) 击杀 (.*?) !坐标:(\d+)，(\d+)  \((\d{8},\d{2}:\d{2}:\d{2})\)'
-    
-    # 祝福记录模式：[公告] 玩家A 得到了 XX祝福 的祝福! (YYYYMMDD,HH:MM:SS)
-    blessing_pattern = r'\[公告\]  (.*?) 得到了 (.*?) 的祝福! \((\d{8},\d{2}:\d{2}:\d{2})\)'
-    
-    battle_details = []
-    blessings = []
-    
-    # 逐行处理，打印调试信息
-    for i, line in enumerate(lines):
-        if i % 1000 == 0 and i > 0:
-            logger.debug(f"已处理 {i}/{total_lines} 行")
-            
-        # 尝试匹配击杀记录
-        kill_match = re.search(kill_pattern, line)
-        if kill_match:
-            killer_name = kill_match.group(1).strip()
-            victim_name = kill_match.group(2).strip()
-            x_coord = int(kill_match.group(3))
-            y_coord = int(kill_match.group(4))
-            timestamp_str = kill_match.group(5)
-            
-            try:
-                # 解析时间戳 YYYYMMDD,HH:MM:SS
-                date_part, time_part = timestamp_str.split(',')
-                year = int(date_part[0:4])
-                month = int(date_part[4:6])
-                day = int(date_part[6:8])
-                
-                hour, minute, second = map(int, time_part.split(':'))
-                timestamp = datetime(year, month, day, hour, minute, second)
-                
-                battle_details.append({
-                    'killer_name': killer_name,
-                    'victim_name': victim_name,
-                    'x_coord': x_coord,
-                    'y_coord': y_coord,
-                    'timestamp': timestamp
-                })
-                continue
-            except (ValueError, IndexError) as e:
-                logger.error(f"解析时间戳时出错，行 {i+1}: {timestamp_str}，错误: {str(e)}")
-        
-        # 尝试匹配祝福记录
-        blessing_match = re.search(blessing_pattern, line)
-        if blessing_match:
-            player_name = blessing_match.group(1).strip()
-            blessing_name = blessing_match.group(2).strip()
-            timestamp_str = blessing_match.group(3)
-            
-            try:
-                # 解析时间戳 YYYYMMDD,HH:MM:SS
-                date_part, time_part = timestamp_str.split(',')
-                year = int(date_part[0:4])
-                month = int(date_part[4:6])
-                day = int(date_part[6:8])
-                
-                hour, minute, second = map(int, time_part.split(':'))
-                timestamp = datetime(year, month, day, hour, minute, second)
-                
-                blessings.append({
-                    'player_name': player_name,
-                    'blessing_name': blessing_name,
-                    'timestamp': timestamp
-                })
-                continue
-            except (ValueError, IndexError) as e:
-                logger.error(f"解析时间戳时出错，行 {i+1}: {timestamp_str}，错误: {str(e)}")
+    battle_details, blessings = split_battle_events(
+        iter_battle_events(iter_event_lines(log_content))
+    )
     
     # 记录解析结果
     logger.info(f"解析完成，共找到 {len(battle_details)} 条击杀记录和 {len(blessings)} 条祝福记录")
@@ -264,8 +149,144 @@ def parse_battle_log(log_content):
     return battle_details, blessings
 
 
-def save_battle_log_to_db(battle_details, blessings):
-    """将解析的战斗日志和祝福数据保存到数据库"""
+def parse_log_file(file_path):
+    """
+    读取并解析单个日志文件，不访问数据库，可在子进程中执行
+
+    同一目录下的日志视为同一来源，共用识别出的编码缓存。
+
+    Returns:
+        tuple: (file_path, encoding, total_lines, battle_details, blessings)
+    """
+    content, encoding = decode_log_file(file_path, source=os.path.dirname(os.path.abspath(file_path)))
+    battle_details, blessings = parse_battle_log(content)
+    return file_path, encoding, content.count('\n') + 1, battle_details, blessings
+
+
+def load_existing_players():
+    """
+    查询人员表，返回 {去除首尾空格的名称: id}
+
+    这是战斗记录名称解析为 person id 的唯一规则：日志中的名称已去除首尾空格，与去除首尾空格后的
+    人员名称精确匹配，多名人员（包括已删除的）匹配时取 id 最大的。入库、回填和改名后的重新解析都使用它。
+    """
+    existing_players = {}
+    persons = Person.query.order_by(Person.id).all()
+    logger.info(f"数据库中查询到 {len(persons)} 名玩家记录")
+    
+    for person in persons:
+        # Use stripped name from DB as key to ensure exact match with stripped name from log
+        cleaned_db_name = person.name.strip() if person.name else ''
+        if cleaned_db_name: # Avoid adding empty keys if name is null/empty after stripping
+            existing_players[cleaned_db_name] = person.id
+    return existing_players
+
+
+def collation_key(name):
+    """
+    名称在内存中比较时使用的键，近似 MySQL 默认排序规则下的相等比较：
+    忽略尾部空格、不区分大小写，避免库中判为相同的名称在集合中被当作不同的键
+    """
+    return name.rstrip().casefold() if name else name
+
+
+def battle_record_key(detail):
+    """击杀记录的自然键 (击杀者, 被击杀者, 坐标, 时间)，与 battle_record 的去重条件一致"""
+    return (
+        collation_key(detail['killer_name']),
+        collation_key(detail['victim_name']),
+        f"{detail['x_coord']},{detail['y_coord']}",
+        detail['timestamp']
+    )
+
+
+def load_existing_battle_keys(start_time, end_time):
+    """一次范围查询取回时间窗口内已有战斗记录的自然键集合"""
+    rows = db.session.query(
+        BattleRecord.win, BattleRecord.lost, BattleRecord.position, BattleRecord.publish_at
+    ).filter(
+        BattleRecord.publish_at >= start_time,
+        BattleRecord.publish_at <= end_time
+    )
+    return {
+        (collation_key(row.win), collation_key(row.lost), row.position, row.publish_at)
+        for row in rows
+    }
+
+
+def bulk_insert_battle_records(rows, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """
+    按块执行多行 INSERT 写入 battle_record
+
+    Returns:
+        int: 插入的记录数
+    """
+    table = BattleRecord.__table__
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+    return len(rows)
+
+
+def build_blessing_index(start_time, end_time, batch_keys):
+    """
+    为祝福匹配建立哈希索引
+
+    取回时间窗口内属于本批击杀的记录，按 id 顺序为每个 (击杀者, 时间) 保留第一条记录，
+    同一击杀者同一秒有多条击杀时只标记第一条。击杀者名称按 collation_key 规范化。
+
+    Returns:
+        tuple: ({(击杀者, 时间): 记录 id}, {(击杀者, 日期)})
+    """
+    rows = db.session.query(
+        BattleRecord.id, BattleRecord.win, BattleRecord.lost, BattleRecord.position, BattleRecord.publish_at
+    ).filter(
+        BattleRecord.publish_at >= start_time,
+        BattleRecord.publish_at <= end_time
+    ).order_by(BattleRecord.id)
+
+    blessing_index = {}
+    blessing_days = set()
+    for row in rows:
+        win = collation_key(row.win)
+        if (win, collation_key(row.lost), row.position, row.publish_at) not in batch_keys:
+            continue
+        blessing_index.setdefault((win, row.publish_at), row.id)
+        blessing_days.add((win, row.publish_at.date()))
+    return blessing_index, blessing_days
+
+
+def load_unblessed_records(record_ids, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """取回尚未标记祝福的记录 (id, win_person_id, publish_at)，用于计算汇总表的祝福增量"""
+    record_ids = sorted(record_ids)
+    records = []
+    for start in range(0, len(record_ids), chunk_size):
+        records.extend(db.session.query(
+            BattleRecord.id, BattleRecord.win_person_id, BattleRecord.publish_at
+        ).filter(
+            BattleRecord.id.in_(record_ids[start:start + chunk_size]),
+            db.or_(BattleRecord.remark.is_(None), BattleRecord.remark != 1)
+        ))
+    return records
+
+
+def mark_blessed_records(record_ids):
+    """一条 UPDATE 把记录的祝福标记设置为 1"""
+    table = BattleRecord.__table__
+    db.session.execute(
+        table.update().where(table.c.id.in_(list(record_ids))).values(remark=1)
+    )
+
+
+def save_battle_log_to_db(battle_details, blessings, existing_players=None, stats=None):
+    """
+    将解析的战斗日志和祝福数据保存到数据库
+    
+    Args:
+        battle_details: 击杀记录列表
+        blessings: 祝福记录列表
+        existing_players: 可选，预先加载的 {玩家名称: id}，分批调用时避免重复查询
+        stats: 可选的统计字典，会累加 inserted / skipped / blessings_updated
+    """
     logger.info(f"开始保存战斗日志到数据库: {len(battle_details)}条击杀记录, {len(blessings)}条祝福记录")
     
     try:
@@ -281,19 +302,10 @@ def save_battle_log_to_db(battle_details, blessings):
         
         logger.info(f"战斗日志中共涉及 {len(all_player_names)} 名玩家")
         
-        # 查询现有玩家信息
-        existing_players = {}
         # 查询现在已经存在的人员信息
         try:
-            persons = Person.query.all()
-            logger.info(f"数据库中查询到 {len(persons)} 名玩家记录")
-            
-            for person in persons:
-                # existing_players[person.name] = person.id # Original line
-                # Use stripped name from DB as key to ensure exact match with stripped name from log
-                cleaned_db_name = person.name.strip() if person.name else ''
-                if cleaned_db_name: # Avoid adding empty keys if name is null/empty after stripping
-                    existing_players[cleaned_db_name] = person.id
+            if existing_players is None:
+                existing_players = load_existing_players()
             
             # 检查有多少玩家在数据库中能找到
             found_players = set(existing_players.keys()).intersection(all_player_names)
@@ -309,206 +321,122 @@ def save_battle_log_to_db(battle_details, blessings):
             return False, f"查询玩家信息时出错: {str(e)}"
         
         try:
-            # 开始逐条处理数据
-            logger.debug(f"开始处理 {len(battle_details)} 条击杀记录")
+            logger.debug(f"开始批量处理 {len(battle_details)} 条击杀记录")
             
             battle_success_count = 0
             blessing_success_count = 0 # Initialize blessing counter
-            battle_error_count = 0
-            battle_missing_player_count = 0
             battle_skip_count = 0
             
-            # 首先处理所有战斗记录
-            battle_records_for_blessing = {}  # 创建一个字典保存战斗记录，以便祝福处理时查找
-            
-            # 收集所有时间戳，用于检查记录是否已存在
-            timestamps = {detail['timestamp'] for detail in battle_details}
+            # 祝福匹配用的索引：(击杀者, 时间) -> 记录 id，以及有战斗记录的 (击杀者, 日期)
+            blessing_index = {}
+            blessing_days = set()
             
-            # 逐条处理击杀记录
-            for idx, detail in enumerate(battle_details):
-                killer_name_from_log = detail['killer_name']
-                victim_name_from_log = detail['victim_name']
+            if battle_details:
+                # 一次范围查询取回本批时间窗口内已有记录的自然键，替代逐条 exists 查询
+                batch_start = min(detail['timestamp'] for detail in battle_details)
+                batch_end = max(detail['timestamp'] for detail in battle_details)
+                existing_keys = load_existing_battle_keys(batch_start, batch_end)
                 
-                killer_id = existing_players.get(killer_name_from_log)
-                victim_id = existing_players.get(victim_name_from_log)
-                
-                # 只有当击杀者和受害者都在数据库中存在时才记录战斗详情
-                #if killer_id and victim_id:
-                try:
-                    # 检查是否已存在相同的战斗记录
-                    exists = BattleRecord.query.filter_by(
-                        win=detail['killer_name'],
-                        lost=detail['victim_name'],
-                        position=f"{detail['x_coord']},{detail['y_coord']}",
-                        publish_at=detail['timestamp']
-                    ).first()
-                    
-                    if not exists:
-                        # 创建战斗记录 - 只在记录不存在时创建
-                        battle_record = BattleRecord(
-                            win=detail['killer_name'],  # 胜利者(击杀者)名称
-                            lost=detail['victim_name'],  # 失败者(被击杀者)名称
-                            position=f"{detail['x_coord']},{detail['y_coord']}",
-                            remark=0,  # 祝福数初始为0，后续处理祝福时更新
-                            publish_at=detail['timestamp'],
-                        )
-                        db.session.add(battle_record)
-                        
-                        # 保存到字典中以便后续查找
-                        date_str = detail['timestamp'].date().strftime('%Y-%m-%d')
-                        key = (detail['killer_name'], date_str)
-                        if key not in battle_records_for_blessing:
-                            battle_records_for_blessing[key] = []
-                        battle_records_for_blessing[key].append(battle_record)
-                        
-                        # 每100条提交一次
-                        if (idx + 1) % 100 == 0 or idx == len(battle_details) - 1:
-                            db.session.commit()
-                            logger.debug(f"已处理 {idx+1}/{len(battle_details)} 条战斗记录")
-                        
-                        battle_success_count += 1
-                        
-                    else:
-                        # 记录已存在，也保存到字典中以便更新祝福
-                        date_str = detail['timestamp'].date().strftime('%Y-%m-%d')
-                        key = (detail['killer_name'], date_str)
-                        if key not in battle_records_for_blessing:
-                            battle_records_for_blessing[key] = []
-                        battle_records_for_blessing[key].append(exists)
-                        
+                batch_keys = set()
+                new_rows = []
+                for detail in battle_details:
+                    key = battle_record_key(detail)
+                    batch_keys.add(key)
+                    # 库中已有或本批前面已出现的记录都视为重复
+                    if key in existing_keys:
                         battle_skip_count += 1
                         if battle_skip_count <= 10:
                             logger.debug(f"跳过已存在的重复战斗记录: Win='{detail['killer_name']}', Lost='{detail['victim_name']}', Time='{detail['timestamp']}'")
                         continue
-                    
+                    existing_keys.add(key)
+                    new_rows.append({
+                        'win': detail['killer_name'],  # 胜利者(击杀者)名称
+                        'lost': detail['victim_name'],  # 失败者(被击杀者)名称
+                        'win_person_id': existing_players.get(detail['killer_name']),
+                        'lost_person_id': existing_players.get(detail['victim_name']),
+                        'position': key[2],
+                        'x_coord': detail['x_coord'],
+                        'y_coord': detail['y_coord'],
+                        'remark': 0,  # 祝福数初始为0，后续处理祝福时更新
+                        'publish_at': detail['timestamp'],
+                    })
+                
+                # 多行 INSERT 批量写入新记录，每日汇总、击杀对、热力图和时间线汇总在同一事务中累加
+                try:
+                    battle_success_count = bulk_insert_battle_records(new_rows)
+                    apply_daily_stats_deltas(add_kill_deltas({}, new_rows))
+                    apply_kill_pair_deltas(add_kill_pair_deltas({}, new_rows))
+                    apply_heatmap_deltas(add_heatmap_deltas({}, new_rows))
+                    apply_timeline_deltas(add_timeline_deltas({}, new_rows))
+                    db.session.commit()
+                    logger.info(f"战斗记录处理完成：成功插入 {battle_success_count} 条新记录，跳过 {battle_skip_count} 条重复记录。")
                 except Exception as e:
-                    battle_error_count += 1
-                    logger.error(f"处理战斗记录时出错: {str(e)}, 详情: {detail}", exc_info=True)
                     db.session.rollback()
+                    logger.error(f"提交战斗记录时出错: {str(e)}", exc_info=True)
+                    return False, f"提交战斗记录时出错: {str(e)}"
+                
+                # 祝福需要更新记录的 remark，按本批涉及的记录一次性取回 id
+                if blessings:
+                    blessing_index, blessing_days = build_blessing_index(batch_start, batch_end, batch_keys)
             
-            # 中间提交一次
-            try:
-                db.session.commit()
-                logger.info(f"战斗记录处理完成：成功插入 {battle_success_count} 条新记录，跳过 {battle_skip_count} 条重复记录。")
-            except Exception as e:
-                db.session.rollback()
-                logger.error(f"提交战斗记录时出错: {str(e)}", exc_info=True)
-                return False, f"提交战斗记录时出错: {str(e)}"
-            
-            # 处理祝福记录
+            # 处理祝福记录：按 (玩家, 时间) 精确查找，收集 id 后一次性 UPDATE
             logger.info(f"开始处理 {len(blessings)} 条祝福记录")
             blessing_success_count = 0
-            blessing_error_count = 0
+            blessing_unmatched_count = 0
             blessing_missing_player_count = 0
+            blessed_record_ids = set()
             
-            for idx, blessing in enumerate(blessings):
+            for blessing in blessings:
                 player_name = blessing['player_name']
-                blessing_date = blessing['timestamp'].date()
-                
-                # 将日期对象格式化为字符串作为键
-                date_str = blessing_date.strftime('%Y-%m-%d')
-                
-                # 查找该玩家当天的战斗记录
-                key = (player_name, date_str)
-                if key in battle_records_for_blessing and battle_records_for_blessing[key]:
-                    # 遍历当天该玩家的所有战斗记录，找到时间戳匹配的记录
-                    found_matching_record = False
-                    for battle_record in battle_records_for_blessing[key]:
-                        # 检查时间戳是否匹配
-                        if battle_record.publish_at == blessing['timestamp']:
-                            try:
-                                # 更新祝福标记 - 设置为1
-                                battle_record.remark = 1
-                                blessing_success_count += 1
-                                if blessing_success_count <= 10:
-                                    logger.debug(f"更新战斗记录祝福标记: 玩家='{player_name}', 祝福='{blessing['blessing_name']}', 时间='{blessing['timestamp']}', 祝福值设置为1")
-                                found_matching_record = True
-                                break  # 找到匹配记录后跳出循环
-                            except Exception as e:
-                                blessing_error_count += 1
-                                logger.error(f"更新祝福记录时出错: {str(e)}, 详情: {blessing}", exc_info=True)
-                    
-                    # 如果没有找到时间戳完全匹配的记录，记录警告信息
-                    if not found_matching_record:
+                player_key = collation_key(player_name)
+                record_id = blessing_index.get((player_key, blessing['timestamp']))
+                if record_id is not None:
+                    blessed_record_ids.add(record_id)
+                    blessing_success_count += 1
+                    if blessing_success_count <= 10:
+                        logger.debug(f"更新战斗记录祝福标记: 玩家='{player_name}', 祝福='{blessing['blessing_name']}', 时间='{blessing['timestamp']}', 祝福值设置为1")
+                elif (player_key, blessing['timestamp'].date()) in blessing_days:
+                    # 当天有战斗记录但没有时间戳完全匹配的记录
+                    blessing_unmatched_count += 1
+                    if blessing_unmatched_count <= 10:
                         logger.warning(f"玩家 {player_name} 的祝福记录 (时间: {blessing['timestamp']}) 没有找到完全匹配的战斗记录")
                 else:
                     # 没有找到当天的战斗记录
                     blessing_missing_player_count += 1
                     if blessing_missing_player_count <= 5:
-                        logger.warning(f"玩家 {player_name} 的祝福记录没有找到匹配的战斗记录，日期: {date_str}")
-                
-                # 每50条提交一次
-                if (idx + 1) % 50 == 0 or idx == len(blessings) - 1:
-                    try:
-                        db.session.commit()
-                        logger.debug(f"已处理 {idx+1}/{len(blessings)} 条祝福记录")
-                    except Exception as e:
-                        db.session.rollback()
-                        logger.error(f"提交祝福记录更新时出错: {str(e)}", exc_info=True)
+                        logger.warning(f"玩家 {player_name} 的祝福记录没有找到匹配的战斗记录，日期: {blessing['timestamp'].date()}")
             
-            # Final commit after processing all records
             try:
+                if blessed_record_ids:
+                    # 已标记过的记录不再重复计入汇总表
+                    unblessed_records = load_unblessed_records(blessed_record_ids)
+                    if unblessed_records:
+                        mark_blessed_records(record.id for record in unblessed_records)
+                        blessed = [(record.win_person_id, record.publish_at) for record in unblessed_records]
+                        apply_daily_stats_deltas(add_blessing_deltas({}, blessed))
+                        apply_timeline_deltas(add_timeline_blessing_deltas({}, blessed))
                 db.session.commit()
-                logger.info(f"祝福记录处理完成：成功更新 {blessing_success_count} 条记录，找不到匹配的战斗记录 {blessing_missing_player_count} 条。")
+                logger.info(f"祝福记录处理完成：成功更新 {blessing_success_count} 条记录，当天有战斗但时间不匹配 {blessing_unmatched_count} 条，找不到匹配的战斗记录 {blessing_missing_player_count} 条。")
             except Exception as e:
                 db.session.rollback()
                 logger.error(f"提交祝福记录时出错: {str(e)}", exc_info=True)
                 return False, f"提交祝福记录时出错: {str(e)}"
             
-            # 生成战绩报告SQL (remains the same)
-            battle_report_sql = """
-            WITH player_stats AS (
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.job,
-                    p.god,
-                    -- 统计击杀次数(通过win字段关联)
-                    COUNT(DISTINCT CASE WHEN br.win = p.name THEN br.id END) as kills,
-                    -- 统计死亡次数(通过lost字段关联)
-                    COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
-                    -- 统计祝福次数(只有win的玩家才会有祝福)
-                    SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
-                    -- 获取最后战斗位置和时间
-                    MAX(br.position) as last_position,
-                    MAX(br.publish_at) as last_battle_time
-                FROM 
-                    person p
-                LEFT JOIN 
-                    battle_record br ON br.win = p.name OR br.lost = p.name
-                WHERE 1=1
-                GROUP BY 
-                    p.id, p.name, p.job, p.god
-            )
-            SELECT 
-                id as player_id,
-                name as player_name,
-                job as player_job,
-                god as player_god,
-                kills,
-                deaths,
-                blessings,
-                CASE WHEN deaths > 0 
-                     THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
-                     ELSE kills END as kd_ratio,
-                (kills * 3 + blessings - deaths) as score,
-                last_position,
-                last_battle_time
-            FROM 
-                player_stats
-            ORDER BY 
-                score DESC, kills DESC, deaths ASC;
-            """
-            
-            logger.info("生成战绩报告SQL:")
-            logger.info(battle_report_sql)
-            
             # 计算总体处理时间
             end_time = datetime.now()
             process_time = (end_time - start_time).total_seconds()
             
             logger.info(f"战斗日志保存完成，总处理时间: {process_time:.2f} 秒")
             
+            if battle_success_count or blessed_record_ids:
+                # 批量写入不经过 ORM，需要手动使统计结果缓存失效
+                bump_data_generation('战斗日志入库')
+            
+            if stats is not None:
+                stats['inserted'] = stats.get('inserted', 0) + battle_success_count
+                stats['skipped'] = stats.get('skipped', 0) + battle_skip_count
+                stats['blessings_updated'] = stats.get('blessings_updated', 0) + blessing_success_count
+            
             # 返回处理结果
             return True, f"处理完成：{battle_success_count} 条战斗记录，{blessing_success_count} 条祝福记录成功更新。"
             
@@ -520,4 +448,105 @@ def save_battle_log_to_db(battle_details, blessings):
         
     except Exception as e:
         logger.error(f"保存战斗日志到数据库时发生错误: {str(e)}", exc_info=True)
-        return False, f"保存战斗日志时出错: {str(e)}" 
\ No newline at end of file
+        return False, f"保存战斗日志时出错: {str(e)}" 
+
+
+def _read_head(stream, size):
+    """从流中读取至多 size 字节（可能需要多次 read）"""
+    head = b''
+    while len(head) < size:
+        chunk = stream.read(size - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def _iter_stream_chunks(stream, head, chunk_size=STREAM_CHUNK_SIZE, copy_to=None):
+    """依次产出已读取的开头部分和流中剩余的字节块，可选地同时写入 copy_to 文件"""
+    copy_file = open(copy_to, 'wb') if copy_to else None
+    try:
+        chunk = head
+        while chunk:
+            if copy_file:
+                copy_file.write(chunk)
+            yield chunk
+            chunk = stream.read(chunk_size)
+    finally:
+        if copy_file:
+            copy_file.close()
+
+
+def ingest_battle_log_stream(stream, copy_to=None, batch_size=STREAM_BATCH_SIZE, encoding=None, progress_callback=None, source=None):
+    """
+    流式解析战斗日志并分批写入数据库
+    
+    字节流 -> 增量解码 -> 行生成器 -> 行分类 -> 分批写库，内存中只保留当前字节块和
+    当前批次，第一批记录在文件读完之前就会提交。
+    
+    Args:
+        stream: 可读的二进制流（如上传文件的 file.stream）
+        copy_to: 可选，读取的同时把原始字节保存到该路径
+        batch_size: 每批写库的事件数
+        encoding: 可选，已知的编码；为空时根据流开头的字节检测
+        progress_callback: 可选，每批写库后以统计字典调用，用于上报进度
+        source: 可选，上传来源，用于缓存识别出的编码
+    
+    Returns:
+        tuple: (success, message, stats)
+    """
+    stats = {
+        'lines': 0,
+        'bytes': 0,
+        'kills': 0,
+        'blessings': 0,
+        'inserted': 0,
+        'skipped': 0,
+        'blessings_updated': 0
+    }
+    start_time = datetime.now()
+    
+    head = _read_head(stream, ENCODING_SAMPLE_SIZE)
+    if not head:
+        logger.warning("上传的文件为空")
+        return False, "文件为空", stats
+    
+    if encoding is None:
+        encoding = resolve_encoding(head, source=source)
+    logger.info(f"开始流式解析，使用 {encoding} 编码，每批 {batch_size} 条事件")
+    
+    try:
+        existing_players = load_existing_players()
+    except Exception as e:
+        logger.error(f"查询玩家信息时出错: {str(e)}", exc_info=True)
+        return False, f"查询玩家信息时出错: {str(e)}", stats
+    
+    chunks = _iter_stream_chunks(stream, head, copy_to=copy_to)
+    try:
+        lines = iter_decoded_lines(chunks, encoding, errors='replace', stats=stats)
+        for batch_index, (battle_details, blessings) in enumerate(iter_event_batches(iter_battle_events(lines), batch_size), start=1):
+            stats['kills'] += len(battle_details)
+            stats['blessings'] += len(blessings)
+            save_success, save_message = save_battle_log_to_db(
+                battle_details, blessings, existing_players=existing_players, stats=stats
+            )
+            if not save_success:
+                return False, save_message, stats
+            logger.info(f"第 {batch_index} 批写入完成，已读取 {stats['lines']} 行，累计插入 {stats['inserted']} 条")
+            if progress_callback:
+                progress_callback(stats)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"流式解析战斗日志时出错: {str(e)}", exc_info=True)
+        return False, f"处理文件内容时出错: {str(e)}", stats
+    finally:
+        chunks.close()
+    
+    process_time = (datetime.now() - start_time).total_seconds()
+    logger.info(f"流式解析完成: {stats}，总处理时间: {process_time:.2f} 秒")
+    
+    message = (
+        f"成功解析 {stats['kills']} 条击杀记录和 {stats['blessings']} 条祝福记录 (使用 {encoding} 编码)，"
+        f"处理完成：{stats['inserted']} 条战斗记录，{stats['blessings_updated']} 条祝福记录成功更新。"
+    )
+    return True, message, stats
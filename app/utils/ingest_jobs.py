@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗日志后台解析任务
+
+上传接口保存文件并在 ingest_job 表中创建任务后立即返回任务 id，解析由进程内的
+线程池执行，每批写库后把进度写回任务表。任务表是唯一的共享状态：任务通过
+条件 UPDATE 认领，多个 gunicorn worker 同时恢复排队任务时也只会执行一次。
+
+执行中的任务每批写库后更新 updated_at 作为心跳。进程在解析途中退出时任务会停留在
+running 状态：超过配置项 INGEST_JOB_HEARTBEAT_TIMEOUT 秒没有心跳的任务视为已中断，不再阻止
+相同文件重新上传，应用启动时重新排队执行（已入库的记录按重复跳过）。
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+from app.models.job import IngestJob
+from app.utils.upload_registry import (
+    prepare_upload,
+    duplicate_upload_message,
+    ingest_stored_upload
+)
+from app.services.rank_snapshot import refresh_rank_snapshots
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers):
+    """延迟创建进程内共享的线程池，线程数取首次创建时的配置"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        return _executor
+
+
+def _update_job(job_id, **values):
+    """更新任务记录并提交"""
+    return _update_job_where(job_id, None, **values)
+
+
+def _update_job_where(job_id, condition, **values):
+    """满足 condition 时更新任务记录并提交，返回更新的行数"""
+    values['updated_at'] = datetime.now()
+    statement = IngestJob.__table__.update().where(IngestJob.id == job_id)
+    if condition is not None:
+        statement = statement.where(condition)
+    result = db.session.execute(statement.values(**values))
+    db.session.commit()
+    return result.rowcount
+
+
+def _stale_running_condition():
+    """心跳超时的执行中任务"""
+    cutoff = datetime.now() - timedelta(seconds=current_app.config['INGEST_JOB_HEARTBEAT_TIMEOUT'])
+    return db.and_(
+        IngestJob.status == IngestJob.STATUS_RUNNING,
+        db.or_(IngestJob.updated_at.is_(None), IngestJob.updated_at < cutoff)
+    )
+
+
+def _progress_values(stats):
+    """把解析统计转换为任务表的列"""
+    return {
+        'lines': stats['lines'],
+        'kills': stats['kills'],
+        'blessings': stats['blessings'],
+        'inserted': stats['inserted'],
+        'skipped': stats['skipped'],
+        'blessings_updated': stats['blessings_updated']
+    }
+
+
+def enqueue_upload(stream, filename, upload_folder=None, source=None):
+    """
+    保存上传文件并创建后台解析任务
+
+    相同内容已入库时创建一条 duplicate 状态的任务直接返回；相同内容的任务正在
+    排队或执行时返回该任务，不重复创建（心跳超时的执行中任务除外）。
+
+    Args:
+        stream: 可读的二进制流（如上传文件的 file.stream）
+        filename: 上传时的文件名
+        upload_folder: 可选，上传目录，默认 Config.UPLOAD_FOLDER
+        source: 可选，上传来源（上传用户等），用于缓存识别出的编码
+
+    Returns:
+        tuple: (job, message)；文件为空时 job 为 None
+    """
+    plan = prepare_upload(stream, filename, upload_folder, source)
+    fingerprint = plan['fingerprint']
+
+    if fingerprint['file_size'] == 0:
+        logger.warning("上传的文件为空")
+        return None, "文件为空"
+
+    now = datetime.now()
+    if plan['existing']:
+        message = duplicate_upload_message(plan['existing'])
+        job = IngestJob(
+            status=IngestJob.STATUS_DUPLICATE,
+            original_filename=filename,
+            content_hash=fingerprint['content_hash'],
+            storage_path=fingerprint['storage_path'],
+            file_size=fingerprint['file_size'],
+            message=message,
+            started_at=now,
+            finished_at=now
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job, message
+
+    active = IngestJob.query.filter(
+        IngestJob.content_hash == fingerprint['content_hash'],
+        IngestJob.status.in_([IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING]),
+        db.not_(_stale_running_condition())
+    ).first()
+    if active:
+        logger.info(f"相同文件的解析任务 #{active.id} 正在进行，不重复创建")
+        return active, f"相同文件的解析任务 #{active.id} 正在进行中"
+
+    job = IngestJob(
+        status=IngestJob.STATUS_PENDING,
+        original_filename=filename,
+        content_hash=fingerprint['content_hash'],
+        storage_path=fingerprint['storage_path'],
+        file_size=fingerprint['file_size'],
+        chunk_hashes=json.dumps(fingerprint['chunk_hashes']),
+        encoding=plan['encoding'],
+        resumed_from=plan['resume_offset']
+    )
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"已创建解析任务 #{job.id}: {filename}")
+
+    submit_job(current_app._get_current_object(), job.id)
+    return job, f"文件已上传，后台解析任务 #{job.id} 已提交"
+
+
+def submit_job(app, job_id):
+    """把任务提交到线程池"""
+    _get_executor(app.config['INGEST_WORKERS']).submit(run_ingest_job, app, job_id)
+
+
+def claim_job(job_id):
+    """把排队中的任务标记为执行中，条件 UPDATE 保证只有一个执行者能认领成功"""
+    now = datetime.now()
+    result = db.session.execute(
+        IngestJob.__table__.update()
+        .where(IngestJob.id == job_id)
+        .where(IngestJob.status == IngestJob.STATUS_PENDING)
+        .values(status=IngestJob.STATUS_RUNNING, started_at=now, updated_at=now)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_ingest_job(app, job_id):
+    """在后台线程中执行解析任务"""
+    with app.app_context():
+        try:
+            claimed = claim_job(job_id)
+            if not claimed:
+                logger.info(f"解析任务 #{job_id} 已被其他执行者认领，跳过")
+                return
+
+            job = IngestJob.query.get(job_id)
+            logger.info(f"开始执行解析任务 #{job_id}: {job.original_filename}")
+            fingerprint = {
+                'content_hash': job.content_hash,
+                'chunk_hashes': json.loads(job.chunk_hashes) if job.chunk_hashes else [],
+                'file_size': job.file_size,
+                'storage_path': job.storage_path
+            }
+
+            def report_progress(stats):
+                _update_job(job_id, **_progress_values(stats))
+
+            success, message, stats = ingest_stored_upload(
+                fingerprint, job.original_filename, job.encoding, job.resumed_from,
+                progress_callback=report_progress
+            )
+            _update_job(
+                job_id,
+                status=IngestJob.STATUS_SUCCESS if success else IngestJob.STATUS_FAILED,
+                message=message[:500],
+                finished_at=datetime.now(),
+                **_progress_values(stats)
+            )
+            logger.info(f"解析任务 #{job_id} 结束: {message}")
+            if success:
+                try:
+                    refresh_rank_snapshots()
+                except Exception:
+                    db.session.rollback()
+                    logger.warning(f"解析任务 #{job_id} 完成后重建排名快照失败", exc_info=True)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"执行解析任务 #{job_id} 时出错: {str(e)}", exc_info=True)
+            try:
+                _update_job(
+                    job_id,
+                    status=IngestJob.STATUS_FAILED,
+                    message=f"解析任务出错: {str(e)}"[:500],
+                    finished_at=datetime.now()
+                )
+            except Exception:
+                db.session.rollback()
+                logger.error(f"更新解析任务 #{job_id} 状态失败", exc_info=True)
+
+
+def requeue_stale_jobs():
+    """
+    处理心跳超时的执行中任务，返回重新排队的任务数
+
+    重新标记为排队中；相同文件已经重新上传并有了新的任务时标记为失败，避免重复解析。
+    """
+    requeued = 0
+    for job in IngestJob.query.filter(_stale_running_condition()).order_by(IngestJob.id).all():
+        replaced = IngestJob.query.filter(
+            IngestJob.id != job.id,
+            IngestJob.content_hash == job.content_hash,
+            IngestJob.status.in_([IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING]),
+            db.not_(_stale_running_condition())
+        ).first()
+        if replaced:
+            values = {'status': IngestJob.STATUS_FAILED, 'finished_at': datetime.now(),
+                      'message': f'执行中断（心跳超时），相同文件由任务 #{replaced.id} 处理'}
+        else:
+            values = {'status': IngestJob.STATUS_PENDING, 'message': '执行中断（心跳超时），已重新排队'}
+        # 条件 UPDATE：其他 worker 已处理过的任务不再修改
+        updated = _update_job_where(job.id, _stale_running_condition(), **values)
+        if updated and not replaced:
+            requeued += 1
+        if updated:
+            logger.warning(f"解析任务 #{job.id} 心跳超时: {values['message']}")
+    return requeued
+
+
+def resume_pending_jobs(app):
+    """应用启动时重新提交排队中的任务（上次进程退出前未执行或执行中断的任务）"""
+    with app.app_context():
+        requeue_stale_jobs()
+        job_ids = [row.id for row in db.session.query(IngestJob.id).filter_by(status=IngestJob.STATUS_PENDING)]
+    for job_id in job_ids:
+        submit_job(app, job_id)
+    if job_ids:
+        logger.info(f"重新提交 {len(job_ids)} 个排队中的解析任务")
+    return len(job_ids)
+
+
+def get_job(job_id):
+    """按 id 查询任务"""
+    return IngestJob.query.get(job_id)
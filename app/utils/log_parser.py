@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗日志解析引擎
+
+按固定前缀 [战况] / [公告] 对行进行分类，只有包含前缀的行才会进入
+预编译的正则匹配，其余行直接跳过。
+"""
+
+import re
+import codecs
+from datetime import datetime, timedelta
+from functools import lru_cache
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 行前缀
+KILL_TAG = '[战况]'
+BLESSING_TAG = '[公告]'
+
+# 击杀记录模式：[战况]玩家A 击杀 玩家B !坐标:X，Y  (YYYYMMDD,HH:MM:SS)
+KILL_PATTERN = re.compile(r'\[战况\](.*?) 击杀 (.*?) !坐标:(\d+)，(\d+)  \((\d{8},\d{2}:\d{2}:\d{2})\)')
+
+# 祝福记录模式：[公告]  玩家A 得到了 XX祝福 的祝福! (YYYYMMDD,HH:MM:SS)
+BLESSING_PATTERN = re.compile(r'\[公告\]  (.*?) 得到了 (.*?) 的祝福! \((\d{8},\d{2}:\d{2}:\d{2})\)')
+
+EVENT_KILL = 'kill'
+EVENT_BLESSING = 'blessing'
+
+# 时间戳解析缓存：最近的不同秒数、不同日期
+TIMESTAMP_CACHE_SIZE = 4096
+DAY_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def _decode_day(date_str):
+    """解析 YYYYMMDD，返回当天 0 点"""
+    return datetime(int(date_str[0:4]), int(date_str[4:6]), int(date_str[6:8]))
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def decode_timestamp(timestamp_str):
+    """
+    解析 YYYYMMDD,HH:MM:SS 格式的时间戳
+
+    战斗中同一秒会出现几十条事件，按字符串缓存最近的结果；未命中时用缓存的
+    当天 0 点加上秒数偏移构造。非法的日期或时间与直接构造 datetime 一样抛出 ValueError。
+    """
+    hour = int(timestamp_str[9:11])
+    minute = int(timestamp_str[12:14])
+    second = int(timestamp_str[15:17])
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"时间超出范围: {timestamp_str}")
+    return _decode_day(timestamp_str[0:8]) + timedelta(seconds=hour * 3600 + minute * 60 + second)
+
+
+def _match_from_tag(pattern, tag, line, pos):
+    """从前缀出现的位置开始做锚定匹配，等价于在整行上 search"""
+    while pos != -1:
+        match = pattern.match(line, pos)
+        if match:
+            return match
+        pos = line.find(tag, pos + 1)
+    return None
+
+
+def classify_line(line):
+    """
+    对单行日志进行分类
+
+    Returns:
+        tuple: (EVENT_KILL, 击杀记录) 或 (EVENT_BLESSING, 祝福记录)；非事件行返回 None
+    """
+    pos = line.find(KILL_TAG)
+    if pos != -1:
+        match = _match_from_tag(KILL_PATTERN, KILL_TAG, line, pos)
+        if match:
+            killer_name, victim_name, x_coord, y_coord, timestamp_str = match.groups()
+            try:
+                timestamp = decode_timestamp(timestamp_str)
+            except ValueError as e:
+                logger.error(f"解析时间戳时出错: {timestamp_str}，错误: {str(e)}")
+            else:
+                return EVENT_KILL, {
+                    'killer_name': killer_name.strip(),
+                    'victim_name': victim_name.strip(),
+                    'x_coord': int(x_coord),
+                    'y_coord': int(y_coord),
+                    'timestamp': timestamp
+                }
+
+    pos = line.find(BLESSING_TAG)
+    if pos != -1:
+        match = _match_from_tag(BLESSING_PATTERN, BLESSING_TAG, line, pos)
+        if match:
+            player_name, blessing_name, timestamp_str = match.groups()
+            try:
+                timestamp = decode_timestamp(timestamp_str)
+            except ValueError as e:
+                logger.error(f"解析时间戳时出错: {timestamp_str}，错误: {str(e)}")
+            else:
+                return EVENT_BLESSING, {
+                    'player_name': player_name.strip(),
+                    'blessing_name': blessing_name.strip(),
+                    'timestamp': timestamp
+                }
+
+    return None
+
+
+def iter_event_lines(content):
+    """
+    在整段文本中定位包含事件前缀的行
+
+    直接用 str.find 跳到下一个前缀，不把整个文件切分成行列表。
+    """
+    find = content.find
+    length = len(content)
+    next_kill = find(KILL_TAG)
+    next_blessing = find(BLESSING_TAG)
+
+    while next_kill != -1 or next_blessing != -1:
+        if next_blessing == -1 or (next_kill != -1 and next_kill < next_blessing):
+            pos = next_kill
+        else:
+            pos = next_blessing
+
+        start = content.rfind('\n', 0, pos) + 1
+        end = find('\n', pos)
+        if end == -1:
+            end = length
+        yield content[start:end]
+
+        if next_kill != -1 and next_kill < end:
+            next_kill = find(KILL_TAG, end)
+        if next_blessing != -1 and next_blessing < end:
+            next_blessing = find(BLESSING_TAG, end)
+
+
+def iter_decoded_lines(chunks, encoding, errors='strict', stats=None):
+    """
+    把字节块流增量解码为行
+
+    只在内存中保留当前块和一行未结束的尾部，行按 '\\n' 切分（与整段 split('\\n') 一致）。
+
+    Args:
+        chunks: 可迭代的 bytes 块
+        encoding: 解码使用的编码
+        errors: 解码错误处理策略
+        stats: 可选的统计字典，会累加 'lines' 和 'bytes'
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    pending = ''
+    for chunk in chunks:
+        if stats is not None:
+            stats['bytes'] = stats.get('bytes', 0) + len(chunk)
+        text = pending + decoder.decode(chunk)
+        lines = text.split('\n')
+        pending = lines.pop()
+        if stats is not None:
+            stats['lines'] = stats.get('lines', 0) + len(lines)
+        yield from lines
+
+    pending += decoder.decode(b'', final=True)
+    if stats is not None:
+        stats['lines'] = stats.get('lines', 0) + 1
+    yield pending
+
+
+def iter_battle_events(lines):
+    """逐行分类，依次产出 (事件类型, 记录)"""
+    for line in lines:
+        event = classify_line(line)
+        if event is not None:
+            yield event
+
+
+def split_battle_events(events):
+    """把事件流拆分为击杀列表和祝福列表"""
+    battle_details = []
+    blessings = []
+    for kind, record in events:
+        if kind == EVENT_KILL:
+            battle_details.append(record)
+        else:
+            blessings.append(record)
+    return battle_details, blessings
+
+
+def iter_event_batches(events, batch_size):
+    """
+    把事件流切分为 (击杀列表, 祝福列表) 批次
+
+    批次达到 batch_size 后，只在时间戳变化时切分，保证同一秒内的击杀和
+    祝福落在同一批中，祝福总能与对应的击杀记录匹配。
+    """
+    battle_details = []
+    blessings = []
+    last_timestamp = None
+    for kind, record in events:
+        timestamp = record['timestamp']
+        if (len(battle_details) + len(blessings) >= batch_size
+                and timestamp != last_timestamp):
+            yield battle_details, blessings
+            battle_details = []
+            blessings = []
+        if kind == EVENT_KILL:
+            battle_details.append(record)
+        else:
+            blessings.append(record)
+        last_timestamp = timestamp
+
+    if battle_details or blessings:
+        yield battle_details, blessings
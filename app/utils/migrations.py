@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库结构迁移
+
+迁移脚本位于 db/migrations，文件名以四位版本号开头（如 0002_covering_indexes.py），
+模块文档字符串的第一行是迁移说明，upgrade() 执行迁移，downgrade() 可选，用于回退。
+已执行的版本记录在 schema_migrations 表中，flask db upgrade 按版本号顺序执行
+尚未执行的迁移，每个迁移单独提交。
+
+迁移中的建表、加列和建索引都先检查是否已存在（create_model_tables、add_column、
+create_index），已经手工执行过 db/*.sql 的库也可以直接升级；只想登记版本不执行时
+用 flask db stamp。
+"""
+
+import os
+import re
+import importlib.util
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, String, DateTime, inspect, text
+from app import db
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'db', 'migrations')
+
+# 回退到该版本表示回退全部迁移
+BASE_VERSION = '0000'
+
+_MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', String(16), primary_key=True),  # 迁移版本号
+    Column('description', String(255)),  # 迁移说明
+    Column('applied_at', DateTime)  # 执行时间
+)
+
+Migration = namedtuple('Migration', ['version', 'name', 'description', 'module'])
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """按版本号排序的全部迁移脚本"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version, name = match.groups()
+        spec = importlib.util.spec_from_file_location(f'db_migration_{version}', os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        description = (module.__doc__ or name).strip().splitlines()[0]
+        migrations.append(Migration(version, name, description, module))
+
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise ValueError(f"迁移版本号重复: {', '.join(duplicates)}")
+    return migrations
+
+
+def applied_versions():
+    """已执行的迁移 {版本号: 执行时间}，第一次调用时创建 schema_migrations 表"""
+    connection = db.session.connection()
+    schema_migrations.create(connection, checkfirst=True)
+    rows = connection.execute(schema_migrations.select()).fetchall()
+    return {row.version: row.applied_at for row in rows}
+
+
+def migration_status():
+    """
+    每个迁移的执行状态
+
+    Returns:
+        list: [(Migration, 执行时间，未执行为 None), ...]
+    """
+    applied = applied_versions()
+    return [(migration, applied.get(migration.version)) for migration in load_migrations()]
+
+
+def _find_version(migrations, version):
+    if version != BASE_VERSION and version not in {migration.version for migration in migrations}:
+        raise ValueError(f"没有版本号为 {version} 的迁移")
+
+
+def upgrade(target=None, progress_callback=None):
+    """
+    按版本号顺序执行尚未执行的迁移，直到 target（包含），None 表示全部
+
+    Args:
+        target: 目标版本号
+        progress_callback: 可选，每个迁移执行前调用 progress_callback(migration)
+
+    Returns:
+        list: 执行的迁移
+    """
+    migrations = load_migrations()
+    if target is not None:
+        _find_version(migrations, target)
+    applied = applied_versions()
+
+    executed = []
+    for migration in migrations:
+        if target is not None and migration.version > target:
+            break
+        if migration.version in applied:
+            continue
+        if progress_callback:
+            progress_callback(migration)
+        try:
+            migration.module.upgrade()
+            db.session.execute(schema_migrations.insert().values(
+                version=migration.version, description=migration.description, applied_at=datetime.now()
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.error(f"执行迁移 {migration.version}_{migration.name} 失败", exc_info=True)
+            raise
+        logger.info(f"已执行迁移 {migration.version}_{migration.name}: {migration.description}")
+        executed.append(migration)
+    return executed
+
+
+def downgrade(target, progress_callback=None):
+    """
+    按版本号倒序回退 target 之后已执行的迁移，target 为 BASE_VERSION 时全部回退
+
+    Returns:
+        list: 回退的迁移
+    """
+    migrations = load_migrations()
+    _find_version(migrations, target)
+    applied = applied_versions()
+
+    pending = [migration for migration in reversed(migrations)
+               if migration.version > target and migration.version in applied]
+    missing = [migration for migration in pending if not hasattr(migration.module, 'downgrade')]
+    if missing:
+        raise ValueError(f"迁移 {missing[0].version}_{missing[0].name} 不支持回退")
+
+    reverted = []
+    for migration in pending:
+        if progress_callback:
+            progress_callback(migration)
+        try:
+            migration.module.downgrade()
+            db.session.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.error(f"回退迁移 {migration.version}_{migration.name} 失败", exc_info=True)
+            raise
+        logger.info(f"已回退迁移 {migration.version}_{migration.name}")
+        reverted.append(migration)
+    return reverted
+
+
+def stamp(target):
+    """
+    把 target 及之前的迁移登记为已执行、之后的登记为未执行，不执行迁移本身
+
+    用于表结构已经手工建好的库（如执行过 db/*.sql）。
+
+    Returns:
+        list: 新登记为已执行的迁移
+    """
+    migrations = load_migrations()
+    _find_version(migrations, target)
+    applied = applied_versions()
+
+    stamped = []
+    now = datetime.now()
+    for migration in migrations:
+        if migration.version <= target and migration.version not in applied:
+            db.session.execute(schema_migrations.insert().values(
+                version=migration.version, description=migration.description, applied_at=now
+            ))
+            stamped.append(migration)
+        elif migration.version > target and migration.version in applied:
+            db.session.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+    db.session.commit()
+    return stamped
+
+
+# ---- 迁移脚本使用的辅助函数，均在当前会话的连接上执行 ----
+
+def has_table(table):
+    """表是否存在"""
+    return inspect(db.session.connection()).has_table(table)
+
+
+def has_column(table, column):
+    """列是否存在"""
+    return column in {item['name'] for item in inspect(db.session.connection()).get_columns(table)}
+
+
+def find_index(table, name=None, columns=None):
+    """
+    按名称或列查找索引（含唯一约束），返回索引名，不存在时返回 None
+
+    columns 需要与索引的列完全一致（顺序相同）。
+    """
+    inspector = inspect(db.session.connection())
+    indexes = [(item['name'], item['column_names']) for item in inspector.get_indexes(table)]
+    indexes += [(item['name'], item['column_names']) for item in inspector.get_unique_constraints(table)]
+    for index_name, index_columns in indexes:
+        if (name is not None and index_name == name) or (columns is not None and list(index_columns) == list(columns)):
+            return index_name
+    return None
+
+
+def create_model_tables(*models):
+    """按模型定义创建不存在的表（含模型中声明的索引）"""
+    connection = db.session.connection()
+    for model in models:
+        model.__table__.create(connection, checkfirst=True)
+
+
+def add_column(table, column, definition):
+    """列不存在时添加，definition 为列类型等定义，如 'INTEGER NULL'"""
+    if has_column(table, column):
+        return False
+    db.session.execute(text(f"ALTER TABLE {table} ADD {column} {definition}"))
+    return True
+
+
+def create_index(name, table, columns):
+    """同名或同列的索引都不存在时创建索引"""
+    existing = find_index(table, name, columns)
+    if existing:
+        logger.info(f"{table} 已有索引 {existing}({', '.join(columns)})，跳过 {name}")
+        return False
+    db.session.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+    return True
+
+
+def drop_index(name, table):
+    """索引存在时删除"""
+    if find_index(table, name) is None:
+        return False
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(text(f"DROP INDEX {name} ON {table}"))
+    else:
+        db.session.execute(text(f"DROP INDEX {name}"))
+    return True
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+统计查询结果缓存
+
+排名、三神统计、势力统计等服务函数的结果只在日志入库或人员/分组修改后才会变化。
+cached_result 装饰的函数以 (函数, 规范化后的参数, 当天日期) 为键缓存结果，每条缓存
+记录写入时的数据版本号；入库、人员/分组增删改时递增版本号，旧版本的缓存即失效。
+
+- 容量有限，按 LRU 淘汰（配置项 RESULT_CACHE_SIZE）
+- 版本号是进程内的，其他进程（如 flask ingest-dir）写库后本进程感知不到，
+  因此缓存另有存活时间上限（配置项 RESULT_CACHE_TTL 秒）
+- 当天日期是键的一部分，today/week 等相对时间范围跨天后自动失效
+- 命中/未命中等指标通过 cache_stats() 获取
+"""
+
+import copy
+import time
+import inspect
+import threading
+import functools
+from collections import OrderedDict
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+_entries = OrderedDict()  # key -> (数据版本, 写入时间, 结果)
+_lock = threading.Lock()
+_generation = 0
+_stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'evictions': 0}
+_function_stats = {}  # 函数名 -> {'hits': n, 'misses': n}
+_watched_models = ()  # 变更后需要使缓存失效的模型
+
+
+def data_generation():
+    """当前数据版本号"""
+    return _generation
+
+
+def bump_data_generation(reason=None):
+    """数据发生变化，递增版本号使已有缓存失效"""
+    global _generation
+    with _lock:
+        _generation += 1
+        generation = _generation
+    logger.debug(f"数据版本号递增为 {generation}" + (f": {reason}" if reason else ""))
+    return generation
+
+
+def clear_result_cache():
+    """清空缓存和统计"""
+    with _lock:
+        _entries.clear()
+        _function_stats.clear()
+        for name in _stats:
+            _stats[name] = 0
+
+
+def cache_stats():
+    """
+    缓存指标
+
+    Returns:
+        dict: hits, misses, hit_rate, size, max_size, ttl, generation, stale（版本过期）,
+              expired（超时）, evictions（LRU 淘汰）, functions（按函数的命中/未命中）
+    """
+    config = current_app.config
+    with _lock:
+        stats = dict(_stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+            'size': len(_entries),
+            'max_size': config['RESULT_CACHE_SIZE'],
+            'ttl': config['RESULT_CACHE_TTL'],
+            'generation': _generation,
+            'functions': {name: dict(counts) for name, counts in _function_stats.items()}
+        })
+    return stats
+
+
+def _normalize(value):
+    """规范化参数：去掉字符串首尾空格、空字符串视为 None、时间转为字符串、容器转为元组"""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_normalize(item) for item in value]
+        return tuple(sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    return value
+
+
+def _count(name, outcome):
+    _stats[outcome] += 1
+    if outcome in ('hits', 'misses'):
+        _function_stats.setdefault(name, {'hits': 0, 'misses': 0})[outcome] += 1
+
+
+def cached_result(func):
+    """
+    缓存函数结果的装饰器
+
+    结果在写入和命中时都会深拷贝，调用方修改返回值不会影响缓存。函数抛出异常时不缓存。
+    """
+    signature = inspect.signature(func)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (name, date.today().isoformat(),
+               tuple((arg, _normalize(value)) for arg, value in bound.arguments.items()))
+
+        config = current_app.config
+        max_size, ttl = config['RESULT_CACHE_SIZE'], config['RESULT_CACHE_TTL']
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                generation, stored_at, value = entry
+                if generation != _generation:
+                    del _entries[key]
+                    _count(name, 'stale')
+                elif ttl and now - stored_at > ttl:
+                    del _entries[key]
+                    _count(name, 'expired')
+                else:
+                    _entries.move_to_end(key)
+                    _count(name, 'hits')
+                    return copy.deepcopy(value)
+            _count(name, 'misses')
+            generation = _generation
+
+        result = func(*args, **kwargs)
+
+        with _lock:
+            # 计算期间数据发生了变化时不写入，避免缓存旧数据
+            if generation == _generation:
+                _entries[key] = (generation, now, copy.deepcopy(result))
+                _entries.move_to_end(key)
+                while len(_entries) > max_size:
+                    _entries.popitem(last=False)
+                    _stats['evictions'] += 1
+        return result
+
+    return wrapper
+
+
+def _mark_changed(session, flush_context):
+    """flush 中有被监听模型的增删改时在会话上做标记"""
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, _watched_models):
+            session.info['result_cache_dirty'] = True
+            return
+
+
+def _bump_after_commit(session):
+    if session.info.pop('result_cache_dirty', False):
+        bump_data_generation('ORM 数据变更')
+
+
+def _reset_after_rollback(session):
+    session.info.pop('result_cache_dirty', None)
+
+
+def register_cache_invalidation(*models):
+    """
+    通过 ORM 会话事件监听给定模型的增删改，提交后递增数据版本号
+
+    人员、分组等通过 ORM 修改的数据无需在每个路由中手动递增；Core 层的批量写入
+    （如日志入库）需要显式调用 bump_data_generation。重复调用只会更新监听的模型。
+    """
+    global _watched_models
+    _watched_models = tuple(models)
+    if not event.contains(Session, 'after_flush', _mark_changed):
+        event.listen(Session, 'after_flush', _mark_changed)
+        event.listen(Session, 'after_commit', _bump_after_commit)
+        event.listen(Session, 'after_rollback', _reset_after_rollback)
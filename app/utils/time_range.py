@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+统计查询的时间范围
+
+把 time_range 预设（today、week 等）和自定义起止时间统一转换为左闭右开的
+[开始, 结束) datetime 区间，None 表示该端不限。区间按自然日切分后，整天部分
+可以读取 player_daily_stats 汇总表，只有不足一天的首尾时段才需要扫描 battle_record。
+
+直接查询明细表时用 time_window_condition 生成 `列 >= :开始 AND 列 < :结束` 条件，
+不在列上套 DATE() 等函数，MySQL 可以对时间列的索引做范围扫描。
+"""
+
+import calendar
+from datetime import datetime, date, time, timedelta
+from dateutil import parser
+
+# time_range 预设对应的天数（不含 today/yesterday）
+RANGE_DAYS = {
+    'week': 7,
+    'month': 30,
+    'three_months': 90,
+    'all': 365
+}
+
+# calendar_months=True 时 month/three_months 按自然月回溯，与 INTERVAL n MONTH 一致
+RANGE_MONTHS = {
+    'month': 1,
+    'three_months': 3
+}
+
+
+def to_datetime(value):
+    """把请求参数中的时间（datetime、date 或字符串）转换为 datetime，空值返回 None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return parser.parse(str(value))
+
+
+def subtract_months(day, months):
+    """按自然月回溯，目标月没有这一天时取月末（与 MySQL DATE_SUB(..., INTERVAL n MONTH) 一致）"""
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def month_start(day):
+    """day 所在月份的 1 日（date）"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def next_month(day):
+    """day 所在月份的下月 1 日"""
+    return subtract_months(month_start(day), -1)
+
+
+def time_range_bounds(time_range, today=None, calendar_months=False):
+    """
+    time_range 预设对应的 [开始, 结束) 区间
+
+    Args:
+        time_range: today, yesterday, week, month, three_months, all；其他值表示不限
+        today: 可选，基准日期，默认今天
+        calendar_months: month/three_months 是否按自然月回溯（否则按 30/90 天）
+
+    Returns:
+        tuple: (开始, 结束)，不限的一端为 None
+    """
+    today = today or date.today()
+    midnight = datetime.combine(today, time.min)
+    if time_range == 'today':
+        return midnight, midnight + timedelta(days=1)
+    if time_range == 'yesterday':
+        return midnight - timedelta(days=1), midnight
+    if calendar_months and time_range in RANGE_MONTHS:
+        return datetime.combine(subtract_months(today, RANGE_MONTHS[time_range]), time.min), None
+    if time_range in RANGE_DAYS:
+        return midnight - timedelta(days=RANGE_DAYS[time_range]), None
+    return None, None
+
+
+def datetime_range_bounds(start_datetime=None, end_datetime=None):
+    """自定义起止时间（均包含，精确到秒）对应的 [开始, 结束) 区间"""
+    start = to_datetime(start_datetime)
+    end = to_datetime(end_datetime)
+    return start, end + timedelta(seconds=1) if end else None
+
+
+def date_range_bounds(start_date, end_date):
+    """自定义起止日期（均包含）对应的 [开始, 结束) 区间"""
+    start = to_datetime(start_date)
+    end = to_datetime(end_date)
+    return (
+        datetime.combine(start.date(), time.min) if start else None,
+        datetime.combine(end.date(), time.min) + timedelta(days=1) if end else None
+    )
+
+
+def split_whole_days(start, end):
+    """
+    把 [start, end) 切分为整天部分和首尾不足一天的部分
+
+    Returns:
+        tuple: ((首个整天, 整天结束日期) 或 None, [(开始, 结束), ...] 不足一天的时段)；
+               整天部分为左闭右开的日期区间，不限的一端为 None
+    """
+    first_day = None
+    if start is not None:
+        first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    end_day = end.date() if end is not None else None
+
+    if first_day is not None and end_day is not None and first_day >= end_day:
+        # 不足一个完整自然日，全部走明细
+        return None, [(start, end)] if start < end else []
+
+    partial = []
+    if start is not None and start.time() != time.min:
+        partial.append((start, datetime.combine(first_day, time.min)))
+    if end is not None and end.time() != time.min:
+        partial.append((datetime.combine(end_day, time.min), end))
+    return (first_day, end_day), partial
+
+
+def resolve_time_window(time_range=None, start_datetime=None, end_datetime=None, today=None, calendar_months=False):
+    """
+    统计查询的时间窗口：同时给出自定义起止时间（均包含）时优先使用，否则按 time_range 预设
+
+    Returns:
+        tuple: [开始, 结束) 区间，不限的一端为 None
+    """
+    if start_datetime and end_datetime:
+        return datetime_range_bounds(start_datetime, end_datetime)
+    return time_range_bounds(time_range, today, calendar_months)
+
+
+def previous_window(start=None, end=None, today=None):
+    """
+    [start, end) 的上一个周期：紧接在 start 之前、长度相同的区间
+
+    不限结束时间的区间（week 等预设）按到今天 0 点计算长度；不限开始时间时上一个周期为
+    截至今天 0 点的全部时间。
+
+    Returns:
+        tuple: (开始, 结束)，不限的一端为 None
+    """
+    midnight = datetime.combine(today or date.today(), time.min)
+    if start is None:
+        return None, midnight
+    length = (end if end is not None else midnight) - start
+    if length <= timedelta(0):
+        length = timedelta(days=1)
+    return start - length, start
+
+
+def time_window_condition(column, start=None, end=None, prefix='window'):
+    """
+    [start, end) 区间对应的 SQL 条件和绑定参数
+
+    条件直接比较列值（不套 DATE() 等函数），可以使用列上的索引做范围扫描；
+    时间通过绑定参数传入，SQL 文本不随日期变化。
+
+    Args:
+        column: 列名，如 br.publish_at
+        start: 开始时间（包含），None 表示不限
+        end: 结束时间（不包含），None 表示不限
+        prefix: 绑定参数名前缀，同一条 SQL 中有多个时间窗口时用于区分
+
+    Returns:
+        tuple: (以 AND 开头的条件，不限时为空字符串, 参数字典)
+    """
+    conditions = []
+    params = {}
+    if start is not None:
+        conditions.append(f"AND {column} >= :{prefix}_start")
+        params[f'{prefix}_start'] = start
+    if end is not None:
+        conditions.append(f"AND {column} < :{prefix}_end")
+        params[f'{prefix}_end'] = end
+    return ' '.join(conditions), params
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗日志上传登记
+
+上传的日志按内容哈希登记并压缩保存到 UPLOAD_FOLDER/battle_logs/ 下按内容寻址的路径。
+相同内容的文件再次上传时直接跳过；在旧文件基础上追加了新内容的文件，
+通过逐块比对哈希找到相同的前缀，只解析新增的尾部。
+
+上传请求中 prepare_upload 读取整个上传流，逐块计算哈希并压缩写入磁盘（内存中只保留当前
+字节块，单个文件的大小受配置项 MAX_UPLOAD_SIZE 限制）；解析由后台任务在请求返回后调用
+ingest_stored_upload 从压缩文件读取，因此解析不会与接收同时进行。
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.config import Config
+from app.models.upload import BattleLogUpload
+from app.utils.file_parser import (
+    ENCODING_SAMPLE_SIZE,
+    _read_head,
+    ingest_battle_log_stream
+)
+from app.utils.encoding_resolver import resolve_encoding
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 分块哈希的块大小，修改后旧登记记录的分块哈希将无法用于前缀比对
+FINGERPRINT_CHUNK_SIZE = 64 * 1024
+
+# 压缩日志的存储子目录
+STORAGE_SUBDIR = 'battle_logs'
+
+
+def storage_path_for(content_hash):
+    """内容哈希对应的存储路径(相对上传目录)"""
+    return os.path.join(STORAGE_SUBDIR, content_hash[:2], f"{content_hash}.log.gz")
+
+
+def fingerprint_upload(stream, upload_folder=None):
+    """
+    读取整个上传流，计算内容哈希和分块哈希，同时把内容 gzip 压缩写入存储目录
+
+    内容逐块写入磁盘，内存中只保留当前字节块；累计超过 MAX_UPLOAD_SIZE 时抛出 ValueError，
+    并删除已写入的临时文件。
+
+    Returns:
+        dict: content_hash, chunk_hashes(每个完整块的哈希), line_ends(每个完整块之前最后一个换行之后的偏移),
+              file_size, head(开头用于编码检测的字节), storage_path
+    """
+    upload_folder = upload_folder or Config.UPLOAD_FOLDER
+    storage_dir = os.path.join(upload_folder, STORAGE_SUBDIR)
+    os.makedirs(storage_dir, exist_ok=True)
+    max_size = current_app.config['MAX_UPLOAD_SIZE']
+
+    content_digest = hashlib.sha256()
+    chunk_hashes = []
+    line_ends = []
+    file_size = 0
+    last_line_end = 0
+    head = b''
+
+    tmp = tempfile.NamedTemporaryFile(dir=storage_dir, suffix='.tmp', delete=False)
+    try:
+        with tmp, gzip.GzipFile(fileobj=tmp, mode='wb', mtime=0) as gz:
+            while True:
+                chunk = _read_head(stream, FINGERPRINT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if file_size + len(chunk) > max_size:
+                    raise ValueError(f"上传文件超过 {max_size} 字节的大小上限")
+                gz.write(chunk)
+                content_digest.update(chunk)
+                if len(head) < ENCODING_SAMPLE_SIZE:
+                    head += chunk[:ENCODING_SAMPLE_SIZE - len(head)]
+
+                newline_pos = chunk.rfind(b'\n')
+                if newline_pos != -1:
+                    last_line_end = file_size + newline_pos + 1
+                file_size += len(chunk)
+
+                # 只有完整块参与前缀比对，最后一个不足一块的尾部不登记
+                if len(chunk) == FINGERPRINT_CHUNK_SIZE:
+                    chunk_hashes.append(hashlib.sha256(chunk).hexdigest())
+                    line_ends.append(last_line_end)
+
+        content_hash = content_digest.hexdigest()
+        relative_path = storage_path_for(content_hash)
+        target_path = os.path.join(upload_folder, relative_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.exists(target_path):
+            os.remove(tmp.name)
+        else:
+            os.replace(tmp.name, target_path)
+    except Exception:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+
+    return {
+        'content_hash': content_hash,
+        'chunk_hashes': chunk_hashes,
+        'line_ends': line_ends,
+        'file_size': file_size,
+        'head': head,
+        'storage_path': relative_path
+    }
+
+
+def find_ingested_upload(content_hash):
+    """按内容哈希查找已入库的上传记录"""
+    return BattleLogUpload.query.filter_by(content_hash=content_hash).first()
+
+
+def find_resume_offset(fingerprint):
+    """
+    查找与本次上传前缀相同的已入库文件，返回可以开始解析的字节偏移
+
+    逐块比对完整块哈希，取相同前缀最长的旧文件；偏移回退到最后一个相同块内
+    最后一个换行之后，保证从完整的行开始解析。跨越边界的那一行会被再次解析，
+    由入库去重跳过。
+
+    Returns:
+        tuple: (旧上传记录, 偏移)；没有可复用的前缀时返回 (None, 0)
+    """
+    chunk_hashes = fingerprint['chunk_hashes']
+    if not chunk_hashes:
+        return None, 0
+
+    candidates = BattleLogUpload.query.filter_by(
+        first_chunk_hash=chunk_hashes[0],
+        chunk_size=FINGERPRINT_CHUNK_SIZE
+    ).all()
+
+    best_upload = None
+    best_matched = 0
+    for upload in candidates:
+        matched = 0
+        for old_hash, new_hash in zip(upload.get_chunk_hashes(), chunk_hashes):
+            if old_hash != new_hash:
+                break
+            matched += 1
+        if matched > best_matched:
+            best_upload = upload
+            best_matched = matched
+
+    if best_upload is None:
+        return None, 0
+    return best_upload, fingerprint['line_ends'][best_matched - 1]
+
+
+def register_upload(fingerprint, filename, encoding, resumed_from, stats):
+    """登记已入库的上传文件，并发上传同一文件时忽略唯一键冲突"""
+    chunk_hashes = fingerprint['chunk_hashes']
+    upload = BattleLogUpload(
+        content_hash=fingerprint['content_hash'],
+        first_chunk_hash=chunk_hashes[0] if chunk_hashes else None,
+        chunk_size=FINGERPRINT_CHUNK_SIZE,
+        chunk_hashes=json.dumps(chunk_hashes),
+        file_size=fingerprint['file_size'],
+        storage_path=fingerprint['storage_path'],
+        original_filename=filename,
+        encoding=encoding,
+        resumed_from=resumed_from,
+        kill_count=stats['kills'],
+        blessing_count=stats['blessings'],
+        inserted_count=stats['inserted'],
+        skipped_count=stats['skipped']
+    )
+    try:
+        db.session.add(upload)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.warning(f"上传记录已存在，忽略重复登记: {fingerprint['content_hash']}")
+
+
+def new_upload_stats():
+    """上传解析统计的初始值"""
+    return {
+        'lines': 0,
+        'bytes': 0,
+        'kills': 0,
+        'blessings': 0,
+        'inserted': 0,
+        'skipped': 0,
+        'blessings_updated': 0,
+        'duplicate': False,
+        'resumed_from': 0,
+        'content_hash': None
+    }
+
+
+def prepare_upload(stream, filename, upload_folder=None, source=None):
+    """
+    保存上传文件并确定解析方式
+
+    读取整个流，计算内容哈希/分块哈希并压缩保存；查找已入库的相同文件，
+    以及可复用的相同前缀，确定编码和开始解析的偏移。文件超过 MAX_UPLOAD_SIZE 时抛出 ValueError。
+
+    Args:
+        source: 可选，上传来源（上传用户等），用于缓存识别出的编码
+
+    Returns:
+        dict: fingerprint, existing(已入库的相同文件，没有时为 None), encoding,
+              previous(前缀相同的已入库文件), resume_offset
+    """
+    fingerprint = fingerprint_upload(stream, upload_folder)
+    logger.info(f"上传文件 {filename}: 大小 {fingerprint['file_size']} 字节，sha256={fingerprint['content_hash']}")
+
+    plan = {
+        'fingerprint': fingerprint,
+        'existing': None,
+        'encoding': None,
+        'previous': None,
+        'resume_offset': 0
+    }
+    if fingerprint['file_size'] == 0:
+        return plan
+
+    plan['existing'] = find_ingested_upload(fingerprint['content_hash'])
+    if plan['existing']:
+        existing = plan['existing']
+        logger.info(f"文件内容已于 {existing.created_at} 入库 (原文件名: {existing.original_filename})，跳过解析")
+        return plan
+
+    plan['encoding'] = resolve_encoding(fingerprint['head'], source=source)
+    plan['previous'], plan['resume_offset'] = find_resume_offset(fingerprint)
+    if plan['previous']:
+        logger.info(f"文件前 {plan['resume_offset']} 字节与已入库文件 {plan['previous'].content_hash[:12]} 相同，只解析新增部分")
+    return plan
+
+
+def duplicate_upload_message(existing):
+    """相同文件已入库时的提示信息"""
+    uploaded_at = existing.created_at.strftime('%Y-%m-%d %H:%M:%S') if existing.created_at else '之前'
+    return f"该文件已于 {uploaded_at} 上传并入库，已跳过重复解析。"
+
+
+def ingest_stored_upload(fingerprint, filename, encoding, resume_offset=0, upload_folder=None, progress_callback=None):
+    """
+    从压缩存储中解析上传文件（从 resume_offset 开始），成功后登记本次上传
+
+    Args:
+        fingerprint: 至少包含 content_hash / chunk_hashes / file_size / storage_path
+        filename: 上传时的文件名，仅用于登记
+        encoding: 解码使用的编码
+        resume_offset: 开始解析的字节偏移
+        upload_folder: 可选，上传目录，默认 Config.UPLOAD_FOLDER
+        progress_callback: 可选，每批写库后以统计字典调用
+
+    Returns:
+        tuple: (success, message, stats)
+    """
+    upload_folder = upload_folder or Config.UPLOAD_FOLDER
+    stats = new_upload_stats()
+    stats['content_hash'] = fingerprint['content_hash']
+    stats['resumed_from'] = resume_offset
+
+    if resume_offset >= fingerprint['file_size']:
+        success, message = True, "文件没有新增内容。"
+    else:
+        stored_path = os.path.join(upload_folder, fingerprint['storage_path'])
+        with gzip.open(stored_path, 'rb') as stored:
+            stored.seek(resume_offset)
+            success, message, ingest_stats = ingest_battle_log_stream(
+                stored, encoding=encoding, progress_callback=progress_callback
+            )
+        stats.update(ingest_stats)
+
+    if not success:
+        return False, message, stats
+
+    register_upload(fingerprint, filename, encoding, resume_offset, stats)
+    if resume_offset:
+        message = f"检测到与已上传文件相同的前 {resume_offset} 字节，仅解析新增的 {fingerprint['file_size'] - resume_offset} 字节。{message}"
+    return True, message, stats
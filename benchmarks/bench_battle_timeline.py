@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗时间线汇总表一致性校验和基准
+
+生成两个月的合成数据（含带祝福的击杀、已删除的战斗记录和未解析到玩家的名称），重建
+kill_timeline_minute 后，对不同时间窗口（含不足一分钟的首尾）、势力和点数上限比较旧做法
+（取回窗口内全部击杀记录，在内存中按桶计数）和 get_battle_timeline（整分钟部分读汇总表，
+在 SQL 中按桶聚合）的结果，并输出两者的耗时和返回的点数。
+随后依次入库一批带祝福的新日志（增量累加）、修改一名玩家的名称（按差值调整）、修改一名玩家的势力
+（move_person_faction）后各校验一次，最后全量重建汇总表，校验与增量维护的结果逐行一致。
+
+默认使用临时 SQLite 文件，表结构和索引由 db/migrations 创建；可通过环境变量
+SQLALCHEMY_DATABASE_URI 指向测试用 MySQL（会清空其中的 person、player_group、
+battle_record、player_daily_stats、kill_pair_daily、kill_heatmap_daily、kill_timeline_minute 表）。
+
+用法: python benchmarks/bench_battle_timeline.py [每天击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_battle_timeline.db')
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute  # noqa: E402
+from app.services import battle_service  # noqa: E402
+from app.services.battle_service import GODS, _timeline_buckets, _blessing_spikes  # noqa: E402
+from app.services.stats_service import (  # noqa: E402
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily, rebuild_kill_timeline_minute,
+    move_person_faction
+)
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records, save_battle_log_to_db  # noqa: E402
+from app.utils.time_range import time_window_condition  # noqa: E402
+
+JOBS = ['法师', '弓', '狂', '奶', None]
+START = datetime(2025, 3, 1)
+DAYS = 60
+
+# (开始, 结束)，结束不包含
+RANGES = [
+    (START, START + timedelta(days=DAYS)),
+    (datetime(2025, 3, 10, 20, 30, 17), datetime(2025, 3, 24, 21, 16, 42)),
+    (datetime(2025, 4, 2, 19, 0), datetime(2025, 4, 2, 23, 0)),
+    (datetime(2025, 3, 15, 20, 5, 30), datetime(2025, 3, 15, 20, 41, 10)),
+]
+FACTIONS = [None, '梵天']
+MAX_POINTS = [240, 60]
+
+
+def build_dataset(kills_per_day, seed=20250301):
+    rnd = random.Random(seed)
+    persons = []
+    for god in GODS:
+        for idx in range(150):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS),
+                            'deleted': rnd.random() < 0.05})
+    names = [p['name'] for p in persons] + [f'路人{idx}' for idx in range(30)]
+    rows = []
+    for day in range(DAYS):
+        evening = START + timedelta(days=day, hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.sample(names, 2)
+            publish_at = evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600))
+            rows.append((win, lost, publish_at, rnd.random() < 0.1, rnd.random() < 0.01))
+    return persons, rows
+
+
+def load_dataset(persons, rows):
+    for model in (KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person,
+                  PlayerGroup):
+        model.query.delete()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     deleted_at=datetime.now() if person['deleted'] else None)
+        db.session.add(obj)
+        db.session.flush()
+        person_ids[person['name']] = obj.id
+    bulk_insert_battle_records([{
+        'win': win,
+        'lost': lost,
+        'win_person_id': person_ids.get(win),
+        'lost_person_id': person_ids.get(lost),
+        'position': '0,0',
+        'x_coord': 0,
+        'y_coord': 0,
+        'remark': 1 if blessed else 0,
+        'publish_at': publish_at,
+        'deleted_at': datetime.now() if deleted else None
+    } for win, lost, publish_at, blessed, deleted in rows])
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    rebuild_kill_heatmap_daily()
+    db.session.commit()
+
+
+def legacy_timeline(faction, start, end, max_points):
+    """旧做法：取回窗口内的击杀记录和双方势力，在内存中按桶计数"""
+    bucket_minutes, first, count = _timeline_buckets(start, end, max_points)
+    date_condition, params = time_window_condition('br.publish_at', start, end)
+    rows = db.session.execute(text(f"""
+        SELECT br.publish_at, br.remark, k.god AS killer_god, v.god AS victim_god
+        FROM battle_record br
+        LEFT JOIN person k ON k.id = br.win_person_id
+        LEFT JOIN person v ON v.id = br.lost_person_id
+        WHERE br.deleted_at IS NULL
+          {date_condition}
+    """).columns(publish_at=db.DateTime), params)
+    gods = [faction] if faction is not None else list(GODS)
+    series = {god: {'kills': [0] * count, 'deaths': [0] * count, 'blessings': [0] * count} for god in gods}
+    for row in rows:
+        idx = (row.publish_at - first) // timedelta(minutes=bucket_minutes)
+        for god, key in ((row.killer_god, 'kills'), (row.victim_god, 'deaths')):
+            if god is None or god not in series:
+                continue
+            series[god][key][idx] += 1
+            if key == 'kills' and row.remark == 1:
+                series[god]['blessings'][idx] += 1
+    return {
+        'bucket_minutes': bucket_minutes,
+        'times': [(first + timedelta(minutes=bucket_minutes * idx)).strftime('%Y-%m-%d %H:%M') for idx in range(count)],
+        'series': [dict(series[god], faction=god, blessing_spikes=_blessing_spikes(series[god]['blessings']))
+                   for god in gods]
+    }
+
+
+def new_timeline(faction, start, end, max_points):
+    return battle_service.get_battle_timeline.__wrapped__(faction, None, start, end - timedelta(seconds=1), max_points)
+
+
+def run_checks():
+    """逐项比较，返回 (项数, 不一致项数, 旧做法总耗时, 新实现总耗时, 最多点数)"""
+    checks = 0
+    mismatches = 0
+    legacy_total = 0.0
+    new_total = 0.0
+    most_points = 0
+    for start, end in RANGES:
+        for faction in FACTIONS:
+            for max_points in MAX_POINTS:
+                checks += 1
+                started = time.perf_counter()
+                expected = legacy_timeline(faction, start, end, max_points)
+                legacy_total += time.perf_counter() - started
+
+                started = time.perf_counter()
+                actual = new_timeline(faction, start, end, max_points)
+                new_total += time.perf_counter() - started
+
+                points = len(actual['times'])
+                most_points = max(most_points, points)
+                if expected != actual or points > max_points:
+                    mismatches += 1
+                    print(f"  不一致: {faction or '全部势力'} {start:%m-%d %H:%M:%S}~{end:%m-%d %H:%M:%S} "
+                          f"最多 {max_points} 点，返回 {points} 点")
+                    print(f"    旧: {str(expected)[:300]}")
+                    print(f"    新: {str(actual)[:300]}")
+    return checks, mismatches, legacy_total, new_total, most_points
+
+
+def timeline_rows():
+    return sorted(
+        (str(row.stat_date), row.god, row.minute_of_day, row.kills, row.deaths, row.blessings)
+        for row in db.session.query(KillTimelineMinute.stat_date, KillTimelineMinute.god,
+                                    KillTimelineMinute.minute_of_day, KillTimelineMinute.kills,
+                                    KillTimelineMinute.deaths, KillTimelineMinute.blessings)
+        if row.kills or row.deaths or row.blessings
+    )
+
+
+def main():
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    persons, rows = build_dataset(kills_per_day)
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        load_dataset(persons, rows)
+
+        failed = 0
+        started = time.perf_counter()
+        rebuild_kill_timeline_minute()
+        db.session.commit()
+        print(f"数据库: {db.engine.url.drivername}，战斗记录 {len(rows)} 条，时间线汇总 {KillTimelineMinute.query.count()} 行，"
+              f"重建耗时 {time.perf_counter() - started:.2f}s")
+
+        for stage in ('初始数据', '增量入库后', '玩家改名后', '玩家换势力后'):
+            if stage == '增量入库后':
+                rnd = random.Random(7)
+                names = [p['name'] for p in persons] + ['路人0']
+                battle_details = []
+                blessings = []
+                for idx in range(2000):
+                    win, lost = rnd.sample(names, 2)
+                    timestamp = datetime(2025, 3, 15, 20, 0) + timedelta(seconds=idx)
+                    battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 0, 'y_coord': 0,
+                                           'timestamp': timestamp})
+                    if rnd.random() < 0.3:
+                        blessings.append({'player_name': win, 'blessing_name': '祝福', 'timestamp': timestamp})
+                save_battle_log_to_db(battle_details, blessings)
+            elif stage == '玩家改名后':
+                # 改成未解析到玩家的名称：旧名称的记录不再计入，路人的记录归属该玩家
+                person = Person.query.filter_by(name='比湿奴000').first()
+                person.name = '路人3'
+                db.session.flush()
+                battle_service.resolve_battle_record_person_ids(['比湿奴000', '路人3'])
+                db.session.commit()
+            elif stage == '玩家换势力后':
+                person = Person.query.filter_by(name='湿婆010').first()
+                old_god = person.god
+                person.god = '梵天'
+                move_person_faction(person.id, old_god, person.god)
+                db.session.commit()
+
+            checks, mismatches, legacy_time, new_time, most_points = run_checks()
+            failed += mismatches
+            print(f"[{stage}] {checks} 项，不一致 {mismatches} 项，最多 {most_points} 个点；旧做法 {legacy_time:.2f}s，"
+                  f"新实现 {new_time:.2f}s，加速比 {legacy_time / new_time:.1f}x")
+
+        # 重建路径：全量重建的结果应与增量维护的完全一致
+        maintained = timeline_rows()
+        rebuild_kill_timeline_minute()
+        db.session.commit()
+        rebuilt = timeline_rows()
+        same = maintained == rebuilt
+        failed += not same
+        print(f"[重建] {len(rebuilt)} 行，与增量维护的结果{'一致' if same else '不一致'}")
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+祝福匹配基准
+
+用合成日志（同一秒内多次击杀、重复祝福、找不到击杀的祝福都会出现）分别运行旧版
+ORM 逐条匹配 + 每 50 条提交的实现和新的哈希索引 + 单条 UPDATE 实现，
+校验被标记的记录和更新计数一致后输出祝福阶段耗时。
+
+默认使用内存 SQLite，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会清空其中的 battle_record 表）。
+
+用法: python benchmarks/bench_blessing_match.py [日志行数]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from app import create_app, db  # noqa: E402
+from app.models.player import BattleRecord  # noqa: E402
+from app.utils.file_parser import (  # noqa: E402
+    parse_battle_log,
+    battle_record_key,
+    collation_key,
+    bulk_insert_battle_records,
+    build_blessing_index,
+    mark_blessed_records
+)
+from bench_parse_battle_log import build_synthetic_log  # noqa: E402
+
+
+def legacy_match_blessings(records, blessings):
+    """优化前的祝福匹配逻辑（去掉日志输出），作为对照组"""
+    battle_records_for_blessing = {}
+    for battle_record in records:
+        date_str = battle_record.publish_at.date().strftime('%Y-%m-%d')
+        battle_records_for_blessing.setdefault((battle_record.win, date_str), []).append(battle_record)
+
+    blessing_success_count = 0
+    for idx, blessing in enumerate(blessings):
+        key = (blessing['player_name'], blessing['timestamp'].date().strftime('%Y-%m-%d'))
+        if key in battle_records_for_blessing and battle_records_for_blessing[key]:
+            for battle_record in battle_records_for_blessing[key]:
+                if battle_record.publish_at == blessing['timestamp']:
+                    battle_record.remark = 1
+                    blessing_success_count += 1
+                    break
+        if (idx + 1) % 50 == 0 or idx == len(blessings) - 1:
+            db.session.commit()
+    db.session.commit()
+    return blessing_success_count
+
+
+def run_legacy(battle_details, blessings):
+    start_time = min(d['timestamp'] for d in battle_details)
+    end_time = max(d['timestamp'] for d in battle_details)
+    started = time.perf_counter()
+    records = BattleRecord.query.filter(
+        BattleRecord.publish_at >= start_time,
+        BattleRecord.publish_at <= end_time
+    ).all()
+    count = legacy_match_blessings(records, blessings)
+    return count, time.perf_counter() - started
+
+
+def run_new(battle_details, blessings):
+    start_time = min(d['timestamp'] for d in battle_details)
+    end_time = max(d['timestamp'] for d in battle_details)
+    batch_keys = {battle_record_key(d) for d in battle_details}
+    started = time.perf_counter()
+    blessing_index, _ = build_blessing_index(start_time, end_time, batch_keys)
+    record_ids = set()
+    count = 0
+    for blessing in blessings:
+        record_id = blessing_index.get((collation_key(blessing['player_name']), blessing['timestamp']))
+        if record_id is not None:
+            record_ids.add(record_id)
+            count += 1
+    if record_ids:
+        mark_blessed_records(record_ids)
+    db.session.commit()
+    return count, time.perf_counter() - started
+
+
+def reset_table(battle_details):
+    BattleRecord.query.delete()
+    bulk_insert_battle_records([{
+        'win': d['killer_name'],
+        'lost': d['victim_name'],
+        'position': f"{d['x_coord']},{d['y_coord']}",
+        'remark': 0,
+        'publish_at': d['timestamp'],
+    } for d in battle_details])
+    db.session.commit()
+
+
+def blessed_ids():
+    return sorted(row.id for row in db.session.query(BattleRecord.id).filter(BattleRecord.remark == 1))
+
+
+def main():
+    total_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 60_000
+    battle_details, blessings = parse_battle_log(build_synthetic_log(total_lines))
+    # 为一部分击杀补上同一秒的祝福，保证有足够的匹配
+    blessings = blessings + [
+        {'player_name': d['killer_name'], 'blessing_name': '梵天', 'timestamp': d['timestamp']}
+        for d in battle_details[::3]
+    ]
+    blessings.sort(key=lambda b: b['timestamp'])
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f"数据库: {db.engine.url.drivername}，击杀 {len(battle_details)} 条，祝福 {len(blessings)} 条")
+
+        reset_table(battle_details)
+        legacy_count, legacy_time = run_legacy(battle_details, blessings)
+        legacy_ids = blessed_ids()
+
+        reset_table(battle_details)
+        new_count, new_time = run_new(battle_details, blessings)
+        new_ids = blessed_ids()
+
+        if legacy_count != new_count or legacy_ids != new_ids:
+            print(f"结果不一致！旧实现 更新 {legacy_count} 条/标记 {len(legacy_ids)} 条，新实现 更新 {new_count} 条/标记 {len(new_ids)} 条")
+            sys.exit(1)
+
+        print(f"更新 {new_count} 条祝福，标记 {len(new_ids)} 条记录，结果一致")
+        print(f"旧实现: {legacy_time:.2f}s")
+        print(f"新实现: {new_time:.2f}s")
+        print(f"加速比: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
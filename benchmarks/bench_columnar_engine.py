@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+列式分析引擎一致性校验和基准
+
+生成两个月的合成数据（含已删除的玩家和战斗记录、未解析到玩家的名称、玩家分组、
+祝福），对排名、三神统计、势力统计、势力/分组击杀明细和每日趋势逐一比较
+ANALYTICS_BACKEND=sql 与 numpy 的结果，并输出两种后端的耗时。随后入库一批新日志
+（增量追加）、修改一名玩家的名称（已加载记录被修改，整表重新加载），再校验一次。
+
+SQL 中 ORDER BY 并列的行顺序不确定，列表按完整排序键规范化后再比较；LIMIT 取足够大，
+避免并列导致截断的成员不同。
+
+需要安装 NumPy。默认使用临时 SQLite 文件，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向
+测试用 MySQL（会清空其中的 person、player_group、battle_record、player_daily_stats、kill_pair_daily 表）。
+
+用法: python benchmarks/bench_columnar_engine.py [每天击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    # 仪表盘等查询可能在其他线程中执行，内存 SQLite 无法跨连接共享，使用临时文件
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_columnar.db')
+
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily  # noqa: E402
+from app.services import battle_service, data_service, columnar_engine  # noqa: E402
+from app.services.stats_service import rebuild_player_daily_stats, rebuild_kill_pair_daily  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records, save_battle_log_to_db  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+START = datetime(2025, 3, 1)
+DAYS = 60
+
+RANGES = [
+    (START, START + timedelta(days=DAYS)),
+    (datetime(2025, 3, 10, 20, 30), datetime(2025, 3, 24, 21, 15, 59)),
+    (datetime(2025, 4, 2, 0, 0), datetime(2025, 4, 2, 23, 59, 59)),
+    (datetime(2025, 4, 2, 19, 0), datetime(2025, 4, 2, 22, 0)),
+]
+
+
+def build_dataset(kills_per_day, seed=20250301):
+    rnd = random.Random(seed)
+    persons = []
+    for god in GODS:
+        for idx in range(150):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS),
+                            'group': rnd.randrange(40) if rnd.random() < 0.4 else None,
+                            'deleted': rnd.random() < 0.05})
+    # 未录入 person 表的名称，入库后 person id 为空
+    names = [p['name'] for p in persons] + [f'路人{idx}' for idx in range(30)]
+    rows = []
+    for day in range(DAYS):
+        evening = START + timedelta(days=day, hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.sample(names, 2)
+            publish_at = evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600))
+            rows.append((win, lost, publish_at, rnd.random() < 0.2, rnd.random() < 0.01))
+    return persons, rows
+
+
+def load_dataset(persons, rows):
+    for model in (KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    groups = [PlayerGroup(group_name=f'分组{idx:02d}') for idx in range(40)]
+    db.session.add_all(groups)
+    db.session.flush()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     deleted_at=datetime.now() if person['deleted'] else None,
+                     player_group_id=groups[person['group']].id if person['group'] is not None else None)
+        db.session.add(obj)
+        db.session.flush()
+        person_ids[person['name']] = obj.id
+    bulk_insert_battle_records([{
+        'win': win,
+        'lost': lost,
+        'win_person_id': person_ids.get(win),
+        'lost_person_id': person_ids.get(lost),
+        'position': f'{random.randint(0, 999)},{random.randint(0, 999)}',
+        'remark': 1 if blessed else 0,
+        'publish_at': publish_at,
+        'deleted_at': datetime.now() if deleted else None
+    } for win, lost, publish_at, blessed, deleted in rows])
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    db.session.commit()
+
+
+def canonical_rankings(rankings):
+    return sorted(rankings, key=lambda r: (-r['score'], -r['kills'], r['deaths'], r['id']))
+
+
+def canonical_gods(stats):
+    return {
+        god: dict(data, players=sorted(data['players'], key=lambda p: (-p['kills'], p['deaths'], -p['bless'], p['name'], str(p['job']))))
+        for god, data in stats.items()
+    }
+
+
+def canonical_details(details):
+    return sorted(details, key=lambda d: (-d['count'], d['id']))
+
+
+def build_checks():
+    """(名称, 调用函数, 规范化函数)"""
+    checks = [('faction_statistics', lambda: battle_service.get_faction_statistics.__wrapped__(), None)]
+    for start, end in RANGES:
+        label = f'{start:%m-%d %H:%M}~{end:%m-%d %H:%M}'
+        checks += [
+            (f'rankings {label}',
+             lambda s=start, e=end: battle_service.get_player_rankings.__wrapped__(start_datetime=s, end_datetime=e),
+             canonical_rankings),
+            (f'rankings 比湿奴/奶 {label}',
+             lambda s=start, e=end: battle_service.get_player_rankings.__wrapped__('比湿奴', '奶', start_datetime=s, end_datetime=e),
+             canonical_rankings),
+        ]
+        for grouped in (False, True):
+            checks.append((f'gods_stats grouped={grouped} {label}',
+                           lambda s=start, e=end, g=grouped: battle_service.get_gods_stats.__wrapped__(s, e, g),
+                           canonical_gods))
+        for direction in ('out', 'in'):
+            checks += [
+                (f'faction_kill_details {direction} {label}',
+                 lambda s=start, e=end, d=direction: battle_service.get_faction_kill_details.__wrapped__(
+                     '梵天', d, None, s, e, limit=10000),
+                 canonical_details),
+                (f'group_kill_details {direction} {label}',
+                 lambda s=start, e=end, d=direction: battle_service.get_group_kill_details.__wrapped__(
+                     '分组07', d, None, s, e, limit=10000),
+                 canonical_details),
+            ]
+        for metric, func in (('kills', data_service.get_daily_kills_by_player),
+                             ('deaths', data_service.get_daily_deaths_by_player),
+                             ('scores', data_service.get_daily_scores_by_player)):
+            checks.append((f'daily_{metric} {label}',
+                           lambda f=func, s=start, e=end: f.__wrapped__('custom', 10000, f'{s:%Y-%m-%d}', f'{e:%Y-%m-%d}'),
+                           None))
+    return checks
+
+
+def run_checks(app, checks):
+    """逐项比较两种后端，返回 (不一致项数, SQL 总耗时, NumPy 总耗时)"""
+    mismatches = 0
+    sql_total = 0.0
+    numpy_total = 0.0
+    for name, call, canonical in checks:
+        app.config['ANALYTICS_BACKEND'] = 'sql'
+        started = time.perf_counter()
+        expected = call()
+        sql_total += time.perf_counter() - started
+
+        app.config['ANALYTICS_BACKEND'] = 'numpy'
+        started = time.perf_counter()
+        actual = call()
+        numpy_total += time.perf_counter() - started
+
+        if canonical:
+            expected, actual = canonical(expected), canonical(actual)
+        if expected != actual:
+            mismatches += 1
+            print(f"  不一致: {name}")
+            print(f"    sql:   {str(expected)[:300]}")
+            print(f"    numpy: {str(actual)[:300]}")
+    return mismatches, sql_total, numpy_total
+
+
+def main():
+    if not columnar_engine.columnar_available():
+        print("未安装 NumPy，无法运行")
+        sys.exit(1)
+
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    persons, rows = build_dataset(kills_per_day)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        load_dataset(persons, rows)
+        columnar_engine.reset_columnar_store()
+        print(f"数据库: {db.engine.url.drivername}，玩家 {len(persons)} 名，战斗记录 {len(rows)} 条")
+
+        started = time.perf_counter()
+        columnar_engine.get_store()
+        print(f"列式数据首次加载: {time.perf_counter() - started:.2f}s")
+
+        checks = build_checks()
+        failed = 0
+        for stage in ('初始数据', '增量入库后', '玩家改名后'):
+            if stage == '增量入库后':
+                rnd = random.Random(7)
+                names = [p['name'] for p in persons]
+                battle_details = []
+                for idx in range(500):
+                    win, lost = rnd.sample(names, 2)
+                    battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 1, 'y_coord': 2,
+                                           'timestamp': datetime(2025, 3, 15, 20, 0) + timedelta(seconds=idx)})
+                blessings = [{'player_name': d['killer_name'], 'blessing_name': '梵天', 'timestamp': d['timestamp']}
+                             for d in battle_details[::4]]
+                save_battle_log_to_db(battle_details, blessings)
+            elif stage == '玩家改名后':
+                person = Person.query.filter_by(name='梵天001').first()
+                person.name = '梵天001改'
+                db.session.flush()
+                battle_service.resolve_battle_record_person_ids(['梵天001', '梵天001改'])
+                db.session.commit()
+
+            mismatches, sql_time, numpy_time = run_checks(app, checks)
+            failed += mismatches
+            print(f"[{stage}] {len(checks)} 项，不一致 {mismatches} 项；SQL {sql_time:.2f}s，NumPy {numpy_time:.2f}s"
+                  f"（含刷新），加速比 {sql_time / numpy_time:.1f}x")
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
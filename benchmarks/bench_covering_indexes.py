@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+覆盖索引（迁移 0002_covering_indexes）前后的查询耗时
+
+生成一年的合成战斗记录（默认 500 万条，含已删除的记录和未解析到玩家的名称）和
+3000 名玩家，先执行全部迁移再去掉 0002 的索引作为“优化前”，逐项运行 battle_service
+等处的统计查询；随后创建 0002 的索引并 ANALYZE，再运行一次，输出每项查询前后的耗时
+（各运行 3 次取中位数）和加速比。
+
+查询的时间窗口取晚间不足一天的时段（19:00~22:00），整天部分读汇总表，
+这里测的是直接扫描 battle_record 的部分。
+
+默认使用临时 SQLite 文件；可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会清空其中的 person、player_group、battle_record、player_daily_stats、kill_pair_daily 表）。
+
+用法: python benchmarks/bench_covering_indexes.py [战斗记录条数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_covering_indexes.db')
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily  # noqa: E402
+from app.services import battle_service  # noqa: E402
+from app.services.stats_service import rebuild_player_daily_stats, rebuild_kill_pair_daily, battle_record_day_range  # noqa: E402
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+from app.utils.time_range import time_window_condition  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+PLAYERS = 3000
+START = datetime(2025, 1, 1)
+DAYS = 365
+INSERT_CHUNK_SIZE = 100000
+REPEAT = 3
+
+COVERING_MIGRATION = '0002'
+
+# 分组成员战绩（routes/api_battle.py 分组详情中按名称关联的查询）
+GROUP_MEMBERS_SQL = """
+    SELECT
+        p.id,
+        p.name,
+        p.job,
+        p.god,
+        COUNT(DISTINCT CASE WHEN br.win = p.name THEN br.id END) AS kills,
+        COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) AS deaths,
+        SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) AS bless
+    FROM
+        person p
+    LEFT JOIN
+        battle_record br ON (br.win = p.name OR br.lost = p.name) {date_condition}
+    WHERE
+        p.deleted_at IS NULL
+        AND p.player_group_id = :group_id
+    GROUP BY
+        p.id, p.name, p.job, p.god
+    ORDER BY
+        kills DESC, deaths ASC
+"""
+
+
+def load_dataset(record_count, seed=20250101):
+    for model in (KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    rnd = random.Random(seed)
+    groups = [PlayerGroup(group_name=f'分组{idx:03d}') for idx in range(300)]
+    db.session.add_all(groups)
+    db.session.flush()
+
+    persons = [Person(name=f'{GODS[idx % 3]}{idx:04d}', god=GODS[idx % 3], job=rnd.choice(JOBS),
+                      deleted_at=datetime.now() if rnd.random() < 0.05 else None,
+                      player_group_id=rnd.choice(groups).id if rnd.random() < 0.3 else None)
+               for idx in range(PLAYERS)]
+    db.session.add_all(persons)
+    db.session.flush()
+    person_ids = {person.name: person.id for person in persons}
+    names = list(person_ids) + [f'路人{idx}' for idx in range(200)]
+    weights = [1.0 / (rank + 1) ** 0.5 for rank in range(len(names))]
+    db.session.commit()
+
+    # 分块生成并写入，避免一次性占用大量内存
+    inserted = 0
+    while inserted < record_count:
+        size = min(INSERT_CHUNK_SIZE, record_count - inserted)
+        wins = rnd.choices(names, weights, k=size)
+        losts = rnd.choices(names, weights, k=size)
+        rows = []
+        for win, lost in zip(wins, losts):
+            day = rnd.randrange(DAYS)
+            rows.append({
+                'win': win,
+                'lost': lost,
+                'win_person_id': person_ids.get(win),
+                'lost_person_id': person_ids.get(lost),
+                'position': f'{rnd.randint(0, 999)},{rnd.randint(0, 999)}',
+                'remark': 1 if rnd.random() < 0.2 else 0,
+                'publish_at': START + timedelta(days=day, hours=20, seconds=rnd.randint(-6 * 3600, 3 * 3600)),
+                'deleted_at': datetime.now() if rnd.random() < 0.01 else None
+            })
+        bulk_insert_battle_records(rows)
+        db.session.commit()
+        inserted += size
+        print(f"  已写入 {inserted} 条", end='\r', flush=True)
+    print()
+    return [group.id for group in groups[:20]], [person.name for person in persons[:200]]
+
+
+def analyze():
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(text('ANALYZE TABLE battle_record, person'))
+    else:
+        db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def build_cases(group_ids, player_names):
+    """(名称, 调用函数)"""
+    day = START + timedelta(days=200)
+    start, end = day.replace(hour=19), day.replace(hour=22)
+    date_condition, window_params = time_window_condition('br.publish_at', start, end)
+    group_sql = text(GROUP_MEMBERS_SQL.format(date_condition=date_condition))
+
+    def rebuild_one_day():
+        rebuild_player_daily_stats(day.date(), day.date() + timedelta(days=1))
+        rebuild_kill_pair_daily(day.date(), day.date() + timedelta(days=1))
+        db.session.rollback()
+
+    return [
+        ('排名（不足一天）', lambda: battle_service.get_player_rankings.__wrapped__(start_datetime=start, end_datetime=end)),
+        ('三神统计（不足一天）', lambda: battle_service.get_gods_stats.__wrapped__(start, end, False)),
+        ('势力统计（全部记录）', lambda: battle_service.get_faction_statistics.__wrapped__()),
+        ('势力击杀明细（不足一天）', lambda: battle_service.get_faction_kill_details.__wrapped__('梵天', 'out', None, start, end)),
+        ('重建一天的汇总', rebuild_one_day),
+        ('战斗记录日期范围', battle_record_day_range),
+        ('分组成员战绩 x20（按名称）', lambda: [
+            db.session.execute(group_sql, dict(window_params, group_id=group_id)).fetchall() for group_id in group_ids
+        ]),
+        ('按名称查找玩家 x200', lambda: [
+            db.session.execute(text("SELECT id, god, job FROM person WHERE name = :name AND deleted_at IS NULL"),
+                               {'name': name}).fetchall()
+            for name in player_names
+        ]),
+        ('势力职业成员 x15', lambda: [
+            db.session.execute(text("SELECT id, name FROM person WHERE god = :god AND deleted_at IS NULL AND job = :job"),
+                               {'god': god, 'job': job}).fetchall()
+            for god in GODS for job in JOBS if job
+        ] + [db.session.execute(text("SELECT id FROM person WHERE god = :god"), {'god': god}).fetchall() for god in GODS]),
+    ]
+
+
+def run_cases(cases):
+    """每项运行 REPEAT 次取中位数，返回 {名称: 秒}"""
+    timings = {}
+    for name, call in cases:
+        samples = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - started)
+        timings[name] = sorted(samples)[REPEAT // 2]
+    return timings
+
+
+def main():
+    record_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        covering = next(m for m in migrations.load_migrations() if m.version == COVERING_MIGRATION)
+        covering.module.downgrade()
+        db.session.commit()
+
+        started = time.perf_counter()
+        group_ids, player_names = load_dataset(record_count)
+        analyze()
+        print(f"数据库: {db.engine.url.drivername}，玩家 {PLAYERS} 名，战斗记录 {record_count} 条，"
+              f"生成耗时 {time.perf_counter() - started:.1f}s")
+
+        cases = build_cases(group_ids, player_names)
+        before = run_cases(cases)
+
+        started = time.perf_counter()
+        covering.module.upgrade()
+        db.session.commit()
+        analyze()
+        print(f"创建 {COVERING_MIGRATION} 覆盖索引耗时 {time.perf_counter() - started:.1f}s")
+        after = run_cases(cases)
+
+        print(f"{'查询':<24}{'优化前':>10}{'优化后':>10}{'加速比':>8}")
+        for name, _ in cases:
+            print(f"{name:<24}{before[name] * 1000:>8.1f}ms{after[name] * 1000:>8.1f}ms{before[name] / after[name]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
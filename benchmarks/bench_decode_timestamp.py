@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+时间戳解析微基准
+
+从战斗日志中提取每个事件行的时间戳字符串（按日志顺序，保留同一秒的突发），
+分别用旧版 split + 6 次 int() + datetime() 的实现和带缓存的 decode_timestamp
+逐条解析，校验结果一致后输出每行耗时。
+
+默认测两份合成日志：普通日志（平均每秒 1~2 条事件）和团战日志（每秒 20~60 条事件
+的突发），也可以传入真实日志文件路径。
+
+用法: python benchmarks/bench_decode_timestamp.py [日志文件]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.encoding_resolver import decode_log_file  # noqa: E402
+from app.utils.log_parser import KILL_PATTERN, BLESSING_PATTERN, decode_timestamp  # noqa: E402
+from bench_parse_battle_log import build_synthetic_log  # noqa: E402
+
+ROUNDS = 5
+
+
+def legacy_decode_timestamp(timestamp_str):
+    """优化前的实现，作为对照组"""
+    date_part, time_part = timestamp_str.split(',')
+    hour, minute, second = map(int, time_part.split(':'))
+    return datetime(int(date_part[0:4]), int(date_part[4:6]), int(date_part[6:8]), hour, minute, second)
+
+
+def build_burst_log(total_events, seed=20250402):
+    """生成团战日志：每场团战持续数十秒，每秒 20~60 条击杀/祝福，团战之间间隔数分钟"""
+    rnd = random.Random(seed)
+    ts = datetime(2025, 4, 2, 19, 0, 0)
+    lines = []
+    while len(lines) < total_events:
+        ts += timedelta(minutes=rnd.randint(1, 10))
+        for _ in range(rnd.randint(10, 60)):
+            ts += timedelta(seconds=1)
+            stamp = ts.strftime('%Y%m%d,%H:%M:%S')
+            for _ in range(rnd.randint(20, 60)):
+                if rnd.random() < 0.8:
+                    lines.append(f'[战况]玩家A 击杀 玩家B !坐标:{rnd.randint(0, 999)}，{rnd.randint(0, 999)}  ({stamp})')
+                else:
+                    lines.append(f'[公告]  玩家A 得到了 梵天 的祝福! ({stamp})')
+    return '\r\n'.join(lines[:total_events])
+
+
+def extract_timestamps(content):
+    """按日志顺序提取事件行的时间戳字符串"""
+    timestamps = []
+    for line in content.split('\n'):
+        match = KILL_PATTERN.search(line)
+        if match:
+            timestamps.append(match.group(5))
+            continue
+        match = BLESSING_PATTERN.search(line)
+        if match:
+            timestamps.append(match.group(3))
+    return timestamps
+
+
+def measure(func, timestamps, before_round=None):
+    """多轮取最快一轮，返回 (结果, 每行纳秒)"""
+    best = None
+    result = None
+    for _ in range(ROUNDS):
+        if before_round:
+            before_round()
+        start = time.perf_counter()
+        result = [func(ts) for ts in timestamps]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best / len(timestamps) * 1e9
+
+
+def run(name, content):
+    timestamps = extract_timestamps(content)
+    distinct = len(set(timestamps))
+    print(f"[{name}] 事件行 {len(timestamps)} 条，不同时间戳 {distinct} 个，平均每秒 {len(timestamps) / max(distinct, 1):.1f} 条事件")
+
+    legacy_result, legacy_ns = measure(legacy_decode_timestamp, timestamps)
+    # 每轮清空缓存，测的是从冷缓存开始解析整份日志的成本
+    new_result, new_ns = measure(decode_timestamp, timestamps, before_round=decode_timestamp.cache_clear)
+
+    if legacy_result != new_result:
+        print("解析结果不一致！")
+        sys.exit(1)
+
+    print(f"  旧实现: {legacy_ns:.0f} ns/行")
+    print(f"  新实现: {new_ns:.0f} ns/行 (缓存命中率 {decode_timestamp.cache_info().hits / len(timestamps):.0%})")
+    print(f"  加速比: {legacy_ns / new_ns:.1f}x")
+
+
+def main():
+    if len(sys.argv) > 1:
+        content, encoding = decode_log_file(sys.argv[1])
+        run(f"{sys.argv[1]} ({encoding})", content)
+    else:
+        run("普通日志", build_synthetic_log(1_000_000))
+        run("团战日志", build_burst_log(200_000))
+
+
+if __name__ == '__main__':
+    main()
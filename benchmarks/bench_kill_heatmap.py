@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+击杀热力图汇总表一致性校验和基准
+
+生成两个月的合成数据（只有 position 字符串，含已删除的战斗记录和未解析到玩家的名称），
+先回填 x_coord / y_coord 并重建 kill_heatmap_daily，再对不同时间窗口、势力和网格边长
+比较旧做法（取回窗口内全部击杀记录，在内存中解析 position 后分格计数）和
+get_kill_heatmap（整天部分读汇总表）的结果，并输出两者的耗时。
+随后依次入库一批新日志（增量累加）、修改一名玩家的名称（按差值调整）、修改一名玩家的势力
+（move_person_faction）后各校验一次，最后全量重建汇总表，校验与增量维护的结果逐行一致。
+
+默认使用临时 SQLite 文件，表结构和索引由 db/migrations 创建；可通过环境变量
+SQLALCHEMY_DATABASE_URI 指向测试用 MySQL（会清空其中的 person、player_group、
+battle_record、player_daily_stats、kill_pair_daily、kill_heatmap_daily 表）。
+
+用法: python benchmarks/bench_kill_heatmap.py [每天击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_kill_heatmap.db')
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily  # noqa: E402
+from app.services import battle_service  # noqa: E402
+from app.services.stats_service import (  # noqa: E402
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily, move_person_faction
+)
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records, save_battle_log_to_db  # noqa: E402
+from app.utils.time_range import time_window_condition  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+START = datetime(2025, 3, 1)
+DAYS = 60
+
+RANGES = [
+    (None, None),
+    (START + timedelta(days=30), START + timedelta(days=DAYS)),
+    (datetime(2025, 3, 10, 20, 30), datetime(2025, 3, 24, 21, 16)),
+    (datetime(2025, 4, 2, 19, 0), datetime(2025, 4, 2, 22, 0)),
+]
+FACTIONS = [None, '梵天']
+CELL_SIZES = [10, 50]
+
+
+def build_dataset(kills_per_day, seed=20250301):
+    rnd = random.Random(seed)
+    persons = []
+    for god in GODS:
+        for idx in range(150):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS),
+                            'deleted': rnd.random() < 0.05})
+    names = [p['name'] for p in persons] + [f'路人{idx}' for idx in range(30)]
+    # 击杀集中在几个据点附近
+    hotspots = [(rnd.randint(100, 900), rnd.randint(100, 900)) for _ in range(8)]
+    rows = []
+    for day in range(DAYS):
+        evening = START + timedelta(days=day, hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.sample(names, 2)
+            center_x, center_y = rnd.choice(hotspots)
+            x = min(max(int(rnd.gauss(center_x, 60)), 0), 999)
+            y = min(max(int(rnd.gauss(center_y, 60)), 0), 999)
+            publish_at = evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600))
+            rows.append((win, lost, f'{x},{y}', publish_at, rnd.random() < 0.01))
+    return persons, rows
+
+
+def load_dataset(persons, rows):
+    for model in (KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     deleted_at=datetime.now() if person['deleted'] else None)
+        db.session.add(obj)
+        db.session.flush()
+        person_ids[person['name']] = obj.id
+    # 与迁移前的历史数据一样只有 position，坐标由回填解析
+    bulk_insert_battle_records([{
+        'win': win,
+        'lost': lost,
+        'win_person_id': person_ids.get(win),
+        'lost_person_id': person_ids.get(lost),
+        'position': position,
+        'remark': 0,
+        'publish_at': publish_at,
+        'deleted_at': datetime.now() if deleted else None
+    } for win, lost, position, publish_at, deleted in rows])
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    db.session.commit()
+
+
+def legacy_heatmap(faction, start, end, cell_size):
+    """旧做法：取回窗口内的击杀记录和双方势力，在内存中解析 position 后分格计数"""
+    date_condition, params = time_window_condition('br.publish_at', start, end)
+    rows = db.session.execute(text(f"""
+        SELECT br.position, k.god AS killer_god, v.god AS victim_god
+        FROM battle_record br
+        LEFT JOIN person k ON k.id = br.win_person_id
+        LEFT JOIN person v ON v.id = br.lost_person_id
+        WHERE br.deleted_at IS NULL AND br.position IS NOT NULL
+          {date_condition}
+    """), params)
+    cells = {}
+    for row in rows:
+        x, y = (int(value) for value in row.position.split(','))
+        cell = (x - x % cell_size, y - y % cell_size)
+        for god, index in ((row.killer_god, 0), (row.victim_god, 1)):
+            if god is None or (faction is not None and god != faction):
+                continue
+            cells.setdefault((god,) + cell, [0, 0])[index] += 1
+    return sorted((x, y, god, kills, deaths) for (god, x, y), (kills, deaths) in cells.items())
+
+
+def new_heatmap(faction, start, end, cell_size):
+    result = battle_service.get_kill_heatmap.__wrapped__(faction, None, start, end - timedelta(seconds=1) if end else None,
+                                                          cell_size)
+    return sorted((cell['x'], cell['y'], cell['god'], cell['kills'], cell['deaths']) for cell in result['cells'])
+
+
+def run_checks():
+    """逐项比较，返回 (项数, 不一致项数, 旧做法总耗时, 新实现总耗时)"""
+    checks = 0
+    mismatches = 0
+    legacy_total = 0.0
+    new_total = 0.0
+    for start, end in RANGES:
+        if start is None:
+            # get_kill_heatmap 的自定义区间需要起止时间都给出，全部时间用足够宽的区间
+            start, end = START - timedelta(days=365), START + timedelta(days=DAYS + 365)
+        for faction in FACTIONS:
+            for cell_size in CELL_SIZES:
+                checks += 1
+                started = time.perf_counter()
+                expected = legacy_heatmap(faction, start, end, cell_size)
+                legacy_total += time.perf_counter() - started
+
+                started = time.perf_counter()
+                actual = new_heatmap(faction, start, end, cell_size)
+                new_total += time.perf_counter() - started
+
+                if expected != actual:
+                    mismatches += 1
+                    print(f"  不一致: {faction or '全部势力'} {start:%m-%d %H:%M}~{end:%m-%d %H:%M} 网格 {cell_size}")
+                    print(f"    旧: {str(expected)[:300]}")
+                    print(f"    新: {str(actual)[:300]}")
+    return checks, mismatches, legacy_total, new_total
+
+
+def heatmap_rows():
+    return sorted(
+        (str(row.stat_date), row.god, row.cell_x, row.cell_y, row.kills, row.deaths)
+        for row in db.session.query(KillHeatmapDaily.stat_date, KillHeatmapDaily.god, KillHeatmapDaily.cell_x,
+                                    KillHeatmapDaily.cell_y, KillHeatmapDaily.kills, KillHeatmapDaily.deaths)
+    )
+
+
+def main():
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    persons, rows = build_dataset(kills_per_day)
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        load_dataset(persons, rows)
+
+        failed = 0
+        started = time.perf_counter()
+        updated = battle_service.backfill_battle_record_coordinates()
+        backfill_time = time.perf_counter() - started
+        parsed = db.session.query(BattleRecord.position, BattleRecord.x_coord, BattleRecord.y_coord).all()
+        same = all(position == f'{x},{y}' for position, x, y in parsed)
+        failed += not same
+        print(f"[回填坐标] {updated} 条，耗时 {backfill_time:.2f}s，与 position {'一致' if same else '不一致'}")
+
+        started = time.perf_counter()
+        rebuild_kill_heatmap_daily()
+        db.session.commit()
+        print(f"数据库: {db.engine.url.drivername}，战斗记录 {len(rows)} 条，热力图汇总 {KillHeatmapDaily.query.count()} 行，"
+              f"重建耗时 {time.perf_counter() - started:.2f}s")
+
+        for stage in ('初始数据', '增量入库后', '玩家改名后', '玩家换势力后'):
+            if stage == '增量入库后':
+                rnd = random.Random(7)
+                names = [p['name'] for p in persons] + ['路人0']
+                battle_details = []
+                for idx in range(2000):
+                    win, lost = rnd.sample(names, 2)
+                    battle_details.append({'killer_name': win, 'victim_name': lost,
+                                           'x_coord': rnd.randint(0, 999), 'y_coord': rnd.randint(0, 999),
+                                           'timestamp': datetime(2025, 3, 15, 20, 0) + timedelta(seconds=idx)})
+                save_battle_log_to_db(battle_details, [])
+            elif stage == '玩家改名后':
+                # 改成未解析到玩家的名称：旧名称的记录不再计入，路人的记录归属该玩家
+                person = Person.query.filter_by(name='比湿奴000').first()
+                person.name = '路人3'
+                db.session.flush()
+                battle_service.resolve_battle_record_person_ids(['比湿奴000', '路人3'])
+                db.session.commit()
+            elif stage == '玩家换势力后':
+                person = Person.query.filter_by(name='湿婆010').first()
+                old_god = person.god
+                person.god = '梵天'
+                move_person_faction(person.id, old_god, person.god)
+                db.session.commit()
+
+            checks, mismatches, legacy_time, new_time = run_checks()
+            failed += mismatches
+            print(f"[{stage}] {checks} 项，不一致 {mismatches} 项；旧做法 {legacy_time:.2f}s，"
+                  f"新实现 {new_time:.2f}s，加速比 {legacy_time / new_time:.1f}x")
+
+        # 重建路径：全量重建的结果应与增量维护的完全一致
+        maintained = heatmap_rows()
+        rebuild_kill_heatmap_daily()
+        db.session.commit()
+        rebuilt = heatmap_rows()
+        same = maintained == rebuilt
+        failed += not same
+        print(f"[重建] {len(rebuilt)} 行，与增量维护的结果{'一致' if same else '不一致'}")
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
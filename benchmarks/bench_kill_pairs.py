@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+击杀对汇总表一致性校验和基准
+
+生成两个月的合成数据（含已删除的玩家和战斗记录、未解析到玩家的名称、同名玩家、玩家分组），
+对势力/分组击杀明细、玩家击杀/被杀明细逐一比较旧实现（battle_record 关联 person 两次
+现场聚合）和新实现（kill_pair_daily 按天求和后取前 N 名）的结果，并输出两者的耗时。
+随后入库一批新日志（增量累加）、修改一名玩家的名称（重新汇总相关玩家）再校验一次，
+最后按日期分批重建 kill_pair_daily，校验与增量维护的结果逐行一致。
+
+次数并列的对手在 SQL 中没有确定顺序，列表按 (-次数, id) 规范化后再比较；
+LIMIT 截断处并列的成员可能不同，只比较个数和次数。
+
+默认使用临时 SQLite 文件，表结构和索引由 db/migrations 创建；可通过环境变量
+SQLALCHEMY_DATABASE_URI 指向测试用 MySQL（会清空其中的 person、player_group、
+battle_record、player_daily_stats、kill_pair_daily 表）。
+
+用法: python benchmarks/bench_kill_pairs.py [每天击杀数]
+
+tests/test_kill_pair_daily.py 以较小的规模运行同样的校验并断言结果一致。
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_kill_pairs.db')
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily  # noqa: E402
+from app.services import battle_service  # noqa: E402
+from app.services.stats_service import rebuild_player_daily_stats, rebuild_kill_pair_daily  # noqa: E402
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records, save_battle_log_to_db  # noqa: E402
+from app.utils.time_range import time_window_condition  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+START = datetime(2025, 3, 1)
+DAYS = 60
+LIMIT = 100
+
+RANGES = [
+    (None, None),
+    (START + timedelta(days=30), START + timedelta(days=DAYS)),
+    (datetime(2025, 3, 10, 20, 30), datetime(2025, 3, 24, 21, 16)),
+    (datetime(2025, 4, 2, 0, 0), datetime(2025, 4, 3, 0, 0)),
+    (datetime(2025, 4, 2, 19, 0), datetime(2025, 4, 2, 22, 0)),
+]
+
+
+def build_dataset(kills_per_day, seed=20250301):
+    rnd = random.Random(seed)
+    persons = []
+    for god in GODS:
+        for idx in range(150):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS),
+                            'group': rnd.randrange(40) if rnd.random() < 0.4 else None,
+                            'deleted': rnd.random() < 0.05})
+    # 同名的已删除玩家
+    persons.append({'name': '梵天001', 'god': '湿婆', 'job': '狂', 'group': None, 'deleted': True})
+    names = [p['name'] for p in persons[:450]] + [f'路人{idx}' for idx in range(30)]
+    weights = [1.0 / (rank + 1) ** 0.6 for rank in range(len(names))]
+    rows = []
+    for day in range(DAYS):
+        evening = START + timedelta(days=day, hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.choices(names, weights, k=2)
+            publish_at = evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600))
+            rows.append((win, lost, publish_at, rnd.random() < 0.2, rnd.random() < 0.01))
+    return persons, rows
+
+
+def load_dataset(persons, rows):
+    for model in (KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    groups = [PlayerGroup(group_name=f'分组{idx:02d}') for idx in range(40)]
+    db.session.add_all(groups)
+    db.session.flush()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     deleted_at=datetime.now() if person['deleted'] else None,
+                     player_group_id=groups[person['group']].id if person['group'] is not None else None)
+        db.session.add(obj)
+        db.session.flush()
+        # 与入库时一致：同名时取 id 最大的玩家
+        person_ids[person['name']] = obj.id
+    bulk_insert_battle_records([{
+        'win': win,
+        'lost': lost,
+        'win_person_id': person_ids.get(win),
+        'lost_person_id': person_ids.get(lost),
+        'position': '100,100',
+        'remark': 1 if blessed else 0,
+        'publish_at': publish_at,
+        'deleted_at': datetime.now() if deleted else None
+    } for win, lost, publish_at, blessed, deleted in rows])
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    db.session.commit()
+
+
+def legacy_kill_details(members_join, member_condition, params, direction, start, end, limit):
+    """
+    优化前 get_faction_kill_details / get_group_kill_details 的实现（两者只有成员条件不同，
+    时间区间改由参数传入），作为对照组
+    """
+    date_condition, date_params = time_window_condition('br.publish_at', start, end)
+    params = dict(params, **date_params)
+    member, target = ('k', 'v') if direction == 'out' else ('v', 'k')
+
+    sql = f"""
+    SELECT
+        {target}.id AS target_id,
+        {target}.name AS target_name,
+        {target}.job AS target_job,
+        {target}.god AS target_god,
+        COUNT(*) AS cnt
+    FROM battle_record br
+    JOIN person k ON k.id = br.win_person_id
+    JOIN person v ON v.id = br.lost_person_id
+    {members_join.format(member=member)}
+    WHERE {member_condition.format(member=member)}
+      AND br.deleted_at IS NULL
+      {date_condition}
+    GROUP BY {target}.id, {target}.name, {target}.job, {target}.god
+    ORDER BY cnt DESC
+    {'' if limit is None else f'LIMIT {int(limit)}'}
+    """
+
+    rows = db.session.execute(text(sql), params).fetchall()
+    return [
+        {
+            'id': r.target_id,
+            'name': r.target_name,
+            'job': r.target_job,
+            'god': r.target_god,
+            'count': int(r.cnt or 0)
+        }
+        for r in rows
+    ]
+
+
+def legacy_faction(faction, direction, start, end, limit=LIMIT):
+    return legacy_kill_details('', '{member}.god = :faction', {'faction': faction}, direction, start, end, limit)
+
+
+def legacy_group(group_name, direction, start, end, limit=LIMIT):
+    return legacy_kill_details('JOIN player_group pg ON {member}.player_group_id = pg.id', 'pg.group_name = :group_name',
+                               {'group_name': group_name}, direction, start, end, limit)
+
+
+def legacy_player(player_name, direction, start, end):
+    return legacy_kill_details('', '{member}.name = :player_name', {'player_name': player_name}, direction, start, end, None)
+
+
+def canonical(details):
+    """按 (-次数, id) 排序；达到 LIMIT 时去掉截断处并列的成员，只比较个数和次数"""
+    boundary = min((d['count'] for d in details), default=0) if len(details) >= LIMIT else 0
+    return (
+        len(details),
+        sorted(d['count'] for d in details),
+        sorted(((-d['count'], d['id'], d['name'], d['job'], d['god']) for d in details if d['count'] > boundary),
+               key=lambda item: (item[0], item[1]))
+    )
+
+
+def build_checks():
+    """(名称, 旧实现, 新实现)"""
+    checks = []
+    for start, end in RANGES:
+        label = '全部时间' if start is None else f'{start:%m-%d %H:%M}~{end:%m-%d %H:%M}'
+        for direction in ('out', 'in'):
+            checks += [
+                (f'faction {direction} {label}',
+                 lambda s=start, e=end, d=direction: legacy_faction('梵天', d, s, e),
+                 lambda s=start, e=end, d=direction: battle_service.get_faction_kill_details.__wrapped__(
+                     '梵天', d, None, s, e, limit=LIMIT)),
+                (f'group {direction} {label}',
+                 lambda s=start, e=end, d=direction: legacy_group('分组07', d, s, e),
+                 lambda s=start, e=end, d=direction: battle_service.get_group_kill_details.__wrapped__(
+                     '分组07', d, None, s, e, limit=LIMIT)),
+            ]
+            for name in ('梵天001', '比湿奴000', '湿婆149'):
+                checks.append((
+                    f'player {name} {direction} {label}',
+                    lambda s=start, e=end, d=direction, n=name: legacy_player(n, d, s, e),
+                    lambda s=start, e=end, d=direction, n=name: battle_service._kill_details_from_pairs(
+                        d, "SELECT id FROM person WHERE name = :player_name", {'player_name': n}, s, e, None)
+                ))
+    return checks
+
+
+def run_checks(checks):
+    """逐项比较，返回 (不一致项数, 旧实现总耗时, 新实现总耗时)"""
+    mismatches = 0
+    legacy_total = 0.0
+    new_total = 0.0
+    for name, legacy, new in checks:
+        started = time.perf_counter()
+        expected = legacy()
+        legacy_total += time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = new()
+        new_total += time.perf_counter() - started
+
+        if canonical(expected) != canonical(actual):
+            mismatches += 1
+            print(f"  不一致: {name}")
+            print(f"    旧: {str(expected)[:300]}")
+            print(f"    新: {str(actual)[:300]}")
+    return mismatches, legacy_total, new_total
+
+
+def pair_rows():
+    return sorted(
+        (str(row.stat_date), row.killer_id, row.victim_id, row.kills)
+        for row in db.session.query(KillPairDaily.stat_date, KillPairDaily.killer_id,
+                                    KillPairDaily.victim_id, KillPairDaily.kills)
+    )
+
+
+def main():
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    persons, rows = build_dataset(kills_per_day)
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        load_dataset(persons, rows)
+        print(f"数据库: {db.engine.url.drivername}，玩家 {len(persons)} 名，战斗记录 {len(rows)} 条，"
+              f"击杀对汇总 {KillPairDaily.query.count()} 行")
+
+        checks = build_checks()
+        failed = 0
+        for stage in ('初始数据', '增量入库后', '玩家改名后'):
+            if stage == '增量入库后':
+                rnd = random.Random(7)
+                names = [p['name'] for p in persons]
+                battle_details = []
+                for idx in range(2000):
+                    win, lost = rnd.sample(names, 2)
+                    battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 1, 'y_coord': 2,
+                                           'timestamp': datetime(2025, 3, 15, 20, 0) + timedelta(seconds=idx)})
+                save_battle_log_to_db(battle_details, [])
+            elif stage == '玩家改名后':
+                person = Person.query.filter_by(name='比湿奴000').first()
+                person.name = '梵天001'
+                db.session.flush()
+                battle_service.resolve_battle_record_person_ids(['比湿奴000', '梵天001'])
+                db.session.commit()
+
+            mismatches, legacy_time, new_time = run_checks(checks)
+            failed += mismatches
+            print(f"[{stage}] {len(checks)} 项，不一致 {mismatches} 项；旧实现 {legacy_time:.2f}s，"
+                  f"新实现 {new_time:.2f}s，加速比 {legacy_time / new_time:.1f}x")
+
+        # 重建路径：按 31 天一批重建，结果应与增量维护的完全一致
+        maintained = pair_rows()
+        started = time.perf_counter()
+        KillPairDaily.query.delete()
+        batch_start = START.date()
+        while batch_start < (START + timedelta(days=DAYS)).date():
+            batch_end = batch_start + timedelta(days=31)
+            rebuild_kill_pair_daily(batch_start, batch_end)
+            batch_start = batch_end
+        db.session.commit()
+        rebuilt = pair_rows()
+        same = maintained == rebuilt
+        failed += not same
+        print(f"[重建] {len(rebuilt)} 行，耗时 {time.perf_counter() - started:.2f}s，"
+              f"与增量维护的结果{'一致' if same else '不一致'}")
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
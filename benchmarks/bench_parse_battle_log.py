@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+parse_battle_log 性能基准
+
+生成一份合成的 100 万行战斗日志，分别用旧版逐行 re.search 实现和
+新的前缀分类解析引擎解析，校验结果一致后输出每秒处理行数。
+
+用法: python benchmarks/bench_parse_battle_log.py [行数]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.file_parser import parse_battle_log  # noqa: E402
+
+PLAYERS = [f'玩家{i:03d}' for i in range(300)] + ['◆祐児◆耵℃', '★柠☆栀★', 'Quamx', 'PPA521']
+BLESSING_NAMES = ['梵天', '比湿奴', '湿婆']
+NOISE = [
+    '[聊天] {a}: 今晚八点集合',
+    '[系统] {a} 进入了游戏',
+    '[队伍] {a} 加入了队伍',
+    '[交易] {a} 与 {b} 完成交易',
+]
+
+
+def build_synthetic_log(total_lines, seed=20250402):
+    """生成合成日志：约 15% 击杀、5% 祝福、其余为聊天/系统噪声"""
+    rnd = random.Random(seed)
+    ts = datetime(2025, 4, 2, 19, 0, 0)
+    lines = []
+    for _ in range(total_lines):
+        # 战斗高峰期同一秒内会有多条事件
+        if rnd.random() < 0.3:
+            ts += timedelta(seconds=1)
+        stamp = ts.strftime('%Y%m%d,%H:%M:%S')
+        roll = rnd.random()
+        a, b = rnd.sample(PLAYERS, 2)
+        if roll < 0.15:
+            lines.append(f'[战况]{a} 击杀 {b} !坐标:{rnd.randint(0, 999)}，{rnd.randint(0, 999)}  ({stamp})')
+        elif roll < 0.20:
+            lines.append(f'[公告]  {a} 得到了 {rnd.choice(BLESSING_NAMES)} 的祝福! ({stamp})')
+        else:
+            lines.append(rnd.choice(NOISE).format(a=a, b=b))
+    return '\r\n'.join(lines)
+
+
+def legacy_parse_battle_log(log_content):
+    """优化前的实现（去掉日志输出），作为对照组"""
+    lines = log_content.strip().split('\n')
+    kill_pattern = r'\[战况\](.*?) 击杀 (.*?) !坐标:(\d+)，(\d+)  \((\d{8},\d{2}:\d{2}:\d{2})\)'
+    blessing_pattern = r'\[公告\]  (.*?) 得到了 (.*?) 的祝福! \((\d{8},\d{2}:\d{2}:\d{2})\)'
+    battle_details = []
+    blessings = []
+    for line in lines:
+        kill_match = re.search(kill_pattern, line)
+        if kill_match:
+            try:
+                date_part, time_part = kill_match.group(5).split(',')
+                hour, minute, second = map(int, time_part.split(':'))
+                timestamp = datetime(int(date_part[0:4]), int(date_part[4:6]), int(date_part[6:8]), hour, minute, second)
+                battle_details.append({
+                    'killer_name': kill_match.group(1).strip(),
+                    'victim_name': kill_match.group(2).strip(),
+                    'x_coord': int(kill_match.group(3)),
+                    'y_coord': int(kill_match.group(4)),
+                    'timestamp': timestamp
+                })
+                continue
+            except (ValueError, IndexError):
+                pass
+        blessing_match = re.search(blessing_pattern, line)
+        if blessing_match:
+            try:
+                date_part, time_part = blessing_match.group(3).split(',')
+                hour, minute, second = map(int, time_part.split(':'))
+                timestamp = datetime(int(date_part[0:4]), int(date_part[4:6]), int(date_part[6:8]), hour, minute, second)
+                blessings.append({
+                    'player_name': blessing_match.group(1).strip(),
+                    'blessing_name': blessing_match.group(2).strip(),
+                    'timestamp': timestamp
+                })
+                continue
+            except (ValueError, IndexError):
+                pass
+    return battle_details, blessings
+
+
+def run(func, content, total_lines):
+    start = time.perf_counter()
+    result = func(content)
+    elapsed = time.perf_counter() - start
+    return result, elapsed, total_lines / elapsed
+
+
+def main():
+    total_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"生成 {total_lines} 行合成日志...")
+    content = build_synthetic_log(total_lines)
+
+    legacy_result, legacy_time, legacy_rate = run(legacy_parse_battle_log, content, total_lines)
+    new_result, new_time, new_rate = run(parse_battle_log, content, total_lines)
+
+    if legacy_result != new_result:
+        print("解析结果不一致！")
+        sys.exit(1)
+
+    print(f"击杀 {len(new_result[0])} 条，祝福 {len(new_result[1])} 条，结果一致")
+    print(f"旧实现: {legacy_time:.2f}s, {legacy_rate:,.0f} 行/秒")
+    print(f"新实现: {new_time:.2f}s, {new_rate:,.0f} 行/秒")
+    print(f"加速比: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
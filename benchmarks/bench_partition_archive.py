@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+battle_record 冷数据归档和恢复的一致性校验
+
+生成 8 个月的合成数据（含已删除的记录和未解析到玩家的名称），按 3 个整月的保留范围
+轮换归档，校验：
+
+- 归档后整天范围的统计（排名、三神统计、势力击杀明细）与归档前一致（汇总表保留）
+- 归档后玩家改名触发重新汇总、全量重建汇总，都不会清掉已归档月份的汇总
+- 恢复后 battle_record 的明细逐行一致，汇总表与从明细全量重建的结果一致
+
+并输出归档、恢复的耗时和归档前后统计查询的耗时。
+
+默认使用临时 SQLite 文件（没有分区，按时间范围删除明细）；可通过环境变量
+SQLALCHEMY_DATABASE_URI 指向测试用 MySQL（会把 battle_record 转换为分区表，并清空其中的
+person、player_group、battle_record、player_daily_stats、kill_pair_daily、kill_heatmap_daily、
+kill_timeline_minute、battle_record_archive 表）。
+
+用法: python benchmarks/bench_partition_archive.py [每天击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_partition_archive.db')
+
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute  # noqa: E402
+from app.models.archive import BattleRecordArchive  # noqa: E402
+from app.services import battle_service, partition_service  # noqa: E402
+from app.services.stats_service import (  # noqa: E402
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily, rebuild_kill_timeline_minute
+)
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+from app.utils.time_range import month_start, subtract_months  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+MONTHS = 8
+HORIZON = 3
+
+
+def load_dataset(kills_per_day, seed=20250801):
+    for model in (BattleRecordArchive, KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord,
+                  Person, PlayerGroup):
+        model.query.delete()
+    rnd = random.Random(seed)
+    groups = [PlayerGroup(group_name=f'分组{idx:02d}') for idx in range(20)]
+    db.session.add_all(groups)
+    db.session.flush()
+    person_ids = {}
+    for god in GODS:
+        for idx in range(100):
+            person = Person(name=f'{god}{idx:03d}', god=god, job=rnd.choice(JOBS),
+                            player_group_id=rnd.choice(groups).id if rnd.random() < 0.4 else None)
+            db.session.add(person)
+            db.session.flush()
+            person_ids[person.name] = person.id
+    names = list(person_ids) + [f'路人{idx}' for idx in range(20)]
+
+    first_day = subtract_months(month_start(date.today()), MONTHS - 1)
+    rows = []
+    day = first_day
+    while day < date.today():
+        evening = datetime.combine(day, datetime.min.time()) + timedelta(hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.sample(names, 2)
+            x, y = rnd.randint(0, 999), rnd.randint(0, 999)
+            rows.append({
+                'win': win,
+                'lost': lost,
+                'win_person_id': person_ids.get(win),
+                'lost_person_id': person_ids.get(lost),
+                'position': f'{x},{y}',
+                'x_coord': x,
+                'y_coord': y,
+                'remark': 1 if rnd.random() < 0.2 else 0,
+                'publish_at': evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600)),
+                'deleted_at': datetime.now() if rnd.random() < 0.01 else None
+            })
+        day += timedelta(days=1)
+    bulk_insert_battle_records(rows)
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    rebuild_kill_heatmap_daily()
+    rebuild_kill_timeline_minute()
+    db.session.commit()
+    return first_day, len(rows)
+
+
+def snapshot_stats(first_day):
+    """整天范围的统计，归档前后应一致"""
+    start = datetime.combine(first_day, datetime.min.time())
+    end = datetime.combine(date.today(), datetime.min.time())
+    return {
+        'rankings': battle_service.get_player_rankings.__wrapped__(
+            start_datetime=start, end_datetime=end - timedelta(seconds=1)),
+        'gods': battle_service.get_gods_stats.__wrapped__(start, end, False),
+        'faction_kills': battle_service.get_faction_kill_details.__wrapped__('梵天', 'out', None, start, end),
+        'player_kills': battle_service.get_player_kill_details.__wrapped__(
+            '湿婆007', 'in', start_datetime=start, end_datetime=end - timedelta(seconds=1)),
+        'heatmap': battle_service.get_kill_heatmap.__wrapped__(None, None, start, end - timedelta(seconds=1), 100),
+        'timeline': battle_service.get_battle_timeline.__wrapped__(None, None, start, end - timedelta(seconds=1)),
+    }
+
+
+def rollup_rows():
+    daily = sorted((str(r.stat_date), r.person_id, r.kills, r.deaths, r.blessings) for r in PlayerDailyStats.query)
+    pairs = sorted((str(r.stat_date), r.killer_id, r.victim_id, r.kills) for r in KillPairDaily.query)
+    heatmap = sorted((str(r.stat_date), r.god, r.cell_x, r.cell_y, r.kills, r.deaths) for r in KillHeatmapDaily.query)
+    timeline = sorted((str(r.stat_date), r.god, r.minute_of_day, r.kills, r.deaths, r.blessings)
+                      for r in KillTimelineMinute.query)
+    return daily, pairs, heatmap, timeline
+
+
+def record_rows():
+    return sorted(
+        (r.id, r.win, r.lost, r.win_person_id, r.lost_person_id, r.position, r.x_coord, r.y_coord, r.remark,
+         r.publish_at, r.created_at, r.deleted_at)
+        for r in BattleRecord.query
+    )
+
+
+def check(label, ok):
+    print(f"  [{'一致' if ok else '不一致'}] {label}")
+    return 0 if ok else 1
+
+
+def timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+def main():
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    archive_dir = tempfile.mkdtemp()
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        first_day, record_count = load_dataset(kills_per_day)
+        print(f"数据库: {db.engine.url.drivername}，战斗记录 {record_count} 条，{first_day} 起 {MONTHS} 个月")
+
+        records_before = record_rows()
+        rollups_before = rollup_rows()
+        stats_before, query_before = timed(lambda: snapshot_stats(first_day))
+
+        result, archive_time = timed(lambda: partition_service.rotate_partitions(HORIZON, 2, archive_dir))
+        archived_rows = sum(item['rows'] for item in result['archived'])
+        print(f"归档 {len(result['archived'])} 个月份、{archived_rows} 条记录，耗时 {archive_time:.2f}s，"
+              f"剩余 {BattleRecord.query.count()} 条")
+
+        failed = 0
+        stats_after, query_after = timed(lambda: snapshot_stats(first_day))
+        failed += check(f"归档后整天范围的统计（查询耗时 {query_before:.2f}s -> {query_after:.2f}s）",
+                        stats_before == stats_after)
+        failed += check("归档后汇总表不变", rollup_rows() == rollups_before)
+
+        # 改名触发重新汇总，已归档月份的汇总应保留
+        person = Person.query.filter_by(name='比湿奴000').first()
+        person.name = '比湿奴000改'
+        db.session.flush()
+        battle_service.resolve_battle_record_person_ids(['比湿奴000', '比湿奴000改'])
+        db.session.commit()
+        archived_days = partition_service.archived_months()[0].month
+        kept = PlayerDailyStats.query.filter(PlayerDailyStats.person_id == person.id,
+                                             PlayerDailyStats.stat_date < month_start(date.today())).filter(
+            PlayerDailyStats.stat_date >= archived_days).count()
+        failed += check("改名重新汇总后保留已归档月份的汇总", kept > 0)
+        person.name = '比湿奴000'
+        db.session.flush()
+        battle_service.resolve_battle_record_person_ids(['比湿奴000', '比湿奴000改'])
+        db.session.commit()
+
+        rebuild_player_daily_stats()
+        rebuild_kill_pair_daily()
+        rebuild_kill_heatmap_daily()
+        rebuild_kill_timeline_minute()
+        db.session.commit()
+        failed += check("全量重建后汇总表不变", rollup_rows() == rollups_before)
+
+        _, restore_time = timed(lambda: [partition_service.restore_month(item['month'], archive_dir)
+                                         for item in result['archived']])
+        print(f"恢复 {len(result['archived'])} 个月份，耗时 {restore_time:.2f}s")
+        failed += check("恢复后明细逐行一致", record_rows() == records_before)
+        restored_rollups = rollup_rows()
+        rebuild_player_daily_stats()
+        rebuild_kill_pair_daily()
+        rebuild_kill_heatmap_daily()
+        rebuild_kill_timeline_minute()
+        db.session.commit()
+        failed += check("恢复后汇总表与全量重建一致", restored_rollups == rollup_rows() == rollups_before)
+        failed += check("恢复后整天范围的统计", snapshot_stats(first_day) == stats_before)
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+晚间 PK 参与统计基准
+
+生成一个月的合成战斗记录（每晚 20:00~22:00 集中交战，白天零星交战，部分击杀带祝福），
+分别运行旧版 pk_participation 视图中的统计逻辑（person 与 battle_record 按名称
+IN 连接，每个分组/玩家单独查询一次祝福数）和 get_pk_participation，校验奖励等结果
+一致后输出耗时和 SQL 条数；并校验每个未分组玩家的参与日期（get_pk_participation_dates）
+与汇总中的参与天数一致。
+
+默认使用内存 SQLite，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会清空其中的 person、player_group、battle_record、player_daily_stats 表）。
+
+用法: python benchmarks/bench_pk_participation.py [每晚击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from sqlalchemy import event, text, bindparam  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats  # noqa: E402
+from app.services.battle_service import get_pk_participation, get_pk_participation_dates  # noqa: E402
+from app.services.stats_service import rebuild_player_daily_stats  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶']
+START_DATE = date(2025, 4, 1)
+END_DATE = date(2025, 4, 30)
+
+
+def build_dataset(kills_per_night, seed=20250401):
+    """每个势力 200 名玩家，比湿奴约一半玩家属于 2~4 人的分组"""
+    rnd = random.Random(seed)
+    groups = []
+    persons = []
+    for god in GODS:
+        for idx in range(200):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS), 'group': None})
+    vishnu = [p for p in persons if p['god'] == '比湿奴']
+    idx = 0
+    while idx < len(vishnu) // 2:
+        size = rnd.randint(2, 4)
+        groups.append(f'分组{len(groups):02d}')
+        # 同一分组的成员使用同一职业（或包含奶妈），旧实现的分组职业才是确定的
+        job = rnd.choice(JOBS)
+        for member in vishnu[idx:idx + size]:
+            member['group'] = len(groups) - 1
+            member['job'] = job
+        idx += size
+
+    names = [p['name'] for p in persons]
+    rows = []
+    day = START_DATE
+    while day <= END_DATE:
+        evening = datetime.combine(day, datetime.min.time()) + timedelta(hours=20)
+        for _ in range(kills_per_night):
+            win, lost = rnd.sample(names, 2)
+            rows.append((win, lost, evening + timedelta(seconds=rnd.randint(0, 7199)), rnd.random() < 0.2))
+        for _ in range(kills_per_night // 10):
+            win, lost = rnd.sample(names, 2)
+            rows.append((win, lost, datetime.combine(day, datetime.min.time()) + timedelta(seconds=rnd.randint(0, 86399)), False))
+        day += timedelta(days=1)
+    return groups, persons, rows
+
+
+def load_dataset(groups, persons, rows):
+    for model in (PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    group_objs = [PlayerGroup(group_name=name) for name in groups]
+    db.session.add_all(group_objs)
+    db.session.flush()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     player_group_id=group_objs[person['group']].id if person['group'] is not None else None)
+        db.session.add(obj)
+        db.session.flush()
+        person_ids[person['name']] = obj.id
+    bulk_insert_battle_records([{
+        'win': win,
+        'lost': lost,
+        'win_person_id': person_ids[win],
+        'lost_person_id': person_ids[lost],
+        'position': '100,100',
+        'remark': 1 if blessed else 0,
+        'publish_at': publish_at
+    } for win, lost, publish_at, blessed in rows])
+    rebuild_player_daily_stats()
+    db.session.commit()
+
+
+def legacy_pk_participation(start_date, end_date):
+    """优化前 pk_participation 视图中的统计逻辑（去掉日志输出），作为对照组"""
+    start_datetime = datetime.combine(start_date, datetime.min.time().replace(hour=20))
+    end_datetime = datetime.combine(end_date, datetime.min.time().replace(hour=21, minute=59, second=59))
+    results = db.session.execute(text("""
+        SELECT DISTINCT
+            p.id AS person_id, p.name AS person_name, p.god, p.job, p.player_group_id, pg.group_name,
+            DATE(br.publish_at) as participation_date
+        FROM person p
+        JOIN battle_record br ON p.name IN (br.win, br.lost)
+        LEFT JOIN player_group pg ON p.player_group_id = pg.id
+        WHERE p.deleted_at IS NULL
+          AND p.god = '比湿奴'
+          AND br.publish_at >= :start_datetime
+          AND br.publish_at <= :end_datetime
+        ORDER BY p.player_group_id, p.id, participation_date
+    """), {'start_datetime': start_datetime, 'end_datetime': end_datetime}).fetchall()
+
+    group_aggregates = {}
+    individual_aggregates = {}
+    for person_id, person_name, god, job, player_group_id, group_name, participation_date in results:
+        if player_group_id:
+            data = group_aggregates.setdefault(player_group_id, {
+                'name': group_name or f'分组 {player_group_id}', 'god': god,
+                'members': [], 'jobs': set(), 'participation_dates': set()
+            })
+            data['participation_dates'].add(participation_date)
+            if person_id not in {m['id'] for m in data['members']}:
+                data['members'].append({'id': person_id, 'name': person_name, 'job': job})
+                data['jobs'].add(job)
+        else:
+            data = individual_aggregates.setdefault(person_id, {
+                'id': person_id, 'name': person_name, 'god': god, 'job': job, 'participation_dates': set()
+            })
+            data['participation_dates'].add(participation_date)
+
+    query_blessing_count_base = """
+        SELECT COUNT(*)
+        FROM battle_record br
+        WHERE br.remark = '1'
+          AND br.publish_at >= :start_datetime
+          AND br.publish_at <= :end_datetime
+          AND {win_condition}
+    """
+    params = {'start_datetime': start_datetime, 'end_datetime': end_datetime}
+    summary_data = []
+    total_reward_all = 0
+    period_total_days = (end_date - start_date).days + 1
+    full_attendance_list = []
+
+    for group_key, data in group_aggregates.items():
+        participation_days = len(data['participation_dates'])
+        group_job = '奶' if '奶' in data['jobs'] else (list(data['jobs'])[0] if data['jobs'] else '未知')
+        member_names = [m['name'] for m in data['members']]
+        # 原实现直接绑定 tuple（依赖 pymysql 展开），这里用 expanding 参数以便在 SQLite 上运行
+        query = text(query_blessing_count_base.format(win_condition="br.win IN :member_names"))
+        query = query.bindparams(bindparam('member_names', expanding=True))
+        blessing_count = db.session.execute(query, dict(params, member_names=member_names)).scalar() or 0
+        reward = (20_000_000_000 if group_job == '奶' else 10_000_000_000) * participation_days
+        reward += 10_000_000_000 if blessing_count > 0 else 0
+        total_reward_all += reward
+        if participation_days == period_total_days:
+            full_attendance_list.append(data['name'] + " (组)")
+        summary_data.append({'id': group_key, 'name': data['name'], 'god': data['god'], 'job': group_job,
+                             'participation_days': participation_days, 'total_blessings': blessing_count,
+                             'reward': reward, 'is_group': True})
+
+    for player_id, data in individual_aggregates.items():
+        participation_days = len(data['participation_dates'])
+        job = data['job'] or '未知'
+        query = text(query_blessing_count_base.format(win_condition="br.win = :player_name"))
+        blessing_count = db.session.execute(query, dict(params, player_name=data['name'])).scalar() or 0
+        reward = (20_000_000_000 if job == '奶' else 10_000_000_000) * participation_days
+        reward += 10_000_000_000 if blessing_count > 0 else 0
+        total_reward_all += reward
+        if participation_days == period_total_days:
+            full_attendance_list.append(data['name'])
+        summary_data.append({'id': player_id, 'name': data['name'], 'god': data['god'], 'job': job,
+                             'participation_days': participation_days, 'total_blessings': blessing_count,
+                             'reward': reward, 'is_group': False})
+
+    summary_data.sort(key=lambda x: (-x['reward'], -x['participation_days'], x['name']))
+    return {
+        'summary_data': summary_data,
+        'total_reward_all': total_reward_all,
+        'period_total_days': period_total_days,
+        'full_attendance_list': full_attendance_list
+    }
+
+
+def measure(func, *args):
+    """返回 (结果, 耗时, SQL 条数)"""
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        started = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - started, statements[0]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def main():
+    kills_per_night = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    groups, persons, rows = build_dataset(kills_per_night)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        load_dataset(groups, persons, rows)
+        print(f"数据库: {db.engine.url.drivername}，玩家 {len(persons)} 名，分组 {len(groups)} 个，"
+              f"战斗记录 {len(rows)} 条（{START_DATE} ~ {END_DATE}）")
+
+        for start_date, end_date in [(START_DATE, END_DATE), (date(2025, 4, 15), date(2025, 4, 15))]:
+            legacy_result, legacy_time, legacy_statements = measure(legacy_pk_participation, start_date, end_date)
+            # 绕过结果缓存，测的是实际查询成本
+            new_result, new_time, new_statements = measure(get_pk_participation.__wrapped__, start_date, end_date)
+
+            if legacy_result != new_result:
+                print(f"[{start_date} ~ {end_date}] 结果不一致！")
+                sys.exit(1)
+
+            print(f"[{start_date} ~ {end_date}] {len(new_result['summary_data'])} 个分组/玩家，"
+                  f"总奖励 {new_result['total_reward_all']}，结果一致")
+            print(f"  旧实现: {legacy_time:.3f}s，{legacy_statements} 条 SQL")
+            print(f"  新实现: {new_time:.3f}s，{new_statements} 条 SQL")
+            print(f"  加速比: {legacy_time / new_time:.1f}x")
+
+            # 参与详情与汇总的参与天数一致
+            individuals = [item for item in new_result['summary_data'] if not item['is_group']]
+            mismatched = [
+                item['name'] for item in individuals
+                if len(get_pk_participation_dates.__wrapped__(item['id'], start_date, end_date, item['god']))
+                != item['participation_days']
+            ]
+            if mismatched:
+                print(f"  参与详情与汇总不一致: {mismatched[:10]}")
+                sys.exit(1)
+            print(f"  参与详情: {len(individuals)} 名玩家的参与日期与汇总一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+玩家详情查询基准
+
+生成一个月的合成战斗记录（含自己击杀自己、对手不在 person 表中等情况），
+对一批玩家分别运行旧版 get_player_details（汇总、近期战斗、击杀明细、被杀明细四条查询，
+汇总用 OR 关联）和新版（load_player_battle_summary 一条 UNION ALL 查询），校验结果一致后
+输出 SQL 条数、平均耗时和 p95。
+
+新版的击杀/被杀明细按 person id 读取 kill_pair_daily，同名玩家时与旧版按名称关联的口径
+不同，这一情况由 bench_kill_pairs.py 覆盖，这里的数据中没有同名玩家。
+
+并列的记录（同一时间的战斗、次数相同的对手）在 SQL 中没有确定顺序，比较时按完整的排序键
+规范化；LIMIT 截断处并列的对手只比较个数和次数。旧版的 last_position 是 MAX(position)
+（字符串的字典序最大值），新版改为最近一场战斗的位置，比较时两者都按新口径取值。
+
+默认使用内存 SQLite，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会清空其中的 person、player_group、battle_record、player_daily_stats 表）。
+
+用法: python benchmarks/bench_player_details.py [战斗记录条数]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from sqlalchemy import event, text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily  # noqa: E402
+from app.services.battle_service import get_player_details  # noqa: E402
+from app.services.stats_service import rebuild_kill_pair_daily  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+from app.utils import migrations  # noqa: E402
+from app.utils.time_range import time_window_condition  # noqa: E402
+
+START = datetime(2025, 5, 1)
+DAYS = 30
+SAMPLE_PLAYERS = 40
+
+
+def build_dataset(record_count, seed=20250501):
+    """300 名玩家加 20 个不在 person 表中的名称；活跃度按幂律分布，少数玩家战斗记录很多"""
+    rnd = random.Random(seed)
+    persons = [(f'玩家{idx:03d}', rnd.choice(['梵天', '比湿奴', '湿婆']), rnd.choice(['法师', '弓', '奶', None]))
+               for idx in range(300)]
+    names = [name for name, _, _ in persons] + [f'路人{idx}' for idx in range(20)]
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(names))]
+    rows = []
+    for _ in range(record_count):
+        win, lost = rnd.choices(names, weights, k=2)
+        rows.append({
+            'win': win,
+            'lost': lost,
+            'position': f'{rnd.randint(0, 999)},{rnd.randint(0, 999)}',
+            'remark': 1 if rnd.random() < 0.2 else 0,
+            'publish_at': START + timedelta(seconds=rnd.randint(0, DAYS * 86400))
+        })
+    return persons, rows
+
+
+def load_dataset(persons, rows):
+    for model in (KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    person_ids = {}
+    for name, god, job in persons:
+        person = Person(name=name, god=god, job=job)
+        db.session.add(person)
+        db.session.flush()
+        person_ids[name] = person.id
+    bulk_insert_battle_records([
+        dict(row, win_person_id=person_ids.get(row['win']), lost_person_id=person_ids.get(row['lost'])) for row in rows
+    ])
+    rebuild_kill_pair_daily()
+    db.session.commit()
+
+
+def legacy_player_details(player_name, start=None, end=None):
+    """优化前 get_player_details 的实现（去掉日志输出，时间区间改由参数传入），作为对照组"""
+    from app.models.player import Person
+
+    # 查找玩家
+    player = Person.query.filter_by(name=player_name, deleted_at=None).first()
+    if not player:
+        return None
+
+    date_condition, date_params = time_window_condition('br.publish_at', start, end)
+
+    # 获取战绩汇总数据
+    sql = """
+    WITH player_battle_stats AS (
+        SELECT 
+            p.id AS player_id,
+            p.name AS player_name,
+            p.job AS player_job,
+            p.god AS player_god,
+            COUNT(DISTINCT CASE WHEN br.win = p.name THEN br.id END) as kills,
+            COUNT(DISTINCT CASE WHEN br.lost = p.name THEN br.id END) as deaths,
+            SUM(CASE WHEN br.win = p.name THEN COALESCE(br.remark, 0) ELSE 0 END) as blessings,
+            MAX(br.position) as last_position,
+            MAX(br.publish_at) as last_battle_time
+        FROM 
+            person p
+        LEFT JOIN 
+            battle_record br ON (br.win = p.name OR br.lost = p.name)
+        WHERE 
+            p.name = :player_name
+            AND p.deleted_at IS NULL
+            {date_condition}
+        GROUP BY 
+            p.id, p.name, p.job, p.god
+    )
+    SELECT 
+        player_id,
+        player_name,
+        player_job,
+        player_god,
+        kills,
+        deaths,
+        blessings,
+        CASE WHEN deaths > 0 
+             THEN ROUND(CAST(kills AS FLOAT) / deaths, 2) 
+             ELSE kills END as kd_ratio,
+        (kills * 3 + blessings - deaths) as score,
+        last_position,
+        last_battle_time
+    FROM 
+        player_battle_stats
+    """.format(date_condition=date_condition)
+
+    # 原实现直接 text(sql)，这里指定时间列的类型以便在 SQLite 上得到 datetime
+    result = db.session.execute(text(sql).columns(last_battle_time=db.DateTime), dict(date_params, player_name=player_name)).first()
+
+    # 如果没有战绩记录，返回基本信息
+    if not result or (result.kills == 0 and result.deaths == 0):
+        return {
+            'id': player.id,
+            'name': player.name,
+            'faction': player.god,
+            'job': player.job,
+            'kills': 0,
+            'deaths': 0,
+            'kd_ratio': 0.0,
+            'score': 0,
+            'blessings': 0,
+            'last_battle_time': None,
+            'last_position': '0,0',
+            'recent_battles': [],
+            'kills_details': [],
+            'deaths_details': []
+        }
+
+    # 获取近期战斗记录
+    recent_battles_sql = """
+    SELECT 
+        br.id,
+        CASE 
+            WHEN br.win = :player_name THEN br.lost
+            ELSE br.win
+        END as opponent_name,
+        CASE 
+            WHEN br.win = :player_name THEN 'win'
+            ELSE 'lost'
+        END as battle_result,
+        br.remark as blessings,
+        br.position,
+        br.publish_at
+    FROM 
+        battle_record br 
+    WHERE 
+        (br.win = :player_name OR br.lost = :player_name)
+        {date_condition}
+    ORDER BY 
+        br.publish_at DESC 
+    LIMIT 50
+    """.format(date_condition=date_condition)
+
+    recent_battles = db.session.execute(text(recent_battles_sql).columns(publish_at=db.DateTime), dict(date_params, player_name=player_name)).fetchall()
+
+    # 查询击杀明细
+    kills_details_sql = """
+    SELECT 
+        v.id AS victim_id,
+        v.name AS victim_name,
+        v.job AS victim_job,
+        v.god AS victim_god,
+        COUNT(*) AS kill_count
+    FROM 
+        battle_record br
+    JOIN 
+        person v ON br.lost = v.name
+    WHERE 
+        br.win = :player_name
+        {date_condition}
+    GROUP BY 
+        v.id, v.name, v.job, v.god
+    ORDER BY 
+        kill_count DESC
+    LIMIT 50
+    """.format(date_condition=date_condition)
+
+    kills_rows = db.session.execute(text(kills_details_sql), dict(date_params, player_name=player_name)).fetchall()
+
+    kills_details = [
+        {
+            'id': row.victim_id,
+            'name': row.victim_name,
+            'job': row.victim_job,
+            'god': row.victim_god,
+            'count': int(row.kill_count or 0)
+        }
+        for row in kills_rows
+    ]
+
+    # 查询被杀明细
+    deaths_details_sql = """
+    SELECT 
+        k.id AS killer_id,
+        k.name AS killer_name,
+        k.job AS killer_job,
+        k.god AS killer_god,
+        COUNT(*) AS death_count
+    FROM 
+        battle_record br
+    JOIN 
+        person k ON br.win = k.name
+    WHERE 
+        br.lost = :player_name
+        {date_condition}
+    GROUP BY 
+        k.id, k.name, k.job, k.god
+    ORDER BY 
+        death_count DESC
+    LIMIT 50
+    """.format(date_condition=date_condition)
+
+    deaths_rows = db.session.execute(text(deaths_details_sql), dict(date_params, player_name=player_name)).fetchall()
+
+    deaths_details = [
+        {
+            'id': row.killer_id,
+            'name': row.killer_name,
+            'job': row.killer_job,
+            'god': row.killer_god,
+            'count': int(row.death_count or 0)
+        }
+        for row in deaths_rows
+    ]
+
+    # 构建返回数据
+    player_details = {
+        'id': result.player_id,
+        'name': result.player_name,
+        'faction': result.player_god,
+        'job': result.player_job,
+        'kills': int(result.kills),
+        'deaths': int(result.deaths),
+        'kd_ratio': float(result.kd_ratio),
+        'score': int(result.score),
+        'blessings': int(result.blessings),
+        'last_battle_time': result.last_battle_time.strftime('%Y-%m-%d %H:%M:%S') if result.last_battle_time else None,
+        'last_position': result.last_position or '0,0',
+        'recent_battles': [
+            {
+                'id': battle.id,
+                'opponent_name': battle.opponent_name,
+                'battle_result': battle.battle_result,
+                'blessings': int(battle.blessings) if battle.blessings else 0,
+                'position': battle.position,
+                'publish_at': battle.publish_at.strftime('%Y-%m-%d %H:%M:%S') if battle.publish_at else None
+            }
+            for battle in recent_battles
+        ],
+        'kills_details': kills_details,
+        'deaths_details': deaths_details
+    }
+
+    return player_details
+
+
+
+def canonical(details, legacy=False):
+    """规范化详情：近期战斗按 (时间, id) 排序；对手明细去掉 LIMIT 截断处并列的成员；旧版的最后位置按新口径取值"""
+    if details is None:
+        return None
+    result = dict(details)
+    result['recent_battles'] = sorted(details['recent_battles'], key=lambda b: (b['publish_at'], b['id']), reverse=True)
+    # 最后位置：最近一场战斗的位置，新版返回的值必须与之一致
+    expected_position = result['recent_battles'][0]['position'] if result['recent_battles'] else '0,0'
+    if legacy or details['last_position'] == expected_position:
+        result['last_position'] = expected_position
+    for key in ('kills_details', 'deaths_details'):
+        items = details[key]
+        boundary = min((item['count'] for item in items), default=0) if len(items) >= 50 else 0
+        result[key] = (
+            len(items),
+            sorted(item['count'] for item in items),
+            sorted((item['id'], item['name'], item['job'], item['god'], item['count']) for item in items if item['count'] > boundary)
+        )
+    return result
+
+
+def measure(func, args_list):
+    """返回 (结果列表, 每次调用的耗时列表, SQL 总条数)"""
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    results = []
+    timings = []
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for args in args_list:
+            started = time.perf_counter()
+            results.append(func(*args))
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return results, timings, statements[0]
+
+
+def p95(timings):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def main():
+    record_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    persons, rows = build_dataset(record_count)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        # 与生产库相同的表结构和索引
+        migrations.upgrade()
+        load_dataset(persons, rows)
+        print(f"数据库: {db.engine.url.drivername}，玩家 {len(persons)} 名，战斗记录 {len(rows)} 条")
+
+        players = [name for name, _, _ in persons[:SAMPLE_PLAYERS]]
+        windows = [(None, None), (START + timedelta(days=10, hours=20), START + timedelta(days=17))]
+        for start, end in windows:
+            cases = [(name, start, end) for name in players]
+            legacy_results, legacy_timings, legacy_statements = measure(legacy_player_details, cases)
+            # 绕过结果缓存，测的是实际查询成本；get_player_details 的 start/end 为包含的结束时间
+            new_cases = [(name, None, start, end - timedelta(seconds=1) if end else None) for name, start, end in cases]
+            if start is None:
+                new_cases = [(name, 'all') for name, _, _ in cases]
+            new_results, new_timings, new_statements = measure(get_player_details.__wrapped__, new_cases)
+
+            mismatches = [name for name, old, new in zip(players, legacy_results, new_results) if canonical(old, legacy=True) != canonical(new)]
+            label = '全部时间' if start is None else f'{start:%m-%d %H:%M} ~ {end:%m-%d %H:%M}'
+            if mismatches:
+                print(f"[{label}] 结果不一致: {mismatches}")
+                sys.exit(1)
+            print(f"[{label}] {len(players)} 名玩家，结果一致")
+            print(f"  旧实现: 平均 {sum(legacy_timings) / len(cases) * 1000:.1f}ms，p95 {p95(legacy_timings) * 1000:.1f}ms，"
+                  f"每次 {legacy_statements / len(cases):.0f} 条 SQL")
+            print(f"  新实现: 平均 {sum(new_timings) / len(cases) * 1000:.1f}ms，p95 {p95(new_timings) * 1000:.1f}ms，"
+                  f"每次 {new_statements / len(cases):.0f} 条 SQL")
+            print(f"  p95 加速比: {p95(legacy_timings) / p95(new_timings):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+排名快照一致性校验和基准
+
+以今天为基准生成最近两个月的合成数据（含已删除的玩家和战斗记录、没有战斗的玩家、
+未解析到玩家的名称），对不同时间范围和势力/职业筛选比较：
+
+- get_player_rank 的名次与完整排名列表（get_player_rankings）中的位置一致，名次变化与
+  上一个周期完整列表中的位置之差一致；不存在的玩家返回 None，没有战斗的玩家名次为 None
+- get_rank_movers 与两个完整列表逐人比较得到的上升/下降/新上榜列表一致
+
+并输出旧做法（取完整排名列表后查找玩家）与快照查询的单次耗时。随后入库一批今天的
+新日志，确认快照随数据版本号失效、由 refresh_rank_snapshots 重建后再校验一次。
+
+默认使用临时 SQLite 文件，表结构和索引由 db/migrations 创建；可通过环境变量
+SQLALCHEMY_DATABASE_URI 指向测试用 MySQL（会清空其中的 person、player_group、
+battle_record、player_daily_stats 表）。
+
+用法: python benchmarks/bench_rank_lookup.py [每天击杀数]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_rank_lookup.db')
+
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats  # noqa: E402
+from app.services import battle_service, rank_snapshot  # noqa: E402
+from app.services.stats_service import rebuild_player_daily_stats  # noqa: E402
+from app.utils import migrations  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records, save_battle_log_to_db  # noqa: E402
+from app.utils.result_cache import clear_result_cache  # noqa: E402
+from app.utils.time_range import resolve_time_window, previous_window  # noqa: E402
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+DAYS = 60
+TODAY = datetime.combine(date.today(), datetime.min.time())
+
+# (time_range, 自定义开始, 自定义结束)
+WINDOWS = [
+    ('today', None, None),
+    ('yesterday', None, None),
+    ('week', None, None),
+    ('all', None, None),
+    (None, (TODAY - timedelta(days=9)).replace(hour=20, minute=30), (TODAY - timedelta(days=3)).replace(hour=21)),
+]
+FILTERS = [(None, None), ('梵天', None), (None, '奶')]
+
+
+def load_dataset(kills_per_day, seed=20250901):
+    for model in (PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    rnd = random.Random(seed)
+    person_ids = {}
+    for god in GODS:
+        for idx in range(300):
+            person = Person(name=f'{god}{idx:03d}', god=god, job=rnd.choice(JOBS),
+                            deleted_at=datetime.now() if rnd.random() < 0.03 else None)
+            db.session.add(person)
+            db.session.flush()
+            person_ids[person.name] = person.id
+    # 没有任何战斗记录的玩家
+    db.session.add(Person(name='观战者', god='梵天', job='奶'))
+    names = list(person_ids) + [f'路人{idx}' for idx in range(30)]
+
+    rows = []
+    for day in range(DAYS):
+        evening = TODAY - timedelta(days=DAYS - 1 - day) + timedelta(hours=20)
+        # 每个玩家每天的活跃程度不同，名次在周期之间有变化
+        weights = [rnd.random() ** 3 for _ in names]
+        for _ in range(kills_per_day):
+            win, lost = rnd.choices(names, weights=weights, k=2)
+            if win == lost:
+                continue
+            rows.append({
+                'win': win,
+                'lost': lost,
+                'win_person_id': person_ids.get(win),
+                'lost_person_id': person_ids.get(lost),
+                'position': '0,0',
+                'x_coord': 0,
+                'y_coord': 0,
+                'remark': 1 if rnd.random() < 0.2 else 0,
+                'publish_at': evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600)),
+                'deleted_at': datetime.now() if rnd.random() < 0.01 else None
+            })
+    bulk_insert_battle_records(rows)
+    rebuild_player_daily_stats()
+    db.session.commit()
+    return names, len(rows)
+
+
+def window_of(time_range, start, end):
+    return resolve_time_window(time_range, start, end)
+
+
+def legacy_lists(time_range, start, end, faction, job):
+    """旧做法：当前周期和上一个周期的完整排名列表"""
+    current = battle_service.get_player_rankings.__wrapped__(faction, job, time_range, start, end)
+    previous = battle_service.player_rankings(faction, job, *previous_window(*window_of(time_range, start, end)))
+    return current, previous
+
+
+def legacy_rank(current, previous, name):
+    rank = next((idx for idx, player in enumerate(current, start=1) if player['name'] == name), None)
+    previous_rank = next((idx for idx, player in enumerate(previous, start=1) if player['name'] == name), None)
+    change = previous_rank - rank if rank is not None and previous_rank is not None else None
+    return rank, len(current), previous_rank, len(previous), change
+
+
+def legacy_movers(current, previous, limit):
+    previous_ranks = {}
+    for idx, player in enumerate(previous, start=1):
+        previous_ranks.setdefault(player['name'], idx)
+    risers, fallers, newcomers = [], [], []
+    for rank, player in enumerate(current, start=1):
+        previous_rank = previous_ranks.get(player['name'])
+        if previous_rank is None:
+            newcomers.append((player['name'], rank))
+        elif previous_rank > rank:
+            risers.append((previous_rank - rank, player['name'], rank))
+        elif previous_rank < rank:
+            fallers.append((previous_rank - rank, player['name'], rank))
+    risers.sort(key=lambda item: (-item[0], item[2]))
+    fallers.sort(key=lambda item: (item[0], item[2]))
+    return risers[:limit], fallers[:limit], newcomers[:limit]
+
+
+def run_checks(names):
+    """逐项比较，返回 (项数, 不一致项数, 旧做法单次耗时, 快照单次耗时)"""
+    checks = 0
+    mismatches = 0
+    legacy_times = []
+    snapshot_times = []
+    rnd = random.Random(11)
+    for time_range, start, end in WINDOWS:
+        for faction, job in FILTERS:
+            label = f"{time_range or f'{start:%m-%d %H:%M}~{end:%m-%d %H:%M}'} {faction or '全部势力'}/{job or '全部职业'}"
+            current, previous = legacy_lists(time_range, start, end, faction, job)
+            sample = rnd.sample(names, 40) + ['观战者', '不存在的玩家', '湿婆299']
+            for name in sample:
+                checks += 1
+                started = time.perf_counter()
+                full = battle_service.get_player_rankings.__wrapped__(faction, job, time_range, start, end)
+                next((player for player in full if player['name'] == name), None)
+                legacy_times.append(time.perf_counter() - started)
+                expected = legacy_rank(current, previous, name)
+
+                started = time.perf_counter()
+                result = rank_snapshot.get_player_rank(name, faction, job, time_range, start, end)
+                snapshot_times.append(time.perf_counter() - started)
+
+                person = Person.query.filter_by(name=name, deleted_at=None).first()
+                if result is None:
+                    ok = person is None and expected[0] is None
+                else:
+                    actual = (result['rank'], result['total'], result['previous_rank'], result['previous_total'],
+                              result['rank_change'])
+                    ok = actual == expected and person is not None
+                if not ok:
+                    mismatches += 1
+                    print(f"  不一致: {label} {name} 旧: {expected} 新: {result}")
+
+            for limit in (5, 50):
+                checks += 1
+                movers = rank_snapshot.get_rank_movers(faction, job, time_range, start, end, limit)
+                actual = (
+                    [(entry['rank_change'], entry['name'], entry['rank']) for entry in movers['risers']],
+                    [(entry['rank_change'], entry['name'], entry['rank']) for entry in movers['fallers']],
+                    [(entry['name'], entry['rank']) for entry in movers['newcomers']],
+                )
+                expected = legacy_movers(current, previous, limit)
+                if actual != expected or movers['total'] != len(current):
+                    mismatches += 1
+                    print(f"  不一致: {label} 名次变化榜 {limit} 人")
+                    print(f"    旧: {str(expected)[:300]}")
+                    print(f"    新: {str(actual)[:300]}")
+    average = lambda values: sum(values) / len(values)  # noqa: E731
+    return checks, mismatches, average(legacy_times), average(snapshot_times)
+
+
+def main():
+    kills_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        names, record_count = load_dataset(kills_per_day)
+        names.append('观战者')
+        print(f"数据库: {db.engine.url.drivername}，战斗记录 {record_count} 条，玩家 {len(names)} 名")
+
+        failed = 0
+        for stage in ('初始数据', '增量入库后'):
+            if stage == '增量入库后':
+                rnd = random.Random(5)
+                battle_details = []
+                for idx in range(3000):
+                    win, lost = rnd.sample(names[:200], 2)
+                    battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 0, 'y_coord': 0,
+                                           'timestamp': TODAY + timedelta(hours=10, seconds=idx)})
+                before = len(rank_snapshot._snapshots)
+                save_battle_log_to_db(battle_details, [])
+                started = time.perf_counter()
+                refreshed = rank_snapshot.refresh_rank_snapshots()
+                print(f"入库 {len(battle_details)} 条后重建 {refreshed}/{before} 个快照，耗时 {time.perf_counter() - started:.2f}s")
+                failed += refreshed != before
+
+            clear_result_cache()
+            checks, mismatches, legacy_time, snapshot_time = run_checks(names)
+            failed += mismatches
+            print(f"[{stage}] {checks} 项，不一致 {mismatches} 项；单次查询 旧做法 {legacy_time * 1000:.2f}ms，"
+                  f"快照 {snapshot_time * 1000:.3f}ms，加速比 {legacy_time / snapshot_time:.0f}x")
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+save_battle_log_to_db 击杀记录入库基准
+
+生成 5 万条合成击杀记录（其中一部分预先写入库中、一部分在文件内重复），
+分别用旧版逐条 exists 查询 + ORM 逐条插入的实现和新的范围查询 + 多行
+INSERT 实现写入空库，校验插入/跳过计数和最终表内容一致后输出耗时。
+
+默认使用内存 SQLite，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会清空其中的 battle_record 表）。
+
+用法: python benchmarks/bench_save_battle_log.py [击杀条数]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from app import create_app, db  # noqa: E402
+from app.models.player import BattleRecord  # noqa: E402
+from app.utils.file_parser import save_battle_log_to_db, bulk_insert_battle_records  # noqa: E402
+
+PLAYERS = [f'玩家{i:03d}' for i in range(300)]
+
+
+def build_battle_details(total_kills, seed=20250402):
+    """生成合成击杀记录：约 2% 为文件内重复行"""
+    rnd = random.Random(seed)
+    ts = datetime(2025, 4, 2, 19, 0, 0)
+    details = []
+    for _ in range(total_kills):
+        if details and rnd.random() < 0.02:
+            details.append(dict(rnd.choice(details[-50:])))
+            continue
+        if rnd.random() < 0.5:
+            ts += timedelta(seconds=1)
+        killer, victim = rnd.sample(PLAYERS, 2)
+        details.append({
+            'killer_name': killer,
+            'victim_name': victim,
+            'x_coord': rnd.randint(0, 999),
+            'y_coord': rnd.randint(0, 999),
+            'timestamp': ts
+        })
+    return details
+
+
+def legacy_save_battle_details(battle_details):
+    """优化前的击杀记录处理逻辑（去掉日志输出），作为对照组"""
+    inserted = 0
+    skipped = 0
+    for idx, detail in enumerate(battle_details):
+        exists = BattleRecord.query.filter_by(
+            win=detail['killer_name'],
+            lost=detail['victim_name'],
+            position=f"{detail['x_coord']},{detail['y_coord']}",
+            publish_at=detail['timestamp']
+        ).first()
+        if not exists:
+            db.session.add(BattleRecord(
+                win=detail['killer_name'],
+                lost=detail['victim_name'],
+                position=f"{detail['x_coord']},{detail['y_coord']}",
+                remark=0,
+                publish_at=detail['timestamp'],
+            ))
+            if (idx + 1) % 100 == 0 or idx == len(battle_details) - 1:
+                db.session.commit()
+            inserted += 1
+        else:
+            skipped += 1
+    db.session.commit()
+    return inserted, skipped
+
+
+def new_save_battle_details(battle_details):
+    stats = {}
+    success, message = save_battle_log_to_db(battle_details, [], existing_players={}, stats=stats)
+    if not success:
+        raise RuntimeError(message)
+    return stats['inserted'], stats['skipped']
+
+
+def reset_table(preloaded):
+    """清空 battle_record 并写入预置的已有记录"""
+    BattleRecord.query.delete()
+    bulk_insert_battle_records([{
+        'win': d['killer_name'],
+        'lost': d['victim_name'],
+        'position': f"{d['x_coord']},{d['y_coord']}",
+        'remark': 0,
+        'publish_at': d['timestamp'],
+    } for d in preloaded])
+    db.session.commit()
+
+
+def snapshot():
+    rows = db.session.query(
+        BattleRecord.win, BattleRecord.lost, BattleRecord.position, BattleRecord.publish_at
+    ).all()
+    return sorted(tuple(row) for row in rows)
+
+
+def run(func, battle_details, preloaded):
+    reset_table(preloaded)
+    start = time.perf_counter()
+    counts = func(battle_details)
+    elapsed = time.perf_counter() - start
+    return counts, snapshot(), elapsed
+
+
+def main():
+    total_kills = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    battle_details = build_battle_details(total_kills)
+    # 文件前 5% 的记录在上传前已入库
+    preloaded = battle_details[:total_kills // 20]
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f"数据库: {db.engine.url.drivername}，击杀记录 {total_kills} 条，预置 {len(preloaded)} 条")
+
+        legacy_counts, legacy_rows, legacy_time = run(legacy_save_battle_details, battle_details, preloaded)
+        new_counts, new_rows, new_time = run(new_save_battle_details, battle_details, preloaded)
+
+        if legacy_counts != new_counts or legacy_rows != new_rows:
+            print(f"结果不一致！旧实现 插入/跳过={legacy_counts}，新实现 插入/跳过={new_counts}")
+            sys.exit(1)
+
+        print(f"插入 {new_counts[0]} 条，跳过 {new_counts[1]} 条，结果一致")
+        print(f"旧实现: {legacy_time:.2f}s, {total_kills / legacy_time:,.0f} 条/秒")
+        print(f"新实现: {new_time:.2f}s, {total_kills / new_time:,.0f} 条/秒")
+        print(f"加速比: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务层 SQL 执行计划回归检查
+
+在种子数据上逐个调用 QUERIES 中登记的服务函数（绕过结果缓存），记录其间执行的每条 SELECT，
+对每条语句做 EXPLAIN，提取每个表的访问方式、使用的索引和预估扫描行数，与检入的基线
+benchmarks/query_plans/<数据库>.json 比较：
+
+- 访问方式变差（如 range -> ALL、SEARCH -> SCAN）判为回归
+- 预估扫描行数超过基线的 ROWS_TOLERANCE 倍且多出 ROWS_SLACK 行以上判为回归
+- 新出现的全表/全索引扫描判为回归
+- 使用的索引变化但访问方式不变、语句文本变化、新增或减少语句只提示
+
+MySQL 使用 EXPLAIN FORMAT=JSON（rows_examined_per_scan，MariaDB 为 rows），
+SQLite 使用 EXPLAIN QUERY PLAN（没有行数，只比较访问方式和索引）。
+表结构和索引由 db/migrations 创建，种子数据固定随机种子、以当天为基准生成，
+today/week 等相对时间范围在任何一天运行都命中相同比例的数据。
+
+默认使用临时 SQLite 文件；检查 MySQL 时通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用实例
+（如 docker run -e MYSQL_ROOT_PASSWORD=... -e MYSQL_DATABASE=oneapi -p 3306:3306 mysql:8，
+会清空其中的 person、player_group、battle_record、player_daily_stats、kill_pair_daily、kill_heatmap_daily、
+kill_timeline_minute 表），
+第一次运行加 --update 生成基线并检入。修改 SQL 或索引后，确认计划变化符合预期再用 --update 更新基线。
+
+用法: python benchmarks/check_query_plans.py [--update] [--only 名称前缀] [--verbose]
+
+tests/test_query_plans.py 在测试数据库（SQLite）上运行同样的检查，有回归时测试失败。
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import hashlib
+import argparse
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'check_query_plans.db')
+
+from sqlalchemy import event, text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models.player import Person, PlayerGroup, BattleRecord  # noqa: E402
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute  # noqa: E402
+from app.services import battle_service  # noqa: E402
+from app.services import data_service as services_data  # noqa: E402
+from app.services import rank_snapshot  # noqa: E402
+from app.services.stats_service import (  # noqa: E402
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily, rebuild_kill_timeline_minute
+)
+from app.utils import data_service as utils_data  # noqa: E402
+from app.utils import migrations  # noqa: E402
+from app.utils.battle_report import generate_battle_report  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+from app.utils.result_cache import clear_result_cache  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_plans')
+
+# 种子数据规模，改动后需要重新生成基线
+SEED = 20250601
+DAYS = 60
+KILLS_PER_DAY = 400
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+
+# 预估扫描行数的回归阈值
+ROWS_TOLERANCE = 1.5
+ROWS_SLACK = 100
+
+# 访问方式从好到差的等级（MySQL 的 type；SQLite 的 SEARCH / SCAN）
+ACCESS_RANK = {
+    'system': 0, 'const': 1, 'eq_ref': 2, 'ref': 3, 'fulltext': 3, 'ref_or_null': 4,
+    'unique_subquery': 4, 'index_subquery': 5, 'index_merge': 5, 'range': 6, 'index': 7, 'ALL': 8,
+    'search': 3, 'covering_scan': 7, 'index_scan': 7, 'scan': 8,
+}
+FULL_SCAN_RANK = 7
+
+
+def seed_dataset():
+    """450 名玩家（含已删除）、40 个分组和最近 DAYS 天的战斗记录（含已删除和未解析到玩家的名称）"""
+    for model in (KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person, PlayerGroup):
+        model.query.delete()
+    rnd = random.Random(SEED)
+    groups = [PlayerGroup(group_name=f'分组{idx:02d}') for idx in range(40)]
+    db.session.add_all(groups)
+    db.session.flush()
+
+    person_ids = {}
+    for god in GODS:
+        for idx in range(150):
+            person = Person(name=f'{god}{idx:03d}', god=god, job=rnd.choice(JOBS),
+                            deleted_at=datetime.now() if rnd.random() < 0.05 else None,
+                            player_group_id=rnd.choice(groups).id if rnd.random() < 0.4 else None)
+            db.session.add(person)
+            db.session.flush()
+            person_ids[person.name] = person.id
+    names = list(person_ids) + [f'路人{idx}' for idx in range(30)]
+
+    first_day = date.today() - timedelta(days=DAYS - 1)
+    rows = []
+    for day in range(DAYS):
+        evening = datetime.combine(first_day + timedelta(days=day), time(20))
+        for _ in range(KILLS_PER_DAY):
+            win, lost = rnd.sample(names, 2)
+            x, y = rnd.randint(0, 999), rnd.randint(0, 999)
+            rows.append({
+                'win': win,
+                'lost': lost,
+                'win_person_id': person_ids.get(win),
+                'lost_person_id': person_ids.get(lost),
+                'position': f'{x},{y}',
+                'x_coord': x,
+                'y_coord': y,
+                'remark': 1 if rnd.random() < 0.2 else 0,
+                'publish_at': evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600)),
+                'deleted_at': datetime.now() if rnd.random() < 0.01 else None
+            })
+    bulk_insert_battle_records(rows)
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    rebuild_kill_heatmap_daily()
+    rebuild_kill_timeline_minute()
+    db.session.commit()
+
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(text('ANALYZE TABLE battle_record, person, player_group, player_daily_stats, kill_pair_daily, '
+                               'kill_heatmap_daily, kill_timeline_minute'))
+    else:
+        db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def build_queries(app):
+    """登记的服务查询：[(名称, 调用函数)]，名称前缀为所在模块"""
+    today = datetime.combine(date.today(), time.min)
+    evening = (today - timedelta(days=3)).replace(hour=19), (today - timedelta(days=3)).replace(hour=22)
+    days = today - timedelta(days=10, hours=4), today - timedelta(days=2, hours=1)
+    person_id = Person.query.filter_by(name='梵天001').first().id
+    page = battle_service.get_player_battles('梵天001', limit=20)
+
+    def group_details_route():
+        from app.routes.battle import group_details
+        with app.test_request_context('/api/group_details', query_string={
+            'player_name': '分组07',
+            'start_datetime': f'{days[0]:%Y-%m-%dT%H:%M}',
+            'end_datetime': f'{days[1]:%Y-%m-%dT%H:%M}'
+        }):
+            return group_details()
+
+    def player_kills_route():
+        from app.routes.battle import get_player_kills
+        with app.test_request_context('/battle/player/梵天001/kills'):
+            return get_player_kills('梵天001')
+
+    def player_rank():
+        # 快照不随结果缓存清空，先丢弃，确保执行排名查询
+        rank_snapshot.clear_rank_snapshots()
+        return rank_snapshot.get_player_rank('梵天001', '梵天', time_range='week')
+
+    def statistics_route():
+        from app.routes.battle import get_statistics
+        return get_statistics('梵天')
+
+    return [
+        ('battle_service.get_player_rankings week', lambda: battle_service.get_player_rankings.__wrapped__(time_range='week')),
+        ('battle_service.get_player_rankings evening', lambda: battle_service.get_player_rankings.__wrapped__(
+            '梵天', '法师', start_datetime=evening[0], end_datetime=evening[1])),
+        ('battle_service.get_all_jobs', lambda: battle_service.get_all_jobs.__wrapped__()),
+        ('battle_service.get_player_details week', lambda: battle_service.get_player_details.__wrapped__('梵天001', 'week')),
+        ('battle_service.get_player_details all', lambda: battle_service.get_player_details.__wrapped__('梵天001', 'all')),
+        ('battle_service.get_player_battles first', lambda: battle_service.get_player_battles('梵天001', limit=20)),
+        ('battle_service.get_player_battles cursor', lambda: battle_service.get_player_battles(
+            '梵天001', cursor=page['next_cursor'], limit=20)),
+        ('battle_service.get_gods_stats days', lambda: battle_service.get_gods_stats.__wrapped__(days[0], days[1], False)),
+        ('battle_service.get_gods_stats grouped', lambda: battle_service.get_gods_stats.__wrapped__(days[0], days[1], True)),
+        ('battle_service.get_faction_statistics', lambda: battle_service.get_faction_statistics.__wrapped__()),
+        ('battle_service.get_faction_kill_details out', lambda: battle_service.get_faction_kill_details.__wrapped__(
+            '梵天', 'out', None, days[0], days[1])),
+        ('battle_service.get_group_kill_details in', lambda: battle_service.get_group_kill_details.__wrapped__(
+            '分组07', 'in', None, days[0], days[1])),
+        ('battle_service.get_player_kill_details', lambda: battle_service.get_player_kill_details.__wrapped__('梵天001')),
+        ('battle_service.get_kill_heatmap days', lambda: battle_service.get_kill_heatmap.__wrapped__(
+            '梵天', None, days[0], days[1], 50)),
+        ('battle_service.get_battle_timeline evening', lambda: battle_service.get_battle_timeline.__wrapped__(
+            None, None, evening[0] + timedelta(seconds=17), evening[1] + timedelta(seconds=42))),
+        ('battle_service.get_battle_timeline days', lambda: battle_service.get_battle_timeline.__wrapped__(
+            '梵天', None, days[0], days[1], 120)),
+        ('battle_service.get_pk_participation', lambda: battle_service.get_pk_participation.__wrapped__(
+            (today - timedelta(days=14)).date(), (today - timedelta(days=1)).date())),
+        ('battle_service.get_pk_participation_dates', lambda: battle_service.get_pk_participation_dates.__wrapped__(
+            1, (today - timedelta(days=14)).date(), (today - timedelta(days=1)).date())),
+        ('rank_snapshot.get_player_rank week', player_rank),
+        ('services.data_service.get_faction_stats week', lambda: services_data.get_faction_stats.__wrapped__('week')),
+        ('services.data_service.get_player_rankings week', lambda: services_data.get_player_rankings.__wrapped__('梵天', 'week')),
+        ('services.data_service.get_daily_kills_by_player', lambda: services_data.get_daily_kills_by_player.__wrapped__('week', 5)),
+        ('services.data_service.get_daily_deaths_by_player', lambda: services_data.get_daily_deaths_by_player.__wrapped__('week', 5)),
+        ('services.data_service.get_daily_scores_by_player', lambda: services_data.get_daily_scores_by_player.__wrapped__('week', 5)),
+        ('utils.data_service.get_faction_stats', utils_data.get_faction_stats),
+        ('utils.data_service.get_player_rankings', lambda: utils_data.get_player_rankings('梵天')),
+        ('utils.data_service.get_battle_details_by_player', lambda: utils_data.get_battle_details_by_player(
+            person_id, days[0], days[1])),
+        ('utils.data_service.get_statistics', lambda: utils_data.get_statistics('梵天')),
+        ('battle_report.generate_battle_report', lambda: generate_battle_report(tempfile.mkdtemp(), days[0], days[1])),
+        ('routes.battle.group_details', group_details_route),
+        ('routes.battle.get_player_kills', player_kills_route),
+        ('routes.battle.get_statistics', statistics_route),
+    ]
+
+
+def capture_statements(call):
+    """执行 call，返回其间执行的 SELECT 语句 [(SQL, 参数)]"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH', '(')):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+        db.session.rollback()
+    return statements
+
+
+def _mysql_accesses(node, accesses):
+    """递归收集 EXPLAIN FORMAT=JSON 中的每个表访问"""
+    if isinstance(node, dict):
+        table = node.get('table')
+        if isinstance(table, dict) and 'access_type' in table:
+            rows = table.get('rows_examined_per_scan', table.get('rows'))
+            accesses.append({
+                'table': table.get('table_name'),
+                'access': table['access_type'],
+                'key': table.get('key'),
+                'rows': int(rows) if rows is not None else None
+            })
+        for value in node.values():
+            _mysql_accesses(value, accesses)
+    elif isinstance(node, list):
+        for value in node:
+            _mysql_accesses(value, accesses)
+
+
+_SQLITE_ACCESS = re.compile(r'^(SCAN|SEARCH) (\S+)(?: USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY|PRIMARY KEY) ?(\S+)?)?')
+
+
+def _sqlite_access(detail):
+    match = _SQLITE_ACCESS.match(detail)
+    if not match or match.group(2) == 'CONSTANT':
+        return None
+    operation, table, using, key = match.groups()
+    if operation == 'SEARCH':
+        access = 'search'
+    elif using == 'COVERING INDEX':
+        access = 'covering_scan'
+    elif using:
+        access = 'index_scan'
+    else:
+        access = 'scan'
+    if using in ('INTEGER PRIMARY KEY', 'PRIMARY KEY'):
+        key = 'PRIMARY'
+    elif key and key.startswith('('):
+        key = None
+    return {'table': table, 'access': access, 'key': key, 'rows': None}
+
+
+def explain(statement, parameters):
+    """返回语句中每个表访问的 [{table, access, key, rows}]"""
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'mysql':
+        row = connection.exec_driver_sql('EXPLAIN FORMAT=JSON ' + statement, parameters).fetchone()
+        accesses = []
+        _mysql_accesses(json.loads(row[0]), accesses)
+        return accesses
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [access for access in (_sqlite_access(row[-1]) for row in rows) if access]
+
+
+def fingerprint(statement):
+    return hashlib.sha1(' '.join(statement.split()).encode('utf-8')).hexdigest()[:12]
+
+
+def collect_plans(queries, only=None):
+    """{名称: [{sql, accesses}, ...]}，调用失败的查询记为 {'error': 信息}"""
+    plans = {}
+    for name, call in queries:
+        if only and not name.startswith(only):
+            continue
+        clear_result_cache()
+        try:
+            statements = capture_statements(call)
+            plans[name] = [{'sql': fingerprint(sql), 'accesses': explain(sql, params)} for sql, params in statements]
+        except Exception as e:
+            db.session.rollback()
+            plans[name] = {'error': f'{type(e).__name__}: {e}'[:300]}
+    return plans
+
+
+def compare_accesses(label, baseline, current):
+    """比较同一条语句的表访问，返回 (回归列表, 提示列表)"""
+    regressions, notes = [], []
+    remaining = list(baseline)
+    for access in current:
+        match = next((item for item in remaining if item['table'] == access['table']), None)
+        if match is None:
+            if ACCESS_RANK.get(access['access'], FULL_SCAN_RANK) >= FULL_SCAN_RANK:
+                regressions.append(f"{label} 新增对 {access['table']} 的 {access['access']} 扫描")
+            else:
+                notes.append(f"{label} 新增对 {access['table']} 的 {access['access']} 访问")
+            continue
+        remaining.remove(match)
+        old_rank = ACCESS_RANK.get(match['access'], FULL_SCAN_RANK)
+        new_rank = ACCESS_RANK.get(access['access'], FULL_SCAN_RANK)
+        if new_rank > old_rank:
+            regressions.append(f"{label} {access['table']}: {match['access']}({match['key']}) -> "
+                               f"{access['access']}({access['key']})")
+        elif access['key'] != match['key']:
+            notes.append(f"{label} {access['table']}: 索引 {match['key']} -> {access['key']}")
+        if (match['rows'] is not None and access['rows'] is not None
+                and access['rows'] > match['rows'] * ROWS_TOLERANCE and access['rows'] - match['rows'] > ROWS_SLACK):
+            regressions.append(f"{label} {access['table']}: 预估扫描行数 {match['rows']} -> {access['rows']}")
+    for access in remaining:
+        notes.append(f"{label} 不再访问 {access['table']}（原 {access['access']}）")
+    return regressions, notes
+
+
+def compare(baseline, current):
+    """返回 (回归列表, 提示列表)"""
+    regressions, notes = [], []
+    for name, statements in current.items():
+        if isinstance(statements, dict):
+            regressions.append(f"{name} 执行失败: {statements['error']}")
+            continue
+        expected = baseline.get(name)
+        if expected is None or isinstance(expected, dict):
+            notes.append(f"{name} 没有基线，共 {len(statements)} 条语句")
+            continue
+        if len(statements) != len(expected):
+            notes.append(f"{name} 语句数 {len(expected)} -> {len(statements)}")
+        for idx, statement in enumerate(statements):
+            label = f"{name} #{idx + 1}"
+            if idx >= len(expected):
+                regressions.extend(f"{label} 新语句对 {a['table']} 的 {a['access']} 扫描" for a in statement['accesses']
+                                   if ACCESS_RANK.get(a['access'], FULL_SCAN_RANK) >= FULL_SCAN_RANK)
+                continue
+            if statement['sql'] != expected[idx]['sql']:
+                notes.append(f"{label} SQL 文本已变化")
+            found, hints = compare_accesses(label, expected[idx]['accesses'], statement['accesses'])
+            regressions.extend(found)
+            notes.extend(hints)
+    for name in baseline:
+        if name not in current and not name.startswith('_'):
+            notes.append(f"{name} 在基线中但本次没有运行")
+    return regressions, notes
+
+
+def baseline_path_for(dialect):
+    return os.path.join(BASELINE_DIR, f'{dialect}.json')
+
+
+def load_baseline(dialect):
+    """检入的基线，没有该数据库的基线时返回 None"""
+    path = baseline_path_for(dialect)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def print_plans(plans):
+    for name, statements in plans.items():
+        if isinstance(statements, dict):
+            print(f"{name}: 执行失败 {statements['error']}")
+            continue
+        for idx, statement in enumerate(statements):
+            summary = ', '.join(
+                f"{a['table']}:{a['access']}" + (f"({a['key']})" if a['key'] else '') + (f" rows={a['rows']}" if a['rows'] is not None else '')
+                for a in statement['accesses']
+            )
+            print(f"{name} #{idx + 1}: {summary}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='服务层 SQL 执行计划回归检查')
+    arg_parser.add_argument('--update', action='store_true', help='把本次的执行计划写入基线')
+    arg_parser.add_argument('--only', help='只检查名称以此开头的查询')
+    arg_parser.add_argument('--verbose', action='store_true', help='输出每条语句的执行计划')
+    args = arg_parser.parse_args()
+
+    app = create_app()
+    app.config['ANALYTICS_BACKEND'] = 'sql'
+    with app.app_context():
+        migrations.upgrade()
+        seed_dataset()
+        dialect = db.engine.dialect.name
+        baseline_path = baseline_path_for(dialect)
+
+        plans = collect_plans(build_queries(app), args.only)
+        statement_count = sum(len(s) for s in plans.values() if isinstance(s, list))
+        print(f"数据库: {dialect}，{len(plans)} 个查询，{statement_count} 条语句")
+        if args.verbose:
+            print_plans(plans)
+
+        if args.update:
+            baseline = {}
+            if args.only:
+                baseline = load_baseline(dialect) or {}
+            baseline.update(plans)
+            baseline['_meta'] = {'seed': SEED, 'days': DAYS, 'kills_per_day': KILLS_PER_DAY,
+                                 'server': db.session.execute(text(
+                                     'SELECT VERSION()' if dialect == 'mysql' else 'SELECT sqlite_version()')).scalar()}
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(baseline, f, ensure_ascii=False, indent=1, sort_keys=True)
+                f.write('\n')
+            print(f"基线已写入 {baseline_path}")
+            return
+
+        baseline = load_baseline(dialect)
+        if baseline is None:
+            print(f"没有 {dialect} 的基线 {baseline_path}，请先用 --update 生成并检入")
+            sys.exit(1)
+
+        regressions, notes = compare(baseline, plans)
+        for note in notes:
+            print(f"[提示] {note}")
+        for regression in regressions:
+            print(f"[回归] {regression}")
+        if regressions:
+            print(f"{len(regressions)} 处执行计划回归")
+            sys.exit(1)
+        print("执行计划与基线一致" if not notes else "没有执行计划回归")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+时间范围条件的执行计划检查
+
+对每个 time_range 预设和一个自定义起止时间，用 resolve_time_window + time_window_condition
+生成 battle_record 的时间条件，EXPLAIN 后断言 publish_at 所在的索引被用于范围访问
+（MySQL: type=range 且 key 为 PUBLISH_AT_INDEXES 之一；SQLite: SEARCH ... USING [COVERING] INDEX
+且对 publish_at 做范围比较）。由 db/migrations 建表时，优化器会选择覆盖索引
+idx_battle_record_live_time_ids（deleted_at = NULL 之后按 publish_at 范围扫描）。
+同时输出优化前 DATE(publish_at) = 当天 写法的执行计划作为对照（全表扫描）。
+
+MySQL 需要先执行 db/add_battle_record_indexes.sql；SQLite 下脚本自行创建同名索引。
+默认使用内存 SQLite，可通过环境变量 SQLALCHEMY_DATABASE_URI 指向测试用 MySQL
+（会向 battle_record 写入合成数据）。
+
+用法: python benchmarks/check_time_range_explain.py [战斗记录条数]
+
+tests/test_query_plans.py 在测试数据库上运行同样的检查。
+"""
+
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.utils.file_parser import bulk_insert_battle_records  # noqa: E402
+from app.utils.time_range import resolve_time_window, time_window_condition  # noqa: E402
+
+INDEX_NAME = 'idx_battle_record_publish_at'
+
+# 可以对 publish_at 做范围访问的索引
+PUBLISH_AT_INDEXES = (INDEX_NAME, 'idx_battle_record_live_time_ids')
+PRESETS = ['today', 'yesterday', 'week', 'month', 'three_months', 'all']
+
+QUERY = "SELECT COUNT(*) FROM battle_record br WHERE br.deleted_at IS NULL {date_condition}"
+
+# 优化前的写法，作为对照组
+LEGACY_CONDITION = {
+    'mysql': "AND DATE(br.publish_at) = CURDATE()",
+    'sqlite': "AND DATE(br.publish_at) = DATE('now', 'localtime')"
+}
+
+
+def load_rows(count):
+    """最近一年内均匀分布的战斗记录，保证各预设区间都只命中部分数据"""
+    rnd = random.Random(20250101)
+    now = datetime.now()
+    bulk_insert_battle_records([{
+        'win': f'玩家{rnd.randrange(500)}',
+        'lost': f'玩家{rnd.randrange(500)}',
+        'position': '100,100',
+        'remark': 0,
+        'publish_at': now - timedelta(seconds=rnd.randint(0, 3 * 365 * 86400))
+    } for _ in range(count)])
+    db.session.commit()
+
+
+def explain(dialect, sql, params):
+    """返回 (是否对 publish_at 索引做范围访问, 计划描述)"""
+    if dialect == 'mysql':
+        rows = db.session.execute(text('EXPLAIN ' + sql), params).mappings().all()
+        row = next(r for r in rows if r['table'] == 'br')
+        plan = f"type={row['type']} key={row['key']} rows={row['rows']}"
+        return row['type'] == 'range' and row['key'] in PUBLISH_AT_INDEXES, plan
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+    plan = '; '.join(row[-1] for row in rows)
+    uses_index = any(f'INDEX {name} ' in plan for name in PUBLISH_AT_INDEXES)
+    return plan.startswith('SEARCH') and uses_index and ('publish_at>' in plan or 'publish_at<' in plan), plan
+
+
+def analyze(dialect):
+    """更新统计信息，使优化器按当前数据量选择执行计划"""
+    if dialect == 'mysql':
+        db.session.execute(text('ANALYZE TABLE battle_record'))
+    else:
+        db.session.execute(text('ANALYZE'))
+
+
+def check_cases(dialect):
+    """
+    EXPLAIN 每个 time_range 预设和一个自定义起止时间生成的时间条件
+
+    Returns:
+        list: [(名称, 是否对 publish_at 索引做范围访问, 时间条件, 计划描述)]
+    """
+    cases = [(preset, resolve_time_window(preset)) for preset in PRESETS]
+    now = datetime.now()
+    cases.append(('custom', resolve_time_window(None, now - timedelta(days=3, hours=4), now - timedelta(days=1))))
+
+    results = []
+    for name, (start, end) in cases:
+        date_condition, params = time_window_condition('br.publish_at', start, end)
+        ok, plan = explain(dialect, QUERY.format(date_condition=date_condition), params)
+        results.append((name, ok, date_condition, plan))
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON battle_record(publish_at)"))
+        load_rows(count)
+        analyze(dialect)
+
+        failed = 0
+        for name, ok, date_condition, plan in check_cases(dialect):
+            failed += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name:<13} {date_condition}\n       {plan}")
+
+        legacy_condition = LEGACY_CONDITION.get(dialect)
+        if legacy_condition:
+            _, plan = explain(dialect, QUERY.format(date_condition=legacy_condition), {})
+            print(f"[对照] 优化前 {legacy_condition}\n       {plan}")
+
+        if failed:
+            print(f"{failed} 个时间范围没有使用 publish_at 索引做范围访问")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
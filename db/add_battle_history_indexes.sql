@@ -0,0 +1,13 @@
+-- 已纳入迁移 db/migrations/0001_baseline.py，新环境执行 flask db upgrade 即可，无需再单独执行本脚本
+-- 玩家战斗记录游标分页（/api/battle/player/<name>/battles）使用的索引
+-- 分页按 (publish_at, id) 倒序，击杀/被杀两侧分别按 win、lost 做范围扫描；
+-- InnoDB 二级索引末尾隐含主键 id，(win, publish_at) 的索引顺序即 (win, publish_at, id)，
+-- 每页只读取 LIMIT 条索引记录，无需排序。
+-- 已有的 idx_battle_record_win_date(win, publish_at, deleted_at) 中 deleted_at 位于 id 之前，
+-- 同一秒内的记录在索引中不按 id 排列，无法直接满足该排序。
+
+-- 1. 击杀一侧
+CREATE INDEX idx_battle_record_win_publish ON battle_record(win, publish_at);
+
+-- 2. 被杀一侧
+CREATE INDEX idx_battle_record_lost_publish ON battle_record(lost, publish_at);
@@ -1,3 +1,4 @@
+-- 已纳入迁移 db/migrations/0001_baseline.py，新环境执行 flask db upgrade 即可，无需再单独执行本脚本
 -- 为 battle_record 表添加性能优化索引
 -- 这些索引将大幅提升战绩查询的速度
 -- 注意: 如果索引已存在，执行会报错，这是正常的，脚本会自动跳过
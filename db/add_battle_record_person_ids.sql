@@ -0,0 +1,21 @@
+-- 已纳入迁移 db/migrations/0001_baseline.py，新环境执行 flask db upgrade 即可，无需再单独执行本脚本
+-- 为 battle_record 添加击杀者/被击杀者的 person.id 列
+-- 排名、三神统计、击杀明细等聚合查询改为按整数 id 分组和 JOIN，不再用 win/lost 字符串关联 person.name
+-- 新入库的记录在写入时填充；已有记录执行下面的回填语句，或执行 flask backfill-person-ids（按 id 分段更新）
+
+alter table battle_record
+    add win_person_id int unsigned null comment 'win 对应的 person.id' after lost,
+    add lost_person_id int unsigned null comment 'lost 对应的 person.id' after win_person_id;
+
+-- 1. 按击杀者 id 查询击杀明细、按时间范围统计
+CREATE INDEX idx_battle_record_win_person ON battle_record(win_person_id, publish_at);
+
+-- 2. 按被击杀者 id 查询死亡明细、按时间范围统计
+CREATE INDEX idx_battle_record_lost_person ON battle_record(lost_person_id, publish_at);
+
+-- 3. 回填已有记录（数据量大时建议使用 flask backfill-person-ids 分段执行）
+UPDATE battle_record br
+    LEFT JOIN person w ON w.name = br.win
+    LEFT JOIN person l ON l.name = br.lost
+SET br.win_person_id  = w.id,
+    br.lost_person_id = l.id;
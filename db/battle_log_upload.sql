@@ -0,0 +1,31 @@
+-- 战斗日志上传登记表
+-- 按内容哈希记录已入库的日志文件，相同文件再次上传时直接跳过，
+-- 追加了新内容的文件只解析新增的尾部
+
+create table battle_log_upload
+(
+    id                int unsigned auto_increment comment 'id'
+        primary key,
+    content_hash      char(64)        not null comment '整个文件的 sha256',
+    first_chunk_hash  char(64)        null comment '第一个完整块的 sha256',
+    chunk_size        int unsigned    not null comment '分块大小(字节)',
+    chunk_hashes      mediumtext      null comment '每个完整块的 sha256，JSON 数组',
+    file_size         bigint unsigned not null comment '文件大小(字节)',
+    storage_path      varchar(255)    null comment '压缩存储路径(相对上传目录)',
+    original_filename varchar(255)    null comment '上传文件名',
+    encoding          varchar(20)     null comment '解析使用的编码',
+    resumed_from      bigint unsigned null default 0 comment '开始解析的字节偏移',
+    kill_count        int unsigned    null default 0 comment '解析的击杀记录数',
+    blessing_count    int unsigned    null default 0 comment '解析的祝福记录数',
+    inserted_count    int unsigned    null default 0 comment '新插入的战斗记录数',
+    skipped_count     int unsigned    null default 0 comment '跳过的重复战斗记录数',
+    created_at        timestamp       null,
+    updated_at        timestamp       null,
+    create_by         int unsigned    null,
+    constraint uk_battle_log_upload_content_hash
+        unique (content_hash)
+)
+    comment '战斗日志上传登记';
+
+create index idx_battle_log_upload_first_chunk
+    on battle_log_upload (first_chunk_hash);
@@ -0,0 +1,32 @@
+-- battle_record 按月分区和归档登记表
+-- 由迁移 0004_battle_record_partitions 执行（flask db upgrade），分区边界按现有数据自动生成，
+-- 以下为手工执行时的参考；之后用 flask partitions rotate 创建未来月份的分区、归档冷数据
+
+create table battle_record_archive
+(
+    id          int unsigned auto_increment comment 'id'
+        primary key,
+    month       date         not null comment '归档月份（该月 1 日）',
+    row_count   int unsigned not null default 0 comment '归档的战斗记录条数（含已删除的）',
+    file_name   varchar(255) not null comment '归档文件名，位于 BATTLE_RECORD_ARCHIVE_DIR',
+    checksum    varchar(64)  not null comment '归档文件的 SHA-256',
+    archived_at timestamp    null comment '归档时间',
+    restored_at timestamp    null comment '恢复时间，未恢复为空',
+    constraint uk_battle_record_archive_month
+        unique (month)
+)
+    comment 'battle_record 归档记录';
+
+-- 分区表的主键必须包含分区列；InnoDB 分区表不支持外键，先删除 battle_record 上的外键。
+-- publish_at 为 timestamp 时只能按 UNIX_TIMESTAMP() 分区（datetime 列用 RANGE COLUMNS (publish_at)，
+-- 上界直接写 '2025-02-01'）。
+alter table battle_record
+    modify publish_at timestamp not null,
+    drop primary key,
+    add primary key (id, publish_at)
+    partition by range (unix_timestamp(publish_at)) (
+        partition p202501 values less than (unix_timestamp('2025-02-01 00:00:00')),
+        partition p202502 values less than (unix_timestamp('2025-03-01 00:00:00')),
+        partition p202503 values less than (unix_timestamp('2025-04-01 00:00:00')),
+        partition pmax values less than (maxvalue)
+    );
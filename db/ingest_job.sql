@@ -0,0 +1,34 @@
+-- 战斗日志解析任务表
+-- 上传接口只创建任务并立即返回，由后台线程池执行解析并把进度写回本表
+
+create table ingest_job
+(
+    id                int unsigned auto_increment comment 'id'
+        primary key,
+    status            varchar(20)     not null default 'pending' comment '状态: pending running success failed duplicate',
+    original_filename varchar(255)    null comment '上传文件名',
+    content_hash      char(64)        null comment '文件内容 sha256',
+    storage_path      varchar(255)    null comment '压缩存储路径(相对上传目录)',
+    file_size         bigint unsigned null default 0 comment '文件大小(字节)',
+    chunk_hashes      mediumtext      null comment '每个完整块的 sha256，JSON 数组',
+    encoding          varchar(20)     null comment '解码使用的编码',
+    resumed_from      bigint unsigned null default 0 comment '开始解析的字节偏移',
+    lines             int unsigned    null default 0 comment '已解析行数',
+    kills             int unsigned    null default 0 comment '已解析击杀记录数',
+    blessings         int unsigned    null default 0 comment '已解析祝福记录数',
+    inserted          int unsigned    null default 0 comment '已插入战斗记录数',
+    skipped           int unsigned    null default 0 comment '跳过的重复战斗记录数',
+    blessings_updated int unsigned    null default 0 comment '已更新祝福标记数',
+    message           varchar(500)    null comment '结果或错误信息',
+    started_at        timestamp       null,
+    finished_at       timestamp       null,
+    created_at        timestamp       null,
+    updated_at        timestamp       null
+)
+    comment '战斗日志解析任务';
+
+create index idx_ingest_job_status
+    on ingest_job (status);
+
+create index idx_ingest_job_content_hash
+    on ingest_job (content_hash);
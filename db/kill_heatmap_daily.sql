@@ -0,0 +1,28 @@
+-- battle_record 整数坐标列和每日击杀热力图汇总表
+-- 由迁移 0005_battle_record_coordinates 执行（flask db upgrade），同时从 position 回填坐标并重建汇总；
+-- 之后回填坐标执行 flask backfill-coordinates，重建汇总执行 flask rebuild-heatmap
+
+alter table battle_record
+    add x_coord int null comment 'position 中的 X 坐标，入库时解析',
+    add y_coord int null comment 'position 中的 Y 坐标';
+
+-- 按 (日期, 势力, 网格) 预聚合 battle_record 的击杀坐标，网格边长为 10 个坐标单位（HEATMAP_CELL_SIZE）
+-- 击杀计入击杀者势力的 kills，同时计入被击杀者势力的 deaths；计数在记录归属变化时按差值调整，使用有符号整数
+create table kill_heatmap_daily
+(
+    id         int unsigned auto_increment comment 'id'
+        primary key,
+    stat_date  date        not null comment '统计日期',
+    god        varchar(20) not null comment '势力',
+    cell_x     int         not null comment '网格 X 编号（坐标整除网格边长）',
+    cell_y     int         not null comment '网格 Y 编号',
+    kills      int         not null default 0 comment '该势力在此网格的击杀数',
+    deaths     int         not null default 0 comment '该势力在此网格的死亡数',
+    updated_at timestamp   null,
+    constraint uk_kill_heatmap_daily_date_cell
+        unique (stat_date, god, cell_x, cell_y)
+)
+    comment '每日击杀热力图汇总';
+
+create index idx_kill_heatmap_daily_god
+    on kill_heatmap_daily (god, stat_date);
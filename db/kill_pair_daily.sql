@@ -0,0 +1,24 @@
+-- 每日击杀对汇总表
+-- 按 (日期, 击杀者, 被击杀者) 预聚合 battle_record，入库时与战斗记录在同一事务中增量更新
+-- 势力/分组击杀明细、玩家击杀/被杀明细按天求和后取前 N 名，只有不足一天的首尾时段才扫描 battle_record
+-- 由迁移 0003_kill_pair_daily 创建（flask db-upgrade）；历史数据执行 flask rebuild-kill-pairs 重建
+
+create table kill_pair_daily
+(
+    id         int unsigned auto_increment comment 'id'
+        primary key,
+    stat_date  date         not null comment '统计日期',
+    killer_id  int unsigned not null comment '击杀者 person.id',
+    victim_id  int unsigned not null comment '被击杀者 person.id',
+    kills      int unsigned not null default 0 comment '击杀次数',
+    updated_at timestamp    null,
+    constraint uk_kill_pair_daily_date_pair
+        unique (stat_date, killer_id, victim_id)
+)
+    comment '每日击杀对汇总';
+
+create index idx_kill_pair_daily_killer
+    on kill_pair_daily (killer_id, stat_date);
+
+create index idx_kill_pair_daily_victim
+    on kill_pair_daily (victim_id, stat_date);
@@ -0,0 +1,25 @@
+-- 每分钟势力击杀时间线汇总表
+-- 由迁移 0006_kill_timeline_minute 执行（flask db upgrade），同时从 battle_record 重建；
+-- 之后重建汇总执行 flask rebuild-timeline
+
+-- 按 (日期, 势力, 当天第几分钟) 预聚合 battle_record，时间线接口按需要的粒度再合并分钟
+-- 击杀计入击杀者势力的 kills（remark = 1 的祝福同时计入 blessings），同时计入被击杀者势力的 deaths；
+-- 计数在记录归属变化时按差值调整，使用有符号整数
+create table kill_timeline_minute
+(
+    id            int unsigned auto_increment comment 'id'
+        primary key,
+    stat_date     date        not null comment '统计日期',
+    god           varchar(20) not null comment '势力',
+    minute_of_day smallint    not null comment '当天第几分钟（0-1439）',
+    kills         int         not null default 0 comment '该势力在这一分钟的击杀数',
+    deaths        int         not null default 0 comment '该势力在这一分钟的死亡数',
+    blessings     int         not null default 0 comment '该势力在这一分钟的祝福数',
+    updated_at    timestamp   null,
+    constraint uk_kill_timeline_minute_date_god
+        unique (stat_date, god, minute_of_day)
+)
+    comment '每分钟势力击杀时间线汇总';
+
+create index idx_kill_timeline_minute_god
+    on kill_timeline_minute (god, stat_date);
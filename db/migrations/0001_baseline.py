@@ -0,0 +1,33 @@
+"""
+基线：现有业务表、person id 列和 db/*.sql 中的索引
+
+新库按 app/models 的定义建表；已有的库只补齐缺少的列和索引
+（对应 add_battle_record_person_ids.sql、add_battle_record_indexes.sql、
+add_battle_history_indexes.sql），已存在的部分跳过。
+person id 列是新加的时需要再执行 flask backfill-person-ids 回填。
+"""
+
+from app.models import PlayerGroup, Person, BattleRecord, Rankings, BattleLogUpload, IngestJob, PlayerDailyStats
+from app.utils.migrations import create_model_tables, add_column, create_index
+
+
+def upgrade():
+    create_model_tables(PlayerGroup, Person, BattleRecord, Rankings, BattleLogUpload, IngestJob, PlayerDailyStats)
+
+    add_column('battle_record', 'win_person_id', 'INTEGER NULL')
+    add_column('battle_record', 'lost_person_id', 'INTEGER NULL')
+
+    # add_battle_record_indexes.sql
+    create_index('idx_battle_record_win', 'battle_record', ['win'])
+    create_index('idx_battle_record_lost', 'battle_record', ['lost'])
+    create_index('idx_battle_record_publish_at', 'battle_record', ['publish_at'])
+    create_index('idx_battle_record_win_date', 'battle_record', ['win', 'publish_at', 'deleted_at'])
+    create_index('idx_battle_record_lost_date', 'battle_record', ['lost', 'publish_at', 'deleted_at'])
+    # add_battle_record_person_ids.sql
+    create_index('idx_battle_record_win_person', 'battle_record', ['win_person_id', 'publish_at'])
+    create_index('idx_battle_record_lost_person', 'battle_record', ['lost_person_id', 'publish_at'])
+    # add_battle_history_indexes.sql
+    create_index('idx_battle_record_win_publish', 'battle_record', ['win', 'publish_at'])
+    create_index('idx_battle_record_lost_publish', 'battle_record', ['lost', 'publish_at'])
+    # player_daily_stats.sql
+    create_index('idx_player_daily_stats_person', 'player_daily_stats', ['person_id', 'stat_date'])
@@ -0,0 +1,36 @@
+"""
+覆盖索引：统计查询的时间窗口扫描和按玩家名称/势力/分组的 person 查找
+
+battle_record（InnoDB 二级索引末尾隐含主键 id）：
+- idx_battle_record_live_time_ids (deleted_at, publish_at, win_person_id, lost_person_id, remark)
+  覆盖 player_daily_stats / kill_pair_daily 不足一天的首尾时段、汇总表重建和势力统计，
+  `deleted_at IS NULL AND publish_at 范围` 只扫描索引，不回表
+- idx_battle_record_live_time_names (deleted_at, publish_at, win, lost, remark)
+  覆盖按名称关联 person 的统计（data_service 的排名/统计、分组成员战绩）
+
+person：
+- idx_person_name_live (name, deleted_at, god, job)：按名称查找玩家和 `p.name = br.win` 关联
+- idx_person_god_live (god, deleted_at, job)：按势力（和职业）筛选未删除的玩家
+- idx_person_group_live (player_group_id, deleted_at)：分组成员和分组人数
+"""
+
+from app.utils.migrations import create_index, drop_index
+
+INDEXES = [
+    ('idx_battle_record_live_time_ids', 'battle_record',
+     ['deleted_at', 'publish_at', 'win_person_id', 'lost_person_id', 'remark']),
+    ('idx_battle_record_live_time_names', 'battle_record', ['deleted_at', 'publish_at', 'win', 'lost', 'remark']),
+    ('idx_person_name_live', 'person', ['name', 'deleted_at', 'god', 'job']),
+    ('idx_person_god_live', 'person', ['god', 'deleted_at', 'job']),
+    ('idx_person_group_live', 'person', ['player_group_id', 'deleted_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        drop_index(name, table)
@@ -0,0 +1,21 @@
+"""
+每日击杀对汇总表 kill_pair_daily，并从 battle_record 重建历史数据
+
+表结构见 db/kill_pair_daily.sql。重建依赖 win_person_id/lost_person_id，
+之后回填 person id 时执行 flask rebuild-kill-pairs 重新汇总。
+"""
+
+from app.extensions import db
+from app.models import KillPairDaily
+from app.services.stats_service import rebuild_kill_pair_daily
+from app.utils.migrations import create_model_tables, has_table
+
+
+def upgrade():
+    create_model_tables(KillPairDaily)
+    rebuild_kill_pair_daily()
+
+
+def downgrade():
+    if has_table('kill_pair_daily'):
+        KillPairDaily.__table__.drop(db.session.connection())
@@ -0,0 +1,27 @@
+"""
+battle_record 按月分区（仅 MySQL）和归档登记表 battle_record_archive
+
+分区会重建整张 battle_record，大表请在低峰期执行；之后由 flask partitions rotate
+创建未来月份的分区并归档冷数据。其他数据库只建登记表。表结构见 db/battle_record_partitions.sql。
+"""
+
+from flask import current_app
+from app.extensions import db
+from app.models import BattleRecordArchive
+from app.services.partition_service import partition_battle_record, unpartition_battle_record, archived_months
+from app.utils.migrations import create_model_tables, has_table
+
+
+def upgrade():
+    create_model_tables(BattleRecordArchive)
+    if db.engine.dialect.name == 'mysql':
+        partition_battle_record(current_app.config['BATTLE_RECORD_FUTURE_PARTITIONS'])
+
+
+def downgrade():
+    if has_table('battle_record_archive'):
+        if archived_months():
+            raise ValueError("还有已归档的月份，请先用 flask partitions restore 恢复")
+        BattleRecordArchive.__table__.drop(db.session.connection())
+    if db.engine.dialect.name == 'mysql':
+        unpartition_battle_record()
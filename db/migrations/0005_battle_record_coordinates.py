@@ -0,0 +1,28 @@
+"""
+battle_record 增加整数坐标列 x_coord / y_coord，从 position 回填，并创建击杀热力图汇总表 kill_heatmap_daily
+
+回填按 id 区间分段提交，中断后重新执行只处理还没有坐标的记录。表结构见 db/kill_heatmap_daily.sql。
+"""
+
+from sqlalchemy import text
+from app.extensions import db
+from app.models import KillHeatmapDaily
+from app.services.battle_service import backfill_battle_record_coordinates
+from app.services.stats_service import rebuild_kill_heatmap_daily
+from app.utils.migrations import add_column, create_model_tables, has_column, has_table
+
+
+def upgrade():
+    add_column('battle_record', 'x_coord', 'INTEGER NULL')
+    add_column('battle_record', 'y_coord', 'INTEGER NULL')
+    backfill_battle_record_coordinates()
+    create_model_tables(KillHeatmapDaily)
+    rebuild_kill_heatmap_daily()
+
+
+def downgrade():
+    if has_table('kill_heatmap_daily'):
+        KillHeatmapDaily.__table__.drop(db.session.connection())
+    for column in ('y_coord', 'x_coord'):
+        if has_column('battle_record', column):
+            db.session.execute(text(f"ALTER TABLE battle_record DROP COLUMN {column}"))
@@ -0,0 +1,20 @@
+"""
+创建每分钟势力击杀时间线汇总表 kill_timeline_minute，并从 battle_record 重建
+
+表结构见 db/kill_timeline_minute.sql。
+"""
+
+from app.extensions import db
+from app.models import KillTimelineMinute
+from app.services.stats_service import rebuild_kill_timeline_minute
+from app.utils.migrations import create_model_tables, has_table
+
+
+def upgrade():
+    create_model_tables(KillTimelineMinute)
+    rebuild_kill_timeline_minute()
+
+
+def downgrade():
+    if has_table('kill_timeline_minute'):
+        KillTimelineMinute.__table__.drop(db.session.connection())
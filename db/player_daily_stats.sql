@@ -0,0 +1,22 @@
+-- 玩家每日战绩汇总表
+-- 按 (日期, 玩家) 预聚合 battle_record，入库时与战斗记录在同一事务中增量更新
+-- 整天范围的排名、三神统计、势力统计和每日趋势直接读取本表，只有不足一天的首尾时段才扫描 battle_record
+-- 历史数据执行 flask rebuild-daily-stats 重建（依赖 win_person_id/lost_person_id，见 add_battle_record_person_ids.sql）
+
+create table player_daily_stats
+(
+    id         int unsigned auto_increment comment 'id'
+        primary key,
+    stat_date  date         not null comment '统计日期',
+    person_id  int unsigned not null comment 'person.id',
+    kills      int unsigned not null default 0 comment '击杀数',
+    deaths     int unsigned not null default 0 comment '死亡数',
+    blessings  int unsigned not null default 0 comment '带祝福的击杀数',
+    updated_at timestamp    null,
+    constraint uk_player_daily_stats_date_person
+        unique (stat_date, person_id)
+)
+    comment '玩家每日战绩汇总';
+
+create index idx_player_daily_stats_person
+    on player_daily_stats (person_id, stat_date);
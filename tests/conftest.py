@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest 公共夹具
+
+测试始终使用临时 SQLite 文件（不会连接环境变量中配置的数据库），表结构和索引由
+db/migrations 创建。仪表盘等查询可能在其他线程中执行，内存 SQLite 无法跨连接共享，
+因此不使用 sqlite://。
+"""
+
+import os
+import tempfile
+
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tests.db')
+
+import pytest  # noqa: E402
+from app import create_app  # noqa: E402
+from app.utils import migrations  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    """整个测试会话共用的应用和数据库"""
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        yield app
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试用合成数据
+
+战斗记录包含已删除的玩家和战斗记录、未录入 person 表的名称、玩家分组和祝福，
+写入后重建全部汇总表，并清空结果缓存、列式数据和排名快照。
+"""
+
+import random
+from datetime import datetime, timedelta
+from app import db
+from app.models.player import Person, PlayerGroup, BattleRecord
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.services import columnar_engine
+from app.services.rank_snapshot import clear_rank_snapshots
+from app.services.stats_service import (
+    rebuild_player_daily_stats, rebuild_kill_pair_daily, rebuild_kill_heatmap_daily, rebuild_kill_timeline_minute
+)
+from app.utils.file_parser import bulk_insert_battle_records
+from app.utils.result_cache import clear_result_cache
+
+GODS = ['梵天', '比湿奴', '湿婆']
+JOBS = ['法师', '弓', '狂', '奶', None]
+START = datetime(2025, 3, 1)
+GROUP_COUNT = 10
+
+
+def build_dataset(days=20, kills_per_day=300, players_per_god=40, seed=20250301):
+    """
+    生成玩家和战斗记录
+
+    Returns:
+        tuple: (玩家列表, 战斗记录列表)；战斗记录为 (win, lost, publish_at, 是否祝福, 是否已删除)
+    """
+    rnd = random.Random(seed)
+    persons = []
+    for god in GODS:
+        for idx in range(players_per_god):
+            persons.append({'name': f'{god}{idx:03d}', 'god': god, 'job': rnd.choice(JOBS),
+                            'group': rnd.randrange(GROUP_COUNT) if rnd.random() < 0.4 else None,
+                            'deleted': rnd.random() < 0.05})
+    names = [p['name'] for p in persons] + [f'路人{idx}' for idx in range(10)]
+    rows = []
+    for day in range(days):
+        evening = START + timedelta(days=day, hours=20)
+        for _ in range(kills_per_day):
+            win, lost = rnd.sample(names, 2)
+            publish_at = evening + timedelta(seconds=rnd.randint(-6 * 3600, 3 * 3600))
+            rows.append((win, lost, publish_at, rnd.random() < 0.2, rnd.random() < 0.02))
+    return persons, rows
+
+
+def load_dataset(persons, rows, seed=20250301):
+    """清空相关表后写入玩家、分组和战斗记录，并重建汇总表"""
+    for model in (KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person,
+                  PlayerGroup):
+        model.query.delete()
+    groups = [PlayerGroup(group_name=f'分组{idx:02d}') for idx in range(GROUP_COUNT)]
+    db.session.add_all(groups)
+    db.session.flush()
+    person_ids = {}
+    for person in persons:
+        obj = Person(name=person['name'], god=person['god'], job=person['job'],
+                     deleted_at=datetime.now() if person['deleted'] else None,
+                     player_group_id=groups[person['group']].id if person['group'] is not None else None)
+        db.session.add(obj)
+        db.session.flush()
+        person_ids[person['name']] = obj.id
+
+    rnd = random.Random(seed)
+    records = []
+    for win, lost, publish_at, blessed, deleted in rows:
+        x, y = rnd.randint(0, 999), rnd.randint(0, 999)
+        records.append({
+            'win': win,
+            'lost': lost,
+            'win_person_id': person_ids.get(win),
+            'lost_person_id': person_ids.get(lost),
+            'position': f'{x},{y}',
+            'x_coord': x,
+            'y_coord': y,
+            'remark': 1 if blessed else 0,
+            'publish_at': publish_at,
+            'deleted_at': datetime.now() if deleted else None
+        })
+    bulk_insert_battle_records(records)
+    rebuild_player_daily_stats()
+    rebuild_kill_pair_daily()
+    rebuild_kill_heatmap_daily()
+    rebuild_kill_timeline_minute()
+    db.session.commit()
+    reset_derived_state()
+
+
+def reset_derived_state():
+    """丢弃进程内的结果缓存、列式数据和排名快照"""
+    clear_result_cache()
+    columnar_engine.reset_columnar_store()
+    clear_rank_snapshots()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日志入库去重（save_battle_log_to_db）
+
+库中的名称与日志中的名称只差尾部空格或大小写时，MySQL 默认排序规则下视为同一条记录，
+内存中的去重和祝福匹配也要按同样的规则比较。
+"""
+
+from datetime import datetime
+from app import db
+from app.models.player import Person, BattleRecord
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.utils.file_parser import save_battle_log_to_db, bulk_insert_battle_records
+from tests.factories import reset_derived_state
+
+PUBLISH_AT = datetime(2025, 3, 1, 20, 0)
+
+
+def test_names_differing_in_case_or_trailing_spaces_are_duplicates(app):
+    for model in (KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person):
+        model.query.delete()
+    bulk_insert_battle_records([{
+        'win': 'Alpha ', 'lost': 'beta', 'position': '1,2', 'x_coord': 1, 'y_coord': 2,
+        'remark': 0, 'publish_at': PUBLISH_AT
+    }])
+    db.session.commit()
+    reset_derived_state()
+
+    battle_details = [
+        {'killer_name': 'alpha', 'victim_name': 'BETA', 'x_coord': 1, 'y_coord': 2, 'timestamp': PUBLISH_AT},
+        {'killer_name': 'ALPHA', 'victim_name': 'Beta  ', 'x_coord': 1, 'y_coord': 2, 'timestamp': PUBLISH_AT},
+    ]
+    blessings = [{'player_name': 'Alpha', 'blessing_name': '梵天', 'timestamp': PUBLISH_AT}]
+    stats = {}
+    success, _ = save_battle_log_to_db(battle_details, blessings, existing_players={}, stats=stats)
+
+    assert success
+    assert stats['inserted'] == 0
+    assert stats['skipped'] == 2
+    assert [(record.win, record.remark) for record in BattleRecord.query.all()] == [('Alpha ', 1)]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+列式分析引擎与 SQL 查询的一致性
+
+对排名、三神统计、势力统计、势力/分组击杀明细和每日趋势，比较 ANALYTICS_BACKEND=sql
+与 numpy 的结果：初始数据、增量入库后（列式数据追加新记录）、玩家改名后（整表重新加载）
+各校验一次。SQL 中 ORDER BY 并列的行顺序不确定，列表按完整排序键规范化后再比较。
+"""
+
+import random
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.player import Person
+from app.services import battle_service, data_service, columnar_engine
+from app.utils.file_parser import save_battle_log_to_db
+from tests.factories import START, build_dataset, load_dataset
+
+pytestmark = pytest.mark.skipif(not columnar_engine.columnar_available(), reason='未安装 NumPy')
+
+RANGES = [
+    (START, START + timedelta(days=20)),
+    (datetime(2025, 3, 5, 20, 30), datetime(2025, 3, 12, 21, 15, 59)),
+    (datetime(2025, 3, 10, 0, 0), datetime(2025, 3, 10, 23, 59, 59)),
+    (datetime(2025, 3, 10, 19, 0), datetime(2025, 3, 10, 22, 0)),
+]
+
+
+def canonical_rankings(rankings):
+    return sorted(rankings, key=lambda r: (-r['score'], -r['kills'], r['deaths'], r['id']))
+
+
+def canonical_gods(stats):
+    return {
+        god: dict(data, players=sorted(data['players'], key=lambda p: (-p['kills'], p['deaths'], -p['bless'], p['name'], str(p['job']))))
+        for god, data in stats.items()
+    }
+
+
+def canonical_details(details):
+    return sorted(details, key=lambda d: (-d['count'], d['id']))
+
+
+def build_checks():
+    """(名称, 调用函数, 规范化函数)"""
+    checks = [('faction_statistics', lambda: battle_service.get_faction_statistics.__wrapped__(), None)]
+    for start, end in RANGES:
+        label = f'{start:%m-%d %H:%M}~{end:%m-%d %H:%M}'
+        checks += [
+            (f'rankings {label}',
+             lambda s=start, e=end: battle_service.get_player_rankings.__wrapped__(start_datetime=s, end_datetime=e),
+             canonical_rankings),
+            (f'rankings 比湿奴/奶 {label}',
+             lambda s=start, e=end: battle_service.get_player_rankings.__wrapped__('比湿奴', '奶', start_datetime=s, end_datetime=e),
+             canonical_rankings),
+        ]
+        for grouped in (False, True):
+            checks.append((f'gods_stats grouped={grouped} {label}',
+                           lambda s=start, e=end, g=grouped: battle_service.get_gods_stats.__wrapped__(s, e, g),
+                           canonical_gods))
+        for direction in ('out', 'in'):
+            checks += [
+                (f'faction_kill_details {direction} {label}',
+                 lambda s=start, e=end, d=direction: battle_service.get_faction_kill_details.__wrapped__(
+                     '梵天', d, None, s, e, limit=10000),
+                 canonical_details),
+                (f'group_kill_details {direction} {label}',
+                 lambda s=start, e=end, d=direction: battle_service.get_group_kill_details.__wrapped__(
+                     '分组03', d, None, s, e, limit=10000),
+                 canonical_details),
+            ]
+        for metric, func in (('kills', data_service.get_daily_kills_by_player),
+                             ('deaths', data_service.get_daily_deaths_by_player),
+                             ('scores', data_service.get_daily_scores_by_player)):
+            checks.append((f'daily_{metric} {label}',
+                           lambda f=func, s=start, e=end: f.__wrapped__('custom', 10000, f'{s:%Y-%m-%d}', f'{e:%Y-%m-%d}'),
+                           None))
+    return checks
+
+
+def mismatched_checks(app):
+    """两种后端结果不一致的检查项名称"""
+    mismatches = []
+    try:
+        for name, call, canonical in build_checks():
+            app.config['ANALYTICS_BACKEND'] = 'sql'
+            expected = call()
+            app.config['ANALYTICS_BACKEND'] = 'numpy'
+            actual = call()
+            if canonical:
+                expected, actual = canonical(expected), canonical(actual)
+            if expected != actual:
+                mismatches.append(name)
+    finally:
+        app.config['ANALYTICS_BACKEND'] = 'sql'
+    return mismatches
+
+
+@pytest.fixture
+def dataset(app):
+    persons, rows = build_dataset()
+    load_dataset(persons, rows)
+    return persons
+
+
+def test_initial_data_matches_sql(app, dataset):
+    assert mismatched_checks(app) == []
+
+
+def test_incremental_ingest_matches_sql(app, dataset):
+    # 先加载列式数据，入库后应只追加新记录
+    app.config['ANALYTICS_BACKEND'] = 'numpy'
+    columnar_engine.get_store()
+    app.config['ANALYTICS_BACKEND'] = 'sql'
+
+    rnd = random.Random(7)
+    names = [p['name'] for p in dataset]
+    battle_details = []
+    for idx in range(300):
+        win, lost = rnd.sample(names, 2)
+        battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 1, 'y_coord': 2,
+                               'timestamp': datetime(2025, 3, 10, 20, 0) + timedelta(seconds=idx)})
+    blessings = [{'player_name': d['killer_name'], 'blessing_name': '梵天', 'timestamp': d['timestamp']}
+                 for d in battle_details[::4]]
+    success, _ = save_battle_log_to_db(battle_details, blessings)
+    assert success
+
+    assert mismatched_checks(app) == []
+
+
+def test_rename_matches_sql(app, dataset):
+    app.config['ANALYTICS_BACKEND'] = 'numpy'
+    columnar_engine.get_store()
+    app.config['ANALYTICS_BACKEND'] = 'sql'
+
+    person = Person.query.filter_by(name='梵天001').first()
+    person.name = '梵天001改'
+    db.session.flush()
+    battle_service.resolve_battle_record_person_ids(['梵天001', '梵天001改'])
+    db.session.commit()
+
+    assert mismatched_checks(app) == []
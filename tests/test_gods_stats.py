@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+三神统计按玩家分组显示（get_gods_stats show_grouped=True）
+"""
+
+from datetime import datetime
+from app.services import battle_service
+from tests.factories import load_dataset
+
+
+def test_grouped_row_per_group_with_member_job(app):
+    persons = [
+        {'name': '梵天甲', 'god': '梵天', 'job': '奶', 'group': 0, 'deleted': False},
+        {'name': '梵天乙', 'god': '梵天', 'job': '法师', 'group': 0, 'deleted': False},
+        {'name': '梵天丙', 'god': '梵天', 'job': None, 'group': 0, 'deleted': False},
+        {'name': '梵天丁', 'god': '梵天', 'job': None, 'group': None, 'deleted': False},
+        {'name': '湿婆甲', 'god': '湿婆', 'job': '狂', 'group': None, 'deleted': False},
+    ]
+    publish_at = datetime(2025, 3, 1, 20, 0)
+    rows = [(win, '湿婆甲', publish_at, False, False) for win in ('梵天甲', '梵天乙', '梵天丙', '梵天丁')]
+    load_dataset(persons, rows)
+
+    stats = battle_service.get_gods_stats.__wrapped__(show_grouped=True)
+    assert [(p['name'], p['job'], p['kills'], p['is_group']) for p in stats['梵天']['players']] == [
+        ('分组00', '法师', 3, True),
+        ('梵天丁', '未知', 1, False),
+    ]
+    assert stats['梵天']['player_count'] == 2
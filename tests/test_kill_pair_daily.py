@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+击杀对汇总表 kill_pair_daily 的一致性
+
+使用 benchmarks/bench_kill_pairs.py 的数据集（含已删除的玩家和战斗记录、未解析到玩家的名称、
+同名玩家、玩家分组）和对照实现，断言：
+
+- 势力/分组/玩家击杀明细与直接聚合 battle_record 的结果一致
+- 增量入库、玩家改名后，增量维护的汇总表与按日期分批全量重建的结果逐行一致
+"""
+
+import random
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.player import Person
+from app.models.stats import KillPairDaily
+from app.services import battle_service
+from app.services.stats_service import rebuild_kill_pair_daily
+from app.utils.file_parser import save_battle_log_to_db
+from tests.factories import reset_derived_state
+import bench_kill_pairs
+
+
+def mismatched_checks():
+    """汇总表实现与 battle_record 对照实现不一致的检查项名称"""
+    return [
+        name for name, legacy, new in bench_kill_pairs.build_checks()
+        if bench_kill_pairs.canonical(legacy()) != bench_kill_pairs.canonical(new())
+    ]
+
+
+def rebuilt_pair_rows():
+    """按 31 天一批全量重建 kill_pair_daily 后的全部行"""
+    KillPairDaily.query.delete()
+    batch_start = bench_kill_pairs.START.date()
+    end_day = (bench_kill_pairs.START + timedelta(days=bench_kill_pairs.DAYS)).date()
+    while batch_start < end_day:
+        batch_end = batch_start + timedelta(days=31)
+        rebuild_kill_pair_daily(batch_start, batch_end)
+        batch_start = batch_end
+    db.session.commit()
+    return bench_kill_pairs.pair_rows()
+
+
+@pytest.fixture
+def dataset(app):
+    persons, rows = bench_kill_pairs.build_dataset(kills_per_day=100)
+    bench_kill_pairs.load_dataset(persons, rows)
+    reset_derived_state()
+    return persons
+
+
+def test_rollup_matches_raw_records(dataset):
+    assert mismatched_checks() == []
+    maintained = bench_kill_pairs.pair_rows()
+    assert maintained
+    assert rebuilt_pair_rows() == maintained
+
+
+def test_incremental_ingest_matches_rebuild(dataset):
+    rnd = random.Random(7)
+    names = [p['name'] for p in dataset]
+    battle_details = []
+    for idx in range(500):
+        win, lost = rnd.sample(names, 2)
+        battle_details.append({'killer_name': win, 'victim_name': lost, 'x_coord': 1, 'y_coord': 2,
+                               'timestamp': datetime(2025, 3, 15, 20, 0) + timedelta(seconds=idx)})
+    success, _ = save_battle_log_to_db(battle_details, [])
+    assert success
+
+    assert mismatched_checks() == []
+    maintained = bench_kill_pairs.pair_rows()
+    assert rebuilt_pair_rows() == maintained
+
+
+def test_rename_matches_rebuild(dataset):
+    # 改成另一名玩家的名称：两个名称的记录都需要重新归属
+    person = Person.query.filter_by(name='比湿奴000').first()
+    person.name = '梵天001'
+    db.session.flush()
+    battle_service.resolve_battle_record_person_ids(['比湿奴000', '梵天001'])
+    db.session.commit()
+
+    assert mismatched_checks() == []
+    maintained = bench_kill_pairs.pair_rows()
+    assert rebuilt_pair_rows() == maintained
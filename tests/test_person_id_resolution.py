@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+战斗记录名称解析为 person id 的规则
+
+入库（save_battle_log_to_db）和回填（backfill_battle_record_person_ids）使用同一规则：
+日志名称与去除首尾空格后的人员名称匹配，多名人员匹配时取 id 最大的。
+"""
+
+from datetime import datetime, timedelta
+from app import db
+from app.models.player import Person, BattleRecord
+from app.models.stats import PlayerDailyStats, KillPairDaily, KillHeatmapDaily, KillTimelineMinute
+from app.services.battle_service import backfill_battle_record_person_ids
+from app.utils.file_parser import save_battle_log_to_db
+from tests.factories import reset_derived_state
+
+
+def person_ids():
+    return [(record.win_person_id, record.lost_person_id)
+            for record in BattleRecord.query.order_by(BattleRecord.id)]
+
+
+def test_backfill_resolves_names_like_ingest(app):
+    for model in (KillTimelineMinute, KillHeatmapDaily, KillPairDaily, PlayerDailyStats, BattleRecord, Person):
+        model.query.delete()
+    padded = Person(name=' 玩家甲 ', god='梵天')
+    first = Person(name='玩家乙', god='梵天')
+    db.session.add_all([padded, first])
+    db.session.flush()
+    second = Person(name='玩家乙 ', god='湿婆')
+    db.session.add(second)
+    db.session.commit()
+    reset_derived_state()
+
+    publish_at = datetime(2025, 3, 1, 20, 0)
+    battle_details = [
+        {'killer_name': '玩家甲', 'victim_name': '玩家乙', 'x_coord': 1, 'y_coord': 2, 'timestamp': publish_at},
+        {'killer_name': '玩家乙', 'victim_name': '路人', 'x_coord': 1, 'y_coord': 2,
+         'timestamp': publish_at + timedelta(seconds=1)},
+    ]
+    success, _ = save_battle_log_to_db(battle_details, [])
+    assert success
+    ingested = person_ids()
+    assert ingested == [(padded.id, second.id), (second.id, None)]
+
+    BattleRecord.query.update({'win_person_id': None, 'lost_person_id': None})
+    db.session.commit()
+    assert backfill_battle_record_person_ids(chunk_size=1) == 2
+    assert person_ids() == ingested
+    assert backfill_battle_record_person_ids() == 0
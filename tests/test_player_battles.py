@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+玩家战斗记录分页（get_player_battles）
+"""
+
+from sqlalchemy import text
+from app import db
+from app.models.player import Person, BattleRecord
+from app.services.battle_service import get_player_battles
+from tests.factories import reset_derived_state
+
+
+def test_losses_without_killer_are_listed(app):
+    BattleRecord.query.delete()
+    Person.query.delete()
+    db.session.add(Person(name='玩家甲', god='梵天'))
+    # 模型的 win 默认值为 '0'，直接写入 NULL
+    db.session.execute(text("""
+        INSERT INTO battle_record (win, lost, position, publish_at)
+        VALUES (NULL, '玩家甲', '0,0', '2025-03-01 20:00:00'),
+               ('玩家甲', '玩家乙', '0,0', '2025-03-01 20:01:00'),
+               ('玩家甲', '玩家甲', '0,0', '2025-03-01 20:02:00')
+    """))
+    db.session.commit()
+    reset_derived_state()
+
+    result = get_player_battles('玩家甲')
+    assert [(battle['battle_result'], battle['opponent_name']) for battle in result['battles']] == [
+        ('win', '玩家甲'),
+        ('win', '玩家乙'),
+        ('lost', None),
+    ]
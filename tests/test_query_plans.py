@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+执行计划检查
+
+复用 benchmarks 下检查脚本的逻辑，在测试数据库上断言：
+
+- time_range 预设和自定义起止时间生成的时间条件使用 publish_at 索引做范围访问
+  （benchmarks/check_time_range_explain.py）
+- 服务层查询的执行计划与检入的基线相比没有回归（benchmarks/check_query_plans.py）；
+  修改 SQL 或索引后确认计划变化符合预期，再用 check_query_plans.py --update 更新基线
+"""
+
+import pytest
+from app import db
+from app.models.player import BattleRecord
+from tests.factories import reset_derived_state
+import check_query_plans
+import check_time_range_explain
+
+
+def test_time_range_conditions_use_publish_at_index(app):
+    BattleRecord.query.delete()
+    check_time_range_explain.load_rows(5000)
+    dialect = db.engine.dialect.name
+    check_time_range_explain.analyze(dialect)
+
+    results = check_time_range_explain.check_cases(dialect)
+    assert [(name, plan) for name, ok, _, plan in results if not ok] == []
+
+
+def test_service_queries_have_no_plan_regressions(app):
+    dialect = db.engine.dialect.name
+    baseline = check_query_plans.load_baseline(dialect)
+    if baseline is None:
+        pytest.skip(f'没有 {dialect} 的执行计划基线')
+
+    app.config['ANALYTICS_BACKEND'] = 'sql'
+    check_query_plans.seed_dataset()
+    reset_derived_state()
+    plans = check_query_plans.collect_plans(check_query_plans.build_queries(app))
+
+    regressions, _ = check_query_plans.compare(baseline, plans)
+    assert regressions == []